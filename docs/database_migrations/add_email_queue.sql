@@ -0,0 +1,31 @@
+-- Migration: Add the email queue
+-- Services write one email_queue row per rendered email and return; the notification service's
+-- dispatcher (or POST /notifications/email/dispatch) claims due rows in batches and sends them over a
+-- small pool of reused, authenticated SMTP connections, holding each recipient domain to its rate limit.
+-- Transient failures are retried with exponential backoff (attempts, next_attempt_at); permanent ones
+-- and rows past the attempt limit end as 'failed' with last_error. A rate-limited row is moved to a later
+-- next_attempt_at without counting an attempt.
+
+CREATE TABLE IF NOT EXISTS public.email_queue (
+  id bigserial PRIMARY KEY,
+  idempotency_key text NOT NULL,
+  to_email text NOT NULL,
+  domain text NOT NULL DEFAULT '',                   -- recipient domain, for per-domain rate limits
+  subject text NOT NULL,
+  html_content text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  status text NOT NULL DEFAULT 'pending',            -- pending | processing | sent | failed
+  attempts integer NOT NULL DEFAULT 0,
+  next_attempt_at timestamptz NOT NULL DEFAULT now(), -- also the lease expiry while processing
+  last_error text NULL,
+  sent_at timestamptz NULL,
+  CONSTRAINT email_queue_status_check CHECK (status IN ('pending', 'processing', 'sent', 'failed'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_email_queue_idempotency_key
+ON public.email_queue USING btree (idempotency_key) TABLESPACE pg_default;
+
+-- The dispatcher's claim query: due rows that are not finished
+CREATE INDEX IF NOT EXISTS idx_email_queue_due
+ON public.email_queue USING btree (next_attempt_at, id) TABLESPACE pg_default
+WHERE status IN ('pending', 'processing');
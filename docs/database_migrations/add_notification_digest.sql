@@ -0,0 +1,61 @@
+-- Migration: Add per-user notification digests
+-- Users choose instant delivery (one notification and email per reminder, the default) or a digest:
+-- the reminder and overdue sweeps then buffer each notification as a notification_digest_items row,
+-- and the notification service sends one combined in-app notification (type 'digest') and one email
+-- per user once the oldest buffered item has waited digest_window_minutes.
+-- Delivered items keep their source sweep and task/project and record the digest they went out in
+-- (digest_id, notification_id), so every line of a digest can be traced back.
+-- idempotency_key is unique, so an hourly sweep buffering the same reminder again is ignored.
+-- The digest notification is stored with notifications.outbox_key = 'digest:<digest_id>'
+-- (see add_notification_outbox.sql), so a retried digest never stores a second notification.
+
+CREATE TABLE IF NOT EXISTS public.user_notification_settings (
+  user_id uuid PRIMARY KEY,
+  delivery_mode text NOT NULL DEFAULT 'instant',     -- instant | digest
+  digest_window_minutes integer NULL,                -- NULL: the service default (DIGEST_WINDOW_MINUTES)
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  CONSTRAINT user_notification_settings_mode_check CHECK (delivery_mode IN ('instant', 'digest')),
+  CONSTRAINT user_notification_settings_window_check CHECK (digest_window_minutes BETWEEN 0 AND 10080)
+);
+
+CREATE TABLE IF NOT EXISTS public.notification_digest_items (
+  id bigserial PRIMARY KEY,
+  idempotency_key text NOT NULL,
+  user_id uuid NOT NULL,
+  source text NOT NULL,                              -- sweep that buffered it, e.g. check_due_date_reminders
+  item_type text NOT NULL,                           -- task | project
+  item_id uuid NULL,
+  type text NOT NULL,                                -- notification type, e.g. reminder_3_days
+  title text NOT NULL,
+  message text NULL,
+  due_date text NULL,
+  priority text NULL,
+  in_app boolean NOT NULL DEFAULT true,              -- channels the per-task/project preferences allow
+  email boolean NOT NULL DEFAULT true,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  deliver_after timestamptz NOT NULL DEFAULT now(),  -- created_at + the user's window
+  status text NOT NULL DEFAULT 'pending',            -- pending | sent | failed
+  attempts integer NOT NULL DEFAULT 0,
+  last_error text NULL,
+  digest_id text NULL,
+  notification_id text NULL,                         -- notifications.id of the combined entry
+  delivered_at timestamptz NULL,
+  CONSTRAINT notification_digest_items_status_check CHECK (status IN ('pending', 'sent', 'failed'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_digest_items_idempotency_key
+ON public.notification_digest_items USING btree (idempotency_key) TABLESPACE pg_default;
+
+-- The flush: users with a due pending item, then all of their pending items
+CREATE INDEX IF NOT EXISTS idx_notification_digest_items_due
+ON public.notification_digest_items USING btree (deliver_after) TABLESPACE pg_default
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_notification_digest_items_pending_user
+ON public.notification_digest_items USING btree (user_id, id) TABLESPACE pg_default
+WHERE status = 'pending';
+
+-- GET /notifications/<id>/digest-items
+CREATE INDEX IF NOT EXISTS idx_notification_digest_items_notification
+ON public.notification_digest_items USING btree (notification_id) TABLESPACE pg_default
+WHERE notification_id IS NOT NULL;
@@ -0,0 +1,49 @@
+-- Migration: Add the notification outbox
+-- Request handlers write one notification_outbox row per (recipient, notification) and return.
+-- A relay (in the task service, or POST /notifications/outbox/relay) claims due rows in batches and
+-- delivers the in-app, real-time and email channels listed in `channels`, recording finished channels
+-- in `delivered` so a retry only repeats what failed.
+-- idempotency_key is unique, so writing the same intent twice (a retried request, a second sweep)
+-- is ignored. notifications.outbox_key is unique for the same reason: a retried relay batch never
+-- stores a second in-app notification.
+
+CREATE TABLE IF NOT EXISTS public.notification_outbox (
+  id bigserial PRIMARY KEY,
+  idempotency_key text NOT NULL,
+  user_id uuid NOT NULL,
+  title text NOT NULL,
+  message text NULL,
+  type text NOT NULL,
+  task_id uuid NULL,
+  project_id uuid NULL,                              -- project notifications (task_id is NULL)
+  due_date text NULL,
+  priority text NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  channels text[] NOT NULL DEFAULT '{}',
+  delivered text[] NOT NULL DEFAULT '{}',
+  email jsonb NULL,                                  -- send_notification_email arguments
+  status text NOT NULL DEFAULT 'pending',            -- pending | processing | sent | failed
+  attempts integer NOT NULL DEFAULT 0,
+  next_attempt_at timestamptz NOT NULL DEFAULT now(), -- also the lease expiry while processing
+  last_error text NULL,
+  sent_at timestamptz NULL,
+  CONSTRAINT notification_outbox_status_check CHECK (status IN ('pending', 'processing', 'sent', 'failed'))
+);
+
+-- Tables created before project notifications went through the outbox
+ALTER TABLE public.notification_outbox
+ADD COLUMN IF NOT EXISTS project_id uuid NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox_idempotency_key
+ON public.notification_outbox USING btree (idempotency_key) TABLESPACE pg_default;
+
+-- The relay's claim query: due rows that are not finished
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+ON public.notification_outbox USING btree (next_attempt_at, id) TABLESPACE pg_default
+WHERE status IN ('pending', 'processing');
+
+ALTER TABLE public.notifications
+ADD COLUMN IF NOT EXISTS outbox_key text NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_outbox_key
+ON public.notifications USING btree (outbox_key) TABLESPACE pg_default;
@@ -0,0 +1,106 @@
+-- Migration: Add full-text search over tasks, comments and projects
+-- Each searchable table gets a stored tsvector column kept current by Postgres on every write,
+-- with a GIN index, so a search only touches the rows that match its terms.
+-- search_workspace() backs GET /search in the task service: it matches, applies access rules
+-- (task_member for tasks and their comments, creator/collaborators for projects), ranks and
+-- returns one page. Snippets are only built for the rows on that page; matched words are wrapped
+-- in ** (plain text, never HTML, since comments are user input).
+
+ALTER TABLE public.task
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+  setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_task_search_vector
+ON public.task USING gin (search_vector) TABLESPACE pg_default;
+
+ALTER TABLE public.task_comments
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (to_tsvector('english', coalesce(comment_text, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_task_comments_search_vector
+ON public.task_comments USING gin (search_vector) TABLESPACE pg_default;
+
+ALTER TABLE public.project
+ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce(project_name, '')), 'A') ||
+  setweight(to_tsvector('english', coalesce(project_description, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_project_search_vector
+ON public.project USING gin (search_vector) TABLESPACE pg_default;
+
+CREATE OR REPLACE FUNCTION public.search_workspace(
+  p_query text,
+  p_user_id uuid,
+  p_types text[] DEFAULT ARRAY['task', 'comment', 'project'],
+  p_limit integer DEFAULT 20,
+  p_offset integer DEFAULT 0
+)
+RETURNS TABLE (
+  type text,
+  id text,
+  task_id text,
+  project_id text,
+  title text,
+  snippet text,
+  rank real,
+  total bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH q AS (
+    SELECT websearch_to_tsquery('english', p_query) AS query
+  ),
+  member_tasks AS (
+    SELECT tm.task_id FROM public.task_member tm WHERE tm.user_id = p_user_id
+  ),
+  hits AS (
+    SELECT 'task'::text AS type, t.task_id::text AS id, t.task_id::text AS task_id, t.project_id::text AS project_id,
+           t.title::text AS title, coalesce(t.description, '')::text AS body,
+           ts_rank_cd(t.search_vector, q.query) AS rank
+    FROM public.task t, q
+    WHERE 'task' = ANY (p_types)
+      AND t.search_vector @@ q.query
+      AND t.task_id IN (SELECT task_id FROM member_tasks)
+    UNION ALL
+    SELECT 'comment', c.comment_id::text, c.task_id::text, t.project_id::text,
+           t.title::text, c.comment_text::text,
+           ts_rank_cd(c.search_vector, q.query) * 0.8  -- a title hit outranks the same words in a comment
+    FROM public.task_comments c
+    JOIN public.task t ON t.task_id = c.task_id, q
+    WHERE 'comment' = ANY (p_types)
+      AND c.search_vector @@ q.query
+      AND c.task_id IN (SELECT task_id FROM member_tasks)
+    UNION ALL
+    SELECT 'project', p.project_id::text, NULL, p.project_id::text,
+           p.project_name::text, coalesce(p.project_description, '')::text,
+           ts_rank_cd(p.search_vector, q.query)
+    FROM public.project p, q
+    WHERE 'project' = ANY (p_types)
+      AND p.search_vector @@ q.query
+      -- collaborators may hold a JSON array or a JSON-encoded string of one (as in add_task_member_index.sql)
+      AND (p.created_by::text = p_user_id::text
+           OR CASE jsonb_typeof(p.collaborators::jsonb)
+                WHEN 'array' THEN p.collaborators::jsonb
+                WHEN 'string' THEN (p.collaborators::jsonb #>> '{}')::jsonb
+                ELSE '[]'::jsonb
+              END ? p_user_id::text)
+  ),
+  page AS (
+    SELECT h.*, count(*) OVER () AS total
+    FROM hits h
+    ORDER BY h.rank DESC, h.type, h.id
+    LIMIT greatest(p_limit, 0) OFFSET greatest(p_offset, 0)
+  )
+  SELECT page.type, page.id, page.task_id, page.project_id, page.title,
+         ts_headline('english', CASE WHEN page.body = '' THEN page.title ELSE page.body END, q.query,
+                     'MaxWords=25, MinWords=10, MaxFragments=1, StartSel=**, StopSel=**'),
+         page.rank, page.total
+  FROM page, q
+  ORDER BY page.rank DESC, page.type, page.id;
+$$;
@@ -0,0 +1,26 @@
+-- Migration: Add the subtask_counts function
+-- Backs subtasks_count on task lists: one grouped query returns the number of subtasks per parent for
+-- a batch of parent ids, so the task service no longer downloads one row per subtask to count them
+-- (which a 1000-row response cap also truncated for parents with many subtasks).
+-- Without this function the task service falls back to a paged scan of parent_task_id.
+-- p_parent_ids is cast to uuid[] once so the comparison is on the bare column and can use the index
+-- below (casting the column to text would force a scan of every task).
+
+CREATE INDEX IF NOT EXISTS idx_task_parent_task_id
+ON public.task USING btree (parent_task_id) TABLESPACE pg_default
+WHERE parent_task_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.subtask_counts(p_parent_ids text[])
+RETURNS TABLE (
+  parent_task_id text,
+  subtasks_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT t.parent_task_id::text, count(*)
+  FROM public.task t
+  WHERE t.parent_task_id = ANY (p_parent_ids::uuid[])
+    AND t."isSubtask" IS TRUE
+  GROUP BY t.parent_task_id
+$$;
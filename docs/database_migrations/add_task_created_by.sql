@@ -0,0 +1,39 @@
+-- Migration: Add task.created_by
+-- Stores who created a task so access checks (creator vs collaborator) no longer read task_log.
+-- Filled by create_task and bulk creates; recurring instances copy it from the original task.
+-- Rows created before this migration are backfilled below from their 'create' audit entry.
+-- POST /tasks/backfill-created-by repeats the backfill in batches (e.g. for rows written by
+-- older replicas during a rolling deploy) and is safe to run more than once.
+
+ALTER TABLE public.task
+ADD COLUMN IF NOT EXISTS created_by uuid NULL;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint WHERE conname = 'task_created_by_fkey'
+  ) THEN
+    ALTER TABLE public.task
+    ADD CONSTRAINT task_created_by_fkey FOREIGN KEY (created_by)
+    REFERENCES "user" (user_id) ON UPDATE CASCADE ON DELETE SET NULL;
+  END IF;
+END $$;
+
+-- Backfill from the earliest 'create' audit entry of each task (ignores 'system' and other non-UUID actors)
+UPDATE public.task t
+SET created_by = l.user_id::uuid
+FROM (
+  SELECT DISTINCT ON (task_id) task_id, user_id
+  FROM public.task_log
+  WHERE action = 'create'
+  ORDER BY task_id, created_at ASC
+) l
+WHERE t.task_id = l.task_id
+  AND t.created_by IS NULL
+  AND l.user_id::text ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+  AND EXISTS (SELECT 1 FROM "user" u WHERE u.user_id = l.user_id::uuid);
+
+-- Lets the backfill job find remaining rows quickly
+CREATE INDEX IF NOT EXISTS idx_task_created_by_missing
+ON public.task USING btree (task_id) TABLESPACE pg_default
+WHERE created_by IS NULL;
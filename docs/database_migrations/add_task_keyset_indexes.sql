@@ -0,0 +1,11 @@
+-- Migration: Add indexes for keyset (cursor) pagination of task lists
+-- GET /tasks, /tasks/optimized and /tasks/user/<user_id> page by (created_at, task_id) descending
+
+CREATE INDEX IF NOT EXISTS idx_task_created_at_task_id
+ON public.task USING btree (created_at DESC, task_id DESC) TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS idx_task_owner_created_at_task_id
+ON public.task USING btree (owner_id, created_at DESC, task_id DESC) TABLESPACE pg_default;
+
+CREATE INDEX IF NOT EXISTS idx_task_project_created_at_task_id
+ON public.task USING btree (project_id, created_at DESC, task_id DESC) TABLESPACE pg_default;
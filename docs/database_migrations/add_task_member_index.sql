@@ -0,0 +1,40 @@
+-- Migration: Add task_member membership index
+-- Read model mapping users to the tasks they own or collaborate on.
+-- Maintained by the task service (create_task, update_task, delete_task, recurring
+-- instances) and used by GET /users/<user_id>/accessible-tasks.
+
+-- Create task_member table
+CREATE TABLE IF NOT EXISTS public.task_member (
+  user_id uuid NOT NULL,
+  task_id uuid NOT NULL,
+  role text NOT NULL DEFAULT 'collaborator',
+  created_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT task_member_pkey PRIMARY KEY (user_id, task_id),
+  CONSTRAINT task_member_task_id_fkey FOREIGN KEY (task_id) REFERENCES task (task_id) ON UPDATE CASCADE ON DELETE CASCADE,
+  CONSTRAINT valid_task_member_role CHECK (role IN ('owner', 'collaborator'))
+) TABLESPACE pg_default;
+
+-- The primary key already serves lookups by user_id; add the reverse index for rewrites by task
+CREATE INDEX IF NOT EXISTS idx_task_member_task_id
+ON public.task_member USING btree (task_id) TABLESPACE pg_default;
+
+-- Backfill owners
+INSERT INTO public.task_member (user_id, task_id, role)
+SELECT t.owner_id, t.task_id, 'owner'
+FROM public.task t
+WHERE t.owner_id IS NOT NULL
+ON CONFLICT (user_id, task_id) DO NOTHING;
+
+-- Backfill collaborators (the column holds either a JSON array or a JSON-encoded string)
+INSERT INTO public.task_member (user_id, task_id, role)
+SELECT DISTINCT c.collaborator_id::uuid, t.task_id, 'collaborator'
+FROM public.task t
+CROSS JOIN LATERAL jsonb_array_elements_text(
+  CASE jsonb_typeof(t.collaborators::jsonb)
+    WHEN 'array' THEN t.collaborators::jsonb
+    WHEN 'string' THEN (t.collaborators::jsonb #>> '{}')::jsonb
+    ELSE '[]'::jsonb
+  END
+) AS c(collaborator_id)
+WHERE c.collaborator_id ~* '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+ON CONFLICT (user_id, task_id) DO NOTHING;
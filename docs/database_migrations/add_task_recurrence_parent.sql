@@ -0,0 +1,29 @@
+-- Migration: Add task.recurrence_parent_id
+-- Links each recurring task instance to the instance it was generated from, so a series is a chain.
+-- Set by create_recurring_task_instance (on completion) and by POST /tasks/recurring/materialize,
+-- which pre-creates instances due within a rolling window.
+-- The unique index guarantees at most one next instance per task, so the completion path and the
+-- materialization job cannot both create the same occurrence.
+
+ALTER TABLE public.task
+ADD COLUMN IF NOT EXISTS recurrence_parent_id uuid NULL;
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint WHERE conname = 'task_recurrence_parent_id_fkey'
+  ) THEN
+    ALTER TABLE public.task
+    ADD CONSTRAINT task_recurrence_parent_id_fkey FOREIGN KEY (recurrence_parent_id)
+    REFERENCES public.task (task_id) ON UPDATE CASCADE ON DELETE SET NULL;
+  END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_task_recurrence_parent_id
+ON public.task USING btree (recurrence_parent_id) TABLESPACE pg_default
+WHERE recurrence_parent_id IS NOT NULL;
+
+-- Lets the materialization job find open recurring tasks without a full scan
+CREATE INDEX IF NOT EXISTS idx_task_open_recurring
+ON public.task USING btree (due_date) TABLESPACE pg_default
+WHERE recurrence IS NOT NULL AND status <> 'Completed';
@@ -0,0 +1,47 @@
+-- Migration: Add the task_stats function
+-- Backs GET /tasks/stats: one grouped query returns counters per (owner, status, priority), which the
+-- task service folds into dashboard totals. The result has at most owners x statuses x priorities rows,
+-- whatever the number of tasks, so dashboards no longer download full task lists to count them.
+-- Without this function the endpoint falls back to a paged scan of the counted columns.
+
+CREATE OR REPLACE FUNCTION public.task_stats(
+  p_owner_ids text[] DEFAULT NULL,
+  p_project_id text DEFAULT NULL,
+  p_main_only boolean DEFAULT false,
+  p_today date DEFAULT current_date,
+  p_due_soon_days integer DEFAULT 7
+)
+RETURNS TABLE (
+  owner_id text,
+  status text,
+  priority text,
+  total bigint,
+  overdue bigint,
+  due_soon bigint,
+  completion_days_sum double precision,
+  completion_samples bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    t.owner_id::text,
+    t.status::text,
+    COALESCE(t.priority::text, '5'),
+    count(*),
+    count(*) FILTER (WHERE t.status <> 'Completed' AND t.due_date::date < p_today),
+    count(*) FILTER (WHERE t.status <> 'Completed'
+                     AND t.due_date::date BETWEEN p_today AND p_today + p_due_soon_days),
+    COALESCE(sum(GREATEST(0, extract(epoch FROM (t.completed_date::timestamptz - t.created_at::timestamptz)) / 86400))
+             FILTER (WHERE t.status = 'Completed' AND t.completed_date IS NOT NULL AND t.created_at IS NOT NULL), 0),
+    count(*) FILTER (WHERE t.status = 'Completed' AND t.completed_date IS NOT NULL AND t.created_at IS NOT NULL)
+  FROM public.task t
+  WHERE (p_owner_ids IS NULL OR t.owner_id::text = ANY (p_owner_ids))
+    AND (p_project_id IS NULL OR t.project_id::text = p_project_id)
+    AND (NOT p_main_only OR t."isSubtask" IS NOT TRUE)
+  GROUP BY 1, 2, 3;
+$$;
+
+-- Owner-scoped dashboards group by status within an owner
+CREATE INDEX IF NOT EXISTS idx_task_owner_status
+ON public.task USING btree (owner_id, status) TABLESPACE pg_default;
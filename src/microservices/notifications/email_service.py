@@ -1,9 +1,12 @@
 import os
+import re
+import sys
 import smtplib
+from html import escape
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # Load environment variables from .env file
 try:
@@ -26,57 +29,42 @@ FROM_NAME = os.getenv("FROM_NAME", "Task Manager")
 # Frontend URL for task links
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# Shared modules: ../shared next to the services, ../../shared when the project image copies this file
+# into its notifications/ subfolder
+sys.path.append(os.path.join(os.path.dirname(__file__), '../shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../shared'))
+from email_dispatch import EmailDispatcher, SmtpPool, DomainRateLimiter, build_email_row, parse_rate_limits
 
-def create_email_template(notification_type: str, data: dict) -> str:
-    """Create HTML email template based on notification type"""
+# "queue" writes emails to the email_queue table for the dispatcher; "direct" sends them inline
+EMAIL_DELIVERY = os.getenv("EMAIL_DELIVERY", "queue")
 
-    task_title = data.get("task_title", "Untitled Task")
-    due_date = data.get("due_date", "")
-    priority = data.get("priority", 5)
-    task_id = data.get("task_id", "")
-    task_link = f"{FRONTEND_URL}/tasks?taskId={task_id}" if task_id else FRONTEND_URL
+# Set by use_email_dispatcher(); without one, emails are sent inline by send_email()
+EMAIL_DISPATCHER: Optional[EmailDispatcher] = None
 
-    # Convert priority to number if it's a string (for backwards compatibility)
-    if isinstance(priority, str):
-        priority = int(priority) if priority.isdigit() else 5
-    
-    # Priority colors based on 1-10 scale
-    # 1-4: Low priority (green)
-    # 5-7: Medium priority (orange)
-    # 8-10: High priority (red)
-    if priority >= 8:
-        priority_color = "#cf1322"  # Red for high priority
-        priority_label = f"Priority: {priority}/10 (High)"
-    elif priority >= 5:
-        priority_color = "#d46b08"  # Orange for medium priority
-        priority_label = f"Priority: {priority}/10 (Medium)"
-    else:
-        priority_color = "#389e0d"  # Green for low priority
-        priority_label = f"Priority: {priority}/10 (Low)"
 
-    # Base HTML template
-    base_style = """
+# Shared <style> block; the accent colour follows the task priority
+_BASE_STYLE = """
     <style>
         body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
         .container { max-width: 600px; margin: 0 auto; padding: 20px; }
         .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; border-radius: 8px 8px 0 0; text-align: center; }
         .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 8px 8px; }
-        .task-card { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid {priority_color}; }
-        .priority-badge { display: inline-block; padding: 4px 12px; border-radius: 12px; font-size: 12px; font-weight: bold; background: {priority_color}; color: white; }
+        .task-card { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid ${priority_color}; }
+        .priority-badge { display: inline-block; padding: 4px 12px; border-radius: 12px; font-size: 12px; font-weight: bold; background: ${priority_color}; color: white; }
         .button { display: inline-block; padding: 12px 24px; background: #667eea; color: white; text-decoration: none; border-radius: 6px; font-weight: bold; margin: 20px 0; }
         .button:hover { background: #5568d3; }
         .footer { text-align: center; color: #999; font-size: 12px; margin-top: 30px; padding-top: 20px; border-top: 1px solid #e0e0e0; }
     </style>
-    """.replace("{priority_color}", priority_color)
-
-    if notification_type.startswith("reminder_"):
-        days = notification_type.split("_")[1]
-        subject = f"⏰ Task Reminder: {task_title}"
+    """
 
-        html_content = f"""
+# notification type -> (subject, HTML body); ${field} marks what is filled in per message.
+# "reminder" and "project_reminder" serve every reminder_<n>_days / project_reminder_<n>_days type,
+# "generic" any other type with a message.
+_TEMPLATE_SOURCES: Dict[str, Tuple[str, str]] = {
+    "reminder": ("⏰ Task Reminder: ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -87,14 +75,14 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     <p>This is a friendly reminder about your upcoming task:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{task_title}</h2>
-                        <p><strong>Due Date:</strong> {due_date}</p>
-                        <p><strong>Priority:</strong> <span class="priority-badge">{priority_label}</span></p>
-                        <p style="color: #666; margin-top: 15px;">This task is due in <strong>{days} day(s)</strong>. Make sure to complete it on time!</p>
+                        <h2 style="margin-top: 0; color: #333;">${task_title}</h2>
+                        <p><strong>Due Date:</strong> ${due_date}</p>
+                        <p><strong>Priority:</strong> <span class="priority-badge">${priority_label}</span></p>
+                        <p style="color: #666; margin-top: 15px;">This task is due in <strong>${days} day(s)</strong>. Make sure to complete it on time!</p>
                     </div>
 
                     <center>
-                        <a href="{task_link}" class="button">View Task Details</a>
+                        <a href="${task_link}" class="button">View Task Details</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -108,17 +96,11 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "due_date_change":
-        old_due_date = data.get("old_due_date", "")
-        new_due_date = data.get("new_due_date", "")
-        subject = f"📅 Due Date Changed: {task_title}"
-
-        html_content = f"""
+        """),
+    "due_date_change": ("📅 Due Date Changed: ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -129,16 +111,16 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     <p>The due date for a task you're collaborating on has been changed:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{task_title}</h2>
-                        <p><strong>Priority:</strong> <span class="priority-badge">{priority_label}</span></p>
+                        <h2 style="margin-top: 0; color: #333;">${task_title}</h2>
+                        <p><strong>Priority:</strong> <span class="priority-badge">${priority_label}</span></p>
                         <div style="background: #fff7e6; padding: 15px; border-radius: 6px; margin: 15px 0;">
-                            <p style="margin: 5px 0;"><strong>Previous Due Date:</strong> <span style="text-decoration: line-through; color: #999;">{old_due_date}</span></p>
-                            <p style="margin: 5px 0;"><strong>New Due Date:</strong> <span style="color: #d46b08; font-weight: bold;">{new_due_date}</span></p>
+                            <p style="margin: 5px 0;"><strong>Previous Due Date:</strong> <span style="text-decoration: line-through; color: #999;">${old_due_date}</span></p>
+                            <p style="margin: 5px 0;"><strong>New Due Date:</strong> <span style="color: #d46b08; font-weight: bold;">${new_due_date}</span></p>
                         </div>
                     </div>
 
                     <center>
-                        <a href="{task_link}" class="button">View Task Details</a>
+                        <a href="${task_link}" class="button">View Task Details</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -152,17 +134,11 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "task_comment":
-        comment_text = data.get("comment_text", "")
-        commenter_name = data.get("commenter_name", "Someone")
-        subject = f"💬 New Comment: {task_title}"
-
-        html_content = f"""
+        """),
+    "task_comment": ("💬 New Comment: ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -170,19 +146,19 @@ def create_email_template(notification_type: str, data: dict) -> str:
                 </div>
                 <div class="content">
                     <p>Hi there,</p>
-                    <p><strong>{commenter_name}</strong> commented on a task you're collaborating on:</p>
+                    <p><strong>${commenter_name}</strong> commented on a task you're collaborating on:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{task_title}</h2>
-                        <p><strong>Priority:</strong> <span class="priority-badge">{priority}</span></p>
-                        {f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''}
+                        <h2 style="margin-top: 0; color: #333;">${task_title}</h2>
+                        <p><strong>Priority:</strong> <span class="priority-badge">${priority}</span></p>
+                        ${due_date_row}
                         <div style="background: #f0f5ff; padding: 15px; border-radius: 6px; margin: 15px 0; border-left: 3px solid #1890ff;">
-                            <p style="margin: 0; color: #555; font-style: italic;">"{comment_text}"</p>
+                            <p style="margin: 0; color: #555; font-style: italic;">"${comment_text}"</p>
                         </div>
                     </div>
 
                     <center>
-                        <a href="{task_link}" class="button">View Comment & Reply</a>
+                        <a href="${task_link}" class="button">View Comment & Reply</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -196,20 +172,11 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "project_comment":
-        comment_text = data.get("comment_text", "")
-        commenter_name = data.get("commenter_name", "Someone")
-        project_name = data.get("project_name", "Untitled Project")
-        project_id = data.get("project_id", "")
-        project_link = f"{FRONTEND_URL}/projects?projectId={project_id}" if project_id else FRONTEND_URL
-        subject = f"💬 New Comment on Project: {project_name}"
-
-        html_content = f"""
+        """),
+    "project_comment": ("💬 New Comment on Project: ${project_name}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -217,17 +184,17 @@ def create_email_template(notification_type: str, data: dict) -> str:
                 </div>
                 <div class="content">
                     <p>Hi there,</p>
-                    <p><strong>{commenter_name}</strong> commented on a project you're collaborating on:</p>
+                    <p><strong>${commenter_name}</strong> commented on a project you're collaborating on:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{project_name}</h2>
+                        <h2 style="margin-top: 0; color: #333;">${project_name}</h2>
                         <div style="background: #f0f5ff; padding: 15px; border-radius: 6px; margin: 15px 0; border-left: 3px solid #1890ff;">
-                            <p style="margin: 0; color: #555; font-style: italic;">"{comment_text}"</p>
+                            <p style="margin: 0; color: #555; font-style: italic;">"${comment_text}"</p>
                         </div>
                     </div>
 
                     <center>
-                        <a href="{project_link}" class="button">View Comment & Reply</a>
+                        <a href="${project_link}" class="button">View Comment & Reply</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -241,18 +208,11 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "project_created":
-        project_name = data.get("project_name", "Untitled Project")
-        project_id = data.get("project_id", "")
-        project_link = f"{FRONTEND_URL}/projects?projectId={project_id}" if project_id else FRONTEND_URL
-        subject = f"📁 New Project Created: {project_name}"
-
-        html_content = f"""
+        """),
+    "project_created": ("📁 New Project Created: ${project_name}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -263,12 +223,12 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     <p>You have successfully created a new project:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{project_name}</h2>
-                        {f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''}
+                        <h2 style="margin-top: 0; color: #333;">${project_name}</h2>
+                        ${due_date_row}
                     </div>
 
                     <center>
-                        <a href="{project_link}" class="button">View Project Details</a>
+                        <a href="${project_link}" class="button">View Project Details</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -282,18 +242,11 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "project_assigned":
-        project_name = data.get("project_name", "Untitled Project")
-        project_id = data.get("project_id", "")
-        project_link = f"{FRONTEND_URL}/projects?projectId={project_id}" if project_id else FRONTEND_URL
-        subject = f"📁 New Project Assigned: {project_name}"
-
-        html_content = f"""
+        """),
+    "project_assigned": ("📁 New Project Assigned: ${project_name}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -304,12 +257,12 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     <p>You have been assigned to a new project:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{project_name}</h2>
-                        {f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''}
+                        <h2 style="margin-top: 0; color: #333;">${project_name}</h2>
+                        ${due_date_row}
                     </div>
 
                     <center>
-                        <a href="{project_link}" class="button">View Project Details</a>
+                        <a href="${project_link}" class="button">View Project Details</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -323,89 +276,66 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "task_mention":
-        comment_text = data.get("comment_text", "")
-        commenter_name = data.get("commenter_name", "Someone")
-        subject = f"👤 You were mentioned in a task: {task_title}"
-
-        html_content = f"""
+        """),
+    "task_mention": ("👤 You were mentioned in a task: ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
                     <h1>You were mentioned in a task!</h1>
                 </div>
                 <div class="content">
-                    <p><strong>{commenter_name}</strong> mentioned you in a comment on the task <strong>"{task_title}"</strong>.</p>
+                    <p><strong>${commenter_name}</strong> mentioned you in a comment on the task <strong>"${task_title}"</strong>.</p>
                     <div class="comment-box">
                         <p><strong>Comment:</strong></p>
-                        <p>"{comment_text}"</p>
+                        <p>"${comment_text}"</p>
                     </div>
                     <div class="task-info">
-                        <p><strong>Task:</strong> {task_title}</p>
-                        <p><strong>Priority:</strong> <span style="color: {priority_color};">{priority_label}</span></p>
-                        {f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''}
+                        <p><strong>Task:</strong> ${task_title}</p>
+                        <p><strong>Priority:</strong> <span style="color: ${priority_color};">${priority_label}</span></p>
+                        ${due_date_row}
                     </div>
                     <div class="action">
-                        <a href="{task_link}" class="button">View Task</a>
+                        <a href="${task_link}" class="button">View Task</a>
                     </div>
                 </div>
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "project_mention":
-        comment_text = data.get("comment_text", "")
-        commenter_name = data.get("commenter_name", "Someone")
-        project_name = data.get("project_name", "Untitled Project")
-        project_id = data.get("project_id", "")
-        project_link = f"{FRONTEND_URL}/projects/{project_id}" if project_id else FRONTEND_URL
-        subject = f"👤 You were mentioned in a project: {project_name}"
-
-        html_content = f"""
+        """),
+    "project_mention": ("👤 You were mentioned in a project: ${project_name}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
                     <h1>You were mentioned in a project!</h1>
                 </div>
                 <div class="content">
-                    <p><strong>{commenter_name}</strong> mentioned you in a comment on the project <strong>"{project_name}"</strong>.</p>
+                    <p><strong>${commenter_name}</strong> mentioned you in a comment on the project <strong>"${project_name}"</strong>.</p>
                     <div class="comment-box">
                         <p><strong>Comment:</strong></p>
-                        <p>"{comment_text}"</p>
+                        <p>"${comment_text}"</p>
                     </div>
                     <div class="task-info">
-                        <p><strong>Project:</strong> {project_name}</p>
-                        {f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''}
+                        <p><strong>Project:</strong> ${project_name}</p>
+                        ${due_date_row}
                     </div>
                     <div class="action">
-                        <a href="{project_link}" class="button">View Project</a>
+                        <a href="${project_link}" class="button">View Project</a>
                     </div>
                 </div>
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type.startswith("project_reminder_"):
-        days = notification_type.split("_")[2]
-        project_name = data.get("project_name", task_title)
-        project_id = data.get("project_id", "")
-        project_link = f"{FRONTEND_URL}/projects/{project_id}" if project_id else FRONTEND_URL
-        subject = f"⏰ Project Reminder: {project_name}"
-
-        html_content = f"""
+        """),
+    "project_reminder": ("⏰ Project Reminder: ${project_name}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -416,13 +346,13 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     <p>This is a friendly reminder about your upcoming project:</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{project_name}</h2>
-                        <p><strong>Due Date:</strong> {due_date}</p>
-                        <p style="color: #666; margin-top: 15px;">This project is due in <strong>{days} day(s)</strong>. Make sure to complete it on time!</p>
+                        <h2 style="margin-top: 0; color: #333;">${project_name}</h2>
+                        <p><strong>Due Date:</strong> ${due_date}</p>
+                        <p style="color: #666; margin-top: 15px;">This project is due in <strong>${days} day(s)</strong>. Make sure to complete it on time!</p>
                     </div>
 
                     <center>
-                        <a href="{project_link}" class="button">View Project Details</a>
+                        <a href="${project_link}" class="button">View Project Details</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -436,26 +366,18 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "overdue_tasks":
-        message = data.get("message", "You have overdue tasks")
-        subject = f"⚠️ {task_title}"
-
-        # Style for overdue (high priority red)
-        overdue_style = base_style.replace("{priority_color}", "#cf1322")
-
-        html_content = f"""
+        """),
+    "overdue_tasks": ("⚠️ ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{overdue_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header" style="background: linear-gradient(135deg, #cf1322 0%, #a8071a 100%);">
                     <h1 style="margin: 0;">⚠️ Overdue Tasks Alert</h1>
                 </div>
                 <div class="content">
-                    <p>{message}</p>
+                    <p>${message}</p>
 
                     <div class="task-card" style="border-left: 4px solid #cf1322; background: #fff1f0;">
                         <h2 style="margin-top: 0; color: #cf1322;">Action Required</h2>
@@ -463,7 +385,7 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     </div>
 
                     <center>
-                        <a href="{FRONTEND_URL}/tasks" class="button" style="background: #cf1322;">View All Tasks</a>
+                        <a href="${frontend_url}/tasks" class="button" style="background: #cf1322;">View All Tasks</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -477,26 +399,18 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
-
-    elif notification_type == "overdue_projects":
-        message = data.get("message", "You have overdue projects")
-        subject = f"⚠️ {task_title}"
-
-        # Style for overdue (high priority red)
-        overdue_style = base_style.replace("{priority_color}", "#cf1322")
-
-        html_content = f"""
+        """),
+    "overdue_projects": ("⚠️ ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{overdue_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header" style="background: linear-gradient(135deg, #cf1322 0%, #a8071a 100%);">
                     <h1 style="margin: 0;">⚠️ Overdue Projects Alert</h1>
                 </div>
                 <div class="content">
-                    <p>{message}</p>
+                    <p>${message}</p>
 
                     <div class="task-card" style="border-left: 4px solid #cf1322; background: #fff1f0;">
                         <h2 style="margin-top: 0; color: #cf1322;">Action Required</h2>
@@ -504,7 +418,7 @@ def create_email_template(notification_type: str, data: dict) -> str:
                     </div>
 
                     <center>
-                        <a href="{FRONTEND_URL}/projects" class="button" style="background: #cf1322;">View All Projects</a>
+                        <a href="${frontend_url}/projects" class="button" style="background: #cf1322;">View All Projects</a>
                     </center>
 
                     <p style="color: #666; font-size: 14px; margin-top: 30px;">
@@ -518,21 +432,41 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
+        """),
+    "digest": ("📋 Your Digest: ${task_title}", """
+        <!DOCTYPE html>
+        <html>
+        <head>${style}</head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h1 style="margin: 0;">📋 Your Notification Digest</h1>
+                </div>
+                <div class="content">
+                    <p>Hi ${name},</p>
+                    <p>${message}</p>
 
-    else:
-        # Generic notification - but only if we have a valid message
-        message = data.get("message", "")
-        if not message or message.strip() == "":
-            # Don't send email if message is empty
-            return None, None
-            
-        subject = f"📬 Notification: {task_title}"
-
-        html_content = f"""
+                    <div class="task-card">
+                        <h2 style="margin-top: 0; color: #333;">${task_title}</h2>
+                        <ul style="padding-left: 20px;">${digest_rows}</ul>
+                    </div>
+
+                    <center>
+                        <a href="${frontend_url}/tasks" class="button">Open Task Manager</a>
+                    </center>
+                </div>
+                <div class="footer">
+                    <p>You're receiving a digest because you chose digest delivery. Switch to instant notifications in your settings.</p>
+                    <p>Task Manager • Helping you stay productive</p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """),
+    "generic": ("📬 Notification: ${task_title}", """
         <!DOCTYPE html>
         <html>
-        <head>{base_style}</head>
+        <head>${style}</head>
         <body>
             <div class="container">
                 <div class="header">
@@ -540,15 +474,15 @@ def create_email_template(notification_type: str, data: dict) -> str:
                 </div>
                 <div class="content">
                     <p>Hi there,</p>
-                    <p>{message}</p>
+                    <p>${message}</p>
 
                     <div class="task-card">
-                        <h2 style="margin-top: 0; color: #333;">{task_title}</h2>
-                        <p><strong>Priority:</strong> <span class="priority-badge">{priority_label}</span></p>
+                        <h2 style="margin-top: 0; color: #333;">${task_title}</h2>
+                        <p><strong>Priority:</strong> <span class="priority-badge">${priority_label}</span></p>
                     </div>
 
                     <center>
-                        <a href="{task_link}" class="button">View Task Details</a>
+                        <a href="${task_link}" class="button">View Task Details</a>
                     </center>
                 </div>
                 <div class="footer">
@@ -557,9 +491,272 @@ def create_email_template(notification_type: str, data: dict) -> str:
             </div>
         </body>
         </html>
-        """
+        """),
+}
+
+# Always rendered with the overdue (high priority) red
+_FIXED_FIELDS = {
+    "overdue_tasks": {"priority_color": "#cf1322"},
+    "overdue_projects": {"priority_color": "#cf1322"},
+    "digest": {"priority_color": "#667eea"},
+}
 
-    return subject, html_content
+_FIELD_PATTERN = re.compile(r"\$\{(\w+)\}")
+
+
+class EmailTemplate:
+    """
+    Template text split once into literal chunks and ${field} slots
+
+    render() joins the chunks with the values dropped in, so the ~4 KB body is never rescanned.
+    """
+
+    __slots__ = ("_head", "_slots", "fields")
+
+    def __init__(self, source: str):
+        parts = _FIELD_PATTERN.split(source)  # literal, field, literal, ..., literal
+        self._head = parts[0]
+        self._slots = tuple(zip(parts[1::2], parts[2::2]))  # (field, literal that follows it)
+        self.fields = frozenset(parts[1::2])
+
+    def render(self, values: Dict[str, Any]) -> str:
+        chunks = [self._head]
+        for name, literal in self._slots:
+            chunks.append(str(values[name]))
+            chunks.append(literal)
+        return "".join(chunks)
+
+    def partial(self, values: Dict[str, Any]) -> "EmailTemplate":
+        """A template with the given fields already filled in, merged into the surrounding literal text"""
+        template = EmailTemplate.__new__(EmailTemplate)
+        head, slots = self._head, []
+        for name, literal in self._slots:
+            if name in values:
+                if slots:
+                    slots[-1] = (slots[-1][0], slots[-1][1] + str(values[name]) + literal)
+                else:
+                    head += str(values[name]) + literal
+            else:
+                slots.append((name, literal))
+        template._head, template._slots = head, tuple(slots)
+        template.fields = frozenset(name for name, _ in slots)
+        return template
+
+
+# Built once at import, with the shared style joined in: notification type -> (subject, HTML body)
+EMAIL_TEMPLATES: Dict[str, Tuple[EmailTemplate, EmailTemplate]] = {
+    key: (EmailTemplate(subject).partial(_FIXED_FIELDS.get(key, {})),
+          EmailTemplate(html.replace("${style}", _BASE_STYLE)).partial(_FIXED_FIELDS.get(key, {})))
+    for key, (subject, html) in _TEMPLATE_SOURCES.items()
+}
+
+
+def template_key(notification_type: str) -> str:
+    """EMAIL_TEMPLATES key for a notification type"""
+    if notification_type.startswith("reminder_"):
+        return "reminder"
+    if notification_type.startswith("project_reminder_"):
+        return "project_reminder"
+    return notification_type if notification_type in EMAIL_TEMPLATES else "generic"
+
+
+def _priority_badge(priority: int) -> Tuple[str, str]:
+    # Priority colors based on 1-10 scale
+    # 1-4: Low priority (green)
+    # 5-7: Medium priority (orange)
+    # 8-10: High priority (red)
+    if priority >= 8:
+        return "#cf1322", f"Priority: {priority}/10 (High)"
+    if priority >= 5:
+        return "#d46b08", f"Priority: {priority}/10 (Medium)"
+    return "#389e0d", f"Priority: {priority}/10 (Low)"
+
+
+_PRIORITY_BADGES = {priority: _priority_badge(priority) for priority in range(11)}
+
+
+def _task_values(data: dict) -> Dict[str, Any]:
+    """Fields every task template uses: title, due date, priority badge and link"""
+    due_date = data.get("due_date", "")
+    priority = data.get("priority", 5)
+    task_id = data.get("task_id", "")
+
+    # Convert priority to number if it's a string (for backwards compatibility)
+    if isinstance(priority, str):
+        priority = int(priority) if priority.isdigit() else 5
+    badge = _PRIORITY_BADGES.get(priority) if type(priority) is int else None
+    priority_color, priority_label = badge or _priority_badge(priority)
+    return {
+        "task_title": data.get("task_title", "Untitled Task"),
+        "due_date": due_date,
+        "priority": priority,
+        "priority_color": priority_color,
+        "priority_label": priority_label,
+        "task_link": f"{FRONTEND_URL}/tasks?taskId={task_id}" if task_id else FRONTEND_URL,
+    }
+
+
+def _project_values(data: dict, project_link: str) -> Dict[str, Any]:
+    """Task fields plus the project name and link (project_link formats the project id)"""
+    values = _task_values(data)
+    project_id = data.get("project_id", "")
+    values["project_name"] = data.get("project_name", "Untitled Project")
+    values["project_link"] = FRONTEND_URL + project_link.format(project_id) if project_id else FRONTEND_URL
+    return values
+
+
+def _with_due_date_row(values: Dict[str, Any]) -> Dict[str, Any]:
+    due_date = values["due_date"]
+    values["due_date_row"] = f'<p><strong>Due Date:</strong> {due_date}</p>' if due_date else ''
+    return values
+
+
+def _comment_values(values: Dict[str, Any], data: dict) -> Dict[str, Any]:
+    values["comment_text"] = data.get("comment_text", "")
+    values["commenter_name"] = data.get("commenter_name", "Someone")
+    return _with_due_date_row(values)
+
+
+def _reminder_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    values = _task_values(data)
+    values["days"] = notification_type.split("_")[1]
+    return values
+
+
+def _due_date_change_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    values = _task_values(data)
+    values["old_due_date"] = data.get("old_due_date", "")
+    values["new_due_date"] = data.get("new_due_date", "")
+    return values
+
+
+def _project_reminder_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    values = _project_values(data, "/projects/{}")
+    values["days"] = notification_type.split("_")[2]
+    values["project_name"] = data.get("project_name", values["task_title"])
+    return values
+
+
+def _message_values(default: str) -> Callable[[str, dict], Dict[str, Any]]:
+    def values(notification_type: str, data: dict) -> Dict[str, Any]:
+        return {**_task_values(data), "message": data.get("message", default), "frontend_url": FRONTEND_URL}
+    return values
+
+
+def _generic_values(notification_type: str, data: dict) -> Optional[Dict[str, Any]]:
+    # Generic notification - but only if we have a valid message
+    message = data.get("message", "")
+    if not message or message.strip() == "":
+        return None
+    values = _task_values(data)
+    values["message"] = message
+    return values
+
+
+def _task_comment_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    return _comment_values(_task_values(data), data)
+
+
+def _project_comment_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    return _comment_values(_project_values(data, "/projects?projectId={}"), data)
+
+
+def _project_mention_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    return _comment_values(_project_values(data, "/projects/{}"), data)
+
+
+def _project_event_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    return _with_due_date_row(_project_values(data, "/projects?projectId={}"))
+
+
+def _digest_row(item: dict) -> str:
+    item_id = item.get("item_id")
+    if not item_id:
+        link = f"{FRONTEND_URL}/tasks"
+    elif item.get("item_type") == "project":
+        link = f"{FRONTEND_URL}/projects/{item_id}"
+    else:
+        link = f"{FRONTEND_URL}/tasks?taskId={item_id}"
+    row = f'<li style="margin-bottom: 10px;"><a href="{link}"><strong>{escape(item.get("title") or "Notification")}</strong></a>'
+    if item.get("message"):
+        row += f'<br><span style="color: #666;">{escape(item["message"])}</span>'
+    return row + "</li>"
+
+
+def _digest_values(notification_type: str, data: dict) -> Dict[str, Any]:
+    # One list entry per buffered notification (notification_digest_items rows)
+    items = data.get("items") or []
+    return {
+        "task_title": data.get("task_title") or f"{len(items)} Update{'s' if len(items) != 1 else ''}",
+        "name": escape(data.get("name") or "there"),
+        "message": data.get("message") or "Here is everything that needed your attention since your last digest:",
+        "digest_rows": "".join(_digest_row(item) for item in items),
+        "frontend_url": FRONTEND_URL,
+    }
+
+
+# EMAIL_TEMPLATES key -> builder of the per-message field values (None: nothing to send)
+_TEMPLATE_VALUES: Dict[str, Callable[[str, dict], Optional[Dict[str, Any]]]] = {
+    "reminder": _reminder_values,
+    "due_date_change": _due_date_change_values,
+    "task_comment": _task_comment_values,
+    "project_comment": _project_comment_values,
+    "project_created": _project_event_values,
+    "project_assigned": _project_event_values,
+    "task_mention": _task_comment_values,
+    "project_mention": _project_mention_values,
+    "project_reminder": _project_reminder_values,
+    "overdue_tasks": _message_values("You have overdue tasks"),
+    "overdue_projects": _message_values("You have overdue projects"),
+    "digest": _digest_values,
+    "generic": _generic_values,
+}
+
+
+def _template_values(key: str, notification_type: str, data: dict) -> Optional[Dict[str, Any]]:
+    """Per-message field values for template `key`; None when there is nothing to send"""
+    return _TEMPLATE_VALUES[key](notification_type, data)
+
+
+# (template key, priority colour, priority label) -> EMAIL_TEMPLATES pair with the badge filled in;
+# at most 11 priorities per key, so the style block's colour slots are filled once, not per email
+_BADGE_TEMPLATES: Dict[Tuple[str, Any, Any], Tuple[EmailTemplate, EmailTemplate]] = {}
+
+
+def _badge_templates(key: str, values: Dict[str, Any]) -> Tuple[EmailTemplate, EmailTemplate]:
+    templates = EMAIL_TEMPLATES[key]
+    if "priority_label" not in values or values.get("priority") not in _PRIORITY_BADGES:
+        return templates
+    badge_key = (key, values["priority_color"], values["priority_label"])
+    badge_templates = _BADGE_TEMPLATES.get(badge_key)
+    if badge_templates is None:
+        badge = {"priority_color": badge_key[1], "priority_label": badge_key[2]}
+        badge_templates = _BADGE_TEMPLATES[badge_key] = (templates[0].partial(badge), templates[1].partial(badge))
+    return badge_templates
+
+
+def create_email_template(notification_type: str, data: dict) -> str:
+    """Create HTML email template based on notification type (subject and body; (None, None) if empty)"""
+    key = template_key(notification_type)
+    values = _template_values(key, notification_type, data)
+    if values is None:
+        # Don't send email if message is empty
+        return None, None
+    subject_template, html_template = _badge_templates(key, values)
+    return subject_template.render(values), html_template.render(values)
+
+
+def render_email_batch(notification_type: str, data: dict, recipients: List[str]) -> List[Tuple[str, str, str]]:
+    """Render one event for many recipients: (to_email, subject, html) per distinct address, rendered once"""
+    subject, html_content = create_email_template(notification_type, data)
+    if subject is None or html_content is None:
+        return []
+    messages, seen = [], set()
+    for to_email in recipients:
+        if to_email and to_email not in seen:
+            seen.add(to_email)
+            messages.append((to_email, subject, html_content))
+    return messages
 
 
 def send_email(to_email: str, subject: str, html_content: str) -> bool:
@@ -594,6 +791,54 @@ def send_email(to_email: str, subject: str, html_content: str) -> bool:
         return False
 
 
+def use_email_dispatcher(get_client, name: str, mode: str) -> Optional[EmailDispatcher]:
+    """Queue this process's emails in email_queue; mode "async" also sends them, "off" leaves that to another service"""
+    global EMAIL_DISPATCHER
+    if EMAIL_DELIVERY != "queue":
+        return None
+    workers = int(os.getenv("EMAIL_WORKERS", "4"))
+    pool = SmtpPool(
+        SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD,
+        size=int(os.getenv("SMTP_POOL_SIZE", str(workers))),
+        max_messages=int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100")),
+        idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", "60")),
+    )
+    EMAIL_DISPATCHER = EmailDispatcher(
+        get_client, pool,
+        from_address=f"{FROM_NAME} <{FROM_EMAIL}>",
+        name=name,
+        mode=mode,
+        workers=workers,
+        # e.g. EMAIL_RATE_LIMITS="gmail.com=60/min,outlook.com=30/min,default=300/min"
+        rate_limiter=DomainRateLimiter(parse_rate_limits(os.getenv("EMAIL_RATE_LIMITS", "default=300/min"))),
+        batch_size=int(os.getenv("EMAIL_BATCH_SIZE", "50")),
+        max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", "6")),
+    )
+    return EMAIL_DISPATCHER
+
+
+def queue_email(to_email: str, subject: str, html_content: str, idempotency_key: Optional[str] = None) -> bool:
+    """Hand an email to the dispatcher's queue, or send it inline when no dispatcher is configured"""
+    if EMAIL_DISPATCHER is None:
+        return send_email(to_email, subject, html_content)
+    if not SMTP_USER or not SMTP_PASSWORD:
+        print("Email credentials not configured. Skipping email send.")
+        return False
+    return EMAIL_DISPATCHER.enqueue([build_email_row(to_email, subject, html_content, idempotency_key)]) == 1
+
+
+def queue_emails(messages: List[Tuple[str, str, str]]) -> int:
+    """Queue (to_email, subject, html) messages with one write; returns how many were queued or sent"""
+    if not messages:
+        return 0
+    if EMAIL_DISPATCHER is None:
+        return sum(1 for to_email, subject, html_content in messages if send_email(to_email, subject, html_content))
+    if not SMTP_USER or not SMTP_PASSWORD:
+        print("Email credentials not configured. Skipping email send.")
+        return 0
+    return EMAIL_DISPATCHER.enqueue([build_email_row(*message) for message in messages])
+
+
 def send_notification_email(
     user_email: str,
     notification_type: str,
@@ -628,7 +873,7 @@ def send_notification_email(
         project_id: Project ID (for project comment notifications)
 
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if the email was queued (or sent), False otherwise
     """
 
     # Prepare data for template
@@ -654,8 +899,53 @@ def send_notification_email(
         print(f"Skipping email send for {notification_type} - empty message")
         return False
 
-    # Send email
-    return send_email(user_email, subject, html_content)
+    # Queue email (sent by the dispatcher's workers)
+    return queue_email(user_email, subject, html_content)
+
+
+# Keyword arguments of send_notification_email besides the recipient, with their defaults
+NOTIFICATION_EMAIL_FIELDS = {
+    "task_title": None, "due_date": None, "priority": "Medium", "task_id": None, "old_due_date": None,
+    "new_due_date": None, "message": None, "comment_text": None, "commenter_name": None,
+    "project_name": None, "project_id": None,
+}
+
+
+def send_notification_emails(user_emails: List[str], notification_type: str, **fields) -> int:
+    """
+    Send the same notification to several recipients: rendered once, queued with one write
+
+    Takes send_notification_email's keyword arguments. Returns how many emails were queued (or sent).
+    """
+    unknown = set(fields) - set(NOTIFICATION_EMAIL_FIELDS)
+    if unknown:
+        raise TypeError(f"Unexpected notification email field(s): {', '.join(sorted(unknown))}")
+    messages = render_email_batch(notification_type, {**NOTIFICATION_EMAIL_FIELDS, **fields}, user_emails)
+    if not messages:
+        if user_emails:
+            print(f"Skipping email send for {notification_type} - empty message")
+        return 0
+    return queue_emails(messages)
+
+
+def send_digest_email(user_email: str, user_name: Optional[str], items: List[Dict[str, Any]],
+                      idempotency_key: Optional[str] = None) -> bool:
+    """
+    Send one email listing a user's buffered notifications
+
+    Args:
+        user_email: Recipient email address
+        user_name: Recipient name for the greeting
+        items: Buffered notifications (title, message, item_type, item_id)
+        idempotency_key: Email queue key, so a retried digest is queued only once
+
+    Returns:
+        bool: True if the email was queued (or sent), False otherwise
+    """
+    if not items:
+        return False
+    subject, html_content = create_email_template("digest", {"items": items, "name": user_name})
+    return queue_email(user_email, subject, html_content, idempotency_key)
 
 
 def send_password_reset_email(
@@ -674,7 +964,7 @@ def send_password_reset_email(
         expiry_minutes: Link expiry time in minutes
 
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if the email was queued (or sent), False otherwise
     """
 
     subject = "🔐 Password Reset Request - Taskio"
@@ -747,7 +1037,7 @@ def send_password_reset_email(
     </html>
     """
 
-    return send_email(user_email, subject, html_content)
+    return queue_email(user_email, subject, html_content)
 
 
 if __name__ == "__main__":
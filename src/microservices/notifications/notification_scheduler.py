@@ -20,6 +20,8 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../../.env')
 
 TASK_SERVICE_URL = os.getenv("TASK_SERVICE_URL", "http://localhost:8080")
 CHECK_INTERVAL = 3600  # 1 hour in seconds
+# Pre-create recurring task instances due within this many days (0 disables the job)
+RECURRING_WINDOW_DAYS = int(os.getenv("RECURRING_MATERIALIZE_WINDOW_DAYS", "0"))
 
 def check_notifications():
     """Call the task service to check all tasks for notifications"""
@@ -39,6 +41,8 @@ def check_notifications():
             data = response.json()
             print(f"✅ Successfully checked {data.get('tasks_processed', 0)} tasks for due date reminders")
             print(f"   {data.get('message', 'Due date notifications processed')}")
+            if "queries" in data:
+                print(f"   Reminders queued: {data.get('notifications_queued', 0)}, queries: {data['queries']}, took {data.get('duration_ms')} ms")
         else:
             print(f"❌ Failed to check notifications: HTTP {response.status_code}")
             print(f"   {response.text}")
@@ -49,24 +53,73 @@ def check_notifications():
     except Exception as e:
         print(f"❌ Error checking notifications: {e}")
 
+def materialize_recurring_tasks():
+    """Ask the task service to pre-create recurring task instances inside the rolling window"""
+    try:
+        response = requests.post(
+            f"{TASK_SERVICE_URL}/tasks/recurring/materialize",
+            params={"window_days": RECURRING_WINDOW_DAYS},
+            timeout=60
+        )
+
+        if response.ok:
+            data = response.json()
+            print(f"🔁 Recurring tasks: created {data.get('instances_created', 0)} instance(s) "
+                  f"for {data.get('series_extended', 0)} series due by {data.get('horizon')}")
+        else:
+            print(f"❌ Failed to materialize recurring tasks: HTTP {response.status_code}")
+            print(f"   {response.text}")
+
+    except requests.exceptions.ConnectionError:
+        print(f"❌ Error: Cannot connect to task service at {TASK_SERVICE_URL}")
+    except Exception as e:
+        print(f"❌ Error materializing recurring tasks: {e}")
+
+def relay_notification_outbox():
+    """Ask the task service to deliver notification outbox rows that are due (e.g. retries after a restart)"""
+    try:
+        response = requests.post(f"{TASK_SERVICE_URL}/notifications/outbox/relay", timeout=60)
+
+        if response.ok:
+            data = response.json()
+            print(f"📬 Notification outbox: sent {data.get('sent', 0)}, retrying {data.get('retried', 0)}, "
+                  f"failed {data.get('failed', 0)}")
+        else:
+            print(f"❌ Failed to relay notification outbox: HTTP {response.status_code}")
+            print(f"   {response.text}")
+
+    except requests.exceptions.ConnectionError:
+        print(f"❌ Error: Cannot connect to task service at {TASK_SERVICE_URL}")
+    except Exception as e:
+        print(f"❌ Error relaying notification outbox: {e}")
+
+def run_jobs():
+    # Materialize first so new instances get their reminders in the same cycle
+    if RECURRING_WINDOW_DAYS > 0:
+        materialize_recurring_tasks()
+    check_notifications()
+    relay_notification_outbox()
+
 if __name__ == "__main__":
     print("=" * 70)
     print("NOTIFICATION SCHEDULER STARTED")
     print("=" * 70)
     print(f"Task Service: {TASK_SERVICE_URL}")
     print(f"Check Interval: Every {CHECK_INTERVAL//60} minutes")
+    if RECURRING_WINDOW_DAYS > 0:
+        print(f"Recurring tasks: pre-created {RECURRING_WINDOW_DAYS} days ahead")
     print()
     print("Press Ctrl+C to stop")
     print("=" * 70)
 
     # Run immediately on start
-    check_notifications()
+    run_jobs()
 
     # Then run every hour
     try:
         while True:
             time.sleep(CHECK_INTERVAL)
-            check_notifications()
+            run_jobs()
     except KeyboardInterrupt:
         print("\n\n" + "=" * 70)
         print("Notification scheduler stopped")
@@ -1,17 +1,16 @@
 import os
+import sys
 import json
-import pika
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone, timedelta
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, jsonify, request
 from flask_cors import CORS
-from supabase import create_client, Client
 from pydantic import BaseModel, ValidationError
 import threading
 import time
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import eventlet
-from email_service import send_notification_email
+from email_service import send_notification_email, send_notification_emails, send_digest_email, use_email_dispatcher
 
 # Environment variables
 SUPABASE_URL: Optional[str] = os.getenv("SUPABASE_URL")
@@ -21,15 +20,48 @@ RABBITMQ_URL: Optional[str] = os.getenv("RABBITMQ_URL", "amqp://localhost")
 if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
     raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Shared user directory cache (Docker copies src/microservices/shared next to the service)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../shared'))
+from user_cache import UserDirectoryCache, make_supabase_user_loader
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
+from cache_events import start_cache_invalidation_listener
+from amqp_publisher import AmqpPublisher
+from notification_digest import NotificationDigest, build_digest_item, summarize_digest
+
+USER_CACHE = UserDirectoryCache(
+    make_supabase_user_loader(lambda: supabase, "user_id, name, email"),
+    name="notification_service_users",
+    max_size=int(os.getenv("USER_CACHE_MAX_SIZE", "5000")),
+    ttl=int(os.getenv("USER_CACHE_TTL", "300")),
+)
+
+# Supabase client, built by the first query
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# User change events evict USER_CACHE entries
+cache_event_listener = None
+
+@on_worker_init
+def start_cache_event_listener() -> None:
+    global cache_event_listener
+    cache_event_listener = start_cache_invalidation_listener(RABBITMQ_URL, "notification-service")
+
+def get_cached_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get user data from the user directory cache (loaded on a miss)"""
+    if not user_id:
+        return None
+    return USER_CACHE.get(user_id)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+# Routes hang off this blueprint; create_app() at the bottom builds the app
+api = Blueprint("notification_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 # Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet')
 
 # Store connected users
 connected_users = {}
@@ -77,6 +109,10 @@ class NotificationCreate(BaseModel):
     task_id: Optional[str] = None
     due_date: Optional[str] = None
 
+class DeliveryPreferencesUpdate(BaseModel):
+    delivery_mode: str
+    digest_window_minutes: Optional[int] = None
+
 class TaskReminderEvent(BaseModel):
     task_id: str
     user_id: str
@@ -86,44 +122,35 @@ class TaskReminderEvent(BaseModel):
 
 # RabbitMQ connection
 class RabbitMQManager:
+    """Publishes notifications through the shared background publisher (safe to call from any thread)"""
+
     def __init__(self):
-        self.connection = None
-        self.channel = None
-        self.connect()
-    
-    def connect(self):
-        try:
-            self.connection = pika.BlockingConnection(pika.URLParameters(RABBITMQ_URL))
-            self.channel = self.connection.channel()
-            
-            # Declare exchanges and queues
-            self.channel.exchange_declare(exchange='task_notifications', exchange_type='topic')
-            self.channel.queue_declare(queue='due_date_reminders', durable=True)
-            self.channel.queue_bind(exchange='task_notifications', queue='due_date_reminders', routing_key='task.reminder.*')
-            
-            print("Connected to RabbitMQ successfully")
-        except Exception as e:
-            print(f"Failed to connect to RabbitMQ: {e}")
-            self.connection = None
-            self.channel = None
-    
-    def publish_notification(self, routing_key: str, message: dict):
-        if not self.channel:
-            self.connect()
-        
-        if self.channel:
-            try:
-                self.channel.basic_publish(
-                    exchange='task_notifications',
-                    routing_key=routing_key,
-                    body=json.dumps(message),
-                    properties=pika.BasicProperties(delivery_mode=2)  # Make message persistent
-                )
-                print(f"Published notification: {routing_key}")
-            except Exception as e:
-                print(f"Failed to publish notification: {e}")
+        self.publisher = AmqpPublisher(
+            RABBITMQ_URL,
+            name="notification-service",
+            exchanges=[('task_notifications', 'topic', False)],
+            queues=[('due_date_reminders', 'task_notifications', 'task.reminder.*')],
+            max_buffer=int(os.getenv("AMQP_PUBLISH_BUFFER", "10000")),
+        )
+
+    def publish_notification(self, routing_key: str, message: dict) -> bool:
+        # Persistent message, queued locally and confirmed by the broker in the background
+        if self.publisher.publish('task_notifications', routing_key, message):
+            return True
+        print(f"Failed to publish notification {routing_key}: publish buffer full")
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return self.publisher.stats()
 
 rabbitmq = RabbitMQManager()
+on_worker_init(rabbitmq.publisher.start)
+
+# Emails from every service are queued in email_queue; this service's workers send them over pooled SMTP
+EMAIL_DISPATCHER = use_email_dispatcher(lambda: supabase, "notification-email",
+                                        os.getenv("EMAIL_DISPATCH_MODE", "async"))
+if EMAIL_DISPATCHER is not None:
+    on_worker_init(EMAIL_DISPATCHER.start)
 
 
 
@@ -158,6 +185,65 @@ def mark_notification_read(notification_id: str, user_id: str) -> bool:
         print(f"Failed to mark notification as read: {e}")
         return False
 
+def deliver_notification_digest(user_id: str, digest_id: str, items: List[Dict[str, Any]]) -> Optional[Any]:
+    """Send a user's buffered notifications as one in-app notification and one email; returns the notification id"""
+    notification_id = None
+    in_app_items = [item for item in items if item.get("in_app", True)]
+    if in_app_items:
+        title, message = summarize_digest(in_app_items)
+        notification_data = {
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "type": "digest",
+            "task_id": None,
+            "due_date": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "is_read": False,
+            # Unique, so a retried digest never stores a second notification
+            "outbox_key": f"digest:{digest_id}"
+        }
+        response = supabase.table("notifications").upsert(
+            notification_data, on_conflict="outbox_key", ignore_duplicates=True
+        ).execute()
+        if response.data:
+            stored_notification = response.data[0]
+            notification_id = stored_notification["id"]
+            send_realtime_notification(user_id, stored_notification)
+            rabbitmq.publish_notification(
+                "notification.digest",
+                {
+                    "notification_id": notification_id,
+                    "user_id": user_id,
+                    "title": title,
+                    "message": message,
+                    "type": "digest",
+                    "created_at": stored_notification["created_at"]
+                }
+            )
+        else:
+            existing = supabase.table("notifications").select("id").eq("outbox_key", f"digest:{digest_id}").execute()
+            notification_id = existing.data[0]["id"] if existing.data else None
+
+    email_items = [item for item in items if item.get("email", True)]
+    if email_items:
+        user = get_cached_user(user_id)
+        if user and user.get("email"):
+            send_digest_email(user["email"], user.get("name"), email_items, idempotency_key=f"digest:{digest_id}")
+
+    print(f"📋 Sent digest of {len(items)} notification(s) to user {user_id}")
+    return notification_id
+
+# Users who choose digest delivery get one combined notification (and email) per window instead of one
+# per reminder. The scheduler flushes digests hourly, so windows are effectively rounded up to the hour.
+DIGEST = NotificationDigest(
+    lambda: supabase,
+    deliver_notification_digest,
+    name="notification-digest",
+    default_mode=os.getenv("NOTIFICATION_DELIVERY_DEFAULT", "instant"),
+    window_minutes=int(os.getenv("DIGEST_WINDOW_MINUTES", "60")),
+)
+
 # Due date reminder logic
 def check_project_due_date_reminders():
     """Check for projects that need reminders and send notifications"""
@@ -208,7 +294,11 @@ def check_project_due_date_reminders():
                 # Check if we should send a reminder today
                 for days in reminder_days:
                     if days_until_due == days:
-                        # Send notification to all stakeholders
+                        # Send notification to all stakeholders (emails go out as one batch below);
+                        # users on digest delivery get it in their next digest instead
+                        email_recipients = []
+                        digest_items = []
+                        digest_users = DIGEST.digest_users(stakeholder_ids)
                         for user_id in stakeholder_ids:
                             # Check if we already sent this reminder to this user
                             existing_notification = supabase.table("notifications").select("id").eq(
@@ -239,6 +329,13 @@ def check_project_due_date_reminders():
                                     "due_date": project["due_date"]
                                 }
 
+                                if user_id in digest_users:
+                                    digest_items.append(build_digest_item(
+                                        user_id, "check_project_due_date_reminders", "project", project["project_id"], notification_data,
+                                        in_app=in_app_enabled, email=email_enabled, day=today.isoformat()
+                                    ))
+                                    continue
+
                                 # Store in database if in-app enabled
                                 if in_app_enabled:
                                     stored_notification = create_notification(notification_data)
@@ -263,29 +360,39 @@ def check_project_due_date_reminders():
 
                                         print(f"Sent {days}-day in-app reminder for project {project['project_id']} to user {user_id}")
 
-                                # Send email if enabled
+                                # Collect email recipient if enabled
                                 if email_enabled:
                                     try:
                                         # Get user email
-                                        user_response = supabase.table("user").select("email").eq("user_id", user_id).execute()
-                                        if user_response.data and len(user_response.data) > 0:
-                                            user_email = user_response.data[0].get("email")
-                                            if user_email:
-                                                send_notification_email(
-                                                    user_email=user_email,
-                                                    notification_type=f"project_reminder_{days}_days",
-                                                    task_title=project["project_name"],
-                                                    comment_text="",
-                                                    commenter_name="",
-                                                    task_id=project["project_id"],
-                                                    due_date=project.get("due_date"),
-                                                    priority="",
-                                                    project_name=project["project_name"],
-                                                    project_id=project["project_id"]
-                                                )
-                                                print(f"Sent {days}-day email reminder for project {project['project_id']} to {user_email}")
+                                        user = get_cached_user(user_id)
+                                        if user and user.get("email"):
+                                            email_recipients.append(user["email"])
                                     except Exception as email_error:
-                                        print(f"Failed to send email reminder: {email_error}")
+                                        print(f"Failed to look up email for user {user_id}: {email_error}")
+
+                        # One render and one queue write for every recipient of this reminder
+                        if email_recipients:
+                            try:
+                                sent = send_notification_emails(
+                                    email_recipients,
+                                    notification_type=f"project_reminder_{days}_days",
+                                    task_title=project["project_name"],
+                                    comment_text="",
+                                    commenter_name="",
+                                    task_id=project["project_id"],
+                                    due_date=project.get("due_date"),
+                                    priority="",
+                                    project_name=project["project_name"],
+                                    project_id=project["project_id"]
+                                )
+                                print(f"Sent {days}-day email reminder for project {project['project_id']} to {sent} recipient(s)")
+                            except Exception as email_error:
+                                print(f"Failed to send email reminder: {email_error}")
+
+                        # One write for every digest user; if it fails, the next sweep buffers them again
+                        if digest_items:
+                            buffered = DIGEST.add(digest_items)
+                            print(f"Buffered {days}-day reminder for project {project['project_id']} for {buffered} digest user(s)")
             except Exception as e:
                 print(f"Error processing project {project.get('project_id', 'unknown')}: {e}")
 
@@ -341,7 +448,11 @@ def check_due_date_reminders():
                 # Check if we should send a reminder today
                 for days in reminder_days:
                     if days_until_due == days:
-                        # Send notification to all stakeholders
+                        # Send notification to all stakeholders (emails go out as one batch below);
+                        # users on digest delivery get it in their next digest instead
+                        email_recipients = []
+                        digest_items = []
+                        digest_users = DIGEST.digest_users(stakeholder_ids)
                         for user_id in stakeholder_ids:
                             # Check if we already sent this reminder to this user TODAY
                             existing_notification = supabase.table("notifications").select("id").eq(
@@ -373,6 +484,13 @@ def check_due_date_reminders():
                                     "priority": task.get("priority", "Medium")
                                 }
 
+                                if user_id in digest_users:
+                                    digest_items.append(build_digest_item(
+                                        user_id, "check_due_date_reminders", "task", task["task_id"], notification_data,
+                                        in_app=in_app_enabled, email=email_enabled, day=today.isoformat()
+                                    ))
+                                    continue
+
                                 # Store in database if in-app enabled
                                 if in_app_enabled:
                                     stored_notification = create_notification(notification_data)
@@ -397,25 +515,35 @@ def check_due_date_reminders():
 
                                         print(f"Sent {days}-day in-app reminder for task {task['task_id']} to user {user_id}")
 
-                                # Send email if enabled
+                                # Collect email recipient if enabled
                                 if email_enabled:
                                     try:
                                         # Get user email
-                                        user_response = supabase.table("user").select("email").eq("user_id", user_id).execute()
-                                        if user_response.data and len(user_response.data) > 0:
-                                            user_email = user_response.data[0].get("email")
-                                            if user_email:
-                                                send_notification_email(
-                                                    user_email=user_email,
-                                                    notification_type=f"reminder_{days}_days",
-                                                    task_title=task["title"],
-                                                    due_date=due_date.strftime('%B %d, %Y'),
-                                                    priority=task.get("priority", "Medium"),
-                                                    task_id=task["task_id"]
-                                                )
-                                                print(f"Sent {days}-day email reminder for task {task['task_id']} to {user_email}")
+                                        user = get_cached_user(user_id)
+                                        if user and user.get("email"):
+                                            email_recipients.append(user["email"])
                                     except Exception as email_error:
-                                        print(f"Failed to send email reminder: {email_error}")
+                                        print(f"Failed to look up email for user {user_id}: {email_error}")
+
+                        # One render and one queue write for every recipient of this reminder
+                        if email_recipients:
+                            try:
+                                sent = send_notification_emails(
+                                    email_recipients,
+                                    notification_type=f"reminder_{days}_days",
+                                    task_title=task["title"],
+                                    due_date=due_date.strftime('%B %d, %Y'),
+                                    priority=task.get("priority", "Medium"),
+                                    task_id=task["task_id"]
+                                )
+                                print(f"Sent {days}-day email reminder for task {task['task_id']} to {sent} recipient(s)")
+                            except Exception as email_error:
+                                print(f"Failed to send email reminder: {email_error}")
+
+                        # One write for every digest user; if it fails, the next sweep buffers them again
+                        if digest_items:
+                            buffered = DIGEST.add(digest_items)
+                            print(f"Buffered {days}-day reminder for task {task['task_id']} for {buffered} digest user(s)")
             except Exception as e:
                 print(f"Error processing task {task.get('task_id', 'unknown')}: {e}")
     
@@ -474,11 +602,29 @@ def check_overdue_tasks():
 
         print(f"👥 Grouped into {len(user_tasks)} user(s)")
 
+        # Digest users get one entry per overdue task in their next digest instead of this alert
+        digest_users = DIGEST.digest_users(user_tasks)
+        digest_items = []
+
         # Send notification to each user
         for user_id, tasks in user_tasks.items():
             count = len(tasks)
             print(f"\n--- Processing user {user_id} ({count} overdue task(s)) ---")
 
+            if user_id in digest_users:
+                digest_items.extend(
+                    build_digest_item(user_id, "check_overdue_tasks", "task", task.get("task_id"), {
+                        "title": "Overdue Task",
+                        "message": f"Task '{task.get('title', 'Untitled')}' was due on {task.get('due_date', 'N/A')}",
+                        "type": "overdue_tasks",
+                        "due_date": task.get("due_date"),
+                        "priority": "High"
+                    }, day=today.isoformat())
+                    for task in tasks
+                )
+                print(f"📋 Added to the user's digest")
+                continue
+
             # Check if already notified today
             existing = supabase.table("notifications").select("id").eq(
                 "user_id", user_id
@@ -527,13 +673,11 @@ def check_overdue_tasks():
 
             # Send email
             try:
-                user_response = supabase.table("user").select("email, name").eq(
-                    "user_id", user_id
-                ).execute()
+                user = get_cached_user(user_id)
 
-                if user_response.data:
-                    email = user_response.data[0].get("email")
-                    name = user_response.data[0].get("name", "there")
+                if user:
+                    email = user.get("email")
+                    name = user.get("name", "there")
 
                     if email:
                         print(f"📧 Sending email to {email}...")
@@ -568,6 +712,10 @@ def check_overdue_tasks():
             except Exception as e:
                 print(f"❌ Email failed: {e}")
 
+        if digest_items:
+            buffered = DIGEST.add(digest_items)
+            print(f"\n📋 Buffered {buffered} overdue task notification(s) for {len(digest_users)} digest user(s)")
+
         print(f"\n{'='*60}")
         print(f"✅ Overdue task check complete")
         print(f"{'='*60}\n")
@@ -624,11 +772,29 @@ def check_overdue_projects():
 
         print(f"👥 Grouped into {len(user_projects)} user(s)")
 
+        # Digest users get one entry per overdue project in their next digest instead of this alert
+        digest_users = DIGEST.digest_users(user_projects)
+        digest_items = []
+
         # Send notification to each user
         for user_id, projects in user_projects.items():
             count = len(projects)
             print(f"\n--- Processing user {user_id} ({count} overdue project(s)) ---")
 
+            if user_id in digest_users:
+                digest_items.extend(
+                    build_digest_item(user_id, "check_overdue_projects", "project", project.get("project_id"), {
+                        "title": "Overdue Project",
+                        "message": f"Project '{project.get('project_name', 'Untitled')}' was due on {project.get('due_date', 'N/A')}",
+                        "type": "overdue_projects",
+                        "due_date": project.get("due_date"),
+                        "priority": "High"
+                    }, day=today.isoformat())
+                    for project in projects
+                )
+                print(f"📋 Added to the user's digest")
+                continue
+
             # Check if already notified today
             existing = supabase.table("notifications").select("id").eq(
                 "user_id", user_id
@@ -666,13 +832,11 @@ def check_overdue_projects():
 
             # Send email
             try:
-                user_response = supabase.table("user").select("email, name").eq(
-                    "user_id", user_id
-                ).execute()
+                user = get_cached_user(user_id)
 
-                if user_response.data:
-                    email = user_response.data[0].get("email")
-                    name = user_response.data[0].get("name", "there")
+                if user:
+                    email = user.get("email")
+                    name = user.get("name", "there")
 
                     if email:
                         print(f"📧 Sending email to {email}...")
@@ -697,6 +861,10 @@ def check_overdue_projects():
             except Exception as e:
                 print(f"❌ Email failed: {e}")
 
+        if digest_items:
+            buffered = DIGEST.add(digest_items)
+            print(f"\n📋 Buffered {buffered} overdue project notification(s) for {len(digest_users)} digest user(s)")
+
         print(f"\n{'='*60}")
         print(f"✅ Overdue project check complete")
         print(f"{'='*60}\n")
@@ -706,21 +874,37 @@ def check_overdue_projects():
         import traceback
         traceback.print_exc()
 
+def flush_notification_digests():
+    """Send one digest to every user whose oldest buffered notification has waited their window"""
+    try:
+        result = DIGEST.flush()
+        if result["digests"] or result["retried"] or result["failed"]:
+            print(f"📋 Sent {result['digests']} digest(s) covering {result['items']} notification(s) "
+                  f"({result['retried']} to retry, {result['failed']} failed)")
+    except Exception as e:
+        print(f"❌ ERROR in flush_notification_digests: {e}")
+
 def reminder_scheduler():
     """Background thread to check for reminders every hour"""
     while True:
-        check_due_date_reminders()
-        check_project_due_date_reminders()
-        check_overdue_tasks()
-        check_overdue_projects()
+        for job in (check_due_date_reminders, check_project_due_date_reminders, check_overdue_tasks, check_overdue_projects,
+                    flush_notification_digests):
+            with METRICS.time_job(job.__name__), QUERY_METRICS.track(f"job {job.__name__}"):
+                job()
         time.sleep(3600)  # Check every hour
 
-# Start background scheduler
-scheduler_thread = threading.Thread(target=reminder_scheduler, daemon=True)
-scheduler_thread.start()
+# Background scheduler, started in the worker process. Socket.IO rooms live in process memory, so this
+# service runs a single (eventlet) worker and the scheduler runs exactly once.
+scheduler_thread = None
+
+@on_worker_init
+def start_reminder_scheduler() -> None:
+    global scheduler_thread
+    scheduler_thread = threading.Thread(target=reminder_scheduler, name="reminder-scheduler", daemon=True)
+    scheduler_thread.start()
 
 # API Routes
-@app.route("/check-overdue", methods=["POST"])
+@api.route("/check-overdue", methods=["POST"])
 def trigger_overdue_check():
     """Manually trigger overdue task and project checks"""
     try:
@@ -731,7 +915,7 @@ def trigger_overdue_check():
     except Exception as e:
         return jsonify({"error": f"Failed to check overdue items: {str(e)}"}), 500
 
-@app.route("/notifications", methods=["GET"])
+@api.route("/notifications", methods=["GET"])
 def get_notifications():
     """Get notifications for a user"""
     try:
@@ -754,7 +938,7 @@ def get_notifications():
     except Exception as e:
         return jsonify({"error": f"Failed to get notifications: {str(e)}"}), 500
 
-@app.route("/notifications/<notification_id>/read", methods=["PATCH"])
+@api.route("/notifications/<notification_id>/read", methods=["PATCH"])
 def mark_read(notification_id: str):
     """Mark notification as read"""
     try:
@@ -771,7 +955,7 @@ def mark_read(notification_id: str):
     except Exception as e:
         return jsonify({"error": f"Failed to mark notification as read: {str(e)}"}), 500
 
-@app.route("/notifications/mark-all-read", methods=["PATCH"])
+@api.route("/notifications/mark-all-read", methods=["PATCH"])
 def mark_all_read():
     """Mark all notifications as read for a user"""
     try:
@@ -786,7 +970,7 @@ def mark_all_read():
     except Exception as e:
         return jsonify({"error": f"Failed to mark all notifications as read: {str(e)}"}), 500
 
-@app.route("/notifications/create", methods=["POST"])
+@api.route("/notifications/create", methods=["POST"])
 def create_notification_endpoint():
     """Create a new notification"""
     try:
@@ -821,7 +1005,52 @@ def create_notification_endpoint():
     except Exception as e:
         return jsonify({"error": f"Failed to create notification: {str(e)}"}), 500
 
-@app.route("/notifications/realtime", methods=["POST"])
+@api.route("/notifications/preferences/<user_id>", methods=["GET"])
+def get_delivery_preferences(user_id: str):
+    """Get a user's delivery mode: instant notifications or a digest per window"""
+    try:
+        return jsonify({"preferences": DIGEST.preferences([user_id])[user_id]}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to get delivery preferences: {str(e)}"}), 500
+
+@api.route("/notifications/preferences/<user_id>", methods=["PUT"])
+def update_delivery_preferences(user_id: str):
+    """Choose instant or digest delivery (digest_window_minutes defaults to DIGEST_WINDOW_MINUTES)"""
+    try:
+        body = DeliveryPreferencesUpdate(**(request.get_json() or {}))
+        preferences = DIGEST.set_preference(user_id, body.delivery_mode, body.digest_window_minutes)
+        return jsonify({"preferences": preferences}), 200
+    except ValidationError as e:
+        return jsonify({"error": "Invalid delivery preferences", "details": e.errors()}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to update delivery preferences: {str(e)}"}), 500
+
+@api.route("/notifications/<notification_id>/digest-items", methods=["GET"])
+def get_digest_items(notification_id: str):
+    """Get the buffered notifications a digest notification combined (source sweep, task or project)"""
+    try:
+        user_id = request.args.get("user_id")
+        if not user_id:
+            return jsonify({"error": "user_id is required"}), 400
+
+        response = supabase.table("notification_digest_items").select(
+            "id, source, item_type, item_id, type, title, message, due_date, created_at, delivered_at"
+        ).eq("notification_id", notification_id).eq("user_id", user_id).order("id").execute()
+        return jsonify({"items": response.data or []}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to get digest items: {str(e)}"}), 500
+
+@api.route("/notifications/digests/flush", methods=["POST"])
+def flush_digests_endpoint():
+    """Send the digests that are due now instead of waiting for the hourly scheduler"""
+    try:
+        return jsonify(DIGEST.flush()), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to flush digests: {str(e)}"}), 500
+
+@api.route("/notifications/realtime", methods=["POST"])
 def send_realtime_notification_endpoint():
     """Send real-time notification via WebSocket without creating database entry"""
     try:
@@ -839,7 +1068,28 @@ def send_realtime_notification_endpoint():
     except Exception as e:
         return jsonify({"error": f"Failed to send real-time notification: {str(e)}"}), 500
 
-@app.route("/test-notifications/<user_id>", methods=["POST"])
+@api.route("/notifications/realtime/batch", methods=["POST"])
+def send_realtime_notification_batch():
+    """Push a batch of already-stored notifications over WebSocket (used by the notification outbox relay)"""
+    try:
+        body = request.get_json() or {}
+        notifications = body.get('notifications')
+        if not isinstance(notifications, list):
+            return jsonify({"error": "notifications must be a list"}), 400
+
+        sent = 0
+        for notification in notifications:
+            user_id = (notification or {}).get('user_id')
+            if user_id:
+                send_realtime_notification(user_id, notification)
+                sent += 1
+
+        return jsonify({"message": "Real-time notifications sent", "sent": sent, "skipped": len(notifications) - sent}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to send real-time notifications: {str(e)}"}), 500
+
+@api.route("/test-notifications/<user_id>", methods=["POST"])
 def test_notifications(user_id: str):
     """Test endpoint to create a sample notification"""
     try:
@@ -865,7 +1115,7 @@ def test_notifications(user_id: str):
         return jsonify({"error": f"Failed to create test notification: {str(e)}"}), 500
 
 
-@app.route("/send-password-reset-email", methods=["POST"])
+@api.route("/send-password-reset-email", methods=["POST"])
 def send_password_reset_email_endpoint():
     """Send password reset email via HTTP endpoint"""
     try:
@@ -899,12 +1149,61 @@ def send_password_reset_email_endpoint():
         return jsonify({"error": f"Failed to send password reset email: {str(e)}"}), 500
 
 
-@app.route("/health", methods=["GET"])
+@api.route("/health", methods=["GET"])
 def health_check():
     """Simple health check endpoint for Docker and CI/CD"""
-    return jsonify({"status": "healthy", "service": "notification-service"}), 200
+    return jsonify({"status": "healthy", "service": "notification-service", "worker": worker_info()}), 200
+
+
+@api.route("/cache/status", methods=["GET"])
+def get_cache_status():
+    """Get user directory cache counters"""
+    return jsonify({"user_cache": USER_CACHE.stats(), "amqp_publisher": rabbitmq.stats(),
+                    "email_dispatch": EMAIL_DISPATCHER.stats() if EMAIL_DISPATCHER else None,
+                    "notification_digest": DIGEST.stats(),
+                    "query_metrics": QUERY_METRICS.stats()}), 200
+
+
+@api.route("/notifications/email/dispatch", methods=["POST"])
+def dispatch_queued_emails():
+    """Send due email_queue rows now (for schedulers and deployments with EMAIL_DISPATCH_MODE=off)"""
+    if EMAIL_DISPATCHER is None:
+        return jsonify({"error": "Email queue is disabled (EMAIL_DELIVERY=direct)"}), 409
+    try:
+        max_batches = max(1, min(int(request.args.get("max_batches", 100)), 1000))
+    except ValueError:
+        return jsonify({"error": "max_batches must be an integer"}), 400
+    try:
+        return jsonify(EMAIL_DISPATCHER.dispatch_pending(max_batches=max_batches)), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to dispatch emails: {str(e)}"}), 500
+
+
+def create_app() -> Flask:
+    """Build the Flask app and attach Socket.IO; the reminder scheduler starts with the worker, not here"""
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app)
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "notification-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "notification-service")
+    # Queue depths and publish/write counters, read from each component's stats() at scrape time
+    METRICS.add_stats("amqp_publisher", rabbitmq.stats, help_text="RabbitMQ notification publisher")
+    METRICS.add_stats("query_metrics", QUERY_METRICS.stats, help_text="Supabase queries per request")
+    METRICS.add_stats("notification_digest", DIGEST.stats, help_text="Per-user notification digests")
+    if EMAIL_DISPATCHER is not None:
+        METRICS.add_stats("email_dispatch", EMAIL_DISPATCHER.stats, help_text="Email queue dispatcher")
+        METRICS.add_stats("smtp_pool", EMAIL_DISPATCHER.pool.stats, help_text="Pooled SMTP connections")
+    app.register_blueprint(api)
+    socketio.init_app(app)
+    return app
+
+
+app = create_app()
 
 
 if __name__ == "__main__":
+    # Development server; production runs under Gunicorn (see shared/gunicorn_conf.py)
     port = int(os.getenv("PORT", 8084))
-    socketio.run(app, host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
+    run_development_server(app, port, socketio=socketio)
\ No newline at end of file
@@ -5,7 +5,7 @@ import uuid
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone, timedelta
 
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, jsonify, request
 from flask_cors import CORS
 
 try:
@@ -21,44 +21,111 @@ try:
     # Add both possible paths for email service (Docker and local development)
     sys.path.append(os.path.join(os.path.dirname(__file__), '../notifications'))
     sys.path.append(os.path.join(os.path.dirname(__file__), 'notifications'))
-    from email_service import send_notification_email
+    from email_service import send_notification_email, use_email_dispatcher
     EMAIL_SERVICE_AVAILABLE = True
     print("✅ Email service loaded successfully")
 except Exception as e:
     print(f"⚠️  Email service not available: {e}")
     EMAIL_SERVICE_AVAILABLE = False
 
-try:
-    from supabase import create_client, Client
-except Exception as exc:
-    raise RuntimeError(
-        "Missing 'supabase' client. Run: pip install -r microservices/requirements.txt"
-    ) from exc
-
-
 SUPABASE_URL: Optional[str] = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY: Optional[str] = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
 if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
     raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
-app = Flask(__name__)
-CORS(app)
+# Shared user directory cache (Docker copies src/microservices/shared next to the service)
+sys.path.append(os.path.join(os.path.dirname(__file__), '../shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'shared'))
+from user_cache import UserDirectoryCache, make_supabase_user_loader
+from cache_events import CacheEventPublisher, start_cache_invalidation_listener, evict_users
+from name_index import UserNameIndex, SupabaseUserNameSource, extract_mention_names
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
+from notification_outbox import NotificationOutbox, build_outbox_row, make_idempotency_key, CHANNEL_IN_APP, CHANNEL_EMAIL
+
+RABBITMQ_URL: str = os.getenv("RABBITMQ_URL", "amqp://localhost")
+
+USER_CACHE = UserDirectoryCache(
+    make_supabase_user_loader(lambda: supabase, "user_id, name, email, department, role"),
+    name="project_service_users",
+    max_size=int(os.getenv("USER_CACHE_MAX_SIZE", "5000")),
+    ttl=int(os.getenv("USER_CACHE_TTL", "300")),
+)
+
+# Case-insensitive name index for @mention resolution and autocomplete
+MENTION_INDEX = UserNameIndex(
+    SupabaseUserNameSource(lambda: supabase),
+    name="project_service_mentions",
+    rebuild_interval=int(os.getenv("MENTION_INDEX_REBUILD_INTERVAL", "3600")),
+)
+
+def on_user_changed(user_ids: List[str], action: str) -> None:
+    """User invalidation event: evict cached rows and re-index the users' names"""
+    evict_users(user_ids, action)
+    MENTION_INDEX.refresh_users(user_ids)
+
+# Supabase client, built by the first query
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# Project writes publish invalidation events; user events evict USER_CACHE entries and refresh MENTION_INDEX
+cache_events = CacheEventPublisher(RABBITMQ_URL, source="project-service")
+cache_event_listener = None
+
+@on_worker_init
+def start_cache_event_listener() -> None:
+    global cache_event_listener
+    cache_event_listener = start_cache_invalidation_listener(
+        RABBITMQ_URL, "project-service", {"user": on_user_changed}
+    )
+
+# Comment emails go to email_queue; the notification service sends them
+EMAIL_DISPATCHER = use_email_dispatcher(lambda: supabase, "project-email", os.getenv("EMAIL_DISPATCH_MODE", "off")) \
+    if EMAIL_SERVICE_AVAILABLE else None
+if EMAIL_DISPATCHER is not None:
+    on_worker_init(EMAIL_DISPATCHER.start)
+
+# Notifications are written to the outbox on the request path and delivered by its relay
+NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
+NOTIFICATION_OUTBOX = NotificationOutbox(
+    get_client=lambda: supabase,
+    get_users=lambda user_ids: USER_CACHE.get_many(user_ids),
+    send_email=send_notification_email if EMAIL_SERVICE_AVAILABLE else None,
+    realtime_url=NOTIFICATION_SERVICE_URL,
+    name="project-notification-outbox",
+    mode=os.getenv("OUTBOX_RELAY_MODE", "async"),
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "100")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+)
+# Each worker relays (rows are claimed with a lease, so workers never deliver the same row twice)
+on_worker_init(NOTIFICATION_OUTBOX.start)
+
+def queue_notifications(rows: List[Dict[str, Any]]) -> int:
+    """Write notification intents to the outbox; returns how many were queued"""
+    queued = NOTIFICATION_OUTBOX.enqueue(rows)
+    if rows and not queued:
+        print(f"❌ Failed to queue {len(rows)} notification(s)")
+    return queued
+
+# Routes hang off this blueprint; create_app() at the bottom builds the app
+api = Blueprint("project_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 
 # Helper functions
-def get_user_email(user_id: str) -> Optional[str]:
-    """Get user email from database"""
-    try:
-        response = supabase.table("user").select("email").eq("user_id", user_id).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0].get("email")
-        return None
-    except Exception as e:
-        print(f"Failed to get user email: {e}")
+def get_cached_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get user data from the user directory cache (loaded on a miss)"""
+    if not user_id:
         return None
+    return USER_CACHE.get(user_id)
+
+def get_user_email(user_id: str) -> Optional[str]:
+    """Get user email from the user directory cache"""
+    user = get_cached_user(user_id)
+    return user.get("email") if user else None
 
 def get_project_stakeholders(project_data: dict) -> List[str]:
     """Get all stakeholders for a project (creator + collaborators)"""
@@ -168,8 +235,9 @@ def save_project_notification_preferences(user_id: str, project_id: str, email_e
         print(f"Error saving project notification preferences: {e}")
         return False
 
-def notify_project_comment(project_data: dict, comment_text: str, commenter_id: str, commenter_name: str):
-    """Send notification to all stakeholders when a comment is added to a project"""
+def notify_project_comment(project_data: dict, comment_text: str, commenter_id: str, commenter_name: str,
+                           comment_id: Optional[str] = None):
+    """Queue a notification for all stakeholders when a comment is added to a project (delivered by the notification outbox)"""
     try:
         # Get all stakeholders (creator + collaborators)
         stakeholders = get_project_stakeholders(project_data)
@@ -180,15 +248,18 @@ def notify_project_comment(project_data: dict, comment_text: str, commenter_id:
 
         print(f"Notifying {len(stakeholders)} stakeholder(s) about new comment on project {project_data.get('project_id')}")
 
+        # Truncate comment for notification if too long
+        truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
+        comment_key = comment_id or str(uuid.uuid4())
+
+        # One outbox row per stakeholder; preferences are applied by the relay when delivering
+        outbox_rows = []
         for stakeholder_id in stakeholders:
             # Skip the person who made the comment
             if stakeholder_id == commenter_id:
                 print(f"Skipping notification for user {stakeholder_id} (they made the comment)")
                 continue
 
-            # Truncate comment for notification if too long
-            truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
-
             notification_data = {
                 "user_id": stakeholder_id,
                 "title": f"New comment on project '{project_data['project_name']}'",
@@ -197,99 +268,30 @@ def notify_project_comment(project_data: dict, comment_text: str, commenter_id:
                 "task_id": None,  # This is a project comment, not a task comment
                 "project_id": project_data.get("project_id"),  # Add project_id for navigation
                 "due_date": project_data.get("due_date"),
-
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "is_read": False
             }
-
-            # Get notification preferences for this user and project
-            email_enabled = True
-            in_app_enabled = True
-            try:
-                prefs_response = supabase.table("project_notification_preferences").select(
-                    "email_enabled, in_app_enabled"
-                ).eq("user_id", stakeholder_id).eq("project_id", project_data.get("project_id")).execute()
-
-                if prefs_response.data and len(prefs_response.data) > 0:
-                    email_enabled = prefs_response.data[0].get("email_enabled", True)
-                    in_app_enabled = prefs_response.data[0].get("in_app_enabled", True)
-                    print(f"📋 Notification preferences for user {stakeholder_id}: email={email_enabled}, in_app={in_app_enabled}")
-                else:
-                    print(f"📋 No preferences found for user {stakeholder_id}, using defaults (both enabled)")
-            except Exception as e:
-                print(f"Error fetching notification preferences: {e}")
-                # Default to enabled if there's an error
-
-            # Check for existing notification to prevent duplicates (check within last 2 minutes)
-            try:
-                existing_check = supabase.table("notifications").select("id").eq("user_id", stakeholder_id).eq("type", "project_comment").gte("created_at", (datetime.now(timezone.utc) - timedelta(minutes=2)).isoformat()).execute()
-
-                if existing_check.data and len(existing_check.data) > 0:
-                    print(f"⏭️  Duplicate project comment notification detected for user {stakeholder_id}, skipping...")
-                    continue
-            except Exception as e:
-                print(f"Error checking existing notifications: {e}")
-                # Continue anyway to avoid blocking notifications
-
-            # Store in-app notification if enabled
-            if in_app_enabled:
-                response = supabase.table("notifications").insert(notification_data).execute()
-                if response.data:
-                    print(f"✅ Sent project comment notification to stakeholder {stakeholder_id}")
-
-                    # Send real-time notification via WebSocket (without creating duplicate database entry)
-                    try:
-                        notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                        realtime_data = {
-                            "user_id": stakeholder_id,
-                            "title": notification_data["title"],
-                            "message": notification_data["message"],
-                            "type": notification_data["type"],
-                            "project_id": notification_data.get("project_id"),
-                            "created_at": notification_data["created_at"]
-                        }
-                        requests.post(
-                            f"{notification_service_url}/notifications/realtime",
-                            json=realtime_data,
-                            timeout=5,
-                            headers={'Content-Type': 'application/json'}
-                        )
-                    except Exception as e:
-                        print(f"Failed to send real-time notification: {e}")
-            else:
-                print(f"⏭️  In-app notifications disabled for user {stakeholder_id}, skipping...")
-
-            # Send email notification if enabled
-            if email_enabled and EMAIL_SERVICE_AVAILABLE:
-                user_email = get_user_email(stakeholder_id)
-                if user_email:
-                    try:
-                        print(f"📧 Sending email to {user_email} about project comment...")
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type="project_comment",
-                            project_name=project_data.get("project_name", "Untitled Project"),
-                            project_id=project_data.get("project_id"),
-                            comment_text=truncated_comment,
-                            commenter_name=commenter_name
-                        )
-                        print(f"✅ Email sent successfully to {user_email}")
-                    except Exception as e:
-                        print(f"❌ Failed to send email to stakeholder: {e}")
-                else:
-                    print(f"⚠️  No email found for stakeholder {stakeholder_id}")
-            elif not email_enabled:
-                print(f"⏭️  Email notifications disabled for user {stakeholder_id}, skipping...")
-            elif not EMAIL_SERVICE_AVAILABLE:
-                print(f"⏭️  Email service not available")
+            outbox_rows.append(build_outbox_row(
+                notification_data,
+                make_idempotency_key("project_comment", comment_key, stakeholder_id),
+                email={
+                    "notification_type": "project_comment",
+                    "project_name": project_data.get("project_name", "Untitled Project"),
+                    "project_id": project_data.get("project_id"),
+                    "comment_text": truncated_comment,
+                    "commenter_name": commenter_name
+                }
+            ))
+
+        queued = queue_notifications(outbox_rows)
+        print(f"✅ Queued {queued} project comment notification(s)")
 
     except Exception as e:
         print(f"Failed to notify stakeholders about project comment: {e}")
         import traceback
         traceback.print_exc()
 
-def notify_project_comment_mentions(project_data: dict, comment_text: str, commenter_id: str, commenter_name: str):
-    """Send notifications to users mentioned in a project comment"""
+def notify_project_comment_mentions(project_data: dict, comment_text: str, commenter_id: str, commenter_name: str,
+                                    comment_id: Optional[str] = None):
+    """Queue notifications for users mentioned in a project comment (delivered by the notification outbox)"""
     print("="*80)
     print("🔔 NOTIFY_PROJECT_COMMENT_MENTIONS CALLED")
     print("="*80)
@@ -299,25 +301,8 @@ def notify_project_comment_mentions(project_data: dict, comment_text: str, comme
     print(f"👤 Commenter Name: {commenter_name}")
 
     try:
-        # Extract @mentions from comment text using a simple approach
-        import re
-        # Find all @mentions by looking for @ followed by word characters
-        # This handles @zenia, @zenia2, @john, etc.
-        mention_pattern = r'@(\w+)'
-        mentioned_names = re.findall(mention_pattern, comment_text)
-        
-        # For usernames with spaces like "zenia 2", we need special handling
-        # Look for patterns like @zenia 2, @john doe, etc.
-        space_mention_pattern = r'@([a-zA-Z]+)\s+(\d+|[a-zA-Z]+)'
-        space_mentions = re.findall(space_mention_pattern, comment_text)
-        
-        # Add space mentions to the list
-        for space_mention in space_mentions:
-            if len(space_mention) == 2:
-                # Handle @zenia 2 -> "zenia 2"
-                combined_name = f"{space_mention[0]} {space_mention[1]}"
-                if combined_name not in mentioned_names:
-                    mentioned_names.append(combined_name)
+        # Extract @mentions (@zenia, @zenia2 and two-word forms like "@zenia 2")
+        mentioned_names = extract_mention_names(comment_text)
         
         if not mentioned_names:
             print("ℹ️  No mentions found in project comment")
@@ -325,24 +310,11 @@ def notify_project_comment_mentions(project_data: dict, comment_text: str, comme
         
         print(f"📝 Found {len(mentioned_names)} mention(s): {mentioned_names}")
         
-        # Get all users from database to match names
-        all_users_response = supabase.table("user").select("user_id, name").execute()
-        if not all_users_response.data:
-            print("❌ Could not fetch users from database")
-            return
-        
-        # Create a mapping of names to user IDs (case-insensitive)
-        name_to_user_id = {}
-        for user in all_users_response.data:
-            user_name = user.get('name', '').strip()
-            if user_name:
-                name_to_user_id[user_name.lower()] = user['user_id']
-        
-        # Find user IDs for mentioned names
+        # Resolve names to user IDs from the in-memory name index (case-insensitive)
+        resolved_mentions = MENTION_INDEX.resolve(mentioned_names)
         mentioned_user_ids = []
         for mentioned_name in mentioned_names:
-            # Try exact match first, then case-insensitive
-            user_id = name_to_user_id.get(mentioned_name.lower())
+            user_id = resolved_mentions.get(mentioned_name)
             if user_id:
                 mentioned_user_ids.append(user_id)
                 print(f"✅ Matched mention '@{mentioned_name}' to user ID: {user_id}")
@@ -352,20 +324,12 @@ def notify_project_comment_mentions(project_data: dict, comment_text: str, comme
         if not mentioned_user_ids:
             print("ℹ️  No valid user IDs found for mentions")
             return
-        
-        # Get project stakeholders to avoid duplicate notifications
-        try:
-            # Get project creator and collaborators
-            stakeholders = [project_data.get("created_by")]
-            if project_data.get("collaborators"):
-                stakeholders.extend(project_data["collaborators"])
-            stakeholders = [s for s in stakeholders if s]  # Remove None values
-            print(f"🔍 DEBUG: Project stakeholders: {stakeholders}")
-        except:
-            stakeholders = []
-        
-        # Send notifications to mentioned users
-        notifications_created = 0
+
+        # Truncate comment for notification if too long
+        truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
+        comment_key = comment_id or str(uuid.uuid4())
+
+        outbox_rows = []
         for mentioned_user_id in mentioned_user_ids:
             # Skip if the mentioned user is the commenter
             if mentioned_user_id == commenter_id:
@@ -374,10 +338,6 @@ def notify_project_comment_mentions(project_data: dict, comment_text: str, comme
 
             # Note: We do NOT skip stakeholders - they should get both comment AND mention notifications
             # This matches the task mention behavior
-
-            # Truncate comment for notification if too long
-            truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
-            
             notification_data = {
                 "user_id": mentioned_user_id,
                 "title": f"You were mentioned in a project comment",
@@ -387,111 +347,24 @@ def notify_project_comment_mentions(project_data: dict, comment_text: str, comme
                 "project_id": project_data.get("project_id"),
                 "due_date": project_data.get("due_date"),
                 "priority": "High",  # Mentions are high priority
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "is_read": False
             }
-            
-            print(f"📝 Creating project mention notification for user {mentioned_user_id}")
-            
-            # Get notification preferences for this user and project
-            email_enabled = True
-            in_app_enabled = True
-            try:
-                prefs_response = supabase.table("project_notification_preferences").select(
-                    "email_enabled, in_app_enabled"
-                ).eq("user_id", mentioned_user_id).eq("project_id", project_data.get("project_id")).execute()
-
-                if prefs_response.data and len(prefs_response.data) > 0:
-                    email_enabled = prefs_response.data[0].get("email_enabled", True)
-                    in_app_enabled = prefs_response.data[0].get("in_app_enabled", True)
-                    print(f"📋 Notification preferences for user {mentioned_user_id}: email={email_enabled}, in_app={in_app_enabled}")
-                else:
-                    print(f"📋 No preferences found for user {mentioned_user_id}, using defaults (both enabled)")
-            except Exception as e:
-                print(f"Error fetching notification preferences: {e}")
-                # Default to enabled if there's an error
-
-            # Check for existing notification to prevent duplicates (check within last 2 minutes)
-            try:
-                existing_check = supabase.table("notifications").select("id").eq("user_id", mentioned_user_id).eq("project_id", project_data.get("project_id")).eq("type", "project_mention").gte("created_at", (datetime.now(timezone.utc) - timedelta(minutes=2)).isoformat()).execute()
-
-                if existing_check.data and len(existing_check.data) > 0:
-                    print(f"⏭️  Duplicate project mention notification detected for user {mentioned_user_id}, skipping...")
-                    continue
-            except Exception as e:
-                print(f"Error checking existing notifications: {e}")
-                # Continue anyway to avoid blocking notifications
-
-            # Store in-app notification if enabled
-            if in_app_enabled:
-                try:
-                    print(f"💾 Inserting project mention notification into database for user {mentioned_user_id}...")
-                    response = supabase.table("notifications").insert(notification_data).execute()
-
-                    if response.data:
-                        notifications_created += 1
-                        print(f"✅ SUCCESS: Project mention notification inserted! ID: {response.data[0].get('id')}")
-                        print(f"   Notification title: {notification_data['title']}")
-                        print(f"   For user: {mentioned_user_id}")
-
-                        # Send real-time notification via WebSocket (if notification service is available)
-                        try:
-                            notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                            print(f"📡 Sending real-time project mention notification via WebSocket")
-                            realtime_data = {
-                                "user_id": mentioned_user_id,
-                                "title": notification_data["title"],
-                                "message": notification_data["message"],
-                                "type": notification_data["type"],
-                                "project_id": notification_data.get("project_id"),
-                                "created_at": notification_data["created_at"]
-                            }
-                            notif_response = requests.post(
-                                f"{notification_service_url}/notifications/realtime",
-                                json=realtime_data,
-                                timeout=5,
-                                headers={'Content-Type': 'application/json'}
-                            )
-                            print(f"   Real-time project mention notification response: {notif_response.status_code}")
-                        except Exception as e:
-                            print(f"⚠️  Failed to send real-time project mention notification: {e}")
-
-                except Exception as insert_error:
-                    print(f"❌ EXCEPTION during project mention notification database insert: {insert_error}")
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print(f"⏭️  In-app notifications disabled for user {mentioned_user_id}, skipping...")
-
-            # Send email notification for project mentions if enabled
-            if email_enabled and EMAIL_SERVICE_AVAILABLE:
-                user_email = get_user_email(mentioned_user_id)
-                if user_email:
-                    try:
-                        print(f"📧 Sending project mention email to {user_email}...")
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type="project_mention",
-                            project_name=project_data.get("project_name", "Untitled Project"),
-                            project_id=project_data.get("project_id"),
-                            comment_text=truncated_comment,
-                            commenter_name=commenter_name,
-                            due_date=project_data.get("due_date")
-                        )
-                        print(f"✅ Project mention email sent to {user_email}")
-                    except Exception as e:
-                        print(f"❌ Failed to send project mention email: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    print(f"⚠️  No email found for mentioned user {mentioned_user_id}")
-            elif not email_enabled:
-                print(f"⏭️  Email notifications disabled for user {mentioned_user_id}, skipping...")
-            elif not EMAIL_SERVICE_AVAILABLE:
-                print(f"⏭️  Email service not available for project mention")
+            outbox_rows.append(build_outbox_row(
+                notification_data,
+                make_idempotency_key("project_mention", comment_key, mentioned_user_id),
+                email={
+                    "notification_type": "project_mention",
+                    "project_name": project_data.get("project_name", "Untitled Project"),
+                    "project_id": project_data.get("project_id"),
+                    "comment_text": truncated_comment,
+                    "commenter_name": commenter_name,
+                    "due_date": project_data.get("due_date")
+                }
+            ))
+
+        notifications_created = queue_notifications(outbox_rows)
 
         print(f"\n{'='*80}")
-        print(f"📊 SUMMARY: Created {notifications_created} project mention notification(s)")
+        print(f"📊 SUMMARY: Queued {notifications_created} project mention notification(s)")
         print(f"{'='*80}\n")
     
     except Exception as e:
@@ -509,7 +382,7 @@ def is_valid_uuid(value: str) -> bool:
         return False
 
 
-@app.route("/projects", methods=["POST"])
+@api.route("/projects", methods=["POST"])
 def create_project():
     try:
         body = request.get_json(silent=True) or {}
@@ -570,7 +443,8 @@ def create_project():
         try:
             stakeholders = get_project_stakeholders(created_project)
             project_creator = created_project.get("created_by")
-            
+
+            outbox_rows = []
             for stakeholder_id in stakeholders:
                 # Determine notification type based on role
                 if stakeholder_id == project_creator:
@@ -583,9 +457,6 @@ def create_project():
                         "task_id": None,
                         "project_id": created_project.get("project_id"),  # Add project_id for navigation
                         "due_date": created_project.get("due_date"),
-
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "is_read": False
                     }
                 else:
                     # This is a collaborator - they get "assigned" notification
@@ -597,26 +468,21 @@ def create_project():
                         "task_id": None,
                         "project_id": created_project.get("project_id"),  # Add project_id for navigation
                         "due_date": created_project.get("due_date"),
+                    }
 
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "is_read": False
+                # In-app notification and email, delivered by the outbox relay
+                outbox_rows.append(build_outbox_row(
+                    notification_data,
+                    make_idempotency_key(notification_data["type"], created_project.get("project_id"), stakeholder_id),
+                    channels=[CHANNEL_IN_APP, CHANNEL_EMAIL],
+                    email={
+                        "notification_type": notification_data["type"],
+                        "project_name": created_project["project_name"],
+                        "project_id": created_project.get("project_id"),
+                        "due_date": created_project.get("due_date")
                     }
-                
-                # Store in-app notification
-                supabase.table("notifications").insert(notification_data).execute()
-                
-                # Send email notification if enabled
-                if EMAIL_SERVICE_AVAILABLE:
-                    user_email = get_user_email(stakeholder_id)
-                    if user_email:
-                        notification_type = "project_created" if stakeholder_id == project_creator else "project_assigned"
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type=notification_type,
-                            project_name=created_project["project_name"],
-                            project_id=created_project.get("project_id"),
-                            due_date=created_project.get("due_date")
-                        )
+                ))
+            queue_notifications(outbox_rows)
         except Exception as e:
             print(f"Failed to send project assignment notifications: {e}")
 
@@ -662,7 +528,7 @@ def map_db_row_to_api(row: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-@app.get("/projects")
+@api.get("/projects")
 def get_projects():
     try:
         limit_param = request.args.get("limit", default=None, type=int)
@@ -704,7 +570,7 @@ def get_projects():
         return jsonify({"error": str(exc)}), 500
 
 
-@app.route("/projects/<project_id>", methods=["PUT"])
+@api.route("/projects/<project_id>", methods=["PUT"])
 def update_project(project_id):
     try:
         body = request.get_json(silent=True) or {}
@@ -776,13 +642,15 @@ def update_project(project_id):
         if not response.data:
             return jsonify({"error": "Project not found or update failed"}), 404
 
+        cache_events.publish("project", [project_id], action="updated")
+
         return jsonify({"project": response.data[0]}), 200
 
     except Exception as exc:
         return jsonify({"error": str(exc)}), 500
 
 
-@app.route("/projects/<project_id>", methods=["DELETE"])
+@api.route("/projects/<project_id>", methods=["DELETE"])
 def delete_project(project_id):
     try:
         # Get the user making the request from query parameter
@@ -807,6 +675,8 @@ def delete_project(project_id):
         if not response.data:
             return jsonify({"error": "Project not found"}), 404
 
+        cache_events.publish("project", [project_id], action="deleted")
+
         return jsonify({"message": "Project deleted successfully"}), 200
 
     except Exception as exc:
@@ -815,7 +685,7 @@ def delete_project(project_id):
 
 # Project Members API Route
 
-@app.route("/projects/<project_id>/members", methods=["GET"])
+@api.route("/projects/<project_id>/members", methods=["GET"])
 def get_project_members(project_id):
     """
     GET /projects/<project_id>/members - Get all members of a specific project (creator + collaborators)
@@ -829,45 +699,36 @@ def get_project_members(project_id):
         project = project_response.data[0]
         members = []
         
-        # Get creator information
         created_by = project.get("created_by")
-        if created_by and is_valid_uuid(created_by):
-            try:
-                user_response = supabase.table("user").select("user_id, name, email").eq("user_id", created_by).execute()
-                if user_response.data:
-                    user = user_response.data[0]
-                    members.append({
-                        "user_id": user["user_id"],
-                        "name": user.get("name", "Unknown User"),
-                        "email": user.get("email", ""),
-                        "role": "creator"
-                    })
-            except Exception as e:
-                print(f"Failed to get creator info: {e}")
-        
-        # Get collaborators information
         collaborators = project.get("collaborators", [])
         if isinstance(collaborators, str):
             try:
                 collaborators = json.loads(collaborators)
             except:
                 collaborators = []
-        
-        if isinstance(collaborators, list):
-            for collaborator_id in collaborators:
-                if collaborator_id and is_valid_uuid(collaborator_id) and collaborator_id != created_by:
-                    try:
-                        user_response = supabase.table("user").select("user_id, name, email").eq("user_id", collaborator_id).execute()
-                        if user_response.data:
-                            user = user_response.data[0]
-                            members.append({
-                                "user_id": user["user_id"],
-                                "name": user.get("name", "Unknown User"),
-                                "email": user.get("email", ""),
-                                "role": "collaborator"
-                            })
-                    except Exception as e:
-                        print(f"Failed to get collaborator info for {collaborator_id}: {e}")
+        if not isinstance(collaborators, list):
+            collaborators = []
+
+        member_ids = []
+        if created_by and is_valid_uuid(created_by):
+            member_ids.append(created_by)
+        member_ids.extend(
+            collaborator_id for collaborator_id in collaborators
+            if collaborator_id and is_valid_uuid(collaborator_id) and collaborator_id != created_by
+        )
+
+        # Creator and collaborators are loaded together - one query for every cache miss
+        users = USER_CACHE.get_many(member_ids)
+
+        for member_id in dict.fromkeys(member_ids):
+            user = users.get(member_id)
+            if user:
+                members.append({
+                    "user_id": member_id,
+                    "name": user.get("name", "Unknown User"),
+                    "email": user.get("email", ""),
+                    "role": "creator" if member_id == created_by else "collaborator"
+                })
         
         return jsonify({
             "success": True,
@@ -880,7 +741,7 @@ def get_project_members(project_id):
 
 # Project Comments API Routes (Read and Create only)
 
-@app.route("/projects/<project_id>/comments", methods=["GET"])
+@api.route("/projects/<project_id>/comments", methods=["GET"])
 def get_project_comments(project_id):
     """
     GET /projects/<project_id>/comments - Get all comments for a specific project
@@ -904,7 +765,7 @@ def get_project_comments(project_id):
         return jsonify({"error": f"Failed to retrieve comments: {str(exc)}"}), 500
 
 
-@app.route("/projects/<project_id>/comments", methods=["POST"])
+@api.route("/projects/<project_id>/comments", methods=["POST"])
 def add_project_comment(project_id):
     """
     POST /projects/<project_id>/comments - Add a new comment to a project
@@ -930,11 +791,10 @@ def add_project_comment(project_id):
             return jsonify({"error": "user_id is required"}), 400
 
         # Get user information for the commenter
-        user_response = supabase.table("user").select("name").eq("user_id", user_id).execute()
+        user = get_cached_user(user_id)
         user_name = "Unknown User"
-        if user_response.data:
-            user = user_response.data[0]
-            user_name = user.get('name', '').strip()
+        if user:
+            user_name = (user.get('name') or '').strip()
             if not user_name:
                 user_name = "Unknown User"
 
@@ -960,7 +820,8 @@ def add_project_comment(project_id):
                 project_data=project,
                 comment_text=comment_text,
                 commenter_id=user_id,
-                commenter_name=user_name
+                commenter_name=user_name,
+                comment_id=created_comment.get("comment_id")
             )
             print(f"✅ Project comment notifications sent for project {project_id}")
         except Exception as notification_error:
@@ -974,7 +835,8 @@ def add_project_comment(project_id):
                 project_data=project,
                 comment_text=comment_text,
                 commenter_id=user_id,
-                commenter_name=user_name
+                commenter_name=user_name,
+                comment_id=created_comment.get("comment_id")
             )
         except Exception as mention_error:
             print(f"⚠️  Error in project mention notification process: {mention_error}")
@@ -990,6 +852,64 @@ def add_project_comment(project_id):
         return jsonify({"error": f"Failed to add comment: {str(exc)}"}), 500
 
 
+@api.route("/users/mention-suggest", methods=["GET"])
+def mention_suggest():
+    """
+    GET /users/mention-suggest?q=<prefix>&limit=<n> - Autocomplete users for @mentions in project comments
+    """
+    try:
+        query = (request.args.get("q") or "").strip()
+        try:
+            limit = min(max(int(request.args.get("limit", 10)), 1), 50)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+
+        users = [{"user_id": user["user_id"], "name": user.get("name")} for user in MENTION_INDEX.suggest(query, limit)]
+        return jsonify({"query": query, "users": users}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to suggest users: {str(e)}"}), 500
+
+
+@api.route("/health", methods=["GET"])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy", "service": "project-service", "worker": worker_info()}), 200
+
+
+@api.route("/cache/status", methods=["GET"])
+def get_cache_status():
+    """Get user directory cache and mention index counters"""
+    return jsonify({"user_cache": USER_CACHE.stats(), "mention_index": MENTION_INDEX.stats(),
+                    "email_dispatch": EMAIL_DISPATCHER.stats() if EMAIL_DISPATCHER else None,
+                    "notification_outbox": NOTIFICATION_OUTBOX.stats(),
+                    "query_metrics": QUERY_METRICS.stats()}), 200
+
+
+@api.route("/cache/clear", methods=["POST"])
+def clear_cache():
+    """Clear the user directory cache and mention index - useful for development/debugging"""
+    USER_CACHE.clear()
+    MENTION_INDEX.clear()
+    return jsonify({"message": "All caches cleared successfully"}), 200
+
+
+def create_app() -> Flask:
+    """Build the Flask app around the project routes"""
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app)
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "project-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "project-service")
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
+    # Development server; production runs under Gunicorn (see shared/gunicorn_conf.py)
     port = int(os.getenv("PORT", 8082))
-    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+    run_development_server(app, port)
\ No newline at end of file
@@ -5,7 +5,7 @@ import json
 import logging
 import requests
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 from collections import Counter
 from enum import Enum
 from html import escape
@@ -15,27 +15,14 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Now import other packages
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Blueprint, jsonify, request, send_file
 from flask_cors import CORS
 
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.graphics.shapes import Drawing, Line, Rect, String
-from reportlab.graphics.charts.piecharts import Pie
-from reportlab.lib.colors import HexColor
-
-# Add this import
-try:
-    from svglib.svglib import svg2rlg
-except ImportError:
-    svg2rlg = None
-    logger.warning("svglib not available - logo will be text-based")
+# ReportLab and svglib are imported inside the functions that draw with them, so startup does not load them
+if TYPE_CHECKING:
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -84,11 +71,75 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
     logger.error(f"SUPABASE_SERVICE_ROLE_KEY: {'✓' if SUPABASE_SERVICE_ROLE_KEY else '✗ MISSING'}")
     raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Shared user directory cache (Docker copies src/microservices/shared next to the service)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from user_cache import PartialLoadError, UserDirectoryCache, make_supabase_user_loader
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
+from cache_events import start_cache_invalidation_listener
+
+RABBITMQ_URL = os.getenv("RABBITMQ_URL", "amqp://localhost")
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "5000"))
+
+
+def load_user_info_from_service(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Load user rows from the user service; unknown users (404) are left out so they are cached as missing.
+
+    A failed lookup (5xx, timeout) does not fail the batch: the other users are still returned,
+    and PartialLoadError tells the cache which IDs to retry next time.
+    """
+    users = {}
+    failures = {}
+    for user_id in user_ids:
+        try:
+            response = requests.get(f"{USER_SERVICE_URL}/users/{user_id}", timeout=5)
+        except requests.RequestException as e:
+            failures[user_id] = str(e)
+            continue
+        if response.ok:
+            users[user_id] = response.json().get('user', {})
+        elif response.status_code != 404:
+            failures[user_id] = f"HTTP {response.status_code}"
+    if failures:
+        details = ", ".join(f"{user_id}: {error}" for user_id, error in list(failures.items())[:5])
+        raise PartialLoadError(users, failures, f"{len(failures)} user lookup(s) failed ({details})")
+    return users
+
+
+# Full user rows from Supabase (get_user_details) and name/department from the user service (fetch_user_info)
+USER_DETAILS_CACHE = UserDirectoryCache(
+    make_supabase_user_loader(lambda: supabase, '*'),
+    name="report_service_user_details",
+    max_size=USER_CACHE_MAX_SIZE,
+    ttl=USER_CACHE_TTL,
+)
+USER_INFO_CACHE = UserDirectoryCache(
+    load_user_info_from_service,
+    name="report_service_user_info",
+    max_size=USER_CACHE_MAX_SIZE,
+    ttl=USER_CACHE_TTL,
+)
+
+# Supabase client, built by the first query (see serving.lazy_supabase_client)
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# User change events evict entries from both caches
+cache_event_listener = None
+
+@on_worker_init
+def start_cache_event_listener() -> None:
+    global cache_event_listener
+    cache_event_listener = start_cache_invalidation_listener(RABBITMQ_URL, "report-service")
+
+# Routes hang off this blueprint; create_app() at the bottom builds the app
+api = Blueprint("report_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 
 def parse_datetime(value: Optional[str]) -> Optional[datetime]:
@@ -296,23 +347,15 @@ def fetch_user_info(user_id: str) -> Dict[str, str]:
     Returns:
         Dictionary with user's name and department or defaults if not found
     """
-    try:
-        # Use the user-service endpoint which has full user info including department
-        user_url = f"{USER_SERVICE_URL}/users/{user_id}"
-        response = requests.get(user_url, timeout=5)
-
-        if response.ok:
-            user_data = response.json().get('user', {})
-            return {
-                'name': user_data.get('name', 'Unknown'),
-                'department': user_data.get('department', 'N/A')
-            }
-        else:
-            logger.warning(f"Could not fetch user {user_id}: HTTP {response.status_code}")
-            return {'name': 'Unknown', 'department': 'N/A'}
-    except Exception as e:
-        logger.warning(f"Error fetching user {user_id}: {e}")
-        return {'name': 'Unknown', 'department': 'N/A'}
+    # The user-service endpoint has full user info including department; results are cached
+    user_data = USER_INFO_CACHE.get(user_id)
+    if user_data:
+        return {
+            'name': user_data.get('name', 'Unknown'),
+            'department': user_data.get('department', 'N/A')
+        }
+    logger.warning(f"Could not fetch user {user_id}")
+    return {'name': 'Unknown', 'department': 'N/A'}
 
 
 def fetch_project_report_data(project_id: str, requesting_user_id: Optional[str] = None) -> Dict[str, Any]:
@@ -372,7 +415,8 @@ def fetch_project_report_data(project_id: str, requesting_user_id: Optional[str]
                     if collab_id:
                         user_ids.add(collab_id)
 
-        # Fetch user info in batch
+        # Fetch user info in batch (misses are loaded once and cached)
+        USER_INFO_CACHE.get_many(user_ids)
         user_info_cache = {}
         for user_id in user_ids:
             user_info_cache[user_id] = fetch_user_info(user_id)
@@ -691,9 +735,12 @@ def calculate_duration(assigned_date: Optional[str], completion_date: Optional[s
         return "N/A"
 
 
-def generate_pie_chart(tasks: List[Dict[str, Any]]) -> Drawing:
+def generate_pie_chart(tasks: List[Dict[str, Any]]) -> "Drawing":
     """Generate a pie chart showing task status distribution with legend."""
-    from reportlab.graphics.shapes import Rect, String
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String
+    from reportlab.graphics.charts.piecharts import Pie
 
     # Count tasks by status
     status_counts = Counter(task.get('status') or 'Unknown' for task in tasks)
@@ -766,9 +813,11 @@ def generate_pie_chart(tasks: List[Dict[str, Any]]) -> Drawing:
 
 
 def generate_bar_chart(data_dict: Dict[str, int], title: str = "Bar Chart", 
-                      max_width: int = 450, max_height: int = 250) -> Drawing:
+                      max_width: int = 450, max_height: int = 250) -> "Drawing":
     """Generate a horizontal bar chart with labels and values."""
-    from reportlab.graphics.shapes import Rect, String, Line
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String, Line
     
     if not data_dict:
         # Create empty chart
@@ -849,9 +898,11 @@ def generate_bar_chart(data_dict: Dict[str, int], title: str = "Bar Chart",
     return drawing
 
 
-def generate_team_member_bar_chart(team_members_data: List[Dict[str, Any]]) -> Drawing:
+def generate_team_member_bar_chart(team_members_data: List[Dict[str, Any]]) -> "Drawing":
     """Generate a bar chart showing task completion by team member."""
-    from reportlab.graphics.shapes import Rect, String
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String
 
     if not team_members_data:
         return generate_bar_chart({}, "Task Status by Team Member")
@@ -968,9 +1019,11 @@ def generate_team_member_bar_chart(team_members_data: List[Dict[str, Any]]) -> D
     return drawing
 
 
-def generate_horizontal_team_bar_chart(team_performance: List[Dict[str, Any]]) -> Drawing:
+def generate_horizontal_team_bar_chart(team_performance: List[Dict[str, Any]]) -> "Drawing":
     """Generate a horizontal stacked bar chart showing task status breakdown by team member."""
-    from reportlab.graphics.shapes import Rect, String, Line
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String, Line
 
     if not team_performance:
         drawing = Drawing(500, 300)
@@ -1189,8 +1242,10 @@ def generate_horizontal_team_bar_chart(team_performance: List[Dict[str, Any]]) -
     return drawing
 
 
-def _darken_color(color: colors.Color, factor: float = 0.82) -> colors.Color:
+def _darken_color(color: "colors.Color", factor: float = 0.82) -> "colors.Color":
     """Return a slightly darker variant of a ReportLab color."""
+    from reportlab.lib import colors
+
     try:
         r = max(0.0, min(color.red * factor, 1.0))
         g = max(0.0, min(color.green * factor, 1.0))
@@ -1200,9 +1255,12 @@ def _darken_color(color: colors.Color, factor: float = 0.82) -> colors.Color:
         return color
 
 
-def build_preview_pie_chart(chart_title: str, data_dict: Dict[str, Any]) -> Optional[Drawing]:
+def build_preview_pie_chart(chart_title: str, data_dict: Dict[str, Any]) -> Optional["Drawing"]:
     """Build a pie chart drawing from preview chart data."""
-    from reportlab.graphics.shapes import Rect, String
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String
+    from reportlab.graphics.charts.piecharts import Pie
 
     if not isinstance(data_dict, dict):
         return None
@@ -1275,9 +1333,10 @@ def build_preview_pie_chart(chart_title: str, data_dict: Dict[str, Any]) -> Opti
     return drawing
 
 
-def build_preview_vertical_bar_chart(chart_title: str, data_dict: Dict[str, Any]) -> Optional[Drawing]:
+def build_preview_vertical_bar_chart(chart_title: str, data_dict: Dict[str, Any]) -> Optional["Drawing"]:
     """Build a vertical bar chart drawing from preview chart data."""
-    from reportlab.graphics.shapes import Rect, String, Line
+    from reportlab.lib.colors import HexColor
+    from reportlab.graphics.shapes import Drawing, Rect, String, Line
 
     if not isinstance(data_dict, dict):
         return None
@@ -1396,6 +1455,14 @@ def generate_pdf_report(user_id: str, user_name: str, tasks: List[Dict[str, Any]
     Returns:
         BytesIO buffer containing the PDF
     """
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+
     # Create a buffer to hold the PDF
     buffer = io.BytesIO()
 
@@ -1715,6 +1782,14 @@ def generate_project_pdf_report(report_data: Dict[str, Any]) -> io.BytesIO:
     Returns:
         BytesIO buffer containing the PDF
     """
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
+
     # Create a buffer to hold the PDF
     buffer = io.BytesIO()
 
@@ -2282,6 +2357,18 @@ def generate_project_pdf_report(report_data: Dict[str, Any]) -> io.BytesIO:
 
 def build_report_header(title: str, styles) -> List[Any]:
     """Construct a reusable report header with logo branding."""
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_LEFT, TA_RIGHT
+    from reportlab.platypus import Table, TableStyle, Paragraph, Spacer
+    from reportlab.graphics.shapes import Drawing, Line
+    try:
+        from svglib.svglib import svg2rlg
+    except ImportError:
+        svg2rlg = None
+        logger.warning("svglib not available - logo will be text-based")
+
     header_elements: List[Any] = []
 
     title_style = ParagraphStyle(
@@ -2357,18 +2444,11 @@ class ReportType(Enum):
     ORGANIZATION = "organization"
 
 def get_user_details(user_id: str) -> Dict[str, Any]:
-    """Fetch user details from Supabase."""
+    """Fetch user details from Supabase through the user directory cache."""
     if not user_id or user_id == 'None':
         logger.warning(f"Invalid user_id provided: {user_id}")
         return None
-    try:
-        response = supabase.table('user').select('*').eq('user_id', user_id).execute()
-        if response.data:
-            return response.data[0]
-        return None
-    except Exception as e:
-        logger.error(f"Error fetching user details: {e}")
-        return None
+    return USER_DETAILS_CACHE.get(user_id)
 
 def get_team_members(department: str, superior_id: str = None) -> List[Dict[str, Any]]:
     """Fetch team members based on department and/or superior."""
@@ -3472,6 +3552,14 @@ def generate_report_preview_data(requesting_user: Dict[str, Any], report_type: s
 
 def generate_preview_pdf(preview_data: Dict[str, Any], requesting_user: Dict[str, Any]) -> io.BytesIO:
     """Build a report PDF that mirrors the preview payload."""
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, KeepTogether
+    from reportlab.graphics.shapes import Drawing
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -4288,6 +4376,13 @@ def generate_director_report(tasks_by_scope: Dict[str, List[Dict[str, Any]]],
                              requesting_user: Dict[str, Any],
                              filters: Dict[str, Any]) -> io.BytesIO:
     """Generate comparative report for directors/managers/HR with branded layout."""
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
     elements: List[Any] = []
@@ -4458,6 +4553,14 @@ def generate_hr_report(data_by_scope: Dict[str, List[Dict[str, Any]]],
                       requesting_user: Dict[str, Any],
                       filters: Dict[str, Any]) -> io.BytesIO:
     """Generate HR-level organization-wide report with comparison insights."""
+    from reportlab.lib import colors
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
     elements: List[Any] = []
@@ -4820,12 +4923,28 @@ def generate_hr_report(data_by_scope: Dict[str, List[Dict[str, Any]]],
     return buffer
 
 
-@app.route("/health", methods=["GET"])
+@api.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "healthy", "service": "report-service"}), 200
-
-@app.route("/available-users", methods=["GET"])
+    return jsonify({"status": "healthy", "service": "report-service", "worker": worker_info()}), 200
+
+@api.route("/cache/status", methods=["GET"])
+def get_cache_status():
+    """Get user directory cache counters."""
+    return jsonify({
+        "user_details_cache": USER_DETAILS_CACHE.stats(),
+        "user_info_cache": USER_INFO_CACHE.stats(),
+        "query_metrics": QUERY_METRICS.stats()
+    }), 200
+
+@api.route("/cache/clear", methods=["POST"])
+def clear_cache():
+    """Clear the user directory caches - useful for development/debugging."""
+    USER_DETAILS_CACHE.clear()
+    USER_INFO_CACHE.clear()
+    return jsonify({"message": "All caches cleared successfully"}), 200
+
+@api.route("/available-users", methods=["GET"])
 def get_available_users():
     """Get all users available for HR individual analysis."""
     try:
@@ -4841,7 +4960,7 @@ def get_available_users():
         logger.error(f"Error fetching available users: {e}")
         return jsonify({"error": "Failed to fetch available users"}), 500
 
-@app.route("/report-options", methods=["GET"])
+@api.route("/report-options", methods=["GET"])
 def get_report_options():
     """Get available report options based on user role and report type."""
     try:
@@ -4927,7 +5046,7 @@ def get_report_options():
         return jsonify({"error": "Failed to fetch report options"}), 500
     """Get specific options based on report type."""
 
-@app.route("/generate-report", methods=["POST"])
+@api.route("/generate-report", methods=["POST"])
 def generate_report():
     try:
         logger.info("=== GENERATE REPORT START ===")
@@ -5031,7 +5150,7 @@ def clean_data_for_json(data):
         return data
 
 
-@app.route("/preview-report", methods=["POST"])
+@api.route("/preview-report", methods=["POST"])
 def preview_report():
     """
     Generate regular report data for preview (returns JSON).
@@ -5090,7 +5209,7 @@ def preview_report():
         logger.error(f"Error generating report preview: {e}", exc_info=True)
         return jsonify({"error": "Failed to generate preview", "details": str(e)}), 500
 
-@app.route("/preview-project-report", methods=["POST"])
+@api.route("/preview-project-report", methods=["POST"])
 def preview_project_report():
     """
     Generate project report data for preview (returns JSON).
@@ -5126,7 +5245,7 @@ def preview_project_report():
         return jsonify({"error": "Failed to generate preview", "details": str(e)}), 500
 
 
-@app.route("/generate-project-report", methods=["POST"])
+@api.route("/generate-project-report", methods=["POST"])
 def generate_project_report_endpoint():
     """
     Generate a PDF report for a project.
@@ -5177,7 +5296,7 @@ def generate_project_report_endpoint():
         logger.error(f"Error generating project report PDF: {e}", exc_info=True)
         return jsonify({"error": "Failed to generate PDF", "details": str(e)}), 500
 
-@app.route("/debug-users", methods=["GET"])
+@api.route("/debug-users", methods=["GET"])
 def debug_users():
     """Debug endpoint to check user data and report permissions."""
     try:
@@ -5228,7 +5347,7 @@ def debug_users():
         logger.error(f"Debug endpoint error: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route("/debug-tasks", methods=["GET"])
+@api.route("/debug-tasks", methods=["GET"])
 def debug_tasks():
     """Debug task fetching and filtering."""
     try:
@@ -5263,5 +5382,22 @@ def debug_tasks():
         return jsonify({"error": str(e)}), 500
 
 
+def create_app() -> Flask:
+    """Build the Flask app around the report routes (ReportLab loads with the first PDF)"""
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app)
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "report-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "report-service")
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8090, debug=True)
+    # Development server (debug with FLASK_DEBUG=1); production runs under Gunicorn (see shared/gunicorn_conf.py)
+    run_development_server(app, int(os.getenv("PORT", 8090)), debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,370 @@
+"""
+AMQP Publisher
+Long-lived, thread-safe RabbitMQ publisher with publisher confirms and micro-batching
+
+- One I/O thread owns the connection (pika SelectConnection); request threads only append to a
+  bounded in-process buffer, so publishing never blocks or serializes requests
+- Messages published within `linger` seconds of each other are written to the socket together
+- Every message stays in memory until the broker confirms it; nacked messages and messages
+  in flight when the connection drops are re-sent after reconnecting (at-least-once delivery)
+- Heartbeats are handled by the I/O loop; lost connections reconnect with exponential backoff
+- While the broker is down, up to max_buffer messages are kept; beyond that publish() returns
+  False and the drop is logged and counted instead of being lost silently
+"""
+
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pika
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BUFFER = 10000
+DEFAULT_LINGER = 0.01  # seconds to wait for more messages before writing a batch
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_IN_FLIGHT = 1000  # unconfirmed messages allowed on the wire
+DEFAULT_HEARTBEAT = 30
+DEFAULT_MAX_ATTEMPTS = 5  # sends per message before a repeatedly nacked message is dropped
+
+
+class _Message:
+    __slots__ = ("sequence", "exchange", "routing_key", "body", "properties", "attempts")
+
+    def __init__(self, sequence: int, exchange: str, routing_key: str, body: bytes, properties: pika.BasicProperties):
+        self.sequence = sequence  # Publish order, kept when messages are re-sent
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.attempts = 0
+
+
+class AmqpPublisher:
+    """Publishes from any thread through a single background I/O thread"""
+
+    def __init__(self, rabbitmq_url: str,
+                 name: str = "amqp_publisher",
+                 exchanges: Optional[Iterable[Tuple[str, str, bool]]] = None,
+                 queues: Optional[Iterable[Tuple[str, str, str]]] = None,
+                 max_buffer: int = DEFAULT_MAX_BUFFER,
+                 linger: float = DEFAULT_LINGER,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 heartbeat: int = DEFAULT_HEARTBEAT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 30):
+        """
+        exchanges: (name, type, durable) declared on every (re)connect
+        queues: (queue, exchange, routing_key) durable queues declared and bound after the exchanges
+        """
+        self.rabbitmq_url = rabbitmq_url
+        self.name = name
+        self.exchanges = list(exchanges or [])
+        self.queues = list(queues or [])
+        self.max_buffer = max_buffer
+        self.linger = linger
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # notified whenever the pending count drops
+        self._buffer: "deque[_Message]" = deque()  # waiting to be sent
+        self._unconfirmed: "OrderedDict[int, _Message]" = OrderedDict()  # delivery tag -> message
+        self._delivery_tag = 0
+        self._sequence = 0
+        self._drain_scheduled = False
+        self._connection: Optional[pika.SelectConnection] = None
+        self._channel = None
+        self._ready = False
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "sent": 0,
+            "confirmed": 0,
+            "nacked": 0,
+            "resent": 0,
+            "dropped": 0,
+            "batches": 0,
+            "connects": 0,
+            "connection_failures": 0,
+        }
+        atexit.register(self.close)
+
+    # --- caller side (any thread) ---
+
+    def publish(self, exchange: str, routing_key: str, message: Any,
+                persistent: bool = True, headers: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Queue a message for publishing; dicts and lists are sent as JSON.
+
+        Returns False only when the local buffer is full (the message is dropped and counted).
+        """
+        if isinstance(message, bytes):
+            body = message
+        elif isinstance(message, str):
+            body = message.encode("utf-8")
+        else:
+            body = json.dumps(message, default=str).encode("utf-8")
+        properties = pika.BasicProperties(
+            content_type="application/json",
+            delivery_mode=2 if persistent else 1,
+            headers=headers,
+        )
+
+        with self._lock:
+            if len(self._buffer) + len(self._unconfirmed) >= self.max_buffer:
+                self._stats["dropped"] += 1
+                dropped = self._stats["dropped"]
+                wake = False
+            else:
+                self._sequence += 1
+                self._buffer.append(_Message(self._sequence, exchange, routing_key, body, properties))
+                self._stats["queued"] += 1
+                wake = not self._drain_scheduled
+                self._drain_scheduled = True
+                dropped = None
+
+        if dropped is not None:
+            # Log the first drop and then every 100th so an outage does not flood the log
+            if dropped == 1 or dropped % 100 == 0:
+                logger.error(f"{self.name}: buffer full ({self.max_buffer}); dropped {routing_key} ({dropped} dropped so far)")
+            return False
+
+        self._ensure_thread()
+        if wake:
+            self._wake()
+        return True
+
+    def start(self) -> "AmqpPublisher":
+        """Connect in the background now instead of on the first publish"""
+        self._ensure_thread()
+        return self
+
+    def pending(self) -> int:
+        """Messages not yet confirmed by the broker"""
+        with self._lock:
+            return len(self._buffer) + len(self._unconfirmed)
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Block until every queued message has been confirmed; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._buffer or self._unconfirmed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.1))
+            return True
+
+    def close(self, timeout: float = 5) -> None:
+        """Flush (up to timeout), then close the connection and stop the I/O thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.set()
+            return
+        self.flush(timeout)
+        self._stopping.set()
+        self._call_on_io_thread(self._close_connection)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "connected": self._ready,
+                "buffered": len(self._buffer),
+                "in_flight": len(self._unconfirmed),
+                "max_buffer": self.max_buffer,
+                **self._stats,
+            }
+
+    # --- I/O thread ---
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if (self._thread is None or not self._thread.is_alive()) and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-io", daemon=True)
+                self._thread.start()
+
+    def _call_on_io_thread(self, callback) -> None:
+        """add_callback_threadsafe is the only connection method that may be called from other threads"""
+        connection = self._connection
+        if connection is None:
+            return
+        try:
+            connection.ioloop.add_callback_threadsafe(callback)
+        except Exception:
+            pass  # Connection is closing; the buffer is drained after reconnecting
+
+    def _wake(self) -> None:
+        if self._ready:
+            self._call_on_io_thread(self._schedule_drain)
+
+    def _schedule_drain(self) -> None:
+        if self._connection is not None:
+            self._connection.ioloop.call_later(self.linger, self._drain)
+
+    def _run(self) -> None:
+        delay = self.reconnect_delay
+        while not self._stopping.is_set():
+            parameters = pika.URLParameters(self.rabbitmq_url)
+            parameters.heartbeat = self.heartbeat
+            parameters.connection_attempts = 1
+            parameters.socket_timeout = 5
+            try:
+                self._connection = pika.SelectConnection(
+                    parameters,
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_open_error,
+                    on_close_callback=self._on_connection_closed,
+                )
+                self._connection.ioloop.start()
+            except Exception as e:
+                logger.warning(f"{self.name}: I/O loop error: {e}")
+
+            connected = self._on_disconnected()
+            if self._stopping.is_set():
+                break
+            delay = self.reconnect_delay if connected else min(delay * 2, self.max_reconnect_delay)
+            self._stopping.wait(delay)
+
+    def _on_disconnected(self) -> bool:
+        """Put unconfirmed messages back at the front of the buffer; returns whether the last connection was usable"""
+        with self._lock:
+            was_ready = self._ready
+            self._ready = False
+            self._channel = None
+            self._connection = None
+            if self._unconfirmed:
+                self._stats["resent"] += len(self._unconfirmed)
+                self._requeue(list(self._unconfirmed.values()))
+                self._unconfirmed.clear()
+            self._drain_scheduled = False
+        return was_ready
+
+    def _requeue(self, messages: List[_Message]) -> None:
+        """Put messages back in the buffer in their original publish order (lock held)"""
+        if messages:
+            self._buffer = deque(sorted([*messages, *self._buffer], key=lambda message: message.sequence))
+
+    def _on_connection_open(self, connection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error) -> None:
+        with self._lock:
+            self._stats["connection_failures"] += 1
+        logger.warning(f"{self.name}: cannot connect to RabbitMQ ({error}); {self.pending()} message(s) buffered")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason) -> None:
+        if not self._stopping.is_set():
+            logger.warning(f"{self.name}: connection closed ({reason}); reconnecting")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel) -> None:
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        self._declare(list(self.exchanges), list(self.queues))
+
+    def _on_channel_closed(self, channel, reason) -> None:
+        logger.warning(f"{self.name}: channel closed ({reason})")
+        self._close_connection()
+
+    def _close_connection(self) -> None:
+        connection = self._connection
+        if connection is not None and not (connection.is_closing or connection.is_closed):
+            connection.close()
+
+    def _declare(self, exchanges: List[Tuple[str, str, bool]], queues: List[Tuple[str, str, str]]) -> None:
+        """Declare exchanges, then queues and bindings, one after another; then enable confirms"""
+        channel = self._channel
+        if exchanges:
+            name, exchange_type, durable = exchanges[0]
+            channel.exchange_declare(exchange=name, exchange_type=exchange_type, durable=durable,
+                                     callback=lambda _: self._declare(exchanges[1:], queues))
+        elif queues:
+            queue, exchange, routing_key = queues[0]
+            channel.queue_declare(queue=queue, durable=True, callback=lambda _: channel.queue_bind(
+                queue=queue, exchange=exchange, routing_key=routing_key,
+                callback=lambda _: self._declare([], queues[1:])))
+        else:
+            channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=self._on_ready)
+
+    def _on_ready(self, _frame) -> None:
+        with self._lock:
+            self._ready = True
+            self._delivery_tag = 0
+            self._stats["connects"] += 1
+        logger.info(f"{self.name}: connected to RabbitMQ")
+        self._drain()
+
+    def _drain(self) -> None:
+        """Send buffered messages (runs on the I/O thread)"""
+        with self._lock:
+            self._drain_scheduled = False
+            if not self._ready or self._channel is None:
+                return
+            room = min(self.batch_size, self.max_in_flight - len(self._unconfirmed))
+            batch = [self._buffer.popleft() for _ in range(min(room, len(self._buffer)))]
+            for message in batch:
+                self._delivery_tag += 1
+                self._unconfirmed[self._delivery_tag] = message
+            more = bool(self._buffer) and len(self._unconfirmed) < self.max_in_flight
+            if more:
+                self._drain_scheduled = True
+        if not batch:
+            return
+
+        for message in batch:
+            message.attempts += 1
+            try:
+                self._channel.basic_publish(message.exchange, message.routing_key, message.body, message.properties)
+            except Exception as e:
+                # The channel is going away; _on_disconnected re-queues everything unconfirmed
+                logger.warning(f"{self.name}: publish failed ({e})")
+                return
+        with self._lock:
+            self._stats["sent"] += len(batch)
+            self._stats["batches"] += 1
+        if more:
+            self._connection.ioloop.call_later(0, self._drain)
+
+    def _on_confirm(self, frame) -> None:
+        """Broker ack/nack for one delivery tag (or every tag up to it when multiple is set)"""
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        with self._idle:
+            if method.multiple:
+                tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+            messages = [self._unconfirmed.pop(tag) for tag in tags]
+            if acked:
+                self._stats["confirmed"] += len(messages)
+            else:
+                self._stats["nacked"] += len(messages)
+                retry = [message for message in messages if message.attempts < self.max_attempts]
+                self._stats["dropped"] += len(messages) - len(retry)
+                self._stats["resent"] += len(retry)
+                self._requeue(retry)
+            self._idle.notify_all()
+            drain = bool(self._buffer) and not self._drain_scheduled
+            if drain:
+                self._drain_scheduled = True
+        if not acked:
+            logger.warning(f"{self.name}: broker rejected {len(messages)} message(s)")
+        if drain:
+            self._schedule_drain()
@@ -0,0 +1,233 @@
+"""
+Batch Writer
+Bounded in-process queue drained by a worker thread that writes rows in bulk
+
+Rows are flushed when a batch reaches batch_size or when flush_interval seconds pass,
+and on shutdown (close() is registered with atexit). flush() waits only for the rows queued
+before it was called, so it returns promptly under a steady stream of writes. In "sync" mode every row is written
+immediately on the caller's thread, which keeps unit tests deterministic.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MODE_ASYNC = "async"
+MODE_SYNC = "sync"
+
+
+class BatchWriter:
+    """Queue rows and insert them in bulk from a background thread"""
+
+    def __init__(self, write_rows: Callable[[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]],
+                 name: str = "batch_writer",
+                 mode: str = MODE_ASYNC,
+                 max_queue_size: int = 10000,
+                 batch_size: int = 100,
+                 flush_interval: float = 0.5,
+                 max_retries: int = 2):
+        self.name = name
+        self.mode = mode if mode in (MODE_ASYNC, MODE_SYNC) else MODE_ASYNC
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._write_rows = write_rows
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._flush_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Rows are numbered as they are queued and written in that order: flush() waits for a watermark
+        self._progress = threading.Condition()
+        self._enqueued = 0
+        self._completed = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "batches": 0,
+            "failed": 0,
+            "sync_fallbacks": 0,
+        }
+        atexit.register(self.close)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+
+    def write_now(self, rows: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Write rows on the caller's thread; exceptions propagate"""
+        written = self._write_rows(rows)
+        self._count("written", len(rows))
+        self._count("batches")
+        return written
+
+    def _enqueue(self, row: Dict[str, Any]) -> None:
+        with self._progress:  # Numbering and queueing together keeps the sequence in queue order
+            self._queue.put_nowait(row)
+            self._enqueued += 1
+        self._count("queued")
+
+    def submit(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Queue a row for writing.
+
+        In sync mode the row is written immediately and the stored row (or None) is returned.
+        In async mode the row itself is returned once queued; if the queue is full the row
+        is written synchronously so nothing is dropped under back-pressure.
+        """
+        if self.mode == MODE_SYNC or self._stop.is_set():
+            written = self.write_now([row])
+            return written[0] if written else None
+
+        self._ensure_worker()
+        try:
+            self._enqueue(row)
+            return row
+        except queue.Full:
+            self._count("sync_fallbacks")
+            written = self.write_now([row])
+            return written[0] if written else None
+
+    def submit_many(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Queue several rows at once; returns how many were written or queued.
+
+        In sync mode the rows go out as a single insert. In async mode rows that do not fit
+        in the queue are written together on the caller's thread.
+        """
+        if not rows:
+            return 0
+        if self.mode == MODE_SYNC or self._stop.is_set():
+            self.write_now(rows)
+            return len(rows)
+
+        self._ensure_worker()
+        overflow = []
+        for row in rows:
+            try:
+                self._enqueue(row)
+            except queue.Full:
+                overflow.append(row)
+        if overflow:
+            self._count("sync_fallbacks", len(overflow))
+            self.write_now(overflow)
+        return len(rows)
+
+    def _write_with_retries(self, rows: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.write_now(rows)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    if len(rows) > 1:
+                        logger.warning(f"{self.name}: batch of {len(rows)} failed after {attempt + 1} attempts, "
+                                       f"splitting it to isolate the bad row(s): {e}")
+                        self._write_bisected(rows)
+                    else:
+                        self._count("failed")
+                        logger.error(f"{self.name}: dropping 1 row after {attempt + 1} attempts: {e}")
+                else:
+                    time.sleep(0.1 * (2 ** attempt))
+
+    def _write_bisected(self, rows: List[Dict[str, Any]]) -> None:
+        """Write each half of a failed batch once, splitting again until only the bad rows are dropped"""
+        middle = len(rows) // 2
+        for half in (rows[:middle], rows[middle:]):
+            try:
+                self.write_now(half)
+            except Exception as e:
+                if len(half) > 1:
+                    self._write_bisected(half)
+                else:
+                    self._count("failed")
+                    logger.error(f"{self.name}: dropping 1 row: {e}")
+
+    def _drain_batch(self, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Collect up to batch_size rows, waiting at most flush_interval after the first"""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # Queue is empty: write now if a flush or shutdown is waiting, otherwise wait for more rows
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._flush_requested.is_set() or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.05)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = self._drain_batch(first)
+            try:
+                self._write_with_retries(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                with self._progress:
+                    self._completed += len(batch)
+                    self._progress.notify_all()
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Block until every row queued before this call has been written; returns False on timeout"""
+        if self.mode == MODE_SYNC or self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        self._flush_requested.set()
+        try:
+            with self._progress:
+                watermark = self._enqueued
+                while self._completed < watermark:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._progress.wait(remaining)
+            return True
+        finally:
+            self._flush_requested.clear()
+
+    def close(self, timeout: float = 10) -> None:
+        """Flush outstanding rows and stop the worker (later submits are written synchronously)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.set()
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "mode": self.mode,
+                "pending": self._queue.qsize(),
+                "batch_size": self.batch_size,
+                "flush_interval_seconds": self.flush_interval,
+                **self._stats,
+            }
@@ -0,0 +1,214 @@
+"""
+Cache Invalidation Events
+Small RabbitMQ topic-exchange events telling every service which cached users, tasks or projects changed
+
+Writers publish "<entity>.<action>" events (e.g. user.updated, task.deleted) after a successful write.
+Each service that holds a cache runs a subscriber on its own exclusive queue and evicts only the
+affected keys, so cache TTLs can be long without serving stale data.
+Publishing never raises: if the broker is unavailable the cache TTL remains the safety net.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pika
+
+from user_cache import invalidate_user_everywhere
+
+logger = logging.getLogger(__name__)
+
+CACHE_EVENTS_EXCHANGE = os.getenv("CACHE_EVENTS_EXCHANGE", "cache_invalidation")
+CACHE_EVENTS_ENABLED = os.getenv("CACHE_EVENTS_ENABLED", "true").lower() == "true"
+RECONNECT_BACKOFF_SECONDS = 30  # Publisher skips the broker for this long after a failed connect
+
+EventHandler = Callable[[List[str], str], None]  # (ids, action)
+
+
+def build_event(entity: str, ids: Iterable[str], action: str, source: str) -> Dict:
+    """Build the JSON body of an invalidation event"""
+    return {
+        "event_id": str(uuid.uuid4()),
+        "entity": entity,
+        "action": action,
+        "ids": [str(i) for i in ids if i],
+        "source": source,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class CacheEventPublisher:
+    """Publishes invalidation events on the cache topic exchange (thread-safe, best effort)"""
+
+    def __init__(self, rabbitmq_url: str, source: str):
+        self.rabbitmq_url = rabbitmq_url
+        self.source = source
+        self._lock = threading.Lock()
+        self._connection = None
+        self._channel = None
+        self._retry_after = 0.0
+        self.published = 0
+        self.failed = 0
+
+    def _ensure_channel(self):
+        if self._channel is not None and self._channel.is_open:
+            return self._channel
+        if time.monotonic() < self._retry_after:
+            return None
+        try:
+            parameters = pika.URLParameters(self.rabbitmq_url)
+            parameters.socket_timeout = 2
+            parameters.blocked_connection_timeout = 2
+            self._connection = pika.BlockingConnection(parameters)
+            self._channel = self._connection.channel()
+            self._channel.exchange_declare(exchange=CACHE_EVENTS_EXCHANGE, exchange_type='topic', durable=True)
+            return self._channel
+        except Exception as e:
+            logger.warning(f"Cache events: cannot connect to RabbitMQ ({e}); relying on cache TTL")
+            self._reset()
+            self._retry_after = time.monotonic() + RECONNECT_BACKOFF_SECONDS
+            return None
+
+    def _reset(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def publish(self, entity: str, ids: Iterable[str], action: str = "updated") -> bool:
+        """Publish "<entity>.<action>" for the given IDs; returns False if the event could not be sent"""
+        if not CACHE_EVENTS_ENABLED:
+            return False
+        event = build_event(entity, ids, action, self.source)
+        if not event["ids"]:
+            return False
+
+        with self._lock:
+            for attempt in range(2):
+                channel = self._ensure_channel()
+                if channel is None:
+                    break
+                try:
+                    channel.basic_publish(
+                        exchange=CACHE_EVENTS_EXCHANGE,
+                        routing_key=f"{entity}.{action}",
+                        body=json.dumps(event),
+                        properties=pika.BasicProperties(content_type="application/json"),
+                    )
+                    self.published += 1
+                    return True
+                except Exception as e:
+                    # Stale connection - reconnect once and retry
+                    logger.warning(f"Cache events: publish failed (attempt {attempt + 1}): {e}")
+                    self._reset()
+            self.failed += 1
+            return False
+
+
+class CacheInvalidationSubscriber:
+    """Consumes invalidation events on an exclusive per-process queue and dispatches them to handlers"""
+
+    def __init__(self, rabbitmq_url: str, service_name: str, handlers: Dict[str, EventHandler],
+                 reconnect_delay: float = 5, max_reconnect_delay: float = 60):
+        self.rabbitmq_url = rabbitmq_url
+        self.service_name = service_name
+        self.handlers = handlers
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.received = 0
+        self.evicted = 0
+
+    def handle_message(self, body: bytes) -> int:
+        """Dispatch one event to its entity handler; returns the number of IDs handled"""
+        try:
+            event = json.loads(body)
+            entity = event.get("entity")
+            ids = [str(i) for i in event.get("ids") or []]
+            action = event.get("action", "updated")
+        except Exception as e:
+            logger.warning(f"Cache events: ignoring malformed event: {e}")
+            return 0
+
+        self.received += 1
+        handler = self.handlers.get(entity)
+        if handler is None or not ids:
+            return 0
+        try:
+            handler(ids, action)
+            self.evicted += len(ids)
+            return len(ids)
+        except Exception as e:
+            logger.warning(f"Cache events: handler for {entity} failed: {e}")
+            return 0
+
+    def _consume(self):
+        connection = pika.BlockingConnection(pika.URLParameters(self.rabbitmq_url))
+        try:
+            channel = connection.channel()
+            channel.exchange_declare(exchange=CACHE_EVENTS_EXCHANGE, exchange_type='topic', durable=True)
+            # Exclusive, server-named queue: every process (and every replica) gets its own copy of each event
+            queue = channel.queue_declare(queue='', exclusive=True, auto_delete=True).method.queue
+            for entity in self.handlers:
+                channel.queue_bind(exchange=CACHE_EVENTS_EXCHANGE, queue=queue, routing_key=f"{entity}.#")
+            channel.basic_consume(
+                queue=queue,
+                on_message_callback=lambda ch, method, properties, body: self.handle_message(body),
+                auto_ack=True,
+            )
+            logger.info(f"Cache events: {self.service_name} listening for {', '.join(self.handlers)} events")
+            while not self._stopped.is_set():
+                connection.process_data_events(time_limit=1)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stopped.is_set():
+            try:
+                self._consume()
+                delay = self.reconnect_delay
+            except Exception as e:
+                logger.warning(f"Cache events: subscriber disconnected ({e}); retrying in {delay}s")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self) -> "CacheInvalidationSubscriber":
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.service_name}-cache-events", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+
+def evict_users(ids: List[str], action: str) -> None:
+    """Default user handler: drop the users from every user directory cache in this process"""
+    invalidate_user_everywhere(*ids)
+
+
+def start_cache_invalidation_listener(rabbitmq_url: str, service_name: str,
+                                      handlers: Optional[Dict[str, EventHandler]] = None
+                                      ) -> Optional[CacheInvalidationSubscriber]:
+    """Start a background subscriber; user events evict from the user directory caches by default"""
+    if not CACHE_EVENTS_ENABLED:
+        return None
+    all_handlers: Dict[str, EventHandler] = {"user": evict_users}
+    all_handlers.update(handlers or {})
+    return CacheInvalidationSubscriber(rabbitmq_url, service_name, all_handlers).start()
@@ -0,0 +1,497 @@
+"""
+Email Dispatch
+Durable email queue delivered off the request path over pooled, reused SMTP connections
+
+Callers write one email_queue row per message (subject and HTML already rendered) and return.
+A dispatcher claims due rows in batches and sends them from a small pool of worker threads:
+
+- SmtpPool keeps up to `size` connections open; STARTTLS and AUTH happen once per connection
+  instead of once per message, and a connection is recycled after max_messages or when it sat
+  idle longer than idle_timeout (servers drop idle sessions)
+- DomainRateLimiter holds each recipient domain to its configured rate (token bucket); a message
+  over the limit is put back with a later next_attempt_at and does not count as an attempt
+- Transient failures (disconnects, timeouts, 4xx replies) are retried with exponential backoff;
+  permanent ones (5xx replies, refused recipients) and rows past max_attempts are marked failed
+
+Claims are leases on next_attempt_at, as in notification_outbox, so several dispatchers can share
+the table. Modes: "async" sends on a background thread woken by every enqueue, "sync" sends on the
+caller's thread right after the write, "off" only writes rows (another service sends them).
+"""
+
+import contextlib
+import logging
+import random
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_TABLE = "email_queue"
+
+MODE_ASYNC = "async"
+MODE_SYNC = "sync"
+MODE_OFF = "off"
+
+DEFAULT_DOMAIN = "default"
+_RATE_UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600}
+
+
+def email_domain(address: str) -> str:
+    return address.rsplit("@", 1)[-1].strip().lower() if address and "@" in address else ""
+
+
+def build_email_row(to_email: str, subject: str, html_content: str,
+                    idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """One email_queue row; without an idempotency key every call queues a new message"""
+    return {
+        "idempotency_key": idempotency_key or uuid.uuid4().hex,
+        "to_email": to_email,
+        "domain": email_domain(to_email),
+        "subject": subject,
+        "html_content": html_content,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": datetime.now(timezone.utc).isoformat(),
+        "last_error": None,
+    }
+
+
+def build_message(row: Dict[str, Any], from_address: str) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = row["subject"]
+    message["From"] = from_address
+    message["To"] = row["to_email"]
+    message.attach(MIMEText(row["html_content"], "html"))
+    return message
+
+
+def is_transient_smtp_error(error: Exception) -> bool:
+    """Whether sending again later may succeed"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return not codes or any(code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True  # Bad credentials are a configuration problem; keep the mail until it is fixed
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    return True  # Disconnects, timeouts, refused connections and anything unexpected
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parse "gmail.com=60/min,outlook.com=30/min,default=300/min" into messages per second by domain"""
+    limits: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        try:
+            domain, rate = part.split("=", 1)
+            count, _, unit = rate.strip().partition("/")
+            limits[domain.strip().lower()] = float(count) / _RATE_UNITS[(unit or "s").strip().lower()]
+        except (ValueError, KeyError):
+            logger.warning(f"Ignoring invalid email rate limit {part.strip()!r}")
+    return limits
+
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain; domains without their own limit share the "default" rate"""
+
+    def __init__(self, limits: Dict[str, float], burst_seconds: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = {domain.lower(): rate for domain, rate in limits.items() if rate > 0}
+        self.burst_seconds = burst_seconds
+        self.clock = clock
+        self._buckets: Dict[str, List[float]] = {}  # domain -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def acquire(self, domain: str) -> float:
+        """Take a token: 0 if the message may go now, otherwise seconds until one is available"""
+        domain = (domain or "").lower()
+        rate = self.limits.get(domain, self.limits.get(DEFAULT_DOMAIN))
+        if rate is None:
+            return 0.0
+        capacity = max(1.0, rate * self.burst_seconds)
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.setdefault(domain, [capacity, now])
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / rate
+
+
+class _PooledConnection:
+    __slots__ = ("server", "messages", "last_used")
+
+    def __init__(self, server):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+
+
+class SmtpPool:
+    """Up to `size` authenticated SMTP connections, each used by one thread at a time"""
+
+    def __init__(self, host: str, port: int, user: Optional[str] = None, password: Optional[str] = None,
+                 size: int = 4, starttls: bool = True, timeout: float = 30,
+                 max_messages: int = 100, idle_timeout: float = 60,
+                 smtp_class: Callable[..., Any] = smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.smtp_class = smtp_class
+        self._idle: List[_PooledConnection] = []
+        self._open = 0
+        self._available = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._stats = {"connections_opened": 0, "connections_closed": 0, "messages_sent": 0, "reconnects": 0}
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _connect(self) -> _PooledConnection:
+        server = self.smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self._count("connections_opened")
+        return _PooledConnection(server)
+
+    def _quit(self, server) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _acquire(self) -> _PooledConnection:
+        stale: List[_PooledConnection] = []
+        try:
+            with self._available:
+                while True:
+                    while self._idle:
+                        connection = self._idle.pop()
+                        if time.monotonic() - connection.last_used < self.idle_timeout:
+                            return connection
+                        self._open -= 1  # Probably dropped by the server already
+                        stale.append(connection)
+                    if self._open < self.size:
+                        self._open += 1
+                        break
+                    self._available.wait()
+        finally:
+            for connection in stale:
+                self._discard(connection)
+        try:
+            return self._connect()
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, connection: Optional[_PooledConnection]) -> None:
+        with self._available:
+            if connection is None:
+                self._open -= 1
+            else:
+                connection.last_used = time.monotonic()
+                self._idle.append(connection)
+            self._available.notify()
+
+    def _discard(self, connection: _PooledConnection) -> None:
+        self._quit(connection.server)
+        self._count("connections_closed")
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connected, authenticated server; it is closed instead of returned if anything fails"""
+        connection = self._acquire()
+        try:
+            yield connection.server
+        except Exception:
+            self._discard(connection)
+            self._release(None)
+            raise
+        connection.messages += 1
+        if connection.messages >= self.max_messages:
+            self._discard(connection)
+            self._release(None)
+        else:
+            self._release(connection)
+
+    def send(self, message) -> None:
+        """Send one message; a connection the server closed while idle is replaced once"""
+        try:
+            with self.connection() as server:
+                server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self._count("reconnects")
+            with self.connection() as server:
+                server.send_message(message)
+        self._count("messages_sent")
+
+    def close(self) -> None:
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._available.notify_all()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._available:
+            in_use = self._open - len(self._idle)
+            idle = len(self._idle)
+        with self._stats_lock:
+            return {"size": self.size, "in_use": in_use, "idle": idle, **self._stats}
+
+
+class EmailDispatcher:
+    """Queues rendered emails and sends them from worker threads sharing an SmtpPool"""
+
+    def __init__(self, get_client: Callable[[], Any],
+                 pool: SmtpPool,
+                 from_address: str,
+                 name: str = "email_dispatch",
+                 mode: str = MODE_ASYNC,
+                 workers: int = 4,
+                 rate_limiter: Optional[DomainRateLimiter] = None,
+                 batch_size: int = 50,
+                 poll_interval: float = 5.0,
+                 max_attempts: int = 6,
+                 retry_base_delay: float = 60,
+                 lease_seconds: float = 300):
+        # get_client is called per query so a patched module-level client is picked up
+        self.get_client = get_client
+        self.pool = pool
+        self.from_address = from_address
+        self.name = name
+        self.mode = mode if mode in (MODE_ASYNC, MODE_SYNC, MODE_OFF) else MODE_ASYNC
+        self.workers = max(1, workers)
+        self.rate_limiter = rate_limiter
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.lease_seconds = lease_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()  # One dispatch pass at a time per process
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "enqueue_errors": 0,
+            "sent_inline": 0,
+            "claimed": 0,
+            "sent": 0,
+            "deferred": 0,
+            "retried": 0,
+            "failed": 0,
+            "dispatch_errors": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    # --- caller side ---
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Store messages (rows from build_email_row) with one upsert; returns how many were accepted.
+
+        If the queue cannot be written the messages are sent inline instead, so mail is not lost
+        while the table is unavailable.
+        """
+        rows = [row for row in rows if row and row.get("to_email")]
+        if not rows:
+            return 0
+        try:
+            self.get_client().table(EMAIL_QUEUE_TABLE).upsert(
+                rows, on_conflict="idempotency_key", ignore_duplicates=True).execute()
+        except Exception as e:
+            self._count("enqueue_errors")
+            logger.error(f"{self.name}: failed to queue {len(rows)} email(s), sending inline: {e}")
+            sent = sum(1 for error in self.send_rows(rows) if error is None)
+            self._count("sent_inline", sent)
+            return sent
+        self._count("enqueued", len(rows))
+
+        if self.mode == MODE_SYNC:
+            self.dispatch_once()
+        elif self.mode == MODE_ASYNC:
+            self._ensure_worker()
+            self._wake.set()
+        return len(rows)
+
+    # --- sending ---
+
+    def _send_row(self, row: Dict[str, Any]) -> Optional[Tuple[bool, str]]:
+        """None when sent, else (transient, error)"""
+        try:
+            self.pool.send(build_message(row, self.from_address))
+            return None
+        except Exception as e:
+            return is_transient_smtp_error(e), f"{type(e).__name__}: {e}"
+
+    def send_rows(self, rows: List[Dict[str, Any]]) -> List[Optional[Tuple[bool, str]]]:
+        """Send rows in parallel over the pool; one outcome per row, in order"""
+        if len(rows) <= 1 or self.workers == 1:
+            return [self._send_row(row) for row in rows]
+        if self._executor is None:
+            with self._start_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix=f"{self.name}-smtp")
+        return list(self._executor.map(self._send_row, rows))
+
+    def dispatch_once(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Claim one batch of due rows and send it; returns per-pass counters"""
+        with self._dispatch_lock:
+            rows = self._claim(limit or self.batch_size)
+            if not rows:
+                return {"claimed": 0, "sent": 0, "deferred": 0, "retried": 0, "failed": 0}
+            ready, deferred = [], {}
+            for row in rows:
+                wait = self.rate_limiter.acquire(row.get("domain") or email_domain(row["to_email"])) \
+                    if self.rate_limiter else 0.0
+                if wait > 0:
+                    deferred[row["id"]] = wait
+                else:
+                    ready.append(row)
+            outcomes = dict(zip((row["id"] for row in ready), self.send_rows(ready)))
+            return self._record(rows, outcomes, deferred)
+
+    def dispatch_pending(self, max_batches: int = 100) -> Dict[str, int]:
+        """Dispatch batches until nothing is due (or max_batches is reached)"""
+        totals = {"claimed": 0, "sent": 0, "deferred": 0, "retried": 0, "failed": 0, "batches": 0}
+        for _ in range(max_batches):
+            result = self.dispatch_once()
+            if not result["claimed"]:
+                break
+            totals["batches"] += 1
+            for key in ("claimed", "sent", "deferred", "retried", "failed"):
+                totals[key] += result[key]
+            if result["claimed"] < self.batch_size:
+                break
+        return totals
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease due rows: pending rows and processing rows whose previous lease expired"""
+        client = self.get_client()
+        now = datetime.now(timezone.utc)
+        due = client.table(EMAIL_QUEUE_TABLE).select("id").in_("status", ["pending", "processing"]) \
+            .lte("next_attempt_at", now.isoformat()).order("id").limit(limit).execute()
+        ids = [row["id"] for row in due.data or []]
+        if not ids:
+            return []
+        lease = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        claimed = client.table(EMAIL_QUEUE_TABLE).update({"status": "processing", "next_attempt_at": lease}) \
+            .in_("id", ids).in_("status", ["pending", "processing"]).lte("next_attempt_at", now.isoformat()).execute()
+        rows = claimed.data or []
+        self._count("claimed", len(rows))
+        return rows
+
+    def _record(self, rows, outcomes, deferred) -> Dict[str, int]:
+        """Write each row's outcome back with one upsert"""
+        now = datetime.now(timezone.utc)
+        result = {"claimed": len(rows), "sent": 0, "deferred": 0, "retried": 0, "failed": 0}
+        updated = []
+        for row in rows:
+            row = dict(row)
+            if row["id"] in deferred:
+                # Over the domain's rate: try again once a token is free, without using up an attempt
+                row.update(status="pending", next_attempt_at=(now + timedelta(seconds=deferred[row["id"]])).isoformat())
+                result["deferred"] += 1
+            elif outcomes.get(row["id"]) is None:
+                row.update(status="sent", sent_at=now.isoformat(), last_error=None)
+                result["sent"] += 1
+            else:
+                transient, error = outcomes[row["id"]]
+                attempts = (row.get("attempts") or 0) + 1
+                row.update(attempts=attempts, last_error=error)
+                if not transient or attempts >= self.max_attempts:
+                    row.update(status="failed")
+                    result["failed"] += 1
+                    logger.error(f"{self.name}: giving up on email {row['id']} to {row['domain']}: {error}")
+                else:
+                    # Exponential backoff with jitter so a recovering server is not hit by the whole batch at once
+                    delay = self.retry_base_delay * (2 ** (attempts - 1)) * random.uniform(1.0, 1.25)
+                    row.update(status="pending", next_attempt_at=(now + timedelta(seconds=delay)).isoformat())
+                    result["retried"] += 1
+            updated.append(row)
+        try:
+            self.get_client().table(EMAIL_QUEUE_TABLE).upsert(updated).execute()
+        except Exception as e:
+            # The lease expires and unrecorded rows are sent again: at-least-once delivery
+            self._count("dispatch_errors")
+            logger.error(f"{self.name}: failed to record {len(updated)} email outcome(s): {e}")
+        for key in ("sent", "deferred", "retried", "failed"):
+            self._count(key, result[key])
+        return result
+
+    # --- background worker ---
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-dispatch", daemon=True)
+                self._thread.start()
+
+    def start(self) -> "EmailDispatcher":
+        """Start the background dispatcher (sends mail queued before this process started)"""
+        if self.mode == MODE_ASYNC:
+            self._ensure_worker()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.dispatch_pending()
+            except Exception as e:
+                self._count("dispatch_errors")
+                logger.warning(f"{self.name}: dispatch pass failed: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = {"name": self.name, "mode": self.mode, "workers": self.workers, **self._stats}
+        stats["smtp_pool"] = self.pool.stats()
+        return stats
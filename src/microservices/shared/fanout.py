@@ -0,0 +1,100 @@
+"""
+Concurrent Fan-Out
+Runs independent I/O-bound stages (e.g. Supabase queries) of one request on a bounded shared thread pool
+
+- One pool per service, shared by all requests, so concurrency stays bounded under load
+- When every worker slot is taken, stages run inline on the request thread instead of queueing
+- Each stage is timed; the caller gets {stage: result} plus {stage: milliseconds}
+- Stages run in a copy of the caller's contextvars, so per-request context follows the work
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class FanOut:
+    """Bounded thread pool that runs named stages concurrently and reports per-stage timings"""
+
+    def __init__(self, name: str = "fanout", max_workers: int = DEFAULT_MAX_WORKERS):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._stats_lock = threading.Lock()
+        self._stats = {"runs": 0, "stages": 0, "inline_stages": 0, "errors": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so importing a service does not start threads
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    @staticmethod
+    def _timed(fn: Callable[[], Any]) -> Tuple[Any, Optional[BaseException], float]:
+        start = time.perf_counter()
+        try:
+            return fn(), None, (time.perf_counter() - start) * 1000
+        except BaseException as e:  # Re-raised on the caller's thread
+            return None, e, (time.perf_counter() - start) * 1000
+
+    def run(self, stages: Dict[str, Callable[[], Any]]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Run every stage and wait for all of them.
+
+        Returns (results, timings_ms). If any stage raised, the first failure (in stage order)
+        is re-raised after all stages have finished.
+        """
+        self._count("runs")
+        self._count("stages", len(stages))
+        futures = {}
+        outcomes: Dict[str, Tuple[Any, Optional[BaseException], float]] = {}
+
+        names = list(stages)
+        # The last stage always runs on the calling thread, which would otherwise sit idle
+        for name in names[:-1]:
+            if self._slots.acquire(blocking=False):
+                context = contextvars.copy_context()
+                future = self._get_executor().submit(context.run, self._timed, stages[name])
+                future.add_done_callback(lambda _: self._slots.release())
+                futures[name] = future
+            else:
+                self._count("inline_stages")
+                outcomes[name] = self._timed(stages[name])
+        if names:
+            outcomes[names[-1]] = self._timed(stages[names[-1]])
+
+        for name, future in futures.items():
+            outcomes[name] = future.result()
+
+        results = {name: outcomes[name][0] for name in names}
+        timings = {name: round(outcomes[name][2], 2) for name in names}
+        for name in names:
+            error = outcomes[name][1]
+            if error is not None:
+                self._count("errors")
+                logger.warning(f"{self.name}: stage '{name}' failed: {error}")
+                raise error
+        return results, timings
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {"name": self.name, "max_workers": self.max_workers, **self._stats}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration shared by every service
+
+    gunicorn -c ../shared/gunicorn_conf.py task_service:app
+
+Pre-fork model: the master loads the app once and forks WEB_CONCURRENCY workers, each serving
+GUNICORN_THREADS concurrent requests. Workers are recycled after GUNICORN_MAX_REQUESTS requests
+(with jitter so they do not all restart together) and replaced if they hang for GUNICORN_TIMEOUT.
+Workers share METRICS_MULTIPROC_DIR so /metrics reports the whole server, whichever worker answers
+(see metrics.py); it is cleared when the master starts.
+
+Environment:
+    PORT                      listen port (default 8000)
+    WEB_CONCURRENCY           worker processes (default 2 x CPU cores + 1, at most 8)
+    GUNICORN_THREADS          threads per worker (default 4)
+    GUNICORN_WORKER_CLASS     gthread / sync / eventlet (default gthread, or sync with one thread)
+    GUNICORN_PRELOAD          1 to import the app in the master before forking (default 1)
+    GUNICORN_MAX_REQUESTS     requests before a worker is recycled (default 1000, 0 disables)
+    GUNICORN_TIMEOUT          seconds before a silent worker is killed (default 60)
+    METRICS_MULTIPROC_DIR     worker metrics snapshots (default <tmp>/service-metrics-<port>)
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+
+# Make shared modules (serving, ...) importable whatever the service's working directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync")
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max(max_requests // 10, 0)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = "-"
+errorlog = "-"
+
+# Set before the app is imported so every process (master and workers) builds its registry on it
+os.environ.setdefault("METRICS_MULTIPROC_DIR",
+                      os.path.join(tempfile.gettempdir(), f"service-metrics-{os.getenv('PORT', '8000')}"))
+
+
+def on_starting(server):
+    """Runs in the master before the app loads: drop snapshots from the previous run"""
+    from metrics import reset_multiproc_dir
+
+    reset_multiproc_dir(os.environ["METRICS_MULTIPROC_DIR"])
+
+
+def post_worker_init(worker):
+    """Runs in each worker after the fork: open connections and start background threads there"""
+    from serving import init_worker
+
+    init_worker(
+        server="gunicorn",
+        workers=worker.cfg.workers,
+        threads=worker.cfg.threads,
+        worker_class=worker.cfg.worker_class_str,
+    )
+
+
+def worker_exit(server, worker):
+    print(f"👋 Worker {worker.pid} exiting")
+
+
+def child_exit(server, worker):
+    """Runs in the master: keep the exited worker's counters in the server totals"""
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid, os.environ["METRICS_MULTIPROC_DIR"])
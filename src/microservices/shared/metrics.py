@@ -0,0 +1,486 @@
+"""
+Service Metrics
+In-process Prometheus text-format metrics with a /metrics endpoint per Flask service
+
+No client library or collector process is needed: counters, gauges and histograms live in memory
+and are rendered in the Prometheus exposition format on GET /metrics (scrape it with Prometheus,
+or just curl it). install_metrics(app, service) records:
+
+- http_requests_total / http_request_duration_seconds per route, method and status
+- http_requests_in_flight
+- supabase_query_duration_seconds per table and method (via query_metrics)
+- outbound_http_request_duration_seconds per host and method (every `requests` call)
+- user_cache_* counters for every UserDirectoryCache in the process
+- job_duration_seconds for background jobs timed with time_job()
+
+Component stats() dicts (publishers, writers, outboxes) are exported with add_stats(): numeric
+fields become gauges, or counters for monotonic fields listed in COUNTER_FIELDS.
+
+Metrics are recorded per process. Under Gunicorn (several worker processes behind one port) set
+METRICS_MULTIPROC_DIR, as gunicorn_conf.py does: every worker writes its exposition to
+<dir>/worker-<pid>.prom every METRICS_SYNC_INTERVAL seconds (and on every scrape it answers), and
+/metrics returns the sum over all workers' files, whichever worker the scrape reaches. Counters and
+histograms are summed; gauges are summed over live workers (e.g. in-flight requests). When a worker
+exits, the master folds its counters and histograms into dead.prom (mark_process_dead), so totals
+never go backwards when workers are recycled.
+"""
+
+import atexit
+import bisect
+import contextlib
+import glob
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SYNC_INTERVAL_SECONDS = float(os.getenv("METRICS_SYNC_INTERVAL", "5"))
+
+# stats() fields that only ever grow; exported as <prefix>_<field>_total counters
+COUNTER_FIELDS = frozenset({
+    "hits", "negative_hits", "misses", "loads", "load_errors", "coalesced_waits", "evictions", "expirations",
+    "invalidations", "queued", "sent", "confirmed", "nacked", "resent", "dropped", "batches", "connects",
+    "connection_failures", "written", "failed", "sync_fallbacks", "enqueued", "enqueue_errors", "claimed",
+    "retried", "in_app_delivered", "realtime_delivered", "emails_delivered", "relay_errors", "runs", "stages",
+    "inline_stages", "errors", "requests", "queries", "over_budget", "n_plus_one", "queries_outside_requests",
+    "sent_inline", "deferred", "dispatch_errors", "connections_opened", "connections_closed", "messages_sent",
+    "reconnects", "items_buffered", "buffer_errors", "digests", "items_flushed", "flush_errors",
+})
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Sequence[Any]) -> LabelValues:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}")
+        return tuple(str(value) for value in values)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1) -> None:
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *label_values: Any, value: float) -> None:
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, *label_values: Any, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, *label_values: Any, value: float) -> None:
+        key = self._key(label_values)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            if position < len(self.buckets):
+                series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values: Any):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*label_values, value=time.perf_counter() - started)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', _format_value(bound)))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics of one process plus collectors that read component stats at scrape time"""
+
+    def __init__(self, multiproc_dir: Optional[str] = None):
+        self.multiproc_dir = multiproc_dir  # shared by the workers of one server; None: this process only
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+        self._sync_thread: Optional[threading.Thread] = None
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labels != metric.labels:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """collector() returns ready-made exposition lines (HELP/TYPE included)"""
+        self._collectors.append(collector)
+
+    def render_process(self) -> str:
+        """Exposition text for this process alone"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        """Exposition text for the whole server: every worker's metrics summed when multiproc_dir is set"""
+        if not self.multiproc_dir:
+            return self.render_process()
+        self.write_snapshot()
+        return merge_multiproc_dir(self.multiproc_dir)
+
+    def write_snapshot(self) -> None:
+        """Write this process's metrics to multiproc_dir (atomically, so readers never see half a file)"""
+        if not self.multiproc_dir:
+            return
+        # Named at write time: with GUNICORN_PRELOAD the registry is built in the master before forking
+        path = os.path.join(self.multiproc_dir, f"worker-{os.getpid()}.prom")
+        _write_atomically(path, self.render_process())
+
+    def start_sync(self, interval: float) -> None:
+        """Keep this process's snapshot fresh for scrapes answered by other workers"""
+        if not self.multiproc_dir or (self._sync_thread is not None and self._sync_thread.is_alive()):
+            return
+
+        def sync():
+            while True:
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print(f"⚠️ Metrics snapshot failed: {e}")
+                time.sleep(interval)
+
+        self._sync_thread = threading.Thread(target=sync, name="metrics-sync", daemon=True)
+        self._sync_thread.start()
+        atexit.register(self.write_snapshot)
+
+
+def _write_atomically(path: str, text: str) -> None:
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(temporary, path)
+
+
+def merge_expositions(texts: Iterable[str], skip_gauges: Iterable[bool] = ()) -> str:
+    """
+    Sum exposition texts sample by sample (same metric name and labels), keeping HELP/TYPE once.
+
+    skip_gauges[i] drops text i's gauge families (a dead worker's gauges no longer apply).
+    """
+    skip = list(skip_gauges)
+    headers: Dict[str, List[str]] = {}
+    kinds: Dict[str, str] = {}
+    samples: Dict[str, Dict[str, float]] = {}
+    for index, text in enumerate(texts):
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                headers.setdefault(family, [])
+                if len(headers[family]) < 2 and line not in headers[family]:
+                    headers[family].append(line)
+                if line.startswith("# TYPE "):
+                    kinds.setdefault(family, line.rsplit(" ", 1)[-1])
+                continue
+            if not line or line.startswith("#") or family is None:
+                continue
+            if index < len(skip) and skip[index] and kinds.get(family) == "gauge":
+                continue
+            series, _, value = line.rpartition(" ")
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            family_samples = samples.setdefault(family, {})
+            family_samples[series] = family_samples.get(series, 0.0) + number
+    lines: List[str] = []
+    for family, family_samples in samples.items():
+        lines.extend(headers.get(family, []))
+        lines.extend(f"{series} {_format_value(value)}" for series, value in family_samples.items())
+    return "\n".join(lines) + "\n"
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return handle.read()
+    except FileNotFoundError:  # The worker exited and its file was folded into dead.prom meanwhile
+        return ""
+
+
+def merge_multiproc_dir(directory: str) -> str:
+    """Every live worker's snapshot plus the counters of workers that have exited"""
+    texts, skip_gauges = [], []
+    for path in sorted(glob.glob(os.path.join(directory, "worker-*.prom"))):
+        texts.append(_read(path))
+        skip_gauges.append(False)
+    texts.append(_read(os.path.join(directory, "dead.prom")))
+    skip_gauges.append(True)
+    return merge_expositions(texts, skip_gauges)
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None) -> None:
+    """Fold an exited worker's counters and histograms into dead.prom (run by the master only)"""
+    directory = directory or os.getenv("METRICS_MULTIPROC_DIR")
+    if not directory:
+        return
+    path = os.path.join(directory, f"worker-{pid}.prom")
+    if not os.path.exists(path):
+        return
+    dead = os.path.join(directory, "dead.prom")
+    _write_atomically(dead, merge_expositions([_read(dead), _read(path)], [True, True]))
+    os.remove(path)
+
+
+def reset_multiproc_dir(directory: str) -> None:
+    """Create the directory and clear snapshots left by a previous server run"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.prom")):
+        os.remove(path)
+
+
+def stats_lines(prefix: str, stats_by_name: Dict[str, Dict[str, Any]], help_text: str,
+                counters: Iterable[str] = COUNTER_FIELDS) -> List[str]:
+    """Exposition lines for {component name: stats()} - one series per numeric field, labelled name=..."""
+    counters = set(counters)
+    fields: Dict[str, List[Tuple[str, float]]] = {}
+    for name, stats in stats_by_name.items():
+        for field, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)) and field != "name":
+                fields.setdefault(field, []).append((name, value))
+    lines: List[str] = []
+    for field in sorted(fields):
+        is_counter = field in counters
+        metric = f"{prefix}_{field}_total" if is_counter else f"{prefix}_{field}"
+        lines.append(f"# HELP {metric} {help_text}: {field.replace('_', ' ')}")
+        lines.append(f"# TYPE {metric} {'counter' if is_counter else 'gauge'}")
+        for name, value in fields[field]:
+            lines.append(f'{metric}{{name="{_escape(name)}"}} {_format_value(value)}')
+    return lines
+
+
+class ServiceMetrics:
+    """Metrics installed on one Flask service"""
+
+    def __init__(self, service: str, registry: MetricsRegistry):
+        self.service = service
+        self.registry = registry
+        self._stats_sources: Dict[str, List[Tuple[str, Callable[[], Dict[str, Any]], str]]] = {}
+        self.requests = registry.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+        self.latency = registry.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled")
+        self.queries = registry.histogram("supabase_query_duration_seconds", "Supabase (PostgREST) query latency",
+                                          ("table", "method", "outcome"))
+        self.outbound = registry.histogram("outbound_http_request_duration_seconds",
+                                           "Latency of HTTP calls to other services", ("host", "method", "outcome"))
+        self.jobs = registry.histogram("job_duration_seconds", "Background job run time", ("job", "outcome"), JOB_BUCKETS)
+        self.in_flight.set(value=0)
+        registry.add_collector(self._collect_stats)
+
+    def add_stats(self, prefix: str, get_stats: Callable[[], Dict[str, Any]], name: Optional[str] = None,
+                  help_text: Optional[str] = None) -> None:
+        """Export a component's stats() at scrape time, e.g. add_stats("amqp_publisher", publisher.stats)"""
+        self._stats_sources.setdefault(prefix, []).append(
+            (name or prefix, get_stats, help_text or prefix.replace("_", " ")))
+
+    def _collect_stats(self) -> List[str]:
+        lines: List[str] = []
+        for prefix, sources in self._stats_sources.items():
+            stats_by_name = {}
+            for name, get_stats, _ in sources:
+                stats = get_stats()
+                stats_by_name[stats.get("name") or name] = stats
+            lines.extend(stats_lines(prefix, stats_by_name, sources[0][2]))
+        return lines
+
+    @contextlib.contextmanager
+    def time_job(self, job: str):
+        """Record how long a background job ran and whether it raised"""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.jobs.observe(job, outcome, value=time.perf_counter() - started)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+_requests_lock = threading.Lock()
+_outbound_listeners: List[Callable[[str, str, str, float], None]] = []
+
+
+def _instrument_requests() -> None:
+    """Time every call made through the requests library (requests.get/post use Session.send)"""
+    try:
+        import requests
+    except ImportError:
+        return
+    with _requests_lock:
+        send = requests.sessions.Session.send
+        if getattr(send, "_service_metrics", False):
+            return
+
+        def timed_send(session, prepared, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                response = send(session, prepared, **kwargs)
+                outcome = str(response.status_code // 100) + "xx"
+                return response
+            finally:
+                host = urlsplit(prepared.url or "").netloc or "unknown"
+                for listener in list(_outbound_listeners):
+                    listener(host, prepared.method or "GET", outcome, time.perf_counter() - started)
+
+        timed_send._service_metrics = True
+        requests.sessions.Session.send = timed_send
+
+
+def install_metrics(app, service: str, registry: Optional[MetricsRegistry] = None,
+                    path: str = "/metrics") -> ServiceMetrics:
+    """Record request, query and outbound-call metrics for a Flask app and serve them on GET /metrics"""
+    from flask import Response, request
+    from query_metrics import add_query_listener
+    from serving import on_worker_init
+    from user_cache import all_caches
+
+    metrics = ServiceMetrics(service, registry or MetricsRegistry(os.getenv("METRICS_MULTIPROC_DIR")))
+    on_worker_init(lambda: metrics.registry.start_sync(SYNC_INTERVAL_SECONDS))
+    metrics.registry.add_collector(lambda: stats_lines(
+        "user_cache", {cache.name: cache.stats() for cache in all_caches()}, "User directory cache"))
+
+    def on_query(builder, elapsed_ms: float, failed: bool) -> None:
+        table = str(getattr(builder, "path", "")).rstrip("/").rsplit("/", 1)[-1] or "unknown"
+        if "/rpc/" in str(getattr(builder, "path", "")):
+            table = f"rpc:{table}"
+        metrics.queries.observe(table, getattr(builder, "http_method", "?"), "error" if failed else "ok",
+                                value=elapsed_ms / 1000)
+
+    add_query_listener(on_query)
+    _instrument_requests()
+    _outbound_listeners.append(lambda host, method, outcome, seconds: metrics.outbound.observe(
+        host, method, outcome, value=seconds))
+
+    @app.before_request
+    def _start_request_metrics():
+        request.environ["service_metrics.started"] = time.perf_counter()
+        metrics.in_flight.inc()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = request.environ.pop("service_metrics.started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.requests.inc(request.method, route, response.status_code)
+            metrics.latency.observe(request.method, route, value=time.perf_counter() - started)
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(error=None):
+        metrics.in_flight.dec()
+        started = request.environ.pop("service_metrics.started", None)
+        if started is not None:  # after_request did not run: the request raised
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.requests.inc(request.method, route, 500)
+            metrics.latency.observe(request.method, route, value=time.perf_counter() - started)
+
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    app.add_url_rule(path, endpoint="service_metrics", view_func=metrics_endpoint, methods=["GET"])
+    return metrics
@@ -0,0 +1,305 @@
+"""
+User Name Index
+Case-insensitive sorted prefix index over user names, used for @mention resolution and autocomplete
+
+- Built once from the user table and kept current incrementally: user cache events refresh
+  individual users, and names that are not in the index yet are looked up one by one
+- Rebuilt from scratch every rebuild_interval seconds as a safety net
+- Exact lookups are dict hits; prefix lookups are a bisect over the sorted key list
+
+Every word of a name is indexed, so "doe" suggests "John Doe" as well as "Doe Ray".
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REBUILD_INTERVAL = 3600  # 1 hour
+DEFAULT_MISS_TTL = 60  # seconds before an unknown name is looked up in the database again
+DEFAULT_SUGGEST_LIMIT = 10
+
+# @zenia, @zenia2, and "@zenia 2" / "@john doe" style names with a space
+MENTION_PATTERN = re.compile(r'@(\w+)')
+SPACE_MENTION_PATTERN = re.compile(r'@([a-zA-Z]+)\s+(\d+|[a-zA-Z]+)')
+
+
+def normalize_name(name: Any) -> str:
+    """Case-fold a name and collapse whitespace so lookups are case-insensitive"""
+    return " ".join(str(name or "").split()).casefold()
+
+
+def extract_mention_names(comment_text: str) -> List[str]:
+    """Return the names mentioned in a comment, including two-word forms like "@zenia 2" """
+    mentioned_names = MENTION_PATTERN.findall(comment_text or "")
+    for first, second in SPACE_MENTION_PATTERN.findall(comment_text or ""):
+        combined_name = f"{first} {second}"
+        if combined_name not in mentioned_names:
+            mentioned_names.append(combined_name)
+    return mentioned_names
+
+
+def _search_keys(normalized: str) -> List[str]:
+    """Index keys for a name: the full name and every suffix starting at a word boundary"""
+    words = normalized.split(" ")
+    return [" ".join(words[start:]) for start in range(len(words)) if words[start]]
+
+
+class SupabaseUserNameSource:
+    """Reads (user_id, name) rows for the index from Supabase"""
+
+    def __init__(self, get_client: Callable[[], Any], table: str = "user",
+                 columns: str = "user_id, name", page_size: int = 1000, batch_size: int = 200):
+        # get_client is called per load so a patched module-level client is picked up
+        self.get_client = get_client
+        self.table = table
+        self.columns = columns
+        self.page_size = page_size
+        self.batch_size = batch_size
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Every user, read in pages so PostgREST's row cap does not truncate the index"""
+        client = self.get_client()
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            response = client.table(self.table).select(self.columns).order("user_id").range(
+                start, start + self.page_size - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < self.page_size:
+                return rows
+            start += self.page_size
+
+    def load_by_ids(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        client = self.get_client()
+        rows: List[Dict[str, Any]] = []
+        for start in range(0, len(user_ids), self.batch_size):
+            batch = user_ids[start:start + self.batch_size]
+            response = client.table(self.table).select(self.columns).in_("user_id", batch).execute()
+            rows.extend(response.data or [])
+        return rows
+
+    def load_by_names(self, names: List[str]) -> List[Dict[str, Any]]:
+        """Case-insensitive exact match per name (LIKE wildcards are escaped)"""
+        client = self.get_client()
+        rows: List[Dict[str, Any]] = []
+        for name in names:
+            pattern = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            response = client.table(self.table).select(self.columns).ilike("name", pattern).execute()
+            rows.extend(response.data or [])
+        return rows
+
+
+class UserNameIndex:
+    """Thread-safe, case-insensitive name -> user index with prefix search"""
+
+    def __init__(self, source: SupabaseUserNameSource,
+                 name: str = "user_name_index",
+                 rebuild_interval: float = DEFAULT_REBUILD_INTERVAL,
+                 miss_ttl: float = DEFAULT_MISS_TTL):
+        self.name = name
+        self.source = source
+        self.rebuild_interval = rebuild_interval
+        self.miss_ttl = miss_ttl
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, str]] = []  # sorted (search key, user_id)
+        self._by_name: Dict[str, List[str]] = {}  # normalized full name -> user IDs
+        self._users: Dict[str, Dict[str, Any]] = {}  # user_id -> row
+        self._missed: Dict[str, float] = {}  # normalized name -> monotonic time to retry the database
+        self._built_at: Optional[float] = None
+        self._stats = {
+            "builds": 0,
+            "build_errors": 0,
+            "resolved": 0,
+            "unresolved": 0,
+            "name_loads": 0,
+            "suggestions": 0,
+            "incremental_updates": 0,
+        }
+
+    # --- building and incremental maintenance ---
+
+    def _ensure_built(self) -> None:
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_interval:
+                return
+            try:
+                rows = self.source.load_all()
+            except Exception as e:
+                self._stats["build_errors"] += 1
+                logger.warning(f"{self.name}: failed to build name index: {e}")
+                if self._built_at is not None:
+                    # Keep serving the previous index; retry after another interval
+                    self._built_at = time.monotonic()
+                return
+            self._keys = []
+            self._by_name = {}
+            self._users = {}
+            self._missed = {}
+            for row in rows:
+                self._add(row, sort=False)
+            self._keys.sort()
+            self._built_at = time.monotonic()
+            self._stats["builds"] += 1
+            logger.info(f"{self.name}: indexed {len(self._users)} user name(s)")
+
+    def _add(self, row: Dict[str, Any], sort: bool = True) -> None:
+        """Index one user row (lock held)"""
+        user_id = row.get("user_id")
+        normalized = normalize_name(row.get("name"))
+        if not user_id or not normalized:
+            return
+        self._users[user_id] = row
+        self._by_name.setdefault(normalized, []).append(user_id)
+        self._missed.pop(normalized, None)
+        for key in _search_keys(normalized):
+            if sort:
+                bisect.insort(self._keys, (key, user_id))
+            else:
+                self._keys.append((key, user_id))
+
+    def _remove(self, user_id: str) -> None:
+        """Drop one user from the index (lock held)"""
+        row = self._users.pop(user_id, None)
+        if row is None:
+            return
+        normalized = normalize_name(row.get("name"))
+        owners = self._by_name.get(normalized, [])
+        if user_id in owners:
+            owners.remove(user_id)
+        if not owners:
+            self._by_name.pop(normalized, None)
+        for key in _search_keys(normalized):
+            position = bisect.bisect_left(self._keys, (key, user_id))
+            if position < len(self._keys) and self._keys[position] == (key, user_id):
+                del self._keys[position]
+
+    def upsert(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Add or replace users (e.g. after a rename)"""
+        with self._lock:
+            for row in rows:
+                if row.get("user_id"):
+                    self._remove(row["user_id"])
+                    self._add(row)
+                    self._stats["incremental_updates"] += 1
+
+    def remove(self, *user_ids: str) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+
+    def refresh_users(self, user_ids: Iterable[str]) -> None:
+        """Reload the given users from the database; users that no longer exist are dropped"""
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids or self._built_at is None:
+            return  # Nothing indexed yet - the first build reads current data anyway
+        try:
+            rows = self.source.load_by_ids(user_ids)
+        except Exception as e:
+            logger.warning(f"{self.name}: failed to refresh {len(user_ids)} user(s): {e}")
+            return
+        found = {row.get("user_id") for row in rows}
+        with self._lock:
+            self.upsert(rows)
+            self.remove(*[user_id for user_id in user_ids if user_id not in found])
+
+    def clear(self) -> None:
+        """Forget everything; the next lookup rebuilds the index"""
+        with self._lock:
+            self._keys = []
+            self._by_name = {}
+            self._users = {}
+            self._missed = {}
+            self._built_at = None
+
+    # --- lookups ---
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, str]:
+        """
+        Map mentioned names to user IDs (case-insensitive exact match).
+
+        Names not in the index are looked up in the database once per miss_ttl, which picks
+        up users created since the last build. Unknown names are left out of the result.
+        """
+        self._ensure_built()
+        names = list(dict.fromkeys(names))
+        resolved: Dict[str, str] = {}
+        to_load: Dict[str, str] = {}
+        now = time.monotonic()
+
+        with self._lock:
+            for name in names:
+                normalized = normalize_name(name)
+                owners = self._by_name.get(normalized)
+                if owners:
+                    resolved[name] = owners[0]
+                elif normalized and self._missed.get(normalized, 0) <= now:
+                    to_load[name] = normalized
+
+        if to_load:
+            try:
+                rows = self.source.load_by_names(list(to_load))
+                self._stats["name_loads"] += 1
+            except Exception as e:
+                logger.warning(f"{self.name}: failed to look up {len(to_load)} name(s): {e}")
+                rows = []
+            with self._lock:
+                self.upsert(rows)
+                for name, normalized in to_load.items():
+                    owners = self._by_name.get(normalized)
+                    if owners:
+                        resolved[name] = owners[0]
+                    else:
+                        self._missed[normalized] = now + self.miss_ttl
+
+        with self._lock:
+            self._stats["resolved"] += len(resolved)
+            self._stats["unresolved"] += len(names) - len(resolved)
+        return resolved
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_SUGGEST_LIMIT) -> List[Dict[str, Any]]:
+        """Users whose name, or any word of it, starts with prefix; full-name matches first"""
+        normalized = normalize_name(prefix)
+        if not normalized or limit <= 0:
+            return []
+        self._ensure_built()
+
+        with self._lock:
+            self._stats["suggestions"] += 1
+            full_matches: List[str] = []
+            word_matches: List[str] = []
+            seen = set()
+            position = bisect.bisect_left(self._keys, (normalized, ""))
+            # Bounded scan: stop once enough full-name matches (or candidates overall) are found
+            while position < len(self._keys) and len(full_matches) < limit and len(seen) < limit * 5:
+                key, user_id = self._keys[position]
+                if not key.startswith(normalized):
+                    break
+                position += 1
+                if user_id in seen:
+                    continue
+                seen.add(user_id)
+                if normalize_name(self._users[user_id].get("name")).startswith(normalized):
+                    full_matches.append(user_id)
+                else:
+                    word_matches.append(user_id)
+            return [dict(self._users[user_id]) for user_id in (full_matches + word_matches)[:limit]]
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "users": len(self._users),
+                "keys": len(self._keys),
+                "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+                "rebuild_interval_seconds": self.rebuild_interval,
+                **self._stats,
+            }
@@ -0,0 +1,309 @@
+"""
+Notification Digest
+Per-user buffer that folds many notifications into one in-app entry and one email
+
+Each user picks instant or digest delivery (user_notification_settings, cached here). For digest
+users the reminder sweeps call add() instead of notifying: every notification becomes one
+notification_digest_items row holding the user, the sweep that produced it, the task or project
+and the notification text. flush() delivers all of a user's pending items as a single digest once
+the oldest one has waited the user's window. Every item records the digest it went out in (digest_id)
+and the id of the combined in-app notification, so each line of a digest can be traced to its
+sweep and item.
+
+Items carry an idempotency key, so the next hourly sweep buffering the same reminder is ignored.
+flush() stores the digest_id on a digest's items before delivering it. A digest whose delivery
+fails (or whose sent status is not recorded) is retried by the next flush with exactly those items
+and the same id, so the in-app and email keys stop it from reaching the user twice; items buffered
+in the meantime go into the following digest. Failed digests are marked failed after max_attempts.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from notification_outbox import make_idempotency_key
+
+logger = logging.getLogger(__name__)
+
+DIGEST_ITEMS_TABLE = "notification_digest_items"
+SETTINGS_TABLE = "user_notification_settings"
+
+DELIVERY_INSTANT = "instant"
+DELIVERY_DIGEST = "digest"
+DELIVERY_MODES = (DELIVERY_INSTANT, DELIVERY_DIGEST)
+MAX_WINDOW_MINUTES = 7 * 24 * 60
+
+# Notification fields copied into an item row
+ITEM_FIELDS = ("title", "message", "type", "due_date", "priority")
+IN_BATCH_SIZE = 200
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+
+def build_digest_item(user_id: str, source: str, item_type: str, item_id: Optional[str],
+                      notification: Dict[str, Any], in_app: bool = True, email: bool = True,
+                      day: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One buffered notification. source names the sweep, item_type/item_id the task or project;
+    in_app/email are the channels the per-item preferences allow. day scopes the idempotency key,
+    so a daily reminder is buffered once per day however often the sweep runs.
+    """
+    row = {field: notification.get(field) for field in ITEM_FIELDS}
+    row.update({
+        "idempotency_key": make_idempotency_key("digest_item", source, row["type"], item_id, user_id, day),
+        "user_id": user_id,
+        "source": source,
+        "item_type": item_type,
+        "item_id": item_id,
+        "in_app": in_app,
+        "email": email,
+        "status": "pending",
+        "attempts": 0,
+    })
+    return row
+
+
+def summarize_digest(items: List[Dict[str, Any]], max_lines: int = 10) -> Tuple[str, str]:
+    """Title and message of the combined in-app notification (one line per item, in buffered order)"""
+    count = len(items)
+    title = f"📋 {count} Update{'s' if count != 1 else ''} in Your Digest"
+    lines = [f"• {item.get('title')}: {item.get('message')}" if item.get("message") else f"• {item.get('title')}"
+             for item in items[:max_lines]]
+    if count > max_lines:
+        lines.append(f"...and {count - max_lines} more")
+    return title, "\n".join(lines)
+
+
+class NotificationDigest:
+    """Stores per-user delivery preferences, buffers digest users' notifications and flushes them"""
+
+    def __init__(self, get_client: Callable[[], Any],
+                 deliver: Callable[[str, str, List[Dict[str, Any]]], Optional[Any]],
+                 name: str = "notification_digest",
+                 default_mode: str = DELIVERY_INSTANT,
+                 window_minutes: int = 60,
+                 settings_ttl: float = 300,
+                 batch_size: int = 500,
+                 max_attempts: int = 5):
+        # get_client is called per query so a patched module-level client is picked up.
+        # deliver(user_id, digest_id, items) sends one digest and returns the in-app notification id
+        self.get_client = get_client
+        self.deliver = deliver
+        self.name = name
+        self.default_mode = default_mode if default_mode in DELIVERY_MODES else DELIVERY_INSTANT
+        self.window_minutes = window_minutes
+        self.settings_ttl = settings_ttl
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._settings: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._settings_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time per process
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "items_buffered": 0,
+            "buffer_errors": 0,
+            "digests": 0,
+            "items_flushed": 0,
+            "retried": 0,
+            "failed": 0,
+            "flush_errors": 0,
+            "load_errors": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    # --- preferences ---
+
+    def _defaults(self, user_id: str) -> Dict[str, Any]:
+        return {"user_id": user_id, "delivery_mode": self.default_mode, "digest_window_minutes": self.window_minutes}
+
+    def _settings_from_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        settings = self._defaults(row["user_id"])
+        if row.get("delivery_mode") in DELIVERY_MODES:
+            settings["delivery_mode"] = row["delivery_mode"]
+        if row.get("digest_window_minutes") is not None:
+            settings["digest_window_minutes"] = row["digest_window_minutes"]
+        return settings
+
+    def preferences(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Delivery settings per user (defaults for users without a row), loading uncached ones in batches"""
+        user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+        now = time.monotonic()
+        result: Dict[str, Dict[str, Any]] = {}
+        with self._settings_lock:
+            for user_id in user_ids:
+                cached = self._settings.get(user_id)
+                if cached and cached[0] > now:
+                    result[user_id] = cached[1]
+        missing = [user_id for user_id in user_ids if user_id not in result]
+        if not missing:
+            return result
+
+        loaded = {user_id: self._defaults(user_id) for user_id in missing}
+        try:
+            client = self.get_client()
+            for start in range(0, len(missing), IN_BATCH_SIZE):
+                response = client.table(SETTINGS_TABLE).select("user_id, delivery_mode, digest_window_minutes") \
+                    .in_("user_id", missing[start:start + IN_BATCH_SIZE]).execute()
+                for row in response.data or []:
+                    loaded[row["user_id"]] = self._settings_from_row(row)
+        except Exception as e:
+            # Fall back to the default mode for this call without caching it
+            self._count("load_errors")
+            logger.warning(f"{self.name}: failed to load delivery settings for {len(missing)} user(s): {e}")
+            return {**result, **loaded}
+        with self._settings_lock:
+            for user_id, settings in loaded.items():
+                self._settings[user_id] = (now + self.settings_ttl, settings)
+        return {**result, **loaded}
+
+    def digest_users(self, user_ids: Iterable[str]) -> set:
+        """The given users whose notifications should be buffered"""
+        return {user_id for user_id, settings in self.preferences(user_ids).items()
+                if settings["delivery_mode"] == DELIVERY_DIGEST}
+
+    def set_preference(self, user_id: str, delivery_mode: str,
+                       digest_window_minutes: Optional[int] = None) -> Dict[str, Any]:
+        """Store a user's delivery mode (and window); raises ValueError for invalid values"""
+        if delivery_mode not in DELIVERY_MODES:
+            raise ValueError(f"delivery_mode must be one of: {', '.join(DELIVERY_MODES)}")
+        if digest_window_minutes is not None and not 0 <= digest_window_minutes <= MAX_WINDOW_MINUTES:
+            raise ValueError(f"digest_window_minutes must be between 0 and {MAX_WINDOW_MINUTES}")
+        row = {"user_id": user_id, "delivery_mode": delivery_mode, "digest_window_minutes": digest_window_minutes,
+               "updated_at": datetime.now(timezone.utc).isoformat()}
+        self.get_client().table(SETTINGS_TABLE).upsert(row, on_conflict="user_id").execute()
+        settings = self._settings_from_row(row)
+        with self._settings_lock:
+            self._settings[user_id] = (time.monotonic() + self.settings_ttl, settings)
+        return settings
+
+    # --- buffer ---
+
+    def add(self, items: List[Dict[str, Any]]) -> int:
+        """
+        Buffer items (rows from build_digest_item) with one upsert; returns how many were written.
+
+        Each item is due once its user's window has passed. Items already buffered (same
+        idempotency key) are ignored. Returns 0 when the write fails, so callers can deliver instantly.
+        """
+        # A sweep may produce the same item twice (e.g. a user listed twice as collaborator); keep the first
+        unique: Dict[str, Dict[str, Any]] = {}
+        for item in items or []:
+            unique.setdefault(item["idempotency_key"], item)
+        items = list(unique.values())
+        if not items:
+            return 0
+        now = datetime.now(timezone.utc)
+        settings = self.preferences(item["user_id"] for item in items)
+        rows = []
+        for item in items:
+            window = settings[item["user_id"]]["digest_window_minutes"]
+            rows.append(dict(item, created_at=now.isoformat(),
+                             deliver_after=(now + timedelta(minutes=window)).isoformat()))
+        try:
+            self.get_client().table(DIGEST_ITEMS_TABLE).upsert(
+                rows, on_conflict="idempotency_key", ignore_duplicates=True).execute()
+        except Exception as e:
+            self._count("buffer_errors")
+            logger.error(f"{self.name}: failed to buffer {len(rows)} notification(s): {e}")
+            return 0
+        self._count("items_buffered", len(rows))
+        return len(rows)
+
+    # --- flush ---
+
+    def _pending_items(self, now: datetime) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Every pending item of the users whose oldest item is due, grouped per user. A batch of users
+        can hold more items than one response returns, so each batch is read page by page.
+        """
+        client = self.get_client()
+        due = client.table(DIGEST_ITEMS_TABLE).select("user_id").eq("status", "pending") \
+            .lte("deliver_after", now.isoformat()).order("deliver_after").limit(self.batch_size).execute()
+        user_ids = list(dict.fromkeys(row["user_id"] for row in due.data or []))
+        per_user: Dict[str, List[Dict[str, Any]]] = {}
+        for start in range(0, len(user_ids), IN_BATCH_SIZE):
+            offset = 0
+            while True:
+                response = client.table(DIGEST_ITEMS_TABLE).select("*").eq("status", "pending") \
+                    .in_("user_id", user_ids[start:start + IN_BATCH_SIZE]).order("id") \
+                    .range(offset, offset + PAGE_SIZE - 1).execute()
+                page = response.data or []
+                for row in page:
+                    per_user.setdefault(row["user_id"], []).append(row)
+                if len(page) < PAGE_SIZE:
+                    break
+                offset += PAGE_SIZE
+        return per_user
+
+    def _assign_digests(self, per_user: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Pick each user's next digest: the items of an earlier attempt that was not recorded as sent,
+        or else all unassigned pending items, which get a new digest_id stored before delivery
+        """
+        digests: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+        assigned = []
+        for user_id, items in per_user.items():
+            earlier = next((item["digest_id"] for item in items if item.get("digest_id")), None)
+            if earlier:
+                # Items buffered since that attempt wait for the next digest
+                digests[user_id] = (earlier, [item for item in items if item.get("digest_id") == earlier])
+                continue
+            digest_id = make_idempotency_key("digest", user_id, *sorted(str(item["id"]) for item in items))
+            items = [dict(item, digest_id=digest_id) for item in items]
+            digests[user_id] = (digest_id, items)
+            assigned.extend(items)
+        if assigned:
+            # Stored first, so a retry (or a flush after a lost status write) resends exactly this set
+            # under the same id and the in-app and email keys deduplicate it
+            self.get_client().table(DIGEST_ITEMS_TABLE).upsert(assigned).execute()
+        return digests
+
+    def flush(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Deliver one digest per user with due items; returns per-pass counters"""
+        with self._flush_lock:
+            now = now or datetime.now(timezone.utc)
+            result = {"digests": 0, "items": 0, "retried": 0, "failed": 0}
+            try:
+                digests = self._assign_digests(self._pending_items(now))
+            except Exception as e:
+                self._count("flush_errors")
+                logger.error(f"{self.name}: failed to assign pending digest items: {e}")
+                return result
+            updated = []
+            for user_id, (digest_id, items) in digests.items():
+                try:
+                    notification_id = self.deliver(user_id, digest_id, items)
+                except Exception as e:
+                    # Only this digest's items count the attempt; later items have not been tried
+                    attempts = max(item.get("attempts") or 0 for item in items) + 1
+                    status = "failed" if attempts >= self.max_attempts else "pending"
+                    result["failed" if status == "failed" else "retried"] += 1
+                    logger.error(f"{self.name}: digest for user {user_id} failed (attempt {attempts}): {e}")
+                    updated.extend(dict(item, attempts=attempts, status=status, last_error=str(e)) for item in items)
+                    continue
+                result["digests"] += 1
+                result["items"] += len(items)
+                updated.extend(dict(item, status="sent", notification_id=notification_id,
+                                    delivered_at=now.isoformat(), last_error=None) for item in items)
+            if updated:
+                try:
+                    self.get_client().table(DIGEST_ITEMS_TABLE).upsert(updated).execute()
+                except Exception as e:
+                    # The items stay pending with their digest_id; the next flush resends the same digest
+                    self._count("flush_errors")
+                    logger.error(f"{self.name}: failed to record {len(updated)} digest item(s): {e}")
+            self._count("items_flushed", result["items"])
+            for key in ("digests", "retried", "failed"):
+                self._count(key, result[key])
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._settings_lock:
+            cached = len(self._settings)
+        with self._stats_lock:
+            return {"name": self.name, "default_mode": self.default_mode, "window_minutes": self.window_minutes,
+                    "cached_settings": cached, **self._stats}
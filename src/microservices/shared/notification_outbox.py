@@ -0,0 +1,408 @@
+"""
+Notification Outbox
+Durable queue of notification intents, delivered off the request path by a relay
+
+The request path writes one notification_outbox row per (recipient, notification) and returns.
+The relay claims due rows in batches and delivers each requested channel:
+
+- in_app: one bulk insert into notifications; notifications.outbox_key is unique, so a retried
+  row never creates a second notification
+- realtime: one POST of the whole batch to the notification service
+- email: one send per recipient (address resolved when sending)
+
+Delivered channels are recorded on the row, so a retry only repeats what failed. Failed rows are
+retried with exponential backoff and marked failed after max_attempts. Claims are leases
+(next_attempt_at moves into the future), so several relays can run at once and a relay that
+dies mid-batch only delays its rows. Notification preferences are applied when delivering: task
+notifications use notification_preferences, project notifications (project_id and no task_id)
+use project_notification_preferences.
+
+Modes: "async" runs the relay on a background thread woken by every enqueue, "sync" delivers on
+the caller's thread right after the write (used by tests), "off" only writes rows and leaves
+delivery to an external relay (POST /notifications/outbox/relay).
+"""
+
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_TABLE = "notification_outbox"
+CHANNEL_IN_APP = "in_app"
+CHANNEL_REALTIME = "realtime"
+CHANNEL_EMAIL = "email"
+ALL_CHANNELS = (CHANNEL_IN_APP, CHANNEL_REALTIME, CHANNEL_EMAIL)
+
+MODE_ASYNC = "async"
+MODE_SYNC = "sync"
+MODE_OFF = "off"
+
+# Notification fields copied from an outbox row into notifications and realtime pushes
+NOTIFICATION_FIELDS = ("user_id", "title", "message", "type", "task_id", "project_id", "due_date", "priority", "created_at")
+REALTIME_FIELDS = ("user_id", "title", "message", "type", "task_id", "project_id", "created_at")
+# Preferences table and its key column, for task and for project notifications
+PREFERENCE_TABLES = (("notification_preferences", "task_id"), ("project_notification_preferences", "project_id"))
+IN_BATCH_SIZE = 200
+PREFERENCES_PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+
+def make_idempotency_key(*parts: Any) -> str:
+    """Stable key for one notification intent, e.g. ("task_comment", task_id, user_id, comment_hash)"""
+    return hashlib.sha1("|".join("" if part is None else str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def build_outbox_row(notification: Dict[str, Any], idempotency_key: str,
+                     channels: Iterable[str] = ALL_CHANNELS,
+                     email: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    One outbox row. notification holds the notifications-table fields; email holds the
+    send_notification_email keyword arguments (the recipient address is looked up at send time).
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    row = {field: notification.get(field) for field in NOTIFICATION_FIELDS}
+    row["created_at"] = row["created_at"] or now
+    channels = [channel for channel in channels if channel in ALL_CHANNELS]
+    if email is None and CHANNEL_EMAIL in channels:
+        channels.remove(CHANNEL_EMAIL)
+    row.update({
+        "idempotency_key": idempotency_key,
+        "channels": channels,
+        "delivered": [],
+        "email": email,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None,
+    })
+    return row
+
+
+def _preference_column(row: Dict[str, Any]) -> Optional[str]:
+    """Key column of the preferences that apply to an outbox row (None: no per-item preferences)"""
+    if row.get("task_id"):
+        return "task_id"
+    if row.get("project_id"):
+        return "project_id"
+    return None
+
+
+class NotificationOutbox:
+    """Writes notification intents and relays them to in-app, realtime and email channels"""
+
+    def __init__(self, get_client: Callable[[], Any],
+                 get_users: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+                 send_email: Optional[Callable[..., Any]] = None,
+                 realtime_url: Optional[str] = None,
+                 name: str = "notification_outbox",
+                 mode: str = MODE_ASYNC,
+                 batch_size: int = 100,
+                 poll_interval: float = 5.0,
+                 max_attempts: int = 8,
+                 retry_base_delay: float = 30,
+                 lease_seconds: float = 120,
+                 http_timeout: float = 5):
+        # get_client is called per query so a patched module-level client is picked up
+        self.get_client = get_client
+        self.get_users = get_users
+        self.send_email = send_email
+        self.realtime_url = realtime_url
+        self.name = name
+        self.mode = mode if mode in (MODE_ASYNC, MODE_SYNC, MODE_OFF) else MODE_ASYNC
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.lease_seconds = lease_seconds
+        self.http_timeout = http_timeout
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._relay_lock = threading.Lock()  # One relay pass at a time per process
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "enqueue_errors": 0,
+            "claimed": 0,
+            "sent": 0,
+            "retried": 0,
+            "failed": 0,
+            "in_app_delivered": 0,
+            "realtime_delivered": 0,
+            "emails_delivered": 0,
+            "relay_errors": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    # --- request path ---
+
+    def enqueue(self, rows: List[Dict[str, Any]], execute: Optional[Callable[[Any], Any]] = None) -> int:
+        """
+        Store intents (rows from build_outbox_row) with one upsert; returns how many were written.
+
+        Rows whose idempotency key already exists are ignored, so enqueueing the same intent twice
+        is harmless. execute runs the query (e.g. a caller's query counter); defaults to query.execute().
+        """
+        rows = [row for row in rows if row and row.get("channels")]
+        if not rows:
+            return 0
+        # Several intents in one call may share a key (e.g. a user mentioned twice); keep the first
+        unique: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            unique.setdefault(row["idempotency_key"], row)
+        rows = list(unique.values())
+        try:
+            query = self.get_client().table(OUTBOX_TABLE).upsert(
+                rows, on_conflict="idempotency_key", ignore_duplicates=True)
+            if execute is not None:
+                execute(query)
+            else:
+                query.execute()
+        except Exception as e:
+            self._count("enqueue_errors")
+            logger.error(f"{self.name}: failed to store {len(rows)} notification(s): {e}")
+            return 0
+        self._count("enqueued", len(rows))
+
+        if self.mode == MODE_SYNC:
+            self.relay_once()
+        elif self.mode == MODE_ASYNC:
+            self._ensure_worker()
+            self._wake.set()
+        return len(rows)
+
+    # --- relay ---
+
+    def relay_once(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Claim one batch of due rows and deliver it; returns per-pass counters"""
+        with self._relay_lock:
+            rows = self._claim(limit or self.batch_size)
+            if not rows:
+                return {"claimed": 0, "sent": 0, "retried": 0, "failed": 0}
+            delivered, errors = self._deliver(rows)
+            return self._record(rows, delivered, errors)
+
+    def relay_pending(self, max_batches: int = 100) -> Dict[str, int]:
+        """Relay batches until nothing is due (or max_batches is reached)"""
+        totals = {"claimed": 0, "sent": 0, "retried": 0, "failed": 0, "batches": 0}
+        for _ in range(max_batches):
+            result = self.relay_once()
+            if not result["claimed"]:
+                break
+            totals["batches"] += 1
+            for key in ("claimed", "sent", "retried", "failed"):
+                totals[key] += result[key]
+            if result["claimed"] < self.batch_size:
+                break
+        return totals
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Lease due rows: pending rows and processing rows whose previous lease expired"""
+        client = self.get_client()
+        now = datetime.now(timezone.utc)
+        due = client.table(OUTBOX_TABLE).select("id").in_("status", ["pending", "processing"]) \
+            .lte("next_attempt_at", now.isoformat()).order("id").limit(limit).execute()
+        ids = [row["id"] for row in due.data or []]
+        if not ids:
+            return []
+        lease = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        # The next_attempt_at filter makes the claim atomic per row: a row leased by another relay
+        # in the meantime no longer matches and is not returned
+        claimed = client.table(OUTBOX_TABLE).update({"status": "processing", "next_attempt_at": lease}) \
+            .in_("id", ids).in_("status", ["pending", "processing"]).lte("next_attempt_at", now.isoformat()).execute()
+        rows = claimed.data or []
+        self._count("claimed", len(rows))
+        return rows
+
+    def _load_preferences(self, rows: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Preferences of the batch's (user, task or project) pairs. A missing row means "enabled", so nothing
+        may be lost to PostgREST's response cap: rows are filtered on both users and items and read page by page.
+        """
+        preferences: Dict[tuple, Dict[str, Any]] = {}
+        client = self.get_client()
+        for table, column in PREFERENCE_TABLES:
+            targets = [row for row in rows if _preference_column(row) == column]
+            item_ids = list({row[column] for row in targets})
+            user_ids = list({row["user_id"] for row in targets if row.get("user_id")})
+            for start in range(0, len(item_ids), IN_BATCH_SIZE):
+                offset = 0
+                while True:
+                    response = client.table(table).select(
+                        f"user_id, {column}, email_enabled, in_app_enabled").in_(
+                        column, item_ids[start:start + IN_BATCH_SIZE]).in_("user_id", user_ids) \
+                        .order(column).order("user_id").range(offset, offset + PREFERENCES_PAGE_SIZE - 1).execute()
+                    page = response.data or []
+                    for pref in page:
+                        preferences[(pref.get("user_id"), pref.get(column))] = pref
+                    if len(page) < PREFERENCES_PAGE_SIZE:
+                        break
+                    offset += PREFERENCES_PAGE_SIZE
+        return preferences
+
+    def _deliver(self, rows: List[Dict[str, Any]]):
+        """Deliver every outstanding channel; returns ({id: delivered channels}, {id: error})"""
+        delivered: Dict[Any, set] = {row["id"]: set(row.get("delivered") or []) for row in rows}
+        errors: Dict[Any, str] = {}
+        try:
+            preferences = self._load_preferences(rows)
+        except Exception as e:
+            # Without preferences nothing can be delivered safely; retry the whole batch later
+            return delivered, {row["id"]: f"preferences: {e}" for row in rows}
+
+        wanted: Dict[Any, set] = {}
+        for row in rows:
+            column = _preference_column(row)
+            prefs = preferences.get((row.get("user_id"), row.get(column)), {}) if column else {}
+            channels = set(row.get("channels") or [])
+            if prefs.get("in_app_enabled", True) is False:
+                channels -= {CHANNEL_IN_APP, CHANNEL_REALTIME}
+            if prefs.get("email_enabled", True) is False or self.send_email is None:
+                channels.discard(CHANNEL_EMAIL)
+            # Disabled channels count as done so the row can complete
+            delivered[row["id"]] |= set(row.get("channels") or []) - channels
+            wanted[row["id"]] = channels - delivered[row["id"]]
+
+        self._deliver_in_app([row for row in rows if CHANNEL_IN_APP in wanted[row["id"]]], delivered, errors)
+        # A realtime push points at the stored notification, so it waits until the insert succeeded
+        self._deliver_realtime([row for row in rows if CHANNEL_REALTIME in wanted[row["id"]] and row["id"] not in errors],
+                               delivered, errors)
+        self._deliver_email([row for row in rows if CHANNEL_EMAIL in wanted[row["id"]]], delivered, errors)
+        return delivered, errors
+
+    def _deliver_in_app(self, rows, delivered, errors) -> None:
+        if not rows:
+            return
+        notifications = [
+            {**{field: row.get(field) for field in NOTIFICATION_FIELDS}, "is_read": False, "outbox_key": row["idempotency_key"]}
+            for row in rows
+        ]
+        try:
+            self.get_client().table("notifications").upsert(
+                notifications, on_conflict="outbox_key", ignore_duplicates=True).execute()
+        except Exception as e:
+            for row in rows:
+                errors[row["id"]] = f"in_app: {e}"
+            return
+        for row in rows:
+            delivered[row["id"]].add(CHANNEL_IN_APP)
+        self._count("in_app_delivered", len(rows))
+
+    def _deliver_realtime(self, rows, delivered, errors) -> None:
+        if not rows:
+            return
+        if not self.realtime_url:
+            for row in rows:
+                delivered[row["id"]].add(CHANNEL_REALTIME)
+            return
+        payload = [{field: row.get(field) for field in REALTIME_FIELDS} for row in rows]
+        try:
+            response = requests.post(f"{self.realtime_url}/notifications/realtime/batch",
+                                     json={"notifications": payload}, timeout=self.http_timeout)
+            response.raise_for_status()
+        except Exception as e:
+            for row in rows:
+                errors.setdefault(row["id"], f"realtime: {e}")
+            return
+        for row in rows:
+            delivered[row["id"]].add(CHANNEL_REALTIME)
+        self._count("realtime_delivered", len(rows))
+
+    def _deliver_email(self, rows, delivered, errors) -> None:
+        if not rows:
+            return
+        try:
+            users = self.get_users([row["user_id"] for row in rows])
+        except Exception as e:
+            for row in rows:
+                errors.setdefault(row["id"], f"email: {e}")
+            return
+        for row in rows:
+            user_email = (users.get(row["user_id"]) or {}).get("email")
+            if not user_email:
+                delivered[row["id"]].add(CHANNEL_EMAIL)  # Nobody to send to; retrying will not help
+                continue
+            try:
+                self.send_email(user_email=user_email, **(row.get("email") or {}))
+                delivered[row["id"]].add(CHANNEL_EMAIL)
+                self._count("emails_delivered")
+            except Exception as e:
+                errors.setdefault(row["id"], f"email: {e}")
+
+    def _record(self, rows, delivered, errors) -> Dict[str, int]:
+        """Write each row's outcome back with one upsert"""
+        now = datetime.now(timezone.utc)
+        result = {"claimed": len(rows), "sent": 0, "retried": 0, "failed": 0}
+        updated = []
+        for row in rows:
+            done = delivered[row["id"]]
+            outstanding = set(row.get("channels") or []) - done
+            row = dict(row, delivered=sorted(done))
+            if not outstanding:
+                row.update(status="sent", sent_at=now.isoformat(), last_error=None)
+                result["sent"] += 1
+            else:
+                attempts = (row.get("attempts") or 0) + 1
+                row.update(attempts=attempts, last_error=errors.get(row["id"], "not delivered"))
+                if attempts >= self.max_attempts:
+                    row.update(status="failed")
+                    result["failed"] += 1
+                    logger.error(f"{self.name}: giving up on notification {row['id']}: {row['last_error']}")
+                else:
+                    delay = self.retry_base_delay * (2 ** (attempts - 1))
+                    row.update(status="pending", next_attempt_at=(now + timedelta(seconds=delay)).isoformat())
+                    result["retried"] += 1
+            updated.append(row)
+        try:
+            self.get_client().table(OUTBOX_TABLE).upsert(updated).execute()
+        except Exception as e:
+            # The lease expires and the batch is retried; in-app delivery is idempotent
+            self._count("relay_errors")
+            logger.error(f"{self.name}: failed to record delivery of {len(updated)} notification(s): {e}")
+        for key in ("sent", "retried", "failed"):
+            self._count(key, result[key])
+        return result
+
+    # --- background worker ---
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-relay", daemon=True)
+                self._thread.start()
+
+    def start(self) -> "NotificationOutbox":
+        """Start the background relay (picks up rows left over from earlier runs)"""
+        if self.mode == MODE_ASYNC:
+            self._ensure_worker()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.relay_pending()
+            except Exception as e:
+                self._count("relay_errors")
+                logger.warning(f"{self.name}: relay pass failed: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {"name": self.name, "mode": self.mode, "batch_size": self.batch_size, **self._stats}
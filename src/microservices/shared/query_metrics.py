@@ -0,0 +1,282 @@
+"""
+Query Metrics
+Per-request Supabase query counting, timing and N+1 detection for the Flask services
+
+install_query_metrics(app, name) wraps PostgREST's execute() once per process and hooks the app:
+
+- Every query executed while a request is active (including FanOut stages, which copy the request's
+  context) is counted and timed against that request
+- Responses get a Server-Timing header: total query time and count, the slowest statement and the
+  whole request (visible in the browser's network panel)
+- Background jobs can opt in with `with metrics.track("job name"):`
+- A warning is logged when a request runs more queries than the budget (QUERY_BUDGET, default 15)
+  or repeats the same statement shape N+1-style (QUERY_REPEAT_THRESHOLD, default 5)
+
+Statements are described by method, table and filtered columns (e.g. "GET user [select,user_id]"),
+never by values, so logs do not carry user data.
+"""
+
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_BUDGET = 15
+DEFAULT_REPEAT_THRESHOLD = 5
+
+_current: contextvars.ContextVar[Optional["RequestQueryStats"]] = contextvars.ContextVar("query_metrics", default=None)
+_patch_lock = threading.Lock()
+_patched = False
+
+
+def describe_statement(builder: Any) -> str:
+    """Shape of a PostgREST request: method, table/function and parameter names (no values)"""
+    method = getattr(builder, "http_method", "?")
+    path = str(getattr(builder, "path", "?")).rstrip("/").rsplit("/", 1)[-1] or "?"
+    if "/rpc/" in str(getattr(builder, "path", "")):
+        path = f"rpc:{path}"
+    params = getattr(builder, "params", None)
+    keys: List[str] = []
+    if params is not None:
+        try:
+            keys = sorted({str(key) for key in params.keys()} - {"limit", "offset", "order"})
+        except Exception:
+            keys = []
+    return f"{method} {path} [{','.join(keys)}]" if keys else f"{method} {path}"
+
+
+class RequestQueryStats:
+    """Queries run on behalf of one request; updated from every thread working for it"""
+
+    def __init__(self, endpoint: str = ""):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.slowest: Tuple[float, str] = (0.0, "")
+        self.by_statement: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed_ms: float, failed: bool = False) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if failed:
+                self.errors += 1
+            if elapsed_ms > self.slowest[0]:
+                self.slowest = (elapsed_ms, statement)
+            self.by_statement[statement] = self.by_statement.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes run at least threshold times (likely N+1 loops), most frequent first"""
+        with self._lock:
+            return sorted(((statement, count) for statement, count in self.by_statement.items() if count >= threshold),
+                          key=lambda item: -item[1])
+
+    def server_timing(self) -> str:
+        request_ms = (time.perf_counter() - self.started) * 1000
+        parts = [f'db;dur={self.total_ms:.1f};desc="{self.count} queries"']
+        if self.count:
+            statement = self.slowest[1].replace('"', "'")
+            parts.append(f'db-slowest;dur={self.slowest[0]:.1f};desc="{statement}"')
+        parts.append(f"app;dur={request_ms:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoint": self.endpoint,
+                "queries": self.count,
+                "query_ms": round(self.total_ms, 2),
+                "errors": self.errors,
+                "slowest_ms": round(self.slowest[0], 2),
+                "slowest_statement": self.slowest[1] or None,
+            }
+
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    """Stats of the request being served on this thread/context, if any"""
+    return _current.get()
+
+
+class QueryMetrics:
+    """Process-wide totals across requests (for /cache/status-style endpoints)"""
+
+    def __init__(self, name: str, budget: int, repeat_threshold: int):
+        self.name = name
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "queries": 0,
+            "query_ms": 0.0,
+            "over_budget": 0,
+            "n_plus_one": 0,
+            "queries_outside_requests": 0,
+        }
+        self._worst: Optional[Dict[str, Any]] = None
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def finish(self, stats: RequestQueryStats) -> None:
+        summary = stats.summary()
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["queries"] += summary["queries"]
+            self._stats["query_ms"] += summary["query_ms"]
+            if self._worst is None or summary["queries"] > self._worst["queries"]:
+                self._worst = summary
+
+        if summary["queries"] > self.budget:
+            self._count("over_budget")
+            logger.warning(f"{self.name}: {summary['endpoint']} ran {summary['queries']} queries "
+                           f"(budget {self.budget}) in {summary['query_ms']} ms; slowest: "
+                           f"{summary['slowest_statement']} ({summary['slowest_ms']} ms)")
+        repeated = stats.repeated(self.repeat_threshold)
+        if repeated:
+            self._count("n_plus_one")
+            shapes = ", ".join(f"{statement} x{count}" for statement, count in repeated[:3])
+            logger.warning(f"{self.name}: possible N+1 in {summary['endpoint']}: {shapes}")
+
+    @contextlib.contextmanager
+    def track(self, label: str):
+        """Count the queries of a background job as if it were a request (budget and N+1 warnings included)"""
+        stats = RequestQueryStats(label)
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+            self.finish(stats)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["query_ms"] = round(stats["query_ms"], 2)
+            return {
+                "name": self.name,
+                "budget": self.budget,
+                "repeat_threshold": self.repeat_threshold,
+                "avg_queries_per_request": round(stats["queries"] / stats["requests"], 2) if stats["requests"] else 0,
+                "worst_request": dict(self._worst) if self._worst else None,
+                **stats,
+            }
+
+
+_metrics: List[QueryMetrics] = []
+_listeners: List[Callable[[Any, float, bool], None]] = []
+
+
+def add_query_listener(listener: Callable[[Any, float, bool], None]) -> None:
+    """Call listener(builder, elapsed_ms, failed) after every Supabase query, in or outside requests"""
+    instrument_postgrest(import_now=False)
+    _listeners.append(listener)
+
+
+def _instrument(execute):
+    @functools.wraps(execute)
+    def timed_execute(builder, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            for metrics in _metrics:
+                metrics._count("queries_outside_requests")
+            if not _listeners:
+                return execute(builder, *args, **kwargs)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return execute(builder, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if stats is not None:
+                stats.record(describe_statement(builder), elapsed_ms, failed)
+            for listener in _listeners:
+                try:
+                    listener(builder, elapsed_ms, failed)
+                except Exception as e:
+                    logger.debug(f"query listener failed: {e}")
+    timed_execute._query_metrics = True
+    return timed_execute
+
+
+def instrument_postgrest(import_now: bool = True) -> bool:
+    """Wrap the execute() of PostgREST's request builders (idempotent); False if postgrest is missing
+
+    With import_now=False nothing is imported: if postgrest is not loaded yet, whoever builds the
+    client later (serving.lazy_supabase_client) calls this again.
+    """
+    global _patched
+    with _patch_lock:
+        if _patched:
+            return True
+        if not import_now and "postgrest" not in sys.modules:
+            return False
+        try:
+            from postgrest._sync import request_builder
+        except ImportError:
+            logger.warning("postgrest not importable; Supabase queries will not be counted")
+            return False
+        # MaybeSingle delegates to Single through super(), so it is counted there once
+        for builder_class in (request_builder.SyncQueryRequestBuilder, request_builder.SyncSingleRequestBuilder):
+            execute = builder_class.__dict__.get("execute")
+            if execute is not None and not getattr(execute, "_query_metrics", False):
+                builder_class.execute = _instrument(execute)
+        _patched = True
+        return True
+
+
+def install_query_metrics(app, name: str, budget: Optional[int] = None,
+                          repeat_threshold: Optional[int] = None) -> QueryMetrics:
+    """Count Supabase queries per request for a Flask app and add Server-Timing headers"""
+    from flask import request
+
+    metrics = QueryMetrics(
+        name,
+        budget if budget is not None else int(os.getenv("QUERY_BUDGET", DEFAULT_QUERY_BUDGET)),
+        repeat_threshold if repeat_threshold is not None else int(os.getenv("QUERY_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD)),
+    )
+    _metrics.append(metrics)
+    instrument_postgrest(import_now=False)
+
+    @app.before_request
+    def _start_query_stats():
+        stats = RequestQueryStats(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}")
+        request.environ["query_metrics.token"] = _current.set(stats)
+        request.environ["query_metrics.stats"] = stats
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = request.environ.get("query_metrics.stats")
+        if stats is not None:
+            response.headers.add("Server-Timing", stats.server_timing())
+            # Lets the cross-origin frontend read the timings through the Resource Timing API
+            response.headers.setdefault("Timing-Allow-Origin", "*")
+        return response
+
+    @app.teardown_request
+    def _finish_query_stats(error=None):
+        stats = request.environ.pop("query_metrics.stats", None)
+        token = request.environ.pop("query_metrics.token", None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                _current.set(None)  # Token from another context (e.g. a streamed response)
+        if stats is not None:
+            metrics.finish(stats)
+
+    return metrics
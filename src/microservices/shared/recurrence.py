@@ -0,0 +1,283 @@
+"""
+Recurrence Rules
+Compiled RRULE-like recurrence rules for recurring tasks
+
+A task's recurrence column holds either a legacy keyword (daily, weekly, biweekly, monthly,
+quarterly, yearly) or a rule string in a subset of RFC 5545 RRULE syntax:
+
+    FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=10;UNTIL=2026-12-31
+
+- FREQ: DAILY, WEEKLY, MONTHLY or YEARLY (required)
+- INTERVAL: step between periods (default 1)
+- BYDAY: weekdays (MO..SU), for DAILY and WEEKLY rules
+- BYMONTHDAY: day of month (1-31), for MONTHLY and YEARLY rules
+- COUNT: occurrences left in the series, counting the current instance
+- UNTIL: last allowed date (inclusive, YYYY-MM-DD or YYYYMMDD)
+
+Monthly and yearly rules keep the day of month of the series start and clamp it to the
+length of shorter months (Jan 31 -> Feb 28 -> Mar 31). An expansion starts from the series
+start, but instances created one at a time only know their own (possibly clamped) due date,
+so anchored() pins a day past the 28th into the rule as BYMONTHDAY and every later instance
+keeps it. Rules are parsed once and cached.
+"""
+
+import calendar
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+MAX_OCCURRENCES = 1000  # Upper bound for a single expansion
+
+# Legacy recurrence keywords stored before rule strings were supported
+LEGACY_RULES: Dict[str, str] = {
+    "daily": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY",
+    "biweekly": "FREQ=WEEKLY;INTERVAL=2",
+    "monthly": "FREQ=MONTHLY",
+    "quarterly": "FREQ=MONTHLY;INTERVAL=3",
+    "yearly": "FREQ=YEARLY",
+}
+
+
+def to_date(value) -> date:
+    """Accept YYYY-MM-DD strings, ISO timestamps, datetimes and dates"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if len(text) == 8 and text.isdigit():
+        return datetime.strptime(text, "%Y%m%d").date()
+    return datetime.strptime(text[:10], "%Y-%m-%d").date()
+
+
+def _add_months(anchor: date, months: int, day: Optional[int] = None) -> date:
+    """Shift by whole months, clamping the day (default: the anchor's) to the target month's length"""
+    month_index = anchor.year * 12 + anchor.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return date(year, month, min(day or anchor.day, calendar.monthrange(year, month)[1]))
+
+
+class RecurrenceRule:
+    """An immutable, parsed recurrence rule"""
+
+    __slots__ = ("freq", "interval", "byweekday", "count", "until", "bymonthday")
+
+    def __init__(self, freq: str, interval: int = 1, byweekday: Tuple[int, ...] = (),
+                 count: Optional[int] = None, until: Optional[date] = None, bymonthday: Optional[int] = None):
+        freq = freq.upper()
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unsupported FREQ '{freq}'")
+        if interval < 1:
+            raise ValueError("INTERVAL must be at least 1")
+        if count is not None and count < 1:
+            raise ValueError("COUNT must be at least 1")
+        if byweekday and freq not in ("DAILY", "WEEKLY"):
+            raise ValueError("BYDAY is only supported for DAILY and WEEKLY rules")
+        if bymonthday is not None:
+            if freq not in ("MONTHLY", "YEARLY"):
+                raise ValueError("BYMONTHDAY is only supported for MONTHLY and YEARLY rules")
+            if not 1 <= bymonthday <= 31:
+                raise ValueError("BYMONTHDAY must be between 1 and 31")
+        self.freq = freq
+        self.interval = interval
+        self.byweekday = tuple(sorted(set(byweekday)))
+        self.count = count
+        self.until = until
+        self.bymonthday = bymonthday
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RecurrenceRule) and self.to_string() == other.to_string()
+
+    def __hash__(self) -> int:
+        return hash(self.to_string())
+
+    def __repr__(self) -> str:
+        return f"RecurrenceRule('{self.to_string()}')"
+
+    def to_string(self) -> str:
+        """Serialize back to the rule syntax (defaults are omitted)"""
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byweekday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.byweekday))
+        if self.bymonthday is not None:
+            parts.append(f"BYMONTHDAY={self.bymonthday}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.isoformat()}")
+        return ";".join(parts)
+
+    def occurrences(self, start, limit: Optional[int] = None, until=None) -> List[date]:
+        """
+        Occurrences strictly after start (the current instance's due date), in order.
+
+        Stops at limit items, at the until horizon (inclusive), at the rule's own COUNT/UNTIL,
+        and never returns more than MAX_OCCURRENCES.
+        """
+        start = to_date(start)
+        horizon = to_date(until) if until is not None else None
+        if self.until is not None and (horizon is None or self.until < horizon):
+            horizon = self.until
+        limit = MAX_OCCURRENCES if limit is None else max(0, min(limit, MAX_OCCURRENCES))
+        if self.count is not None:
+            limit = min(limit, self.count - 1)  # The current instance is one of COUNT
+        if limit <= 0 or (horizon is not None and horizon <= start):
+            return []
+
+        dates = self._expand(start, limit, horizon)
+        if horizon is not None:
+            dates = [day for day in dates if day <= horizon]
+        return dates[:limit]
+
+    def _expand(self, start: date, limit: int, horizon: Optional[date]) -> List[date]:
+        """Candidate dates for occurrences(); computed arithmetically from start, not step by step"""
+        if self.freq in ("MONTHLY", "YEARLY"):
+            step = self.interval * (12 if self.freq == "YEARLY" else 1)
+            periods = limit
+            if horizon is not None:
+                months_to_horizon = (horizon.year - start.year) * 12 + horizon.month - start.month
+                periods = min(periods, months_to_horizon // step + 1)
+            return [_add_months(start, step * k, self.bymonthday) for k in range(1, periods + 1)]
+
+        if not self.byweekday:
+            step = self.interval * (7 if self.freq == "WEEKLY" else 1)
+            periods = limit
+            if horizon is not None:
+                periods = min(periods, (horizon - start).days // step)
+            return [start + timedelta(days=step * k) for k in range(1, periods + 1)]
+
+        if self.freq == "WEEKLY":
+            # Every listed weekday of every INTERVAL-th week, weeks starting on Monday
+            week_start = start - timedelta(days=start.weekday())
+            per_week = len(self.byweekday)
+            weeks = limit // per_week + 2
+            if horizon is not None:
+                weeks = min(weeks, (horizon - week_start).days // (7 * self.interval) + 1)
+            dates = [
+                week_start + timedelta(weeks=self.interval * week, days=day)
+                for week in range(weeks) for day in self.byweekday
+            ]
+            return [day for day in dates if day > start]
+
+        # DAILY with BYDAY: every INTERVAL-th day that falls on a listed weekday
+        allowed = set(self.byweekday)
+        cycle = [start + timedelta(days=self.interval * k) for k in range(1, 8)]
+        if not any(day.weekday() in allowed for day in cycle):
+            return []  # The step never lands on an allowed weekday
+        days = limit * 7
+        if horizon is not None:
+            days = min(days, (horizon - start).days // self.interval)
+        dates = [start + timedelta(days=self.interval * k) for k in range(1, days + 1)]
+        return [day for day in dates if day.weekday() in allowed]
+
+    def next_after(self, start) -> Optional[date]:
+        """The next occurrence after start, or None if the series has ended"""
+        dates = self.occurrences(start, limit=1)
+        return dates[0] if dates else None
+
+    def advanced(self, steps: int = 1) -> "RecurrenceRule":
+        """The rule an instance `steps` occurrences later should carry (COUNT reduced accordingly)"""
+        if self.count is None:
+            return self
+        return RecurrenceRule(self.freq, self.interval, self.byweekday,
+                              max(1, self.count - steps), self.until, self.bymonthday)
+
+    def anchored(self, start) -> "RecurrenceRule":
+        """
+        This rule with the series start's day of month pinned as BYMONTHDAY.
+
+        Only monthly/yearly rules starting after the 28th change: earlier days are never clamped,
+        so their instances cannot drift.
+        """
+        day = to_date(start).day
+        if self.freq not in ("MONTHLY", "YEARLY") or self.bymonthday is not None or day <= 28:
+            return self
+        return RecurrenceRule(self.freq, self.interval, self.byweekday, self.count, self.until, day)
+
+    def describe(self) -> Dict:
+        return {
+            "freq": self.freq,
+            "interval": self.interval,
+            "byday": [WEEKDAYS[day] for day in self.byweekday],
+            "count": self.count,
+            "until": self.until.isoformat() if self.until else None,
+            "bymonthday": self.bymonthday,
+        }
+
+
+@lru_cache(maxsize=512)
+def compile_rule(text: str) -> Optional[RecurrenceRule]:
+    """
+    Parse a recurrence value into a rule.
+
+    Returns None for empty values and unknown keywords; raises ValueError for a malformed rule string.
+    """
+    if not text or not str(text).strip():
+        return None
+    text = str(text).strip()
+    legacy = LEGACY_RULES.get(text.lower())
+    if legacy:
+        return compile_rule(legacy)
+    if "=" not in text:
+        return None
+
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    fields: Dict[str, str] = {}
+    for part in filter(None, text.split(";")):
+        key, _, value = part.partition("=")
+        if not value:
+            raise ValueError(f"Malformed rule part '{part}'")
+        fields[key.strip().upper()] = value.strip()
+
+    unknown = set(fields) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}
+    if unknown:
+        raise ValueError(f"Unsupported rule part(s): {', '.join(sorted(unknown))}")
+    if "FREQ" not in fields:
+        raise ValueError("FREQ is required")
+    if "COUNT" in fields and "UNTIL" in fields:
+        raise ValueError("COUNT and UNTIL cannot be combined")
+
+    try:
+        interval = int(fields.get("INTERVAL", 1))
+        count = int(fields["COUNT"]) if "COUNT" in fields else None
+        bymonthday = int(fields["BYMONTHDAY"]) if "BYMONTHDAY" in fields else None
+        until = None
+        if "UNTIL" in fields:
+            # Accept 2026-12-31 as well as RRULE's 20261231 / 20261231T235959Z
+            value = fields["UNTIL"]
+            until = to_date(value[:10] if "-" in value else value[:8])
+    except ValueError as e:
+        raise ValueError(f"Invalid rule value: {e}")
+
+    byweekday = []
+    for day in filter(None, fields.get("BYDAY", "").upper().split(",")):
+        if day not in WEEKDAYS:
+            raise ValueError(f"Unknown BYDAY value '{day}'")
+        byweekday.append(WEEKDAYS.index(day))
+
+    return RecurrenceRule(fields["FREQ"], interval, tuple(byweekday), count, until, bymonthday)
+
+
+def validate_recurrence(text: Optional[str]) -> Optional[str]:
+    """Return an error message if a recurrence value cannot be used, otherwise None"""
+    if not text:
+        return None
+    try:
+        if compile_rule(text) is None:
+            return f"Unknown recurrence '{text}'"
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def next_occurrence(current_due_date, recurrence: str) -> Optional[date]:
+    """Next due date for a recurrence value, or None when it is unknown or the series has ended"""
+    rule = compile_rule(recurrence)
+    return rule.next_after(current_due_date) if rule else None
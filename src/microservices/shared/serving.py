@@ -0,0 +1,133 @@
+"""
+Serving
+Per-worker initialisation and worker details for the production (pre-fork) entry point
+
+In production every service runs under Gunicorn with shared/gunicorn_conf.py:
+
+    gunicorn -c ../shared/gunicorn_conf.py task_service:app
+
+The master imports the app once (preload) and forks the workers. Anything that must not cross a fork
+(Supabase HTTP connection pools, RabbitMQ connections, background threads) is registered with
+@on_worker_init instead of running at import time; the Gunicorn config calls init_worker() in each
+worker after the fork. `python <service>.py` (development server) calls it too, via run_development_server().
+
+Clients that are slow to import or build (Supabase pulls in httpx, gotrue and postgrest) are LazyClient
+proxies: the module imports without them and each process builds its own client on first use.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_hooks: List[Callable[[], Any]] = []
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    "server": "none",
+    "pid": None,
+    "workers": 1,
+    "threads": 1,
+    "worker_class": "sync",
+    "started_at": None,
+}
+
+
+def on_worker_init(hook: Callable[[], Any]) -> Callable[[], Any]:
+    """Decorator: run hook once in every worker process, in registration order"""
+    with _lock:
+        _hooks.append(hook)
+        already_initialised = _state["pid"] == os.getpid()
+    if already_initialised:  # Registered after init (e.g. a late import): run it now
+        hook()
+    return hook
+
+
+def init_worker(server: str = "development", workers: int = 1, threads: int = 1,
+                worker_class: Optional[str] = None) -> bool:
+    """Run the registered hooks for this process; False if they already ran in it"""
+    with _lock:
+        if _state["pid"] == os.getpid():
+            return False
+        _state.update({
+            "server": server,
+            "pid": os.getpid(),
+            "workers": workers,
+            "threads": threads,
+            "worker_class": worker_class or ("gthread" if threads > 1 else "sync"),
+            "started_at": time.time(),
+        })
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            # A worker that cannot reach a dependency still serves what it can (as the services did before)
+            print(f"⚠️ Worker init: {getattr(hook, '__name__', hook)} failed: {e}")
+    print(f"✅ Worker {os.getpid()} ready ({server}, {workers} worker(s) x {threads} thread(s))")
+    return True
+
+
+def worker_info() -> Dict[str, Any]:
+    """Process details for /health: which worker answered and how the service is being served"""
+    with _lock:
+        state = dict(_state)
+    started_at = state.pop("started_at")
+    return {
+        **state,
+        "pid": os.getpid(),
+        "initialised": state["pid"] == os.getpid(),
+        "uptime_seconds": round(time.time() - started_at, 1) if started_at else 0,
+    }
+
+
+class LazyClient:
+    """Stands in for a client built on first use, once per process (one built before a fork is rebuilt)"""
+
+    def __init__(self, factory: Callable[[], Any], name: str):
+        self._factory = factory
+        self._name = name
+        self._client = None
+        self._pid: Optional[int] = None
+        self._build_lock = threading.Lock()
+
+    def get(self) -> Any:
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._build_lock:
+            if self._client is None or self._pid != os.getpid():
+                started = time.perf_counter()
+                self._client = self._factory()
+                self._pid = os.getpid()
+                print(f"🔌 {self._name} client ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return self._client
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None and self._pid == os.getpid()
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.get(), attribute)
+
+
+def lazy_supabase_client(url: str, key: str) -> LazyClient:
+    """Supabase client whose package is only imported when the first query runs"""
+
+    def build():
+        from supabase import create_client
+        from query_metrics import instrument_postgrest
+
+        instrument_postgrest()  # postgrest is importable now; count and time its queries
+        return create_client(url, key)
+
+    return LazyClient(build, "Supabase")
+
+
+def run_development_server(app, port: int, socketio=None, debug: bool = False) -> None:
+    """Single-process Flask (or Socket.IO) development server with the worker hooks applied"""
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        init_worker()  # With the reloader, only the child process that serves requests initialises
+    if socketio is not None:
+        socketio.run(app, host="0.0.0.0", port=port, debug=debug)
+    else:
+        app.run(host="0.0.0.0", port=port, debug=debug)
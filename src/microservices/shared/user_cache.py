@@ -0,0 +1,267 @@
+"""
+User Directory Cache
+Bounded LRU + TTL cache for user rows, shared by the task, project, report and notification services
+
+- Size bound with least-recently-used eviction
+- Per-entry TTL, with a shorter TTL for negative entries (IDs that do not exist)
+- Single-flight loading: concurrent misses for the same ID wait for one load
+- Hit/miss/eviction counters for /cache/status
+
+Each service supplies a loader that takes a list of IDs and returns {id: row} for the rows it found.
+A loader that reaches some IDs but not others raises PartialLoadError: the rows it did load are
+cached and returned, and the IDs that failed are retried by the next lookup instead of being cached
+as missing.
+"""
+
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 5000
+DEFAULT_TTL = 300  # 5 minutes
+DEFAULT_NEGATIVE_TTL = 60
+DEFAULT_LOAD_TIMEOUT = 10  # seconds a waiting caller blocks on another thread's load
+
+_MISSING = object()  # Marks a negative entry (ID looked up and not found)
+
+# Every cache created in this process, so they can be cleared or invalidated together
+_REGISTRY: "weakref.WeakSet[UserDirectoryCache]" = weakref.WeakSet()
+
+
+class PartialLoadError(Exception):
+    """Raised by a loader that loaded some IDs and failed on others"""
+
+    def __init__(self, loaded: Dict[str, Dict[str, Any]], failed_ids: Iterable[str], message: str = ""):
+        self.loaded = loaded
+        self.failed_ids = frozenset(failed_ids)
+        super().__init__(message or f"failed to load {len(self.failed_ids)} user(s)")
+
+
+class _Flight:
+    """An in-progress load that other callers can wait on"""
+    __slots__ = ("event", "value")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class UserDirectoryCache:
+    """Thread-safe LRU + TTL cache keyed by user ID"""
+
+    def __init__(self, loader: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+                 name: str = "user_directory",
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+                 load_timeout: float = DEFAULT_LOAD_TIMEOUT):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.load_timeout = load_timeout
+        self._loader = loader
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (value, expires_at)
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "coalesced_waits": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+        _REGISTRY.add(self)
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the user row for an ID, loading it on a miss; None if it does not exist"""
+        if not user_id:
+            return None
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return {id: row} for the IDs that exist, loading every miss with one loader call"""
+        unique_ids = list(dict.fromkeys(filter(None, user_ids)))
+        results: Dict[str, Dict[str, Any]] = {}
+        owned: Dict[str, _Flight] = {}
+        waiting: Dict[str, _Flight] = {}
+
+        with self._lock:
+            now = time.monotonic()
+            for user_id in unique_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    value, expires_at = entry
+                    if expires_at > now:
+                        self._entries.move_to_end(user_id)
+                        if value is _MISSING:
+                            self._stats["negative_hits"] += 1
+                        else:
+                            self._stats["hits"] += 1
+                            results[user_id] = value
+                        continue
+                    del self._entries[user_id]
+                    self._stats["expirations"] += 1
+
+                self._stats["misses"] += 1
+                flight = self._flights.get(user_id)
+                if flight is not None:
+                    waiting[user_id] = flight
+                    self._stats["coalesced_waits"] += 1
+                else:
+                    flight = _Flight()
+                    self._flights[user_id] = flight
+                    owned[user_id] = flight
+
+        if owned:
+            results.update(self._load(owned))
+
+        for user_id, flight in waiting.items():
+            if flight.event.wait(self.load_timeout) and flight.value is not None:
+                results[user_id] = flight.value
+
+        return results
+
+    def _load(self, owned: Dict[str, _Flight]) -> Dict[str, Dict[str, Any]]:
+        """Run the loader for IDs this thread owns and publish results to waiting threads"""
+        ids = list(owned)
+        loaded: Dict[str, Dict[str, Any]] = {}
+        failed_ids: Iterable[str] = ()
+        try:
+            loaded = self._loader(ids) or {}
+        except PartialLoadError as e:
+            loaded, failed_ids = e.loaded or {}, e.failed_ids
+            logger.warning(f"{self.name}: loaded {len(loaded)} of {len(ids)} user(s): {e}")
+        except Exception as e:
+            failed_ids = ids
+            logger.warning(f"{self.name}: failed to load {len(ids)} user(s): {e}")
+
+        with self._lock:
+            self._stats["loads"] += 1
+            if failed_ids:
+                self._stats["load_errors"] += 1
+            for user_id, flight in owned.items():
+                value = loaded.get(user_id)
+                # Errors are not cached so the next request retries; missing IDs are cached negatively
+                if user_id not in failed_ids:
+                    self._store(user_id, value)
+                flight.value = value
+                self._flights.pop(user_id, None)
+                flight.event.set()
+
+        return {user_id: value for user_id, value in loaded.items() if user_id in owned and value is not None}
+
+    def _store(self, user_id: str, value: Optional[Dict[str, Any]]) -> None:
+        """Insert an entry and evict least-recently-used entries beyond max_size (lock held)"""
+        if value is None:
+            self._entries[user_id] = (_MISSING, time.monotonic() + self.negative_ttl)
+        else:
+            self._entries[user_id] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, user_id: str, value: Optional[Dict[str, Any]]) -> None:
+        """Store a row that was loaded elsewhere (e.g. from a directory listing)"""
+        if not user_id:
+            return
+        with self._lock:
+            self._store(user_id, value)
+
+    def peek(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh cached row without loading or touching the counters"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic() or entry[0] is _MISSING:
+                return None
+            return entry[0]
+
+    def invalidate(self, *user_ids: str) -> int:
+        """Drop entries for the given IDs; returns how many were present"""
+        removed = 0
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    removed += 1
+            self._stats["invalidations"] += removed
+        return removed
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.peek(user_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and sizing for /cache/status"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["negative_hits"]
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "negative_ttl_seconds": self.negative_ttl,
+                "in_flight_loads": len(self._flights),
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                **self._stats,
+            }
+
+
+def make_supabase_user_loader(get_client: Callable[[], Any], columns: str,
+                              table: str = "user", key_field: str = "user_id",
+                              batch_size: int = 200) -> Callable[[List[str]], Dict[str, Dict[str, Any]]]:
+    """
+    Build a loader that reads user rows from Supabase.
+
+    get_client is called on every load so the service's module-level client can be swapped (e.g. patched in tests).
+    A single ID is looked up with eq(); larger sets use in_() in batches.
+    """
+    def load(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        client = get_client()
+        if len(user_ids) == 1:
+            response = client.table(table).select(columns).eq(key_field, user_ids[0]).execute()
+            return {user_ids[0]: response.data[0]} if response.data else {}
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            response = client.table(table).select(columns).in_(key_field, batch).execute()
+            for row in response.data or []:
+                if row.get(key_field):
+                    rows[row[key_field]] = row
+        return rows
+
+    return load
+
+
+def all_caches() -> List[UserDirectoryCache]:
+    """Every live cache in this process"""
+    return list(_REGISTRY)
+
+
+def invalidate_user_everywhere(*user_ids: str) -> int:
+    """Evict user IDs from every cache in this process"""
+    return sum(cache.invalidate(*user_ids) for cache in all_caches())
+
+
+def clear_all_caches() -> None:
+    """Clear every cache in this process"""
+    for cache in all_caches():
+        cache.clear()
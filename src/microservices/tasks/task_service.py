@@ -4,27 +4,40 @@ import json
 import traceback
 import logging
 import uuid
+import base64
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone, timedelta
 from functools import lru_cache
 import time
 
-import pika
 import requests
 from dotenv import load_dotenv
 
 # Add the notifications microservice to the path to import email_service
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../notifications'))
 try:
-    from email_service import send_notification_email
+    from email_service import send_notification_email, use_email_dispatcher
     EMAIL_SERVICE_AVAILABLE = True
 except ImportError:
     print("Warning: email_service not available. Email notifications will be disabled.")
     EMAIL_SERVICE_AVAILABLE = False
 
-from flask import Flask, jsonify, request
+# Shared modules used by several microservices
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../shared'))
+from user_cache import UserDirectoryCache, make_supabase_user_loader
+from cache_events import CacheEventPublisher, start_cache_invalidation_listener, evict_users
+from name_index import UserNameIndex, SupabaseUserNameSource, extract_mention_names
+from batch_writer import BatchWriter
+from fanout import FanOut
+from amqp_publisher import AmqpPublisher
+from notification_outbox import NotificationOutbox, build_outbox_row, make_idempotency_key, ALL_CHANNELS, CHANNEL_IN_APP, CHANNEL_REALTIME, CHANNEL_EMAIL
+from recurrence import MAX_OCCURRENCES, compile_rule, validate_recurrence
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
+
+from flask import Flask, Blueprint, jsonify, request
 from flask_cors import CORS
-from supabase import create_client, Client
 from pydantic import BaseModel, ValidationError
 
 # Configure logging
@@ -43,80 +56,69 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
 
 RABBITMQ_URL: Optional[str] = os.getenv("RABBITMQ_URL", "amqp://localhost")
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Supabase client, built on first use in each process (importing the supabase package costs ~0.4 s)
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+# Routes are registered on this blueprint; create_app() builds the Flask app around it
+api = Blueprint("task_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 # In-memory cache for performance optimization
-USER_CACHE = {}
+USER_DIRECTORY_COLUMNS = "user_id, name, email, department, role"
+CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))  # 5 minutes
+USER_CACHE = UserDirectoryCache(
+    make_supabase_user_loader(lambda: supabase, USER_DIRECTORY_COLUMNS),
+    name="task_service_users",
+    max_size=int(os.getenv("USER_CACHE_MAX_SIZE", "5000")),
+    ttl=CACHE_TTL,
+)
 PROJECT_CACHE = {}
-CACHE_TTL = 300  # 5 minutes
+
+def evict_cached_projects(project_ids: List[str], action: str) -> None:
+    """Drop projects named in an invalidation event from PROJECT_CACHE"""
+    for project_id in project_ids:
+        PROJECT_CACHE.pop(f"project_{project_id}", None)
+
+# Case-insensitive name index for @mention resolution and autocomplete
+MENTION_INDEX = UserNameIndex(
+    SupabaseUserNameSource(lambda: supabase),
+    name="task_service_mentions",
+    rebuild_interval=int(os.getenv("MENTION_INDEX_REBUILD_INTERVAL", "3600")),
+)
+
+def on_user_changed(user_ids: List[str], action: str) -> None:
+    """User invalidation event: evict cached rows and re-index the users' names"""
+    evict_users(user_ids, action)
+    MENTION_INDEX.refresh_users(user_ids)
+
+# Writes publish invalidation events; the listener evicts users, projects and task access entries changed elsewhere
+cache_events = CacheEventPublisher(RABBITMQ_URL, source="task-service")
+cache_event_listener = None
+
+@on_worker_init
+def start_cache_event_listener() -> None:
+    global cache_event_listener
+    cache_event_listener = start_cache_invalidation_listener(
+        RABBITMQ_URL, "task-service",
+        {"user": on_user_changed, "project": evict_cached_projects, "task": lambda ids, action: evict_task_access(ids, action)}
+    )
+
+# Bounded pool shared by all requests for running independent queries of one request concurrently
+QUERY_FANOUT = FanOut(name="task-query-fanout", max_workers=int(os.getenv("QUERY_FANOUT_WORKERS", "8")))
 
 def get_cached_user(user_id: str) -> Dict[str, Any]:
-    """Get user data from cache or fetch and cache it"""
+    """Get user data from the user directory cache (loaded on a miss)"""
     if not user_id:
         return None
-        
-    cache_key = f"user_{user_id}"
-    current_time = time.time()
-    
-    if cache_key in USER_CACHE:
-        cached_data, timestamp = USER_CACHE[cache_key]
-        if current_time - timestamp < CACHE_TTL:
-            return cached_data
-    
-    # Fetch from database
-    try:
-        response = supabase.table("user").select("user_id, name, email, department").eq("user_id", user_id).execute()
-        if response.data and len(response.data) > 0:
-            user_data = response.data[0]
-            USER_CACHE[cache_key] = (user_data, current_time)
-            return user_data
-    except Exception as e:
-        print(f"Error fetching user {user_id}: {e}")
-    
-    return None
+    return USER_CACHE.get(user_id)
 
 def batch_fetch_users(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
-    """Fetch multiple users in a single query and cache them"""
+    """Fetch multiple users, loading all cache misses in a single query"""
     if not user_ids:
         return {}
-    
-    # Remove duplicates and None values
-    unique_ids = list(set(filter(None, user_ids)))
-    if not unique_ids:
-        return {}
-    
-    # Check cache first
-    users_data = {}
-    missing_ids = []
-    current_time = time.time()
-    
-    for user_id in unique_ids:
-        cache_key = f"user_{user_id}"
-        if cache_key in USER_CACHE:
-            cached_data, timestamp = USER_CACHE[cache_key]
-            if current_time - timestamp < CACHE_TTL:
-                users_data[user_id] = cached_data
-                continue
-        missing_ids.append(user_id)
-    
-    # Fetch missing users in batch
-    if missing_ids:
-        try:
-            response = supabase.table("user").select("user_id, name, email, department").in_("user_id", missing_ids).execute()
-            if response.data:
-                for user in response.data:
-                    user_id = user["user_id"]
-                    users_data[user_id] = user
-                    USER_CACHE[f"user_{user_id}"] = (user, current_time)
-        except Exception as e:
-            print(f"Error batch fetching users: {e}")
-    
-    return users_data
+    return USER_CACHE.get_many(user_ids)
 
 def enhance_task_with_user_data(task: Dict[str, Any], user_cache: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
     """Enhance task data with user information from cache"""
@@ -196,6 +198,18 @@ class RescheduleTask(BaseModel):
     actor_id: str
     new_due_date: str
 
+# Pydantic models for bulk task operations
+class BulkTaskOperation(BaseModel):
+    op: str  # create | update | reassign | delete
+    task_id: Optional[str] = None  # update, reassign, delete
+    changes: Optional[Dict[str, Any]] = None  # update: same fields as TaskUpdate
+    owner_id: Optional[str] = None  # reassign: the new owner
+    task: Optional[Dict[str, Any]] = None  # create: same fields as TaskCreate
+
+class BulkTaskRequest(BaseModel):
+    user_id: str  # Who is performing the operations (used for audit and notifications)
+    operations: List[Dict[str, Any]]  # Validated one by one so a bad item does not reject the batch
+
 
 # Pydantic models for comments
 class CommentCreate(BaseModel):
@@ -203,49 +217,64 @@ class CommentCreate(BaseModel):
 
 
 class NotificationPublisher:
-    def __init__(self):
-        self.connection = None
-        self.channel = None
-        self.connect()
-    
-    def connect(self):
-        try:
-            self.connection = pika.BlockingConnection(pika.URLParameters(RABBITMQ_URL))
-            self.channel = self.connection.channel()
-            self.channel.exchange_declare(exchange='task_notifications', exchange_type='topic')
-            logger.info("Connected to RabbitMQ for notifications")
-        except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
-            self.connection = None
-            self.channel = None
-    
-    def publish_due_date_notification(self, task_data: dict, days_until_due: int):
-        if not self.channel:
-            self.connect()
-        
-        if self.channel:
-            try:
-                message = {
-                    "task_id": task_data.get("task_id"),
-                    "user_id": task_data.get("owner_id"),
-                    "title": f"Task Due in {days_until_due} Day{'s' if days_until_due != 1 else ''}",
-                    "message": f"Task '{task_data.get('title')}' is due in {days_until_due} day{'s' if days_until_due != 1 else ''}",
-                    "type": f"reminder_{days_until_due}_days",
-                    "due_date": task_data.get("due_date"),
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                
-                self.channel.basic_publish(
-                    exchange='task_notifications',
-                    routing_key=f'task.reminder.{days_until_due}_days',
-                    body=json.dumps(message),
-                    properties=pika.BasicProperties(delivery_mode=2)
-                )
-                print(f"Published due date notification for task {task_data.get('task_id')}")
-            except Exception as e:
-                print(f"Failed to publish notification: {e}")
-
-notification_publisher = NotificationPublisher()
+    """Builds task notification messages and hands them to the shared background publisher"""
+
+    def __init__(self, publisher: AmqpPublisher):
+        self.publisher = publisher
+
+    def publish_due_date_notification(self, task_data: dict, days_until_due: int) -> bool:
+        message = {
+            "task_id": task_data.get("task_id"),
+            "user_id": task_data.get("owner_id"),
+            "title": f"Task Due in {days_until_due} Day{'s' if days_until_due != 1 else ''}",
+            "message": f"Task '{task_data.get('title')}' is due in {days_until_due} day{'s' if days_until_due != 1 else ''}",
+            "type": f"reminder_{days_until_due}_days",
+            "due_date": task_data.get("due_date"),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        # Queued in memory and confirmed by the broker on the publisher's I/O thread
+        queued = self.publisher.publish('task_notifications', f'task.reminder.{days_until_due}_days', message)
+        if not queued:
+            print(f"Failed to publish notification for task {task_data.get('task_id')}: publish buffer full")
+        return queued
+
+# One long-lived connection per process, owned by a background I/O thread
+notification_amqp = AmqpPublisher(
+    RABBITMQ_URL,
+    name="task-notifications",
+    exchanges=[('task_notifications', 'topic', False)],
+    max_buffer=int(os.getenv("AMQP_PUBLISH_BUFFER", "10000")),
+)
+notification_publisher = NotificationPublisher(notification_amqp)
+on_worker_init(notification_amqp.start)
+
+# Emails are queued in email_queue and sent by the notification service's dispatcher
+EMAIL_DISPATCHER = use_email_dispatcher(lambda: supabase, "task-email", os.getenv("EMAIL_DISPATCH_MODE", "off")) \
+    if EMAIL_SERVICE_AVAILABLE else None
+if EMAIL_DISPATCHER is not None:
+    on_worker_init(EMAIL_DISPATCHER.start)
+
+# Notifications are written to the outbox on the request path and delivered by its relay
+NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
+NOTIFICATION_OUTBOX = NotificationOutbox(
+    get_client=lambda: supabase,
+    get_users=lambda user_ids: USER_CACHE.get_many(user_ids),
+    send_email=send_notification_email if EMAIL_SERVICE_AVAILABLE else None,
+    realtime_url=NOTIFICATION_SERVICE_URL,
+    name="task-notification-outbox",
+    mode=os.getenv("OUTBOX_RELAY_MODE", "async"),
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "100")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+)
+# Each worker relays (rows are claimed with a lease, so workers never deliver the same row twice)
+on_worker_init(NOTIFICATION_OUTBOX.start)
+
+def queue_notifications(rows: List[Dict[str, Any]], execute=None) -> int:
+    """Write notification intents to the outbox; returns how many were queued"""
+    queued = NOTIFICATION_OUTBOX.enqueue(rows, execute=execute)
+    if rows and not queued:
+        print(f"❌ Failed to queue {len(rows)} notification(s)")
+    return queued
 
 # Helper functions
 def is_valid_uuid(value: str) -> bool:
@@ -296,21 +325,53 @@ def get_task_by_id(task_id: str) -> Optional[Dict[str, Any]]:
     except Exception:
         return None
 
+TASK_ACCESS_COLUMNS = "task_id, owner_id, collaborators, created_by"
+_load_task_access_rows = make_supabase_user_loader(
+    lambda: supabase, TASK_ACCESS_COLUMNS, table="task", key_field="task_id"
+)
+
+def load_task_access(task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Load owner, collaborators and creator for tasks (loader for TASK_ACCESS_CACHE)
+
+    Tasks created before the created_by column was backfilled fall back to their 'create' audit entry.
+    """
+    rows = {task_id: dict(row) for task_id, row in _load_task_access_rows(task_ids).items()}
+    missing_creator = [task_id for task_id, row in rows.items() if not row.get("created_by")]
+    if missing_creator:
+        logs = supabase.table("task_log").select("task_id, user_id, created_at").in_("task_id", missing_creator).eq("action", "create").execute()
+        for log in sorted(logs.data or [], key=lambda log: log.get("created_at") or "", reverse=True):
+            if log.get("task_id") in rows:
+                rows[log["task_id"]]["created_by"] = log.get("user_id")  # Oldest entry wins
+    return rows
+
+# Small LRU + TTL cache of access-relevant task fields; evicted on owner/collaborator changes and deletes
+TASK_ACCESS_CACHE = UserDirectoryCache(
+    load_task_access,
+    name="task_access",
+    max_size=int(os.getenv("TASK_ACCESS_CACHE_MAX_SIZE", "2000")),
+    ttl=int(os.getenv("TASK_ACCESS_CACHE_TTL", "600")),
+)
+
+def evict_task_access(task_ids: List[str], action: str = "updated") -> None:
+    """Drop tasks from TASK_ACCESS_CACHE (also the handler for task invalidation events)"""
+    TASK_ACCESS_CACHE.invalidate(*task_ids)
+
+def publish_task_change(task_ids: List[str], action: str = "updated") -> None:
+    """Evict changed tasks from this process's access cache and tell other replicas to do the same"""
+    evict_task_access(task_ids, action)
+    cache_events.publish("task", task_ids, action=action)
+
+def get_task_creator(task_id: str) -> Optional[str]:
+    """Return the ID of the user who created a task, from the access cache"""
+    entry = TASK_ACCESS_CACHE.get(task_id) if task_id else None
+    return entry.get("created_by") if entry else None
+
 def is_task_creator(task_id: str, user_id: str) -> bool:
-    """Check if user is the creator of the task by looking at audit logs"""
+    """Check if user is the creator of the task (task.created_by via the access cache)"""
     try:
-        response = supabase.table("task_log").select("user_id").eq("task_id", task_id).eq("action", "create").execute()
-        print(f"DEBUG is_task_creator: task_id={task_id}, user_id={user_id}")
-        print(f"DEBUG is_task_creator: create logs={response.data}")
-        if response.data and len(response.data) > 0:
-            creator_id = response.data[0].get("user_id")
-            is_creator = creator_id == user_id
-            print(f"DEBUG is_task_creator: creator_id={creator_id}, is_creator={is_creator}")
-            return is_creator
-        print(f"DEBUG is_task_creator: no create logs found")
-        return False
+        return bool(user_id) and get_task_creator(task_id) == user_id
     except Exception as e:
-        print(f"DEBUG is_task_creator: exception={e}")
+        logger.warning(f"Creator lookup failed for task {task_id}: {e}")
         return False
 
 def can_user_access_task(user_id: str, task_data: dict) -> dict:
@@ -335,8 +396,9 @@ def can_user_access_task(user_id: str, task_data: dict) -> dict:
     
     # Check if user is collaborator (includes managers who created the task)
     if user_id in collaborators:
-        # Check if this collaborator is also the creator (manager)
-        is_creator = is_task_creator(task_id, user_id)
+        # Check if this collaborator is also the creator (manager); rows that carry created_by need no lookup
+        created_by = task_data.get("created_by")
+        is_creator = created_by == user_id if created_by else is_task_creator(task_id, user_id)
         if is_creator:
             return {"can_view": True, "can_comment": True, "can_edit": False, "access_type": "creator"}
         else:
@@ -360,7 +422,96 @@ def get_subtasks_count(task_id: str) -> int:
     except:
         return 0
 
-def map_db_row_to_api(row: Dict[str, Any], include_subtasks_count: bool = False) -> Dict[str, Any]:
+SUBTASK_COUNT_BATCH_SIZE = 200  # Keeps the IN (...) list well inside URL length limits
+SUBTASK_COUNT_PAGE_SIZE = 1000  # PostgREST's default max rows per response
+
+def get_subtasks_counts(task_ids: List[str]) -> Dict[str, int]:
+    """
+    Count subtasks for many parent tasks: one grouped subtask_counts query per batch of IDs.
+
+    Without the function, falls back to reading the batch's parent_task_id column page by page
+    (a single response is capped at 1000 rows, which would undercount busy parents).
+    """
+    unique_ids = list(dict.fromkeys(filter(None, task_ids)))
+    counts = {task_id: 0 for task_id in unique_ids}
+    for start in range(0, len(unique_ids), SUBTASK_COUNT_BATCH_SIZE):
+        batch = unique_ids[start:start + SUBTASK_COUNT_BATCH_SIZE]
+        try:
+            response = supabase.rpc("subtask_counts", {"p_parent_ids": batch}).execute()
+            for row in response.data or []:
+                if row.get("parent_task_id") in counts:
+                    counts[row["parent_task_id"]] = int(row.get("subtasks_count") or 0)
+            continue
+        except Exception as e:
+            logger.warning(f"subtask_counts function unavailable, counting a column scan instead: {e}")
+        try:
+            offset = 0
+            while True:
+                page = (
+                    supabase.table("task")
+                    .select("parent_task_id")
+                    .in_("parent_task_id", batch)
+                    .eq("isSubtask", True)
+                    .order("task_id")
+                    .range(offset, offset + SUBTASK_COUNT_PAGE_SIZE - 1)
+                    .execute()
+                ).data or []
+                for row in page:
+                    parent_task_id = row.get("parent_task_id")
+                    if parent_task_id in counts:
+                        counts[parent_task_id] += 1
+                if len(page) < SUBTASK_COUNT_PAGE_SIZE:
+                    break
+                offset += SUBTASK_COUNT_PAGE_SIZE
+        except Exception as e:
+            logger.warning(f"Failed to count subtasks for {len(batch)} task(s): {e}")
+    return counts
+
+# API field name -> task table column, used by ?fields= sparse projections
+TASK_FIELD_COLUMNS = {
+    "id": "task_id",
+    "title": "title",
+    "description": "description",
+    "dueDate": "due_date",
+    "status": "status",
+    "priority": "priority",
+    "owner_id": "owner_id",
+    "project_id": "project_id",
+    "collaborators": "collaborators",
+    "isSubtask": "isSubtask",
+    "parent_task_id": "parent_task_id",
+    "recurrence": "recurrence",
+    "completedDate": "completed_date",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "subtasks_count": "isSubtask",
+}
+
+def parse_fields_param(raw_fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a ?fields=id,title,status list; None means every field"""
+    if not raw_fields or not raw_fields.strip():
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw_fields.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in TASK_FIELD_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(TASK_FIELD_COLUMNS)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+def build_task_select(fields: Optional[List[str]], default: str = "*", required: Optional[List[str]] = None) -> str:
+    """Build the Supabase select() column list for a sparse projection.
+
+    task_id and created_at are always selected because keyset pagination orders on them.
+    """
+    if not fields:
+        return default
+    columns = ["task_id", "created_at"] + (required or []) + [TASK_FIELD_COLUMNS[f] for f in fields]
+    return ",".join(dict.fromkeys(columns))
+
+def map_db_row_to_api(row: Dict[str, Any], include_subtasks_count: bool = False,
+                      fields: Optional[List[str]] = None,
+                      subtasks_counts: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
     # Parse collaborators to ensure it's always an array
     collaborators = row.get("collaborators") or []
     if isinstance(collaborators, str):
@@ -390,68 +541,256 @@ def map_db_row_to_api(row: Dict[str, Any], include_subtasks_count: bool = False)
     }
 
     # Optionally include subtasks count for parent tasks
-    if include_subtasks_count and not task_data["isSubtask"]:
-        task_data["subtasks_count"] = get_subtasks_count(task_data["id"])
+    if include_subtasks_count and not task_data["isSubtask"] and (not fields or "subtasks_count" in fields):
+        if subtasks_counts is not None:
+            task_data["subtasks_count"] = subtasks_counts.get(task_data["id"], 0)
+        else:
+            task_data["subtasks_count"] = get_subtasks_count(task_data["id"])
+
+    # Sparse projection - only emit the requested fields
+    if fields:
+        return {field: task_data[field] for field in fields if field in task_data}
 
     return task_data
 
+def map_rows_to_api(rows: List[Dict[str, Any]], include_subtasks_count: bool = False,
+                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Map a list of task rows, fetching subtask counts for all parents in one batched query"""
+    subtasks_counts = None
+    if include_subtasks_count and (not fields or "subtasks_count" in fields):
+        subtasks_counts = get_subtasks_counts([
+            row.get("task_id") for row in rows if not row.get("isSubtask")
+        ])
+    return [
+        map_db_row_to_api(row, include_subtasks_count, fields=fields, subtasks_counts=subtasks_counts)
+        for row in rows
+    ]
+
+def wants_subtasks_count(fields: Optional[List[str]]) -> bool:
+    """Whether a list request asked for subtask counts (?include_subtasks_count=true or fields=...,subtasks_count)"""
+    if request.args.get("include_subtasks_count", "false").lower() == "true":
+        return True
+    return bool(fields) and "subtasks_count" in fields
+
+def parse_collaborators(value: Any) -> List[str]:
+    """Normalize the collaborators column (JSON array or JSON string) to a list of user IDs"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except Exception:
+            return []
+    if not isinstance(value, list):
+        return []
+    return [user_id for user_id in value if user_id]
+
+def build_task_member_rows(task_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build task_member rows (owner first, then collaborators) for a task row"""
+    task_id = task_row.get("task_id")
+    if not task_id:
+        return []
+
+    rows = []
+    seen = set()
+    owner_id = task_row.get("owner_id")
+    if owner_id:
+        rows.append({"user_id": owner_id, "task_id": task_id, "role": "owner"})
+        seen.add(owner_id)
+
+    for collaborator_id in parse_collaborators(task_row.get("collaborators")):
+        if collaborator_id not in seen:
+            rows.append({"user_id": collaborator_id, "task_id": task_id, "role": "collaborator"})
+            seen.add(collaborator_id)
+    return rows
+
+def sync_task_members(task_row: Dict[str, Any]) -> bool:
+    """Rewrite the task_member index entries for a task after it is created or its people change"""
+    task_id = task_row.get("task_id") if task_row else None
+    if not task_id:
+        return False
+    try:
+        supabase.table("task_member").delete().eq("task_id", task_id).execute()
+        rows = build_task_member_rows(task_row)
+        if rows:
+            supabase.table("task_member").insert(rows).execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to sync task_member index for task {task_id}: {e}")
+        return False
+
+def sync_task_members_bulk(task_rows: List[Dict[str, Any]]) -> bool:
+    """Rewrite the task_member index entries for many tasks with one delete and one insert"""
+    task_ids = [row["task_id"] for row in task_rows if row and row.get("task_id")]
+    if not task_ids:
+        return True
+    try:
+        supabase.table("task_member").delete().in_("task_id", task_ids).execute()
+        rows = [member for row in task_rows if row for member in build_task_member_rows(row)]
+        if rows:
+            supabase.table("task_member").insert(rows).execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to sync task_member index for {len(task_ids)} task(s): {e}")
+        return False
+
+def remove_task_members(task_ids: List[str]) -> bool:
+    """Drop task_member index entries for deleted tasks"""
+    task_ids = [task_id for task_id in task_ids if task_id]
+    if not task_ids:
+        return True
+    try:
+        supabase.table("task_member").delete().in_("task_id", task_ids).execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to remove task_member index entries for {task_ids}: {e}")
+        return False
+
+def get_member_task_ids(user_id: str) -> Optional[List[str]]:
+    """Look up the IDs of tasks a user owns or collaborates on via the task_member index.
+
+    Returns None when the index is unavailable so callers can fall back to column queries.
+    """
+    try:
+        task_ids = []
+        start = 0
+        while True:  # Paged: PostgREST truncates a response at 1000 rows
+            page = (supabase.table("task_member").select("task_id").eq("user_id", user_id)
+                    .order("task_id").range(start, start + SWEEP_PAGE_SIZE - 1).execute().data or [])
+            task_ids.extend(row["task_id"] for row in page if row.get("task_id"))
+            if len(page) < SWEEP_PAGE_SIZE:
+                break
+            start += SWEEP_PAGE_SIZE
+        return list(dict.fromkeys(task_ids))
+    except Exception as e:
+        logger.warning(f"task_member index lookup failed for user {user_id}: {e}")
+        return None
+
+def filter_visible_tasks(accessible_tasks: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Apply the parent/subtask visibility rules to the tasks a user can access directly.
+
+    A subtask is shown as a standalone entry only when its parent is not accessible;
+    parents the user can access are always shown. Runs in one pass over a
+    parent_task_id -> [children] index, so cost is linear in the number of tasks.
+    """
+    children_by_parent: Dict[str, List[str]] = {}
+    for task_id, task in accessible_tasks.items():
+        parent_task_id = task.get("parent_task_id")
+        if parent_task_id:
+            children_by_parent.setdefault(parent_task_id, []).append(task_id)
+
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    visible_tasks = {}
+    for task_id, task in accessible_tasks.items():
+        parent_task_id = task.get("parent_task_id")
+        if parent_task_id and parent_task_id in accessible_tasks:
+            # User has access to both parent and subtask - show parent only, hide subtask
+            if debug_enabled:
+                logger.debug(f"Excluding subtask {task_id} (parent: {parent_task_id}) - user has access to parent")
+            continue
+
+        if debug_enabled:
+            if parent_task_id:
+                logger.debug(f"Including subtask {task_id} (parent: {parent_task_id}) - user has no access to parent")
+            else:
+                logger.debug(f"Including parent task {task_id} with {len(children_by_parent.get(task_id, []))} accessible subtask(s)")
+        visible_tasks[task_id] = task
+    return visible_tasks
+
+def insert_task_log_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Bulk insert audit rows into task_log"""
+    response = supabase.table("task_log").insert(rows).execute()
+    return response.data or []
+
+# Audit rows are written off the request path in batches; AUDIT_LOG_MODE=sync writes inline (used by tests)
+AUDIT_LOG_WRITER = BatchWriter(
+    insert_task_log_rows,
+    name="task_log_writer",
+    mode=os.getenv("AUDIT_LOG_MODE", "async"),
+    max_queue_size=int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("AUDIT_LOG_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "0.5")),
+)
+
+def build_task_log_row(task_id: str, action: str, field: str, user_id: str,
+                       old_value: Any, new_value: Any) -> Dict[str, Any]:
+    """Build a task_log row with JSONB-safe old/new values"""
+    if not user_id or user_id == 'None':
+        print(f"WARNING: Using 'system' user_id for task {task_id} action {action}")
+        user_id = 'system'
+
+    # Ensure values are JSON-serializable for JSONB storage
+    def make_json_serializable(value):
+        if value is None:
+            return None
+        elif isinstance(value, (str, int, float, bool)):
+            return value
+        elif isinstance(value, (dict, list)):
+            return value
+        else:
+            return str(value)
+
+    # Create proper JSON structure for JSONB columns
+    old_json = {field: make_json_serializable(old_value)} if not isinstance(old_value, (dict, list)) else old_value
+    new_json = {field: make_json_serializable(new_value)} if not isinstance(new_value, (dict, list)) else new_value
+
+    return {
+        "task_id": task_id,
+        "action": action,
+        "field": field,
+        "user_id": user_id,
+        "old_value": old_json,
+        "new_value": new_json,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
 def log_task_change(task_id: str, action: str, field: str, user_id: str,
                     old_value: Any, new_value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Record a task change in task_log.
+
+    In async mode the row is queued for the background writer and returned as queued;
+    in sync mode the inserted row is returned. Returns None if the entry could not be recorded.
+    """
     try:
         # Validate inputs
         if not task_id:
             print(f"ERROR: Cannot log task change - missing task_id")
             return None
+
+        logger.debug(f"AUDIT LOG: Task {task_id} - {action} on {field} by {user_id}")
+
+        log_data = build_task_log_row(task_id, action, field, user_id, old_value, new_value)
+        result = AUDIT_LOG_WRITER.submit(log_data)
         
-        if not user_id or user_id == 'None':
-            print(f"WARNING: Using 'system' user_id for task {task_id} action {action}")
-            user_id = 'system'
-        
-        print(f"📝 AUDIT LOG: Task {task_id} - {action} on {field} by {user_id}")
-        
-        # Ensure values are JSON-serializable for JSONB storage
-        def make_json_serializable(value):
-            if value is None:
-                return None
-            elif isinstance(value, (str, int, float, bool)):
-                return value
-            elif isinstance(value, (dict, list)):
-                return value
-            else:
-                return str(value)
-        
-        # Create proper JSON structure for JSONB columns
-        old_json = {field: make_json_serializable(old_value)} if not isinstance(old_value, (dict, list)) else old_value
-        new_json = {field: make_json_serializable(new_value)} if not isinstance(new_value, (dict, list)) else new_value
-        
-        log_data = {
-            "task_id": task_id,
-            "action": action,
-            "field": field,
-            "user_id": user_id,
-            "old_value": old_json,
-            "new_value": new_json,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        
-        print(f"📝 AUDIT LOG DATA: {log_data}")
-        
-        response = supabase.table("task_log").insert(log_data).execute()
-        
-        if not response.data:
+        if not result:
             print(f"ERROR: No data returned from task_log insert for task {task_id}")
-            print(f"Response: {response}")
             return None
         
-        print(f"✅ AUDIT LOG CREATED: {response.data[0].get('log_id')} for task {task_id}")
-        return response.data[0]
+        return result
         
     except Exception as exc:
         print(f"ERROR: Failed to log task change for {task_id}: {exc}")
-        import traceback
-        traceback.print_exc()
         return None
 
+def log_task_changes(entries: List[Dict[str, Any]]) -> int:
+    """
+    Record many task changes at once (used by bulk operations).
+
+    Each entry holds the log_task_change arguments. Returns the number of rows recorded.
+    """
+    rows = [
+        build_task_log_row(entry["task_id"], entry["action"], entry["field"], entry.get("user_id"),
+                           entry.get("old_value"), entry.get("new_value"))
+        for entry in entries if entry.get("task_id")
+    ]
+    if not rows:
+        return 0
+    try:
+        return AUDIT_LOG_WRITER.submit_many(rows)
+    except Exception as exc:
+        print(f"ERROR: Failed to log {len(rows)} bulk task change(s): {exc}")
+        return 0
+
 def validate_reminder_days(reminder_days: List[int]) -> bool:
     """Validate reminder days: must be between 1-10, max 5 reminders"""
     if not reminder_days or len(reminder_days) > 5:
@@ -495,26 +834,14 @@ def delete_old_notifications(task_id: str):
         print(f"Failed to delete old notifications: {e}")
 
 def get_user_email(user_id: str) -> Optional[str]:
-    """Get user email from database"""
-    try:
-        response = supabase.table("user").select("email").eq("user_id", user_id).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0].get("email")
-        return None
-    except Exception as e:
-        print(f"Failed to get user email: {e}")
-        return None
+    """Get user email from the user directory cache"""
+    user = get_cached_user(user_id)
+    return user.get("email") if user else None
 
 def get_user_role(user_id: str) -> Optional[str]:
-    """Get user role from database"""
-    try:
-        response = supabase.table("user").select("role").eq("user_id", user_id).execute()
-        if response.data and len(response.data) > 0:
-            return response.data[0].get("role")
-        return None
-    except Exception as e:
-        print(f"Failed to get user role: {e}")
-        return None
+    """Get user role from the user directory cache"""
+    user = get_cached_user(user_id)
+    return user.get("role") if user else None
 
 def is_staff_member(user_id: str) -> bool:
     """Check if user is a staff member (not Manager or Director)"""
@@ -594,8 +921,9 @@ def save_notification_preferences(user_id: str, task_id: str, email_enabled: boo
         traceback.print_exc()
         return False
 
-def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: str, commenter_name: str):
-    """Send notifications to users mentioned in a comment"""
+def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: str, commenter_name: str,
+                            comment_id: Optional[str] = None):
+    """Queue notifications for users mentioned in a comment (delivered by the notification outbox)"""
     print("="*80)
     print("🔔 NOTIFY_COMMENT_MENTIONS CALLED")
     print("="*80)
@@ -605,29 +933,8 @@ def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: st
     print(f"👤 Commenter Name: {commenter_name}")
 
     try:
-        # Extract @mentions from comment text using a simple approach
-        import re
-        # Find all @mentions by looking for @ followed by word characters
-        # This handles @zenia, @zenia2, @john, etc.
-        mention_pattern = r'@(\w+)'
-        mentioned_names = re.findall(mention_pattern, comment_text)
-        
-        # For usernames with spaces like "zenia 2", we need special handling
-        # Look for patterns like @zenia 2, @john doe, etc.
-        space_mention_pattern = r'@([a-zA-Z]+)\s+(\d+|[a-zA-Z]+)'
-        space_mentions = re.findall(space_mention_pattern, comment_text)
-        
-        # Add space mentions to the list
-        for space_mention in space_mentions:
-            if len(space_mention) == 2:
-                # Handle @zenia 2 -> "zenia 2"
-                combined_name = f"{space_mention[0]} {space_mention[1]}"
-                if combined_name not in mentioned_names:
-                    mentioned_names.append(combined_name)
-        
-        print(f"🔍 DEBUG: Comment text: '{comment_text}'")
-        print(f"🔍 DEBUG: Regex pattern: {mention_pattern}")
-        print(f"🔍 DEBUG: Found mentions: {mentioned_names}")
+        # Extract @mentions (@zenia, @zenia2 and two-word forms like "@zenia 2")
+        mentioned_names = extract_mention_names(comment_text)
         
         if not mentioned_names:
             print("ℹ️  No mentions found in comment")
@@ -635,34 +942,16 @@ def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: st
         
         print(f"📝 Found {len(mentioned_names)} mention(s): {mentioned_names}")
         
-        # Get all users from database to match names
-        all_users_response = supabase.table("user").select("user_id, name").execute()
-        if not all_users_response.data:
-            print("❌ Could not fetch users from database")
-            return
-        
-        # Create a mapping of names to user IDs (case-insensitive)
-        name_to_user_id = {}
-        print(f"🔍 DEBUG: All users in database:")
-        for user in all_users_response.data:
-            user_name = user.get('name', '').strip()
-            if user_name:
-                name_to_user_id[user_name.lower()] = user['user_id']
-                print(f"   - User: '{user_name}' (ID: {user['user_id']})")
-        
-        print(f"🔍 DEBUG: Name mapping: {name_to_user_id}")
-        
-        # Find user IDs for mentioned names
+        # Resolve names to user IDs from the in-memory name index (case-insensitive)
+        resolved_mentions = MENTION_INDEX.resolve(mentioned_names)
         mentioned_user_ids = []
         for mentioned_name in mentioned_names:
-            # Try exact match first, then case-insensitive
-            user_id = name_to_user_id.get(mentioned_name.lower())
+            user_id = resolved_mentions.get(mentioned_name)
             if user_id:
                 mentioned_user_ids.append(user_id)
                 print(f"✅ Matched mention '@{mentioned_name}' to user ID: {user_id}")
             else:
                 print(f"⚠️  Could not find user for mention '@{mentioned_name}'")
-                print(f"🔍 DEBUG: Available names: {list(name_to_user_id.keys())}")
         
         if not mentioned_user_ids:
             print("ℹ️  No valid user IDs found for mentions")
@@ -680,16 +969,17 @@ def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: st
         except:
             stakeholders = []
         
-        notifications_created = 0
+        # Truncate comment for notification
+        truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
+        comment_key = comment_id or str(uuid.uuid4())
+
+        outbox_rows = []
         for mentioned_user_id in mentioned_user_ids:
             # Skip if user mentioned themselves
             if mentioned_user_id == commenter_id:
                 print(f"⏭️  Skipping self-mention for user {mentioned_user_id}")
                 continue
-            
-            # Truncate comment for notification
-            truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
-            
+
             notification_data = {
                 "user_id": mentioned_user_id,
                 "title": f"You were mentioned in '{task_data['title']}'",
@@ -698,95 +988,29 @@ def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: st
                 "task_id": task_data["task_id"],
                 "due_date": task_data.get("due_date"),
                 "priority": "High",  # Mentions are high priority
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "is_read": False
             }
-            
-            print(f"📝 Creating mention notification for user {mentioned_user_id}")
-            
-            # Check notification preferences
-            prefs = get_notification_preferences(mentioned_user_id, task_data["task_id"])
-            
-            # Store in-app notification if enabled
-            if prefs.get("in_app_enabled", True):
-                try:
-                    # Check for duplicate within last 2 minutes
-                    existing_check = supabase.table("notifications").select("id").eq(
-                        "user_id", mentioned_user_id
-                    ).eq("task_id", task_data["task_id"]).eq("type", "task_mention").gte(
-                        "created_at", (datetime.now(timezone.utc) - timedelta(minutes=2)).isoformat()
-                    ).execute()
-                    
-                    if existing_check.data and len(existing_check.data) > 0:
-                        print(f"⏭️  Duplicate mention notification detected, skipping...")
-                        continue
-                    
-                    response = supabase.table("notifications").insert(notification_data).execute()
-                    
-                    if response.data:
-                        notifications_created += 1
-                        print(f"✅ Mention notification created! ID: {response.data[0].get('id')}")
-                        
-                        # Send real-time notification only for non-stakeholders
-                        # Stakeholders will get real-time notification from regular comment notification
-                        if mentioned_user_id not in stakeholders:
-                            try:
-                                notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                                realtime_data = {
-                                    "user_id": mentioned_user_id,
-                                    "title": notification_data["title"],
-                                    "message": notification_data["message"],
-                                    "type": notification_data["type"],
-                                    "task_id": notification_data.get("task_id"),
-                                    "created_at": notification_data["created_at"]
-                                }
-                                notif_response = requests.post(
-                                    f"{notification_service_url}/notifications/realtime",
-                                    json=realtime_data,
-                                    timeout=5,
-                                    headers={'Content-Type': 'application/json'}
-                                )
-                                print(f"   Real-time mention notification sent: {notif_response.status_code}")
-                            except Exception as e:
-                                print(f"⚠️  Failed to send real-time notification: {e}")
-                        else:
-                            print(f"⏭️  Skipping real-time mention notification for stakeholder {mentioned_user_id}")
-                
-                except Exception as insert_error:
-                    print(f"❌ Error creating mention notification: {insert_error}")
-                    import traceback
-                    traceback.print_exc()
-            
-            # Send email if enabled
-            print(f"🔍 DEBUG: Email check - prefs: {prefs}, EMAIL_SERVICE_AVAILABLE: {EMAIL_SERVICE_AVAILABLE}")
-            if prefs.get("email_enabled", True) and EMAIL_SERVICE_AVAILABLE:
-                user_email = get_user_email(mentioned_user_id)
-                print(f"🔍 DEBUG: User email for {mentioned_user_id}: {user_email}")
-                if user_email:
-                    try:
-                        print(f"📧 Sending mention email to {user_email}...")
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type="task_mention",
-                            task_title=task_data["title"],
-                            comment_text=truncated_comment,
-                            commenter_name=commenter_name,
-                            task_id=task_data["task_id"],
-                            due_date=task_data.get("due_date"),
-                            priority=task_data.get("priority", "Medium")
-                        )
-                        print(f"✅ Mention email sent to {user_email}")
-                    except Exception as e:
-                        print(f"❌ Failed to send mention email: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    print(f"⚠️  No email found for mentioned user {mentioned_user_id}")
-            else:
-                print(f"⏭️  Email notifications disabled for mentioned user {mentioned_user_id} (prefs: {prefs.get('email_enabled')}, service: {EMAIL_SERVICE_AVAILABLE})")
+
+            # Stakeholders get the real-time push from the regular comment notification
+            channels = [CHANNEL_IN_APP, CHANNEL_EMAIL] if mentioned_user_id in stakeholders else ALL_CHANNELS
+            outbox_rows.append(build_outbox_row(
+                notification_data,
+                make_idempotency_key("task_mention", comment_key, mentioned_user_id),
+                channels=channels,
+                email={
+                    "notification_type": "task_mention",
+                    "task_title": task_data["title"],
+                    "comment_text": truncated_comment,
+                    "commenter_name": commenter_name,
+                    "task_id": task_data["task_id"],
+                    "due_date": task_data.get("due_date"),
+                    "priority": task_data.get("priority", "Medium")
+                }
+            ))
+
+        notifications_created = queue_notifications(outbox_rows)
         
         print(f"\n{'='*80}")
-        print(f"📊 SUMMARY: Created {notifications_created} mention notification(s)")
+        print(f"📊 SUMMARY: Queued {notifications_created} mention notification(s)")
         print(f"{'='*80}\n")
     
     except Exception as e:
@@ -795,8 +1019,9 @@ def notify_comment_mentions(task_data: dict, comment_text: str, commenter_id: st
         traceback.print_exc()
         print(f"{'='*80}\n")
 
-def notify_task_comment(task_data: dict, comment_text: str, commenter_id: str, commenter_name: str):
-    """Send notification to all stakeholders when a comment is added to a task"""
+def notify_task_comment(task_data: dict, comment_text: str, commenter_id: str, commenter_name: str,
+                        comment_id: Optional[str] = None):
+    """Queue a notification for all stakeholders when a comment is added to a task (delivered by the notification outbox)"""
     print("="*80)
     print("🔔 NOTIFY_TASK_COMMENT CALLED")
     print("="*80)
@@ -827,18 +1052,18 @@ def notify_task_comment(task_data: dict, comment_text: str, commenter_id: str, c
 
         print(f"✅ Notifying {len(stakeholders)} stakeholder(s) about new comment on task {task_data.get('task_id')}")
 
-        notifications_created = 0
-        for stakeholder_id in stakeholders:
-            print(f"\n--- Processing stakeholder: {stakeholder_id} ---")
+        # Truncate comment for notification if too long
+        truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
+        comment_key = comment_id or str(uuid.uuid4())
 
+        # One outbox row per stakeholder; preferences are applied by the relay when delivering
+        outbox_rows = []
+        for stakeholder_id in stakeholders:
             # Skip the person who made the comment
             if stakeholder_id == commenter_id:
                 print(f"⏭️  Skipping notification for user {stakeholder_id} (they made the comment)")
                 continue
 
-            # Truncate comment for notification if too long
-            truncated_comment = comment_text[:100] + "..." if len(comment_text) > 100 else comment_text
-
             notification_data = {
                 "user_id": stakeholder_id,
                 "title": f"New comment on '{task_data['title']}'",
@@ -847,93 +1072,25 @@ def notify_task_comment(task_data: dict, comment_text: str, commenter_id: str, c
                 "task_id": task_data["task_id"],
                 "due_date": task_data.get("due_date"),
                 "priority": task_data.get("priority", "Medium"),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "is_read": False
             }
+            outbox_rows.append(build_outbox_row(
+                notification_data,
+                make_idempotency_key("task_comment", comment_key, stakeholder_id),
+                email={
+                    "notification_type": "task_comment",
+                    "task_title": task_data["title"],
+                    "comment_text": truncated_comment,
+                    "commenter_name": commenter_name,
+                    "task_id": task_data["task_id"],
+                    "due_date": task_data.get("due_date"),
+                    "priority": task_data.get("priority", "Medium")
+                }
+            ))
 
-            print(f"📝 Notification data prepared: {notification_data}")
-
-            # Check notification preferences
-            prefs = get_notification_preferences(stakeholder_id, task_data["task_id"])
-            print(f"⚙️  Notification preferences: email={prefs.get('email_enabled')}, in_app={prefs.get('in_app_enabled')}")
-
-            # Store in-app notification if enabled
-            if prefs.get("in_app_enabled", True):
-                try:
-                    # Check for existing notification to prevent duplicates (check within last 2 minutes)
-                    existing_check = supabase.table("notifications").select("id").eq("user_id", stakeholder_id).eq("task_id", task_data["task_id"]).eq("type", "task_comment").gte("created_at", (datetime.now(timezone.utc) - timedelta(minutes=2)).isoformat()).execute()
-                    
-                    if existing_check.data and len(existing_check.data) > 0:
-                        print(f"⏭️  Duplicate comment notification detected for user {stakeholder_id}, skipping...")
-                        continue
-                    
-                    print(f"💾 Inserting notification into database for user {stakeholder_id}...")
-                    response = supabase.table("notifications").insert(notification_data).execute()
-
-                    if response.data:
-                        notifications_created += 1
-                        print(f"✅ SUCCESS: Notification inserted! ID: {response.data[0].get('id')}")
-                        print(f"   Notification title: {notification_data['title']}")
-                        print(f"   For user: {stakeholder_id}")
-
-                        # Send real-time notification via WebSocket (if notification service is available)
-                        try:
-                            notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                            print(f"📡 Sending real-time notification via WebSocket")
-                            # Only send real-time notification, don't create another database entry
-                            realtime_data = {
-                                "user_id": stakeholder_id,
-                                "title": notification_data["title"],
-                                "message": notification_data["message"],
-                                "type": notification_data["type"],
-                                "task_id": notification_data.get("task_id"),
-                                "created_at": notification_data["created_at"]
-                            }
-                            # Send via WebSocket without creating duplicate database entry
-                            notif_response = requests.post(
-                                f"{notification_service_url}/notifications/realtime",
-                                json=realtime_data,
-                                timeout=5,
-                                headers={'Content-Type': 'application/json'}
-                            )
-                            print(f"   Real-time notification response: {notif_response.status_code}")
-                        except Exception as e:
-                            print(f"⚠️  Failed to send real-time notification: {e}")
-                    else:
-                        print(f"❌ ERROR: Supabase insert returned no data!")
-                        print(f"   Response: {response}")
-
-                except Exception as insert_error:
-                    print(f"❌ EXCEPTION during database insert: {insert_error}")
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print(f"⏭️  In-app notifications disabled for stakeholder {stakeholder_id}")
-
-            # Send email if enabled
-            if prefs.get("email_enabled", True) and EMAIL_SERVICE_AVAILABLE:
-                user_email = get_user_email(stakeholder_id)
-                if user_email:
-                    try:
-                        print(f"📧 Sending email to {user_email}...")
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type="task_comment",
-                            task_title=task_data["title"],
-                            comment_text=truncated_comment,
-                            commenter_name=commenter_name,
-                            task_id=task_data["task_id"],
-                            due_date=task_data.get("due_date"),
-                            priority=task_data.get("priority", "Medium")
-                        )
-                        print(f"✅ Email sent successfully to {user_email}")
-                    except Exception as e:
-                        print(f"❌ Failed to send email: {e}")
-                else:
-                    print(f"⚠️  No email found for stakeholder {stakeholder_id}")
+        notifications_created = queue_notifications(outbox_rows)
 
         print(f"\n{'='*80}")
-        print(f"📊 SUMMARY: Created {notifications_created} notification(s) for task comment")
+        print(f"📊 SUMMARY: Queued {notifications_created} notification(s) for task comment")
         print(f"{'='*80}\n")
 
     except Exception as e:
@@ -943,68 +1100,56 @@ def notify_task_comment(task_data: dict, comment_text: str, commenter_id: str, c
         print(f"{'='*80}\n")
 
 def calculate_next_due_date(current_due_date: str, recurrence: str) -> Optional[str]:
-    """Calculate the next due date based on recurrence pattern"""
+    """Calculate the next due date based on recurrence pattern (legacy keyword or rule string)"""
     try:
-        # Parse current due date
-        if isinstance(current_due_date, str):
-            current_date = datetime.strptime(current_due_date[:10], "%Y-%m-%d").date()
-        else:
-            current_date = current_due_date
-
-        # Calculate next date based on recurrence type
-        if recurrence == "daily":
-            next_date = current_date + timedelta(days=1)
-        elif recurrence == "weekly":
-            next_date = current_date + timedelta(weeks=1)
-        elif recurrence == "biweekly":
-            next_date = current_date + timedelta(weeks=2)
-        elif recurrence == "monthly":
-            # Add one month (handle month overflow)
-            month = current_date.month
-            year = current_date.year
-            if month == 12:
-                next_date = current_date.replace(year=year + 1, month=1)
-            else:
-                try:
-                    next_date = current_date.replace(month=month + 1)
-                except ValueError:
-                    # Handle day overflow (e.g., Jan 31 -> Feb 28/29)
-                    next_month = month + 1
-                    next_year = year
-                    if next_month > 12:
-                        next_month = 1
-                        next_year += 1
-                    # Get last day of next month
-                    if next_month == 12:
-                        last_day = 31
-                    else:
-                        last_day = (datetime(next_year, next_month + 1, 1) - timedelta(days=1)).day
-                    next_date = current_date.replace(year=next_year, month=next_month, day=min(current_date.day, last_day))
-        elif recurrence == "quarterly":
-            # Add 3 months
-            month = current_date.month
-            year = current_date.year
-            new_month = month + 3
-            new_year = year
-            while new_month > 12:
-                new_month -= 12
-                new_year += 1
-            try:
-                next_date = current_date.replace(year=new_year, month=new_month)
-            except ValueError:
-                # Handle day overflow
-                last_day = (datetime(new_year, new_month + 1 if new_month < 12 else 1, 1) - timedelta(days=1)).day
-                next_date = current_date.replace(year=new_year, month=new_month, day=min(current_date.day, last_day))
-        elif recurrence == "yearly":
-            next_date = current_date.replace(year=current_date.year + 1)
-        else:
+        rule = compile_rule(recurrence)
+        if rule is None:
             return None
-
-        return next_date.strftime("%Y-%m-%d")
+        next_date = rule.next_after(current_due_date)
+        return next_date.strftime("%Y-%m-%d") if next_date else None
     except Exception as e:
         print(f"Error calculating next due date: {e}")
         return None
 
+def next_recurrence_value(recurrence: str, steps: int = 1, anchor=None) -> str:
+    """
+    Recurrence value for an instance `steps` occurrences later.
+
+    COUNT rules change (the remaining count goes down), and monthly/yearly series anchored after
+    the 28th (the due date of the instance the steps start from) gain BYMONTHDAY, so Jan 31 ->
+    Feb 28 -> Mar 31 instead of drifting to the 28th. Other values are copied as-is, so legacy
+    keywords like 'weekly' stay readable.
+    """
+    rule = compile_rule(recurrence)
+    if rule is None:
+        return recurrence
+    anchored = rule.anchored(anchor) if anchor else rule
+    if anchored is rule and rule.count is None:
+        return recurrence
+    return anchored.advanced(steps).to_string()
+
+def get_open_recurrence_successors(task_id: str) -> List[str]:
+    """IDs of the not-yet-completed instances that follow a task in its recurring series"""
+    successor_ids = []
+    current_id = task_id
+    while len(successor_ids) < MAX_OCCURRENCES:
+        response = supabase.table("task").select("task_id, status").eq("recurrence_parent_id", current_id).limit(1).execute()
+        if not response.data:
+            break
+        current_id = response.data[0]["task_id"]
+        if response.data[0].get("status") != "Completed":
+            successor_ids.append(current_id)
+    return successor_ids
+
+def has_recurrence_successor(task_id: str) -> bool:
+    """True if the next instance of a recurring task already exists (e.g. created by materialization)"""
+    try:
+        response = supabase.table("task").select("task_id").eq("recurrence_parent_id", task_id).limit(1).execute()
+        return bool(response.data)
+    except Exception as e:
+        print(f"⚠️  Could not check for existing recurring instance of {task_id}: {e}")
+        return False
+
 def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
     """Create a new instance of a recurring task with the next due date"""
     try:
@@ -1016,6 +1161,11 @@ def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
         if not current_due_date:
             return None
 
+        # The next instance may already have been pre-created by the materialization job
+        if original_task.get("task_id") and has_recurrence_successor(original_task["task_id"]):
+            print(f"ℹ️  Next instance of recurring task {original_task['task_id']} already exists - skipping")
+            return None
+
         # Calculate next due date
         next_due_date = calculate_next_due_date(current_due_date, recurrence)
         if not next_due_date:
@@ -1031,9 +1181,12 @@ def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
             "owner_id": original_task.get("owner_id"),
             "project_id": original_task.get("project_id"),
             "collaborators": original_task.get("collaborators"),
-            "recurrence": recurrence,  # Preserve recurrence pattern
+            "recurrence": next_recurrence_value(recurrence, anchor=current_due_date),  # Preserve recurrence pattern
+            "recurrence_parent_id": original_task.get("task_id"),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
+        if original_task.get("created_by"):
+            new_task_data["created_by"] = original_task["created_by"]
         
         # BUSINESS LOGIC: When a recurring task is created and assigned to a STAFF member (not Manager/Director),
         # automatically set status to "Ongoing" instead of "Unassigned"
@@ -1051,6 +1204,7 @@ def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
         if response.data:
             created_task = response.data[0]
             task_id = created_task.get("task_id")
+            sync_task_members(created_task)
             
             print(f"✅ Created recurring task instance: {task_id} with due date {next_due_date}")
             
@@ -1139,6 +1293,8 @@ def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
                                 "isSubtask": True,
                                 "created_at": datetime.now(timezone.utc).isoformat()
                             }
+                            if original_subtask.get("created_by"):
+                                new_subtask_data["created_by"] = original_subtask["created_by"]
                             
                             # BUSINESS LOGIC: When a recurring subtask is created and assigned to a STAFF member (not Manager/Director),
                             # automatically set status to "Ongoing" instead of "Unassigned"
@@ -1156,6 +1312,7 @@ def create_recurring_task_instance(original_task: dict) -> Optional[dict]:
                             if subtask_response.data:
                                 new_subtask = subtask_response.data[0]
                                 new_subtask_id = new_subtask.get("task_id")
+                                sync_task_members(new_subtask)
                                 print(f"  ✅ Copied subtask: {new_subtask.get('title')} (ID: {new_subtask_id})")
                                 
                                 # Copy notification preferences for the subtask
@@ -1343,9 +1500,16 @@ def notify_collaborators_due_date_change(task_data: dict, old_due_date: str, new
         traceback.print_exc()
         print(f"{'='*80}\n")
 
-def notify_collaborators_due_date_change(task_data: dict, old_due_date: str, new_due_date: str, updated_by: str = None):
-    """Send notification to all stakeholders (owner + collaborators) when due date changes"""
+def notify_collaborators_due_date_change(task_data: dict, old_due_date: str, new_due_date: str, updated_by: str = None,
+                                         change_id: Optional[str] = None):
+    """
+    Queue a notification for all stakeholders (owner + collaborators) when the due date changes.
+
+    change_id identifies this change in the outbox keys (one is generated when omitted), so a later
+    change between the same two dates (A→B, B→A, A→B) is notified again.
+    """
     try:
+        change_key = change_id or str(uuid.uuid4())
         # Get all stakeholders (owner + collaborators)
         stakeholders = get_task_stakeholders(task_data)
 
@@ -1355,6 +1519,7 @@ def notify_collaborators_due_date_change(task_data: dict, old_due_date: str, new
 
         print(f"Notifying {len(stakeholders)} stakeholder(s) about due date change for task {task_data.get('task_id')}")
 
+        outbox_rows = []
         for stakeholder_id in stakeholders:
             # Skip the person who made the change
             if updated_by and stakeholder_id == updated_by:
@@ -1369,62 +1534,230 @@ def notify_collaborators_due_date_change(task_data: dict, old_due_date: str, new
                 "task_id": task_data["task_id"],
                 "due_date": new_due_date,
                 "priority": task_data.get("priority", 5),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "is_read": False
             }
+            outbox_rows.append(build_outbox_row(
+                notification_data,
+                make_idempotency_key("due_date_change", task_data["task_id"], stakeholder_id, old_due_date, new_due_date,
+                                     change_key),
+                email={
+                    "notification_type": "due_date_change",
+                    "task_title": task_data["title"],
+                    "due_date": new_due_date,
+                    "priority": task_data.get("priority", "Medium"),
+                    "task_id": task_data["task_id"],
+                    "old_due_date": old_due_date,
+                    "new_due_date": new_due_date
+                }
+            ))
 
-            # Check notification preferences
-            prefs = get_notification_preferences(stakeholder_id, task_data["task_id"])
-
-            # Store in-app notification if enabled
-            if prefs.get("in_app_enabled", True):
-                response = supabase.table("notifications").insert(notification_data).execute()
-                if response.data:
-                    print(f"✅ Sent due date change notification to stakeholder {stakeholder_id}")
-
-                    # Send real-time notification via WebSocket (without creating duplicate database entry)
-                    try:
-                        notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                        realtime_data = {
-                            "user_id": stakeholder_id,
-                            "title": notification_data["title"],
-                            "message": notification_data["message"],
-                            "type": notification_data["type"],
-                            "task_id": notification_data.get("task_id"),
-                            "created_at": notification_data["created_at"]
-                        }
-                        requests.post(
-                            f"{notification_service_url}/notifications/realtime",
-                            json=realtime_data,
-                            timeout=5,
-                            headers={'Content-Type': 'application/json'}
-                        )
-                    except Exception as e:
-                        print(f"Failed to send real-time notification: {e}")
-
-            # Send email if enabled
-            if prefs.get("email_enabled", True) and EMAIL_SERVICE_AVAILABLE:
-                user_email = get_user_email(stakeholder_id)
-                if user_email:
-                    try:
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type="due_date_change",
-                            task_title=task_data["title"],
-                            due_date=new_due_date,
-                            priority=task_data.get("priority", "Medium"),
-                            task_id=task_data["task_id"],
-                            old_due_date=old_due_date,
-                            new_due_date=new_due_date
-                        )
-                        print(f"📧 Email notification sent to stakeholder {user_email}")
-                    except Exception as e:
-                        print(f"Failed to send email to stakeholder: {e}")
+        queued = queue_notifications(outbox_rows)
+        print(f"✅ Queued {queued} due date change notification(s) for task {task_data.get('task_id')}")
     except Exception as e:
         print(f"Failed to notify stakeholders: {e}")
         import traceback
         traceback.print_exc()
 
+DEFAULT_REMINDER_DAYS = [7, 3, 1]
+MAX_REMINDER_DAY = 10  # validate_reminder_days caps custom reminders at 10 days before the due date
+SWEEP_PAGE_SIZE = 1000
+SWEEP_IN_BATCH_SIZE = 200  # Keeps IN (...) lists well inside URL length limits
+SWEEP_INSERT_BATCH_SIZE = 500
+REMINDER_TASK_COLUMNS = "task_id, title, due_date, priority, status, owner_id, collaborators"
+
+class SweepQueryCounter:
+    """Counts Supabase round trips made by one reminder sweep (or another batched read)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def execute(self, query):
+        self.count += 1
+        return query.execute()
+
+def parse_due_date(value: Any):
+    """Return the due date as a date (accepts YYYY-MM-DD strings, timestamps and date objects)"""
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+def reminder_type(reminder_day: int) -> str:
+    return f"reminder_{reminder_day}_days"
+
+def plan_due_date_reminders(tasks: List[Dict[str, Any]], reminder_days_by_task: Dict[str, List[int]],
+                            already_sent: set, preferences: Dict[tuple, Dict[str, Any]], today) -> List[Dict[str, Any]]:
+    """
+    Compute the reminders to send, in memory.
+
+    already_sent holds (task_id, user_id, type) tuples seen in the last 24 hours;
+    preferences maps (user_id, task_id) to notification_preferences rows (missing means both channels on).
+    Returns one plan item per (task, stakeholder) reminder.
+    """
+    plan = []
+    for task in tasks:
+        if not task.get("due_date") or task.get("status") == "Completed":
+            continue
+        due_date = parse_due_date(task["due_date"])
+        days_until_due = (due_date - today).days
+        reminder_days = reminder_days_by_task.get(task["task_id"]) or DEFAULT_REMINDER_DAYS
+        if days_until_due not in reminder_days:
+            continue
+
+        notification_type = reminder_type(days_until_due)
+        for stakeholder_id in get_task_stakeholders(task):
+            if (task["task_id"], stakeholder_id, notification_type) in already_sent:
+                continue
+            prefs = preferences.get((stakeholder_id, task["task_id"]), {})
+            plan.append({
+                "task": task,
+                "user_id": stakeholder_id,
+                "reminder_day": days_until_due,
+                "due_date": due_date,
+                "type": notification_type,
+                "in_app": prefs.get("in_app_enabled", True) is not False,
+                "email": prefs.get("email_enabled", True) is not False,
+            })
+    return plan
+
+def _select_in_batches(counter: SweepQueryCounter, build_query, ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Run build_query(batch) for each batch of ids, paging every batch with .range() until it is exhausted.
+
+    An IN batch can match many rows per id (e.g. one preference per user and task), and PostgREST
+    silently truncates responses at 1000 rows, so build_query must order its rows for stable pages.
+    """
+    rows = []
+    for start in range(0, len(ids), SWEEP_IN_BATCH_SIZE):
+        batch = ids[start:start + SWEEP_IN_BATCH_SIZE]
+        offset = 0
+        while True:
+            response = counter.execute(build_query(batch).range(offset, offset + SWEEP_PAGE_SIZE - 1))
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < SWEEP_PAGE_SIZE:
+                break
+            offset += SWEEP_PAGE_SIZE
+    return rows
+
+def load_reminder_candidates(counter: SweepQueryCounter, today) -> List[Dict[str, Any]]:
+    """Tasks due within the reminder window (1..MAX_REMINDER_DAY days from today) that are not completed"""
+    window_start = (today + timedelta(days=1)).isoformat()
+    window_end = (today + timedelta(days=MAX_REMINDER_DAY + 1)).isoformat()
+    tasks = []
+    start = 0
+    while True:
+        response = counter.execute(
+            supabase.table("task").select(REMINDER_TASK_COLUMNS)
+            .gte("due_date", window_start).lt("due_date", window_end).neq("status", "Completed")
+            .order("task_id").range(start, start + SWEEP_PAGE_SIZE - 1)
+        )
+        page = response.data or []
+        tasks.extend(page)
+        if len(page) < SWEEP_PAGE_SIZE:
+            return tasks
+        start += SWEEP_PAGE_SIZE
+
+def deliver_reminders(plan: List[Dict[str, Any]], counter: SweepQueryCounter) -> Dict[str, int]:
+    """Queue one outbox row per planned reminder with bulk upserts, then publish the RabbitMQ events"""
+    rows = []
+    for item in plan:
+        channels = ([CHANNEL_IN_APP, CHANNEL_REALTIME] if item["in_app"] else []) + ([CHANNEL_EMAIL] if item["email"] else [])
+        due_date_text = item["due_date"].strftime('%B %d, %Y')
+        rows.append(build_outbox_row(
+            {
+                "user_id": item["user_id"],
+                "title": f"Task Due in {item['reminder_day']} Day{'s' if item['reminder_day'] != 1 else ''}",
+                "message": f"Task '{item['task']['title']}' is due on {due_date_text}",
+                "type": item["type"],
+                "task_id": item["task"]["task_id"],
+                "due_date": item["task"]["due_date"],
+                "priority": item["task"].get("priority", 5),
+            },
+            # One reminder per task, user, reminder day and due date, however often the sweep runs
+            make_idempotency_key("reminder", item["task"]["task_id"], item["user_id"], item["type"], item["task"]["due_date"]),
+            channels=channels,
+            email={
+                "notification_type": item["type"],
+                "task_title": item["task"]["title"],
+                "due_date": due_date_text,
+                "priority": item["task"].get("priority", 5),
+                "task_id": item["task"]["task_id"]
+            }
+        ))
+
+    queued = 0
+    for start in range(0, len(rows), SWEEP_INSERT_BATCH_SIZE):
+        queued += queue_notifications(rows[start:start + SWEEP_INSERT_BATCH_SIZE], execute=counter.execute)
+
+    # One RabbitMQ event per task reminder (not per stakeholder)
+    published = set()
+    for item in plan:
+        key = (item["task"]["task_id"], item["reminder_day"])
+        if item["in_app"] and key not in published:
+            published.add(key)
+            notification_publisher.publish_due_date_notification(item["task"], item["reminder_day"])
+
+    return {"queued": queued, "emails": sum(1 for item in plan if item["email"])}
+
+def run_due_date_sweep(tasks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Send due-date reminders with a fixed number of queries.
+
+    1. Select tasks due within the reminder window (or use the given tasks)
+    2. Bulk-load reminder days, reminders sent in the last 24 hours and notification preferences with IN queries
+    3. Plan the sends in memory
+    4. Bulk-write the reminders to the notification outbox (delivered by its relay)
+    Returns counters for the run, including the number of Supabase queries.
+    """
+    started = time.perf_counter()
+    counter = SweepQueryCounter()
+    today = datetime.now(timezone.utc).date()
+
+    if tasks is None:
+        tasks = load_reminder_candidates(counter, today)
+    else:
+        # Skip the lookups entirely for tasks outside the reminder window
+        tasks = [task for task in tasks if task.get("due_date")
+                 and 1 <= (parse_due_date(task["due_date"]) - today).days <= MAX_REMINDER_DAY]
+    task_ids = [task["task_id"] for task in tasks if task.get("task_id")]
+
+    reminder_days_by_task: Dict[str, List[int]] = {}
+    if task_ids:
+        for row in _select_in_batches(counter, lambda batch: supabase.table("task_reminder_preferences")
+                                      .select("task_id, reminder_days").in_("task_id", batch).order("task_id"), task_ids):
+            if row.get("reminder_days"):
+                reminder_days_by_task[row["task_id"]] = row["reminder_days"]
+
+    # Only tasks with a reminder due today need duplicate and preference checks
+    due_task_ids = list({item["task"]["task_id"] for item in plan_due_date_reminders(tasks, reminder_days_by_task, set(), {}, today)})
+
+    already_sent = set()
+    preferences: Dict[tuple, Dict[str, Any]] = {}
+    if due_task_ids:
+        yesterday = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
+        for row in _select_in_batches(counter, lambda batch: supabase.table("notifications")
+                                      .select("task_id, user_id, type").in_("task_id", batch)
+                                      .like("type", "reminder_%").gte("created_at", yesterday).order("id"), due_task_ids):
+            already_sent.add((row.get("task_id"), row.get("user_id"), row.get("type")))
+        for row in _select_in_batches(counter, lambda batch: supabase.table("notification_preferences")
+                                      .select("user_id, task_id, email_enabled, in_app_enabled").in_("task_id", batch)
+                                      .order("task_id").order("user_id"), due_task_ids):
+            preferences[(row.get("user_id"), row.get("task_id"))] = row
+
+    plan = plan_due_date_reminders(tasks, reminder_days_by_task, already_sent, preferences, today)
+    delivered = deliver_reminders(plan, counter) if plan else {"queued": 0, "emails": 0}
+
+    result = {
+        "tasks_checked": len(tasks),
+        "tasks_due_for_reminder": len(due_task_ids),
+        "reminders_planned": len(plan),
+        "notifications_queued": delivered["queued"],
+        "emails_queued": delivered["emails"],
+        "queries": counter.count,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+    print(f"⏰ Due-date sweep: {result}")
+    return result
+
 def check_and_send_due_date_notifications(task_data: dict):
     """Check if task needs due date notifications and send them to ALL stakeholders"""
     if not task_data.get("due_date"):
@@ -1436,152 +1769,293 @@ def check_and_send_due_date_notifications(task_data: dict):
         return
 
     try:
-        # Handle different date formats
-        due_date_str = task_data["due_date"]
-        if isinstance(due_date_str, str):
-            # Handle both YYYY-MM-DD and full timestamp formats
-            due_date = datetime.strptime(due_date_str[:10], "%Y-%m-%d").date()
-        else:
-            due_date = due_date_str
+        return run_due_date_sweep([task_data])
+    except Exception as e:
+        print(f"Error checking due date notifications: {e}")
 
-        today = datetime.now(timezone.utc).date()
-        days_until_due = (due_date - today).days
+# Recurring instances pre-created ahead of time by POST /tasks/recurring/materialize
+RECURRING_WINDOW_DAYS = int(os.getenv("RECURRING_MATERIALIZE_WINDOW_DAYS", "14"))
+MAX_RECURRING_WINDOW_DAYS = 366
+RECURRING_COPY_FIELDS = ("title", "description", "priority", "owner_id", "project_id", "collaborators", "created_by")
 
-        print(f"Task {task_data.get('task_id')}: Due date {due_date}, days until due: {days_until_due}")
+def load_recurring_series_heads(counter: SweepQueryCounter, horizon) -> List[Dict[str, Any]]:
+    """
+    Open recurring parent tasks due before the horizon that have no next instance yet.
 
-        # Get ALL stakeholders (owner + collaborators)
-        stakeholders = get_task_stakeholders(task_data)
-        if not stakeholders:
-            print(f"No stakeholders found for task {task_data.get('task_id')}")
-            return
+    These are the latest instance of each series; earlier instances already point to a successor.
+    """
+    tasks = []
+    start = 0
+    while True:
+        response = counter.execute(
+            supabase.table("task").select("*").not_.is_("recurrence", "null")
+            .neq("status", "Completed").lte("due_date", horizon.isoformat())
+            .order("task_id").range(start, start + SWEEP_PAGE_SIZE - 1)
+        )
+        page = response.data or []
+        tasks.extend(task for task in page if not task.get("isSubtask") and task.get("due_date"))
+        if len(page) < SWEEP_PAGE_SIZE:
+            break
+        start += SWEEP_PAGE_SIZE
+
+    task_ids = [task["task_id"] for task in tasks]
+    has_successor = {
+        row.get("recurrence_parent_id")
+        for row in _select_in_batches(counter, lambda batch: supabase.table("task")
+                                      .select("recurrence_parent_id").in_("recurrence_parent_id", batch).order("task_id"), task_ids)
+    }
+    return [task for task in tasks if task["task_id"] not in has_successor]
 
-        print(f"Will send reminders to {len(stakeholders)} stakeholder(s): {stakeholders}")
+def plan_recurring_instances(heads: List[Dict[str, Any]], horizon, staff_by_user: Dict[str, bool]) -> List[Dict[str, Any]]:
+    """
+    Build the rows for every occurrence of each series up to the horizon, in memory.
 
-        # Get custom reminder days from task_reminder_preferences or use default [7, 3, 1]
-        reminder_days = [7, 3, 1]  # Default
+    Each new row gets its task_id up front so the chain (recurrence_parent_id) can be
+    inserted in one statement. Returns plan items {"head", "row", "steps"}.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    plan = []
+    for head in heads:
         try:
-            prefs_response = supabase.table("task_reminder_preferences").select("reminder_days").eq("task_id", task_data["task_id"]).execute()
-            if prefs_response.data and len(prefs_response.data) > 0:
-                reminder_days = prefs_response.data[0].get("reminder_days", [7, 3, 1])
-                print(f"Using custom reminder days for task {task_data.get('task_id')}: {reminder_days}")
-        except Exception as e:
-            print(f"Failed to fetch custom reminder days, using default: {e}")
+            rule = compile_rule(head["recurrence"])
+            rule = rule.anchored(head["due_date"]) if rule else None
+        except ValueError as e:
+            print(f"⚠️  Skipping task {head['task_id']}: invalid recurrence '{head['recurrence']}' ({e})")
+            continue
+        if rule is None:
+            continue
+
+        parent_id = head["task_id"]
+        for steps, due_date in enumerate(rule.occurrences(head["due_date"], until=horizon), start=1):
+            row = {field: head.get(field) for field in RECURRING_COPY_FIELDS}
+            row.update({
+                "task_id": str(uuid.uuid4()),
+                "due_date": due_date.isoformat(),
+                "status": "Ongoing" if staff_by_user.get(head.get("owner_id")) else "Unassigned",
+                "recurrence": next_recurrence_value(head["recurrence"], steps, anchor=head["due_date"]),
+                "recurrence_parent_id": parent_id,
+                "created_at": now,
+            })
+            if row.get("priority") is None:
+                row["priority"] = 5
+            if not row.get("created_by"):
+                row.pop("created_by")
+            plan.append({"head": head, "row": row, "steps": steps})
+            parent_id = row["task_id"]
+    return plan
+
+def plan_recurring_subtasks(plan: List[Dict[str, Any]], subtasks_by_parent: Dict[str, List[Dict[str, Any]]],
+                            staff_by_user: Dict[str, bool]) -> List[Dict[str, Any]]:
+    """Copy each series' subtasks onto its new instances, keeping their offset from the parent's due date"""
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for item in plan:
+        head, instance = item["head"], item["row"]
+        for subtask in subtasks_by_parent.get(head["task_id"], []):
+            due_date = instance["due_date"]
+            if subtask.get("due_date"):
+                offset = parse_due_date(subtask["due_date"]) - parse_due_date(head["due_date"])
+                due_date = (parse_due_date(instance["due_date"]) + offset).isoformat()
+            row = {field: subtask.get(field) for field in RECURRING_COPY_FIELDS}
+            row.update({
+                "task_id": str(uuid.uuid4()),
+                "due_date": due_date,
+                "status": "Ongoing" if staff_by_user.get(subtask.get("owner_id")) else "Unassigned",
+                "parent_task_id": instance["task_id"],
+                "isSubtask": True,
+                "created_at": now,
+            })
+            if row.get("priority") is None:
+                row["priority"] = 5
+            if not row.get("created_by"):
+                row.pop("created_by")
+            rows.append({"source_id": subtask["task_id"], "row": row})
+    return rows
+
+def materialize_recurring_instances(window_days: int = RECURRING_WINDOW_DAYS, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Pre-create recurring task instances due within the next window_days.
 
-        for reminder_day in reminder_days:
-            if days_until_due == reminder_day:
-                print(f"Sending {reminder_day}-day reminder for task {task_data.get('task_id')}")
+    Works set-wise: one paged select for the series, IN queries for successors, subtasks and
+    preferences, then bulk inserts. Completing an instance whose successor already exists
+    does not create another one, so this can run alongside the on-completion path.
+    """
+    started = time.perf_counter()
+    counter = SweepQueryCounter()
+    horizon = datetime.now(timezone.utc).date() + timedelta(days=window_days)
+
+    heads = load_recurring_series_heads(counter, horizon)
+    head_ids = [head["task_id"] for head in heads]
+    subtasks_by_parent: Dict[str, List[Dict[str, Any]]] = {}
+    for subtask in _select_in_batches(counter, lambda batch: supabase.table("task").select("*")
+                                      .in_("parent_task_id", batch).eq("isSubtask", True).order("task_id"), head_ids):
+        subtasks_by_parent.setdefault(subtask["parent_task_id"], []).append(subtask)
+
+    owner_ids = [head.get("owner_id") for head in heads]
+    owner_ids += [subtask.get("owner_id") for subtasks in subtasks_by_parent.values() for subtask in subtasks]
+    USER_CACHE.get_many(owner_ids)  # One load for every owner; the role checks below hit memory
+    staff_by_user = {user_id: is_staff_member(user_id) for user_id in set(filter(None, owner_ids))}
+
+    plan = plan_recurring_instances(heads, horizon, staff_by_user)
+    subtask_plan = plan_recurring_subtasks(plan, subtasks_by_parent, staff_by_user)
+    result = {
+        "window_days": window_days,
+        "horizon": horizon.isoformat(),
+        "series_checked": len(heads),
+        "series_extended": len({item["head"]["task_id"] for item in plan}),
+        "instances_planned": len(plan),
+        "subtasks_planned": len(subtask_plan),
+        "instances_created": 0,
+        "subtasks_created": 0,
+        "dry_run": dry_run,
+    }
+    if dry_run or not plan:
+        if dry_run:
+            result["instances"] = [
+                {"parent_task_id": item["row"]["recurrence_parent_id"], "task_id": item["row"]["task_id"],
+                 "due_date": item["row"]["due_date"]}
+                for item in plan
+            ]
+        result["queries"] = counter.count
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    # Chains are contiguous and in order, so every row's parent is in the same or an earlier batch
+    created: List[Dict[str, Any]] = []
+    rows = [item["row"] for item in plan] + [item["row"] for item in subtask_plan]
+    for start in range(0, len(rows), SWEEP_INSERT_BATCH_SIZE):
+        response = counter.execute(supabase.table("task").insert(rows[start:start + SWEEP_INSERT_BATCH_SIZE]))
+        created.extend(response.data or [])
+    created_ids = {row.get("task_id") for row in created}
+    result["instances_created"] = sum(1 for item in plan if item["row"]["task_id"] in created_ids)
+    result["subtasks_created"] = sum(1 for item in subtask_plan if item["row"]["task_id"] in created_ids)
+    sync_task_members_bulk(created)
+
+    # Copy reminder and notification preferences from the task each row was generated from
+    source_by_new_id = {item["row"]["task_id"]: item["head"]["task_id"] for item in plan}
+    source_by_new_id.update({item["row"]["task_id"]: item["source_id"] for item in subtask_plan})
+    source_ids = list(set(source_by_new_id.values()))
+    try:
+        reminder_days = {
+            row["task_id"]: row["reminder_days"]
+            for row in _select_in_batches(counter, lambda batch: supabase.table("task_reminder_preferences")
+                                          .select("task_id, reminder_days").in_("task_id", batch).order("task_id"), source_ids)
+            if row.get("reminder_days")
+        }
+        notification_prefs: Dict[str, List[Dict[str, Any]]] = {}
+        for row in _select_in_batches(counter, lambda batch: supabase.table("notification_preferences")
+                                      .select("user_id, task_id, email_enabled, in_app_enabled").in_("task_id", batch)
+                                      .order("task_id").order("user_id"), source_ids):
+            notification_prefs.setdefault(row["task_id"], []).append(row)
+
+        now = datetime.now(timezone.utc).isoformat()
+        reminder_rows = [
+            {"task_id": new_id, "reminder_days": reminder_days[source_id]}
+            for new_id, source_id in source_by_new_id.items() if new_id in created_ids and source_id in reminder_days
+        ]
+        preference_rows = [
+            {"user_id": pref["user_id"], "task_id": new_id, "email_enabled": pref.get("email_enabled", True),
+             "in_app_enabled": pref.get("in_app_enabled", True), "updated_at": now}
+            for new_id, source_id in source_by_new_id.items() if new_id in created_ids
+            for pref in notification_prefs.get(source_id, [])
+        ]
+        for table, table_rows in (("task_reminder_preferences", reminder_rows), ("notification_preferences", preference_rows)):
+            for start in range(0, len(table_rows), SWEEP_INSERT_BATCH_SIZE):
+                counter.execute(supabase.table(table).insert(table_rows[start:start + SWEEP_INSERT_BATCH_SIZE]))
+    except Exception as e:
+        print(f"⚠️  Failed to copy preferences to materialized instances: {e}")
+
+    log_task_changes([
+        {
+            "task_id": item["row"]["task_id"],
+            "action": "create",
+            "field": "recurring_instance",
+            "user_id": "system",
+            "new_value": {
+                "parent_recurrence_id": item["row"]["recurrence_parent_id"],
+                "recurrence_type": item["row"]["recurrence"],
+                "due_date": item["row"]["due_date"],
+                "materialized": True,
+            },
+        }
+        for item in plan if item["row"]["task_id"] in created_ids
+    ])
 
-                # Send reminder to EACH stakeholder
-                for stakeholder_id in stakeholders:
-                    # Check if we already sent this reminder to this specific user (with multiple checks to prevent race conditions)
-                    try:
-                        # Check for existing notifications within the last 24 hours to prevent duplicates
-                        yesterday = datetime.now(timezone.utc) - timedelta(hours=24)
-                        existing_check = supabase.table("notifications").select("id").eq("task_id", task_data["task_id"]).eq("user_id", stakeholder_id).eq("type", f"reminder_{reminder_day}_days").gte("created_at", yesterday.isoformat()).execute()
-                        if existing_check.data and len(existing_check.data) > 0:
-                            print(f"⏭️  Reminder already exists for stakeholder {stakeholder_id} for task {task_data.get('task_id')} within last 24 hours - skipping to prevent duplicate")
-                            continue
-                    except Exception as e:
-                        print(f"Error checking existing notifications: {e}")
-                        # If check fails, skip to be safe and avoid duplicates
-                        continue
+    result["queries"] = counter.count
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    print(f"🔁 Recurring materialization: {result}")
+    return result
 
-                    # Check notification preferences for this stakeholder
-                    prefs = get_notification_preferences(stakeholder_id, task_data["task_id"])
-                    print(f"Notification preferences for stakeholder {stakeholder_id}, task {task_data.get('task_id')}: {prefs}")
-
-                    # Create notification directly in database first (only if in-app enabled)
-                    if prefs.get("in_app_enabled", True):
-                        notification_data = {
-                            "user_id": stakeholder_id,
-                            "title": f"Task Due in {reminder_day} Day{'s' if reminder_day != 1 else ''}",
-                            "message": f"Task '{task_data['title']}' is due on {due_date.strftime('%B %d, %Y')}",
-                            "type": f"reminder_{reminder_day}_days",
-                            "task_id": task_data["task_id"],
-                            "due_date": task_data["due_date"],
-                            "priority": task_data.get("priority", 5),
-                            "created_at": datetime.now(timezone.utc).isoformat(),
-                            "is_read": False
-                        }
-
-                        # Store in notifications table directly
-                        try:
-                            response = supabase.table("notifications").insert(notification_data).execute()
-                            if response.data:
-                                print(f"✅ Successfully stored {reminder_day}-day notification for stakeholder {stakeholder_id}")
+# Keyset pagination helpers - pages are ordered by (created_at, task_id) descending
+MAX_PAGE_SIZE = 500
 
-                                # Publish to RabbitMQ for real-time delivery
-                                notification_publisher.publish_due_date_notification(task_data, reminder_day)
+def encode_task_cursor(row: Dict[str, Any]) -> Optional[str]:
+    """Encode the (created_at, task_id) position of a row as an opaque cursor"""
+    if not row or not row.get("created_at") or not row.get("task_id"):
+        return None
+    payload = json.dumps({"c": row["created_at"], "t": row["task_id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
 
-                                # Send real-time notification via WebSocket (without creating duplicate database entry)
-                                try:
-                                    notification_service_url = os.getenv("NOTIFICATION_SERVICE_URL", "http://localhost:8084")
-                                    realtime_data = {
-                                        "user_id": stakeholder_id,
-                                        "title": notification_data["title"],
-                                        "message": notification_data["message"],
-                                        "type": notification_data["type"],
-                                        "task_id": notification_data.get("task_id"),
-                                        "created_at": notification_data["created_at"]
-                                    }
-                                    notif_response = requests.post(
-                                        f"{notification_service_url}/notifications/realtime",
-                                        json=realtime_data,
-                                        timeout=5,
-                                        headers={'Content-Type': 'application/json'}
-                                    )
-                                    if notif_response.ok:
-                                        print(f"Successfully sent real-time notification for stakeholder {stakeholder_id}")
-                                    else:
-                                        print(f"Real-time notification service returned status {notif_response.status_code}")
-                                except requests.exceptions.RequestException as e:
-                                    print(f"Failed to send real-time notification: {e}")
-                                    # Continue anyway since we stored in DB
-                            else:
-                                print(f"Failed to store in-app notification in database for stakeholder {stakeholder_id}")
-                        except Exception as e:
-                            print(f"Error storing in-app notification: {e}")
-                    else:
-                        print(f"In-app notifications disabled for stakeholder {stakeholder_id}")
-
-                    # Send email if enabled (separate from in-app)
-                    if prefs.get("email_enabled", True):
-                        if not EMAIL_SERVICE_AVAILABLE:
-                            print(f"Email service not available, skipping email for stakeholder {stakeholder_id}")
-                        else:
-                            user_email = get_user_email(stakeholder_id)
-                            if user_email:
-                                try:
-                                    print(f"Sending email notification to {user_email} for {reminder_day}-day reminder")
-                                    send_notification_email(
-                                        user_email=user_email,
-                                        notification_type=f"reminder_{reminder_day}_days",
-                                        task_title=task_data["title"],
-                                        due_date=due_date.strftime('%B %d, %Y'),
-                                        priority=task_data.get("priority", 5),
-                                        task_id=task_data["task_id"]
-                                    )
-                                    print(f"✅ Email notification sent successfully to {user_email}")
-                                except Exception as e:
-                                    print(f"❌ Failed to send email notification: {e}")
-                                    import traceback
-                                    traceback.print_exc()
-                            else:
-                                print(f"No email found for stakeholder {stakeholder_id}")
-                    else:
-                        print(f"Email notifications disabled for stakeholder {stakeholder_id}")
-    
-    except Exception as e:
-        print(f"Error checking due date notifications: {e}")
+def decode_task_cursor(cursor: str) -> Dict[str, str]:
+    """Decode an opaque cursor back into its (created_at, task_id) position"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        created_at, task_id = payload["c"], payload["t"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(task_id, str) or '"' in created_at + task_id:
+        raise ValueError("Invalid cursor")
+    return {"created_at": created_at, "task_id": task_id}
+
+def get_page_params(default_page_size: Optional[int] = None) -> tuple:
+    """Read ?cursor= and ?page_size= (or the older ?limit=) from the request"""
+    cursor = request.args.get("cursor", default=None, type=str)
+    page_size = request.args.get("page_size", default=None, type=int)
+    if page_size is None:
+        page_size = request.args.get("limit", default=default_page_size, type=int)
+    if cursor and not page_size:
+        page_size = MAX_PAGE_SIZE
+    if page_size is not None:
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    cursor_position = decode_task_cursor(cursor) if cursor else None
+    return cursor_position, page_size
+
+def fetch_task_page(query, cursor_position: Optional[Dict[str, str]], page_size: Optional[int]) -> tuple:
+    """
+    Run a task query as one keyset page.
+
+    Returns (rows, next_cursor). Without a page size the query is unbounded and next_cursor is None.
+    """
+    if cursor_position:
+        created_at = cursor_position["created_at"]
+        task_id = cursor_position["task_id"]
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",task_id.lt."{task_id}")'
+        )
+    query = query.order("created_at", desc=True).order("task_id", desc=True)
+    if page_size:
+        # Fetch one extra row to learn whether another page exists
+        query = query.limit(page_size + 1)
+
+    rows: List[Dict[str, Any]] = query.execute().data or []
+    next_cursor = None
+    if page_size and len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_task_cursor(rows[-1])
+    return rows, next_cursor
 
 # API Routes
 
-@app.route("/tasks", methods=["GET"])
+@api.route("/tasks", methods=["GET"])
 def get_tasks():
     """
     GET /tasks - Retrieve tasks with optional filtering
     Query parameters:
-    - limit: Maximum number of tasks to return
+    - limit / page_size: Maximum number of tasks to return per page
+    - cursor: Opaque cursor from a previous response's next_cursor
+    - fields: Comma-separated API fields to return (e.g. id,title,status,dueDate,priority)
+    - include_subtasks_count: true to add subtasks_count to parent tasks (one batched query)
     - owner_id: Filter by owner ID
     - task_id: Get specific task by ID
     - status: Filter by status
@@ -1590,7 +2064,11 @@ def get_tasks():
     """
     try:
         # Parse query parameters
-        limit_param = request.args.get("limit", default=None, type=int)
+        try:
+            cursor_position, page_size = get_page_params()
+            fields = parse_fields_param(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         owner_id = request.args.get("owner_id", default=None, type=str)
         task_id = request.args.get("task_id", default=None, type=str)
         status = request.args.get("status", default=None, type=str)
@@ -1601,13 +2079,13 @@ def get_tasks():
         query = (
             supabase
             .table("task")
-            .select("task_id,title,due_date,status,priority,description,created_at,updated_at,owner_id,project_id,collaborators,isSubtask,parent_task_id,recurrence,completed_date")
-            .order("created_at", desc=True)
+            .select(build_task_select(
+                fields,
+                default="task_id,title,due_date,status,priority,description,created_at,updated_at,owner_id,project_id,collaborators,isSubtask,parent_task_id,recurrence,completed_date"
+            ))
         )
 
         # Apply filters
-        if limit_param:
-            query = query.limit(limit_param)
         if owner_id:
             query = query.eq("owner_id", owner_id)
         if task_id:
@@ -1620,19 +2098,18 @@ def get_tasks():
             query = query.eq("project_id", project_id)
 
         # Execute query
-        response = query.execute()
-        rows: List[Dict[str, Any]] = response.data or []
+        rows, next_cursor = fetch_task_page(query, cursor_position, page_size)
         
         # Map to API format
-        tasks = [map_db_row_to_api(row) for row in rows]
+        tasks = map_rows_to_api(rows, wants_subtasks_count(fields), fields=fields)
         
-        return jsonify({"tasks": tasks, "count": len(tasks)}), 200
+        return jsonify({"tasks": tasks, "count": len(tasks), "next_cursor": next_cursor}), 200
 
     except Exception as exc:
         return jsonify({"error": f"Failed to retrieve tasks: {str(exc)}"}), 500
 
 
-@app.route("/debug/task/<task_id>", methods=["GET"])
+@api.route("/debug/task/<task_id>", methods=["GET"])
 def debug_task(task_id: str):
     """Debug endpoint to check task data"""
     try:
@@ -1641,6 +2118,7 @@ def debug_task(task_id: str):
             return jsonify({"error": "Task not found"}), 404
         
         # Get audit logs for this task
+        AUDIT_LOG_WRITER.flush(timeout=2)
         logs_response = supabase.table("task_log").select("*").eq("task_id", task_id).execute()
         logs = logs_response.data or []
         
@@ -1652,7 +2130,7 @@ def debug_task(task_id: str):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/tasks/<task_id>/access", methods=["GET"])
+@api.route("/tasks/<task_id>/access", methods=["GET"])
 def check_task_access(task_id: str):
     """
     GET /tasks/<task_id>/access - Check user's access level to a specific task
@@ -1667,15 +2145,13 @@ def check_task_access(task_id: str):
         if not user_id:
             return jsonify({"error": "user_id parameter is required"}), 400
 
-        task_data = get_task_by_id(task_id)
+        # Owner, collaborators and creator come from the access cache - no task or audit-log read on a hit
+        task_data = TASK_ACCESS_CACHE.get(task_id)
         if not task_data:
             return jsonify({"error": "Task not found"}), 404
 
-        print(f"DEBUG: Checking access for user {user_id} to task {task_id}")
-        print(f"DEBUG: Task data: owner_id={task_data.get('owner_id')}, collaborators={task_data.get('collaborators')}")
-
         access_info = can_user_access_task(user_id, task_data)
-        print(f"DEBUG: Access result: {access_info}")
+        logger.debug(f"Access for user {user_id} to task {task_id}: {access_info}")
         
         return jsonify({"task_id": task_id, "user_id": user_id, **access_info}), 200
 
@@ -1683,7 +2159,7 @@ def check_task_access(task_id: str):
         return jsonify({"error": f"Failed to check task access: {str(exc)}"}), 500
 
 
-@app.route("/tasks/<task_id>", methods=["GET"])
+@api.route("/tasks/<task_id>", methods=["GET"])
 def get_task(task_id: str):
     """
     GET /tasks/<task_id> - Get a specific task by ID
@@ -1703,7 +2179,7 @@ def get_task(task_id: str):
         return jsonify({"error": f"Failed to retrieve task: {str(exc)}"}), 500
 
 
-@app.route("/tasks/<task_id>/subtasks/count", methods=["GET"])
+@api.route("/tasks/<task_id>/subtasks/count", methods=["GET"])
 def get_task_subtasks_count(task_id: str):
     """
     GET /tasks/<task_id>/subtasks/count - Get the count of subtasks for a specific parent task
@@ -1717,10 +2193,8 @@ def get_task_subtasks_count(task_id: str):
         if not parent_task:
             return jsonify({"error": "Task not found"}), 404
 
-        # Query for count of tasks that have this task as their parent
-        response = supabase.table("task").select("task_id", count="exact").eq("parent_task_id", task_id).eq("isSubtask", True).execute()
-        
-        count = response.count if response.count is not None else 0
+        # Same batched counting path the list endpoints use
+        count = get_subtasks_counts([task_id]).get(task_id, 0)
         
         return jsonify({"task_id": task_id, "subtasks_count": count}), 200
 
@@ -1728,7 +2202,7 @@ def get_task_subtasks_count(task_id: str):
         return jsonify({"error": f"Failed to retrieve subtasks count: {str(exc)}"}), 500
 
 
-@app.route("/tasks/<task_id>/subtasks", methods=["GET"])
+@api.route("/tasks/<task_id>/subtasks", methods=["GET"])
 def get_task_subtasks(task_id: str):
     """
     GET /tasks/<task_id>/subtasks - Get all subtasks for a specific parent task
@@ -1759,7 +2233,7 @@ def get_task_subtasks(task_id: str):
         return jsonify({"error": f"Failed to retrieve subtasks: {str(exc)}"}), 500
 
 
-@app.route("/tasks/main", methods=["GET"])
+@api.route("/tasks/main", methods=["GET"])
 def get_main_tasks():
     """
     GET /tasks/main - Get all main tasks (excluding subtasks)
@@ -1773,9 +2247,8 @@ def get_main_tasks():
 
         rows: List[Dict[str, Any]] = response.data or []
 
-        # Map to API format - removed include_subtasks_count to prevent N+1 query problem
-        # Subtask counts can be fetched separately via /tasks/<task_id>/subtasks/count if needed
-        tasks = [map_db_row_to_api(row) for row in rows]
+        # Map to API format - subtask counts come from one batched query when requested
+        tasks = map_rows_to_api(rows, wants_subtasks_count(None))
 
         return jsonify({"tasks": tasks, "count": len(tasks)}), 200
 
@@ -1783,7 +2256,7 @@ def get_main_tasks():
         return jsonify({"error": f"Failed to retrieve main tasks: {str(exc)}"}), 500
 
 
-@app.route("/users/<user_id>/accessible-tasks", methods=["GET"])
+@api.route("/users/<user_id>/accessible-tasks", methods=["GET"])
 def get_user_accessible_tasks(user_id: str):
     """
     GET /users/<user_id>/accessible-tasks - Get all tasks accessible to a user
@@ -1792,121 +2265,70 @@ def get_user_accessible_tasks(user_id: str):
     - The task will appear in staff's "All Tasks" (they are owner)
     - The task will appear in manager's "All Tasks" (they are collaborator)
     - If staff reassigns the task to someone else, staff is no longer owner, task disappears from their "All Tasks"
+    Query parameters:
+    - fields: Comma-separated API fields to return
     """
     try:
         if not user_id or user_id.strip() == "":
             return jsonify({"error": "Invalid user ID"}), 400
 
-        # Get tasks owned by the user (owner_id = user_id)
-        owned_response = supabase.table("task").select("*").eq("owner_id", user_id).execute()
-        owned_tasks = owned_response.data or []
-
-        # Get tasks where user is a collaborator (user_id is in collaborators array)
         try:
-            # Try multiple JSONB query approaches
+            fields = parse_fields_param(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # Ownership and the parent link drive the visibility rules, so they are always fetched
+        task_columns = build_task_select(fields, required=["owner_id", "parent_task_id"])
+
+        # Resolve the user's tasks through the task_member index: one indexed lookup
+        # whose cost grows with the user's own task count, not the size of the task table
+        member_task_ids = get_member_task_ids(user_id)
+        member_tasks = None
+        if member_task_ids is not None:
+            try:
+                # Batched IN lists keep the URL short for users with many tasks
+                member_tasks = _select_in_batches(
+                    SweepQueryCounter(),
+                    lambda batch: supabase.table("task").select(task_columns).in_("task_id", batch).order("task_id"),
+                    member_task_ids,
+                )
+            except Exception as e:
+                logger.warning(f"Loading indexed tasks failed for user {user_id}, using column queries: {e}")
+
+        if member_tasks is not None:
+            owned_tasks = []
             collaborated_tasks = []
-            
-            # Approach 1: Use @> (contains) operator for JSONB arrays
+            for task in member_tasks:
+                if task.get("owner_id") == user_id:
+                    owned_tasks.append(task)
+                else:
+                    collaborated_tasks.append(task)
+        else:
+            # Index not available - use the owner_id column and the JSONB containment query
+            owned_response = supabase.table("task").select(task_columns).eq("owner_id", user_id).execute()
+            owned_tasks = owned_response.data or []
+
             try:
-                collaborated_response = supabase.table("task").select("*").filter("collaborators", "cs", f'["{user_id}"]').execute()
+                collaborated_response = supabase.table("task").select(task_columns).filter("collaborators", "cs", f'["{user_id}"]').execute()
                 collaborated_tasks = collaborated_response.data or []
             except Exception as e:
-                pass
-            
-            # Approach 2: If first approach didn't work, try contains operator
-            if not collaborated_tasks:
-                try:
-                    collaborated_response = supabase.table("task").select("*").contains("collaborators", [user_id]).execute()
-                    collaborated_tasks = collaborated_response.data or []
-                except Exception as e:
-                    pass
-            
-            # Approach 3: Manual filtering as fallback
-            if not collaborated_tasks:
-                all_tasks_response = supabase.table("task").select("*").execute()
-                all_tasks = all_tasks_response.data or []
-                
-                for task in all_tasks:
-                    try:
-                        collaborators = task.get("collaborators", [])
-                        
-                        # Parse collaborators if it's a JSON string
-                        if isinstance(collaborators, str):
-                            try:
-                                collaborators = json.loads(collaborators)
-                            except:
-                                collaborators = []
-                        elif collaborators is None:
-                            collaborators = []
-                        
-                        # Check if user is in collaborators list
-                        if user_id in collaborators:
-                            collaborated_tasks.append(task)
-                    except Exception as e:
-                        continue
-        except Exception as e:
-            collaborated_tasks = []
+                logger.warning(f"Collaborator lookup failed for user {user_id}: {e}")
+                collaborated_tasks = []
 
         # Combine owned and collaborated tasks and remove duplicates
         # IMPORTANT: Only include owned tasks and collaborated tasks
         # Do NOT include tasks just because the user created them
         all_tasks = {}
-        for task in owned_tasks + collaborated_tasks:
-            task_id = task.get("task_id")
-            if task_id not in all_tasks:
-                all_tasks[task_id] = task
-
-        # Filter out parent tasks if user only has access to subtasks
-        # If user is a collaborator on a subtask but NOT on the parent task,
-        # only the subtask should appear (not the parent)
-        filtered_tasks = {}
-        
-        # Create a set of task IDs the user has direct access to (as owner or collaborator)
-        user_accessible_task_ids = set(t.get("task_id") for t in owned_tasks + collaborated_tasks)
-        
-        logger.info(f"User {user_id} has direct access to {len(user_accessible_task_ids)} tasks")
-        
-        for task_id, task in all_tasks.items():
-            parent_task_id = task.get("parent_task_id")
-            
-            # If this is a subtask, only include it if user has access to subtask but NOT to parent
-            if parent_task_id:
-                # Check if user has access to the parent task
-                parent_has_access = parent_task_id in user_accessible_task_ids
-                
-                if task_id in user_accessible_task_ids:
-                    if parent_has_access:
-                        # User has access to both parent and subtask - show parent only, hide subtask
-                        logger.info(f"Excluding subtask {task_id} (parent: {parent_task_id}) - user has access to parent")
-                    else:
-                        # User has access to subtask but NOT parent - show subtask as standalone
-                        logger.info(f"Including subtask {task_id} (parent: {parent_task_id}) - user has no access to parent")
-                        filtered_tasks[task_id] = task
-                else:
-                    logger.info(f"Excluding subtask {task_id} (parent: {parent_task_id}) - user has no access to subtask")
-            else:
-                # This is a parent task or standalone task
-                # Check if there are any subtasks that user has access to
-                user_subtasks = [
-                    t for t in all_tasks.values() 
-                    if t.get("parent_task_id") == task_id
-                ]
-                
-                # Only include the parent task if:
-                # 1. User has direct access to this parent task (owner or collaborator), OR
-                # 2. User has no subtasks under this parent (meaning they have access to parent only)
-                if task_id in user_accessible_task_ids:
-                    # User has direct access to parent task - include it
-                    logger.info(f"Including parent task {task_id} (user has direct access)")
-                    filtered_tasks[task_id] = task
-                elif user_subtasks:
-                    # User has subtasks but no direct access to parent - exclude parent
-                    logger.info(f"Excluding parent task {task_id} (user only has access to {len(user_subtasks)} subtask(s))")
-                # If user_subtasks exists but user doesn't have direct access to parent,
-                # exclude the parent (user only sees the subtasks)
+        for task in owned_tasks + collaborated_tasks:
+            task_id = task.get("task_id")
+            if task_id not in all_tasks:
+                all_tasks[task_id] = task
+
+        logger.info(f"User {user_id} has direct access to {len(all_tasks)} tasks")
+
+        filtered_tasks = filter_visible_tasks(all_tasks)
 
         # Map to API format
-        tasks = [map_db_row_to_api(task) for task in filtered_tasks.values()]
+        tasks = map_rows_to_api(list(filtered_tasks.values()), wants_subtasks_count(fields), fields=fields)
         
         return jsonify({"tasks": tasks, "count": len(tasks)}), 200
 
@@ -1914,33 +2336,259 @@ def get_user_accessible_tasks(user_id: str):
         return jsonify({"error": f"Failed to retrieve accessible tasks: {str(exc)}"}), 500
 
 
-@app.route("/tasks/user/<user_id>", methods=["GET"])
+@api.route("/tasks/user/<user_id>", methods=["GET"])
 def get_tasks_by_user(user_id: str):
     """
     GET /tasks/user/<user_id> - Get all tasks owned by a specific user
+    Query parameters:
+    - page_size: Maximum number of tasks to return per page
+    - cursor: Opaque cursor from a previous response's next_cursor
+    - fields: Comma-separated API fields to return
     """
     try:
         if not user_id or user_id.strip() == "":
             return jsonify({"error": "Invalid user ID"}), 400
 
+        try:
+            cursor_position, page_size = get_page_params()
+            fields = parse_fields_param(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Query tasks owned by the user
-        response = supabase.table("task").select("*").eq("owner_id", user_id).execute()
-        
-        if not response.data:
-            return jsonify({"tasks": [], "count": 0}), 200
-        
-        rows: List[Dict[str, Any]] = response.data or []
+        query = supabase.table("task").select(build_task_select(fields)).eq("owner_id", user_id)
+        rows, next_cursor = fetch_task_page(query, cursor_position, page_size)
         
         # Map to API format
-        tasks = [map_db_row_to_api(row) for row in rows]
+        tasks = map_rows_to_api(rows, wants_subtasks_count(fields), fields=fields)
         
-        return jsonify({"tasks": tasks, "count": len(tasks)}), 200
+        return jsonify({"tasks": tasks, "count": len(tasks), "next_cursor": next_cursor}), 200
 
     except Exception as exc:
         return jsonify({"error": f"Failed to retrieve user tasks: {str(exc)}"}), 500
 
 
-@app.route("/tasks", methods=["POST"])
+# Dashboard aggregates: one grouped query (task_stats SQL function) folded into a small payload
+STATS_MAX_OWNERS = 200
+STATS_SCAN_COLUMNS = "owner_id, status, priority, due_date, created_at, completed_date"
+STATS_DUE_SOON_DAYS = 7
+
+def task_stats_groups_from_rows(rows: List[Dict[str, Any]], today) -> List[Dict[str, Any]]:
+    """Group task rows the way the task_stats SQL function does (fallback when it is not installed)"""
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row.get("owner_id"), row.get("status"), str(row.get("priority") if row.get("priority") is not None else 5))
+        group = groups.setdefault(key, {"owner_id": key[0], "status": key[1], "priority": key[2], "total": 0, "overdue": 0,
+                                        "due_soon": 0, "completion_days_sum": 0.0, "completion_samples": 0})
+        group["total"] += 1
+        due = parse_due_date(row["due_date"]) if row.get("due_date") else None
+        if row.get("status") != "Completed":
+            if due and due < today:
+                group["overdue"] += 1
+            elif due and (due - today).days <= STATS_DUE_SOON_DAYS:
+                group["due_soon"] += 1
+        elif row.get("completed_date") and row.get("created_at"):
+            try:
+                created = datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
+                completed = datetime.fromisoformat(str(row["completed_date"]).replace("Z", "+00:00"))
+                if created.tzinfo is None:
+                    created = created.replace(tzinfo=timezone.utc)
+                if completed.tzinfo is None:
+                    completed = completed.replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            group["completion_days_sum"] += max(0.0, (completed - created).total_seconds() / 86400)
+            group["completion_samples"] += 1
+    return list(groups.values())
+
+def load_task_stats_groups(owner_ids: Optional[List[str]], project_id: Optional[str], main_only: bool, today) -> tuple:
+    """Grouped (owner, status, priority) counters for a scope; returns (groups, source)"""
+    try:
+        response = supabase.rpc("task_stats", {
+            "p_owner_ids": owner_ids,
+            "p_project_id": project_id,
+            "p_main_only": main_only,
+            "p_today": today.isoformat(),
+            "p_due_soon_days": STATS_DUE_SOON_DAYS,
+        }).execute()
+        return response.data or [], "grouped_query"
+    except Exception as e:
+        print(f"⚠️  task_stats function unavailable, aggregating a column scan instead: {e}")
+
+    # Fallback: read only the columns the counters need, page by page, and group in memory
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        query = supabase.table("task").select(STATS_SCAN_COLUMNS)
+        if owner_ids:
+            query = query.in_("owner_id", owner_ids)
+        if project_id:
+            query = query.eq("project_id", project_id)
+        if main_only:
+            query = query.or_("isSubtask.is.null,isSubtask.eq.false")  # IS NOT TRUE, as in task_stats
+        page = query.order("task_id").range(start, start + SWEEP_PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < SWEEP_PAGE_SIZE:
+            break
+        start += SWEEP_PAGE_SIZE
+    return task_stats_groups_from_rows(rows, today), "scan"
+
+def _average_days(days_sum: float, samples: int) -> Optional[float]:
+    return round(days_sum / samples, 2) if samples else None
+
+def fold_task_stats(groups: List[Dict[str, Any]], by_owner: bool) -> Dict[str, Any]:
+    """Fold grouped counters into totals, status/priority counts and (optionally) per-owner breakdowns"""
+    stats = {"total": 0, "by_status": {}, "by_priority": {}, "overdue": 0, "due_soon": 0,
+             "completed": 0, "avg_completion_days": None}
+    owners: Dict[str, Dict[str, Any]] = {}
+    days_sum, samples = 0.0, 0
+    for group in groups:
+        total = int(group.get("total") or 0)
+        status = group.get("status") or "Unknown"
+        priority = str(group.get("priority") if group.get("priority") is not None else 5)
+        stats["total"] += total
+        stats["by_status"][status] = stats["by_status"].get(status, 0) + total
+        stats["by_priority"][priority] = stats["by_priority"].get(priority, 0) + total
+        stats["overdue"] += int(group.get("overdue") or 0)
+        stats["due_soon"] += int(group.get("due_soon") or 0)
+        if status == "Completed":
+            stats["completed"] += total
+        days_sum += float(group.get("completion_days_sum") or 0)
+        samples += int(group.get("completion_samples") or 0)
+
+        if by_owner:
+            owner = owners.setdefault(group.get("owner_id") or "unassigned", {
+                "total": 0, "by_status": {}, "overdue": 0, "completed": 0, "_days": 0.0, "_samples": 0})
+            owner["total"] += total
+            owner["by_status"][status] = owner["by_status"].get(status, 0) + total
+            owner["overdue"] += int(group.get("overdue") or 0)
+            if status == "Completed":
+                owner["completed"] += total
+            owner["_days"] += float(group.get("completion_days_sum") or 0)
+            owner["_samples"] += int(group.get("completion_samples") or 0)
+
+    stats["avg_completion_days"] = _average_days(days_sum, samples)
+    if by_owner:
+        for owner in owners.values():
+            owner["avg_completion_days"] = _average_days(owner.pop("_days"), owner.pop("_samples"))
+        stats["by_owner"] = owners
+    return stats
+
+@api.route("/tasks/stats", methods=["GET"])
+def get_task_stats():
+    """
+    GET /tasks/stats - Task counts for dashboards, computed server-side
+    Query parameters:
+    - owner_id: Scope to one owner
+    - owner_ids: Comma-separated owner IDs (e.g. a manager's team)
+    - project_id: Scope to one project
+    - main_only: true to leave subtasks out
+    - by_owner: true to add per-owner breakdowns (default when owner_ids is given)
+    """
+    try:
+        owner_ids = [owner.strip() for owner in request.args.get("owner_ids", "").split(",") if owner.strip()]
+        if request.args.get("owner_id"):
+            owner_ids.append(request.args["owner_id"].strip())
+        owner_ids = list(dict.fromkeys(owner_ids)) or None
+        if owner_ids and len(owner_ids) > STATS_MAX_OWNERS:
+            return jsonify({"error": f"At most {STATS_MAX_OWNERS} owner IDs are allowed"}), 400
+        project_id = request.args.get("project_id") or None
+        main_only = request.args.get("main_only", "false").lower() == "true"
+        by_owner = request.args.get("by_owner", "true" if "owner_ids" in request.args else "false").lower() == "true"
+        # Overdue is judged against the caller's calendar day when given (YYYY-MM-DD)
+        try:
+            today = parse_due_date(request.args["today"]) if request.args.get("today") else datetime.now(timezone.utc).date()
+        except ValueError:
+            return jsonify({"error": "today must be YYYY-MM-DD"}), 400
+
+        groups, source = load_task_stats_groups(owner_ids, project_id, main_only, today)
+        stats = fold_task_stats(groups, by_owner)
+        stats["scope"] = {"owner_ids": owner_ids, "project_id": project_id, "main_only": main_only, "today": today.isoformat()}
+        stats["source"] = source
+        return jsonify(stats), 200
+
+    except Exception as exc:
+        return jsonify({"error": f"Failed to compute task stats: {str(exc)}"}), 500
+
+
+# Full-text search (search_workspace SQL function over GIN-indexed tsvector columns)
+SEARCH_TYPES = ("task", "comment", "project")
+SEARCH_DEFAULT_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_OFFSET = 1000  # Ranked results are paged by offset; deeper pages mean a better query is needed
+SEARCH_MAX_QUERY_LENGTH = 200
+
+@api.route("/search", methods=["GET"])
+def search():
+    """
+    GET /search - Ranked full-text search over task titles/descriptions, task comments and project names
+    Query parameters:
+    - q: Search text (web-search syntax: quoted phrases, OR, -excluded)
+    - user_id: Searching user; only tasks, comments and projects they can access are returned
+    - types: Comma-separated subset of task,comment,project (default all)
+    - page / page_size: 1-based page of results (page_size default 20, max 100)
+    """
+    try:
+        query_text = " ".join(request.args.get("q", "").split())
+        user_id = request.args.get("user_id", "").strip()
+        if len(query_text) < 2:
+            return jsonify({"error": "q must be at least 2 characters"}), 400
+        if len(query_text) > SEARCH_MAX_QUERY_LENGTH:
+            return jsonify({"error": f"q must be at most {SEARCH_MAX_QUERY_LENGTH} characters"}), 400
+        if not is_valid_uuid(user_id):
+            return jsonify({"error": "A valid user_id is required"}), 400
+
+        types = [t.strip() for t in request.args.get("types", ",".join(SEARCH_TYPES)).split(",") if t.strip()]
+        unknown = [t for t in types if t not in SEARCH_TYPES]
+        if unknown or not types:
+            return jsonify({"error": f"types must be a subset of {', '.join(SEARCH_TYPES)}"}), 400
+
+        page = request.args.get("page", default=1, type=int) or 1
+        page_size = request.args.get("page_size", default=SEARCH_DEFAULT_PAGE_SIZE, type=int) or SEARCH_DEFAULT_PAGE_SIZE
+        page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+        offset = (max(1, page) - 1) * page_size
+        if offset > SEARCH_MAX_OFFSET:
+            return jsonify({"error": f"Results beyond the first {SEARCH_MAX_OFFSET} are not available; refine the query"}), 400
+
+        try:
+            response = supabase.rpc("search_workspace", {
+                "p_query": query_text,
+                "p_user_id": user_id,
+                "p_types": types,
+                "p_limit": page_size,
+                "p_offset": offset,
+            }).execute()
+        except Exception as e:
+            print(f"❌ search_workspace failed: {e}")
+            return jsonify({"error": "Search is unavailable (is the search_workspace function installed?)"}), 503
+
+        rows = response.data or []
+        total = int(rows[0]["total"]) if rows else 0
+        results = [{
+            "type": row.get("type"),
+            "id": row.get("id"),
+            "task_id": row.get("task_id"),
+            "project_id": row.get("project_id"),
+            "title": row.get("title"),
+            "snippet": row.get("snippet"),
+            "rank": round(float(row.get("rank") or 0), 4),
+        } for row in rows]
+
+        return jsonify({
+            "query": query_text,
+            "results": results,
+            "count": len(results),
+            "total": total,
+            "page": max(1, page),
+            "page_size": page_size,
+            "has_more": offset + len(results) < total,
+        }), 200
+
+    except Exception as exc:
+        return jsonify({"error": f"Failed to search: {str(exc)}"}), 500
+
+
+@api.route("/tasks", methods=["POST"])
 def create_task():
     """
     POST /tasks - Create a new task or subtask
@@ -1954,6 +2602,10 @@ def create_task():
         except ValidationError as e:
             return jsonify({"error": "Invalid request data", "details": e.errors()}), 400
 
+        recurrence_error = validate_recurrence(task_data.recurrence)
+        if recurrence_error:
+            return jsonify({"error": f"Invalid recurrence: {recurrence_error}"}), 400
+
         # Check if a task with the same title already exists for this user
         title = task_data.title.strip()
         owner_id = task_data.owner_id
@@ -1971,6 +2623,10 @@ def create_task():
         # Note: 'project' is just the project name for display, not stored in DB. Only 'project_id' is stored.
         db_data = task_data.dict(exclude={"reminder_days", "email_enabled", "in_app_enabled", "created_by", "project"})
         db_data["created_at"] = datetime.utcnow().isoformat()
+        # Store who created the task so access checks do not need the audit log
+        creator_for_access = task_data.created_by or db_data.get("owner_id")
+        if creator_for_access and is_valid_uuid(creator_for_access):
+            db_data["created_by"] = creator_for_access
 
         # BUSINESS LOGIC: When a task is created and assigned to a STAFF member (not Manager/Director),
         # automatically set status to "Ongoing" instead of "Unassigned"
@@ -2004,6 +2660,9 @@ def create_task():
         created_task_data = response.data[0]
         task_id = created_task_data.get("task_id")
 
+        # Keep the user -> task membership index current
+        sync_task_members(created_task_data)
+
         # Save notification preferences FIRST (email/in-app toggles)
         if task_data.due_date and task_data.owner_id:
             email_enabled = task_data.email_enabled if task_data.email_enabled is not None else True
@@ -2084,57 +2743,52 @@ def create_task():
         # The duplicate check inside the function will prevent duplicates
         check_and_send_due_date_notifications(created_task_data)
         
-        # Send task creation notifications to stakeholders
+        # Queue task creation notifications for stakeholders
         try:
             stakeholders = get_task_stakeholders(created_task_data)
             task_owner_id = created_task_data.get("owner_id")
-            creator_id = task_data.created_by or db_data.get("owner_id", "system")
-            
+
+            outbox_rows = []
             for stakeholder_id in stakeholders:
                 # Determine notification type based on role
                 if stakeholder_id == task_owner_id:
                     # This is the assignee - they get "assigned" notification
+                    notification_type = "task_assigned"
                     notification_data = {
                         "user_id": stakeholder_id,
                         "title": f"New task assigned: '{created_task_data['title']}'",
                         "message": f"You have been assigned to a new task: '{created_task_data['title']}'",
-                        "type": "task_assigned",
-                        "task_id": task_id,
-                        "due_date": created_task_data.get("due_date"),
-                        "priority": created_task_data.get("priority", "Medium"),
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "is_read": False
                     }
                 else:
                     # This is a collaborator (like the manager who created it) - they get "created" notification
+                    notification_type = "task_created"
                     notification_data = {
                         "user_id": stakeholder_id,
                         "title": f"New task created: '{created_task_data['title']}'",
                         "message": f"A new task has been created and you are collaborating on it: '{created_task_data['title']}'",
-                        "type": "task_created",
-                        "task_id": task_id,
+                    }
+                notification_data.update({
+                    "type": notification_type,
+                    "task_id": task_id,
+                    "due_date": created_task_data.get("due_date"),
+                    "priority": created_task_data.get("priority", "Medium"),
+                })
+
+                # In-app and email, as before (no real-time push for new tasks)
+                outbox_rows.append(build_outbox_row(
+                    notification_data,
+                    make_idempotency_key(notification_type, task_id, stakeholder_id),
+                    channels=[CHANNEL_IN_APP, CHANNEL_EMAIL],
+                    email={
+                        "notification_type": notification_type,
+                        "task_title": created_task_data["title"],
                         "due_date": created_task_data.get("due_date"),
                         "priority": created_task_data.get("priority", "Medium"),
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "is_read": False
+                        "task_id": task_id
                     }
-                
-                # Store in-app notification
-                supabase.table("notifications").insert(notification_data).execute()
-                
-                # Send email notification if enabled
-                if EMAIL_SERVICE_AVAILABLE:
-                    user_email = get_user_email(stakeholder_id)
-                    if user_email:
-                        notification_type = "task_assigned" if stakeholder_id == task_owner_id else "task_created"
-                        send_notification_email(
-                            user_email=user_email,
-                            notification_type=notification_type,
-                            task_title=created_task_data["title"],
-                            due_date=created_task_data.get("due_date"),
-                            priority=created_task_data.get("priority", "Medium"),
-                            task_id=task_id
-                        )
+                ))
+
+            queue_notifications(outbox_rows)
         except Exception as e:
             print(f"Failed to send task creation notifications: {e}")
 
@@ -2143,7 +2797,7 @@ def create_task():
     except Exception as exc:
         return jsonify({"error": f"Failed to create task: {str(exc)}"}), 500
 
-@app.route("/debug/audit-logs/<task_id>", methods=["GET"])
+@api.route("/debug/audit-logs/<task_id>", methods=["GET"])
 def debug_audit_logs(task_id: str):
     """Debug endpoint to check audit logging for a specific task"""
     try:
@@ -2184,7 +2838,7 @@ def debug_audit_logs(task_id: str):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/tasks/<task_id>/logs", methods=["GET"])
+@api.route("/tasks/<task_id>/logs", methods=["GET"])
 def get_task_logs(task_id: str):
     """
     GET /tasks/<task_id>/logs - Get change logs for a specific task
@@ -2193,6 +2847,9 @@ def get_task_logs(task_id: str):
         if not validate_task_id(task_id):
             return jsonify({"error": "Invalid task ID"}), 400
 
+        # Make sure queued audit entries are visible before reading them back
+        AUDIT_LOG_WRITER.flush(timeout=2)
+
         # Query task_log table for this task
         response = supabase.table("task_log").select(
             "log_id,task_id,action,user_id,old_value,new_value,created_at,field"
@@ -2205,7 +2862,114 @@ def get_task_logs(task_id: str):
     except Exception as exc:
         return jsonify({"error": f"Failed to retrieve logs: {str(exc)}"}), 500
     
-@app.route("/tasks/<task_id>", methods=["PUT", "PATCH"])
+def apply_reassignment_rules(existing_task: Dict[str, Any], update_data: Dict[str, Any], actor_id: str) -> Dict[str, Any]:
+    """Apply reassignment and collaborator-preservation rules to an update payload (modified in place)"""
+    # BUSINESS LOGIC: Handle owner_id change (task reassignment)
+    # When a manager/user reassigns a task to someone else:
+    # 1. The new assignee becomes the owner_id
+    # 2. The previous owner should be added as a collaborator (so they can still see/track the task)
+    # 3. The person who did the reassignment should remain as collaborator if they were one
+    # 4. The task status should automatically change to "Ongoing" ONLY if assigned to staff (not Manager/Director)
+    if "owner_id" in update_data:
+        new_owner_id = update_data["owner_id"]
+        old_owner_id = existing_task.get("owner_id")
+
+        # Only process if owner actually changed
+        if new_owner_id and old_owner_id and new_owner_id != old_owner_id:
+            # Automatically set status to "Ongoing" when task is reassigned to a STAFF member
+            # This ensures Manager -> Staff assignments start with "Ongoing" status
+            # But Director -> Manager assignments remain "Unassigned"
+            current_status = existing_task.get("status", "Unassigned")
+            if current_status != "Completed":  # Don't change status if task is already completed
+                if is_staff_member(new_owner_id):
+                    update_data["status"] = "Ongoing"
+                    print(f"✅ Task reassignment: Automatically setting status to 'Ongoing' for staff member (was '{current_status}')")
+                else:
+                    print(f"ℹ️  Task reassignment: Keeping status as '{current_status}' since assignee is not a staff member (likely Manager/Director)")
+
+            # Get existing collaborators
+            existing_collaborators = existing_task.get("collaborators", [])
+            if isinstance(existing_collaborators, str):
+                try:
+                    existing_collaborators = json.loads(existing_collaborators)
+                except:
+                    existing_collaborators = []
+            elif existing_collaborators is None:
+                existing_collaborators = []
+
+            # Make a copy to modify
+            new_collaborators = list(existing_collaborators)
+
+            # Add the old owner as a collaborator if they aren't already
+            # Do NOT add the actor (the person performing the reassignment) as a collaborator.
+            # This prevents managers from being automatically added as collaborators when
+            # they reassign their own tasks to staff.
+            if old_owner_id not in new_collaborators and old_owner_id != actor_id:
+                new_collaborators.append(old_owner_id)
+                print(f"✅ Task reassignment: Adding previous owner {old_owner_id} as collaborator")
+
+            # Remove the new owner from collaborators (if they were a collaborator)
+            # since they are now the owner
+            if new_owner_id in new_collaborators:
+                new_collaborators.remove(new_owner_id)
+                print(f"✅ Task reassignment: Removing new owner {new_owner_id} from collaborators list")
+
+            # Update the collaborators in the update_data
+            update_data["collaborators"] = json.dumps(new_collaborators)
+            print(f"📋 Updated collaborators list: {new_collaborators}")
+
+    # IMPORTANT: Preserve collaborators unless explicitly being managed by someone with permission
+    # If collaborators field is being updated, check if it should be preserved
+    elif "collaborators" in update_data:
+        submitted_collaborators = update_data["collaborators"]
+        existing_collaborators = existing_task.get("collaborators", [])
+
+        # Parse both for comparison
+        if isinstance(submitted_collaborators, str):
+            try:
+                submitted_collaborators = json.loads(submitted_collaborators)
+            except:
+                submitted_collaborators = []
+        elif submitted_collaborators is None:
+            submitted_collaborators = []
+
+        if isinstance(existing_collaborators, str):
+            try:
+                existing_collaborators = json.loads(existing_collaborators)
+            except:
+                existing_collaborators = []
+        elif existing_collaborators is None:
+            existing_collaborators = []
+
+        # If submitted collaborators are empty but existing ones exist, preserve existing
+        # This prevents accidental removal of collaborators by staff edits
+        if not submitted_collaborators and existing_collaborators:
+            update_data["collaborators"] = json.dumps(existing_collaborators)
+        else:
+            # Convert to JSON string for database storage
+            update_data["collaborators"] = json.dumps(submitted_collaborators)
+    return update_data
+
+def apply_completion_date(task_id: str, old_status: Optional[str], update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Set or clear completed_date when an update moves a task into or out of Completed (modified in place)"""
+    if "status" in update_data:
+        new_status = update_data["status"]
+
+        # If task is being marked as completed
+        if new_status == "Completed" and old_status != "Completed":
+            from datetime import date
+
+            # Set completed_date when task is marked as completed
+            update_data["completed_date"] = date.today().isoformat()  # YYYY-MM-DD format
+            print(f"✅ Task {task_id} marked as completed, setting completed_date to {update_data['completed_date']}")
+
+        # If task status is changed FROM completed to something else, clear completed_date
+        elif old_status == "Completed" and new_status != "Completed":
+            update_data["completed_date"] = None
+            print(f"🔄 Task {task_id} status changed from Completed to {new_status}, clearing completed_date")
+    return update_data
+
+@api.route("/tasks/<task_id>", methods=["PUT", "PATCH"])
 def update_task(task_id: str):
     """
     PUT/PATCH /tasks/<task_id> - Update an existing task
@@ -2256,6 +3020,10 @@ def update_task(task_id: str):
             except ValidationError as e:
                 return jsonify({"error": "Invalid request data", "details": e.errors()}), 400
 
+            recurrence_error = validate_recurrence(task_data.recurrence)
+            if recurrence_error:
+                return jsonify({"error": f"Invalid recurrence: {recurrence_error}"}), 400
+
             # Prepare update data (only include non-None values, exclude fields that are handled automatically)
             # Note: completed_date and approval fields are excluded because they're handled automatically
             # Special handling: project_id can be explicitly set to None to remove task from project
@@ -2274,90 +3042,8 @@ def update_task(task_id: str):
 
             actor_id = task_data.updated_by or existing_task.get("owner_id", "system")
             
-            # BUSINESS LOGIC: Handle owner_id change (task reassignment)
-            # When a manager/user reassigns a task to someone else:
-            # 1. The new assignee becomes the owner_id
-            # 2. The previous owner should be added as a collaborator (so they can still see/track the task)
-            # 3. The person who did the reassignment should remain as collaborator if they were one
-            # 4. The task status should automatically change to "Ongoing" ONLY if assigned to staff (not Manager/Director)
-            if "owner_id" in update_data:
-                new_owner_id = update_data["owner_id"]
-                old_owner_id = existing_task.get("owner_id")
-                
-                # Only process if owner actually changed
-                if new_owner_id and old_owner_id and new_owner_id != old_owner_id:
-                    # Automatically set status to "Ongoing" when task is reassigned to a STAFF member
-                    # This ensures Manager -> Staff assignments start with "Ongoing" status
-                    # But Director -> Manager assignments remain "Unassigned"
-                    current_status = existing_task.get("status", "Unassigned")
-                    if current_status != "Completed":  # Don't change status if task is already completed
-                        if is_staff_member(new_owner_id):
-                            update_data["status"] = "Ongoing"
-                            print(f"✅ Task reassignment: Automatically setting status to 'Ongoing' for staff member (was '{current_status}')")
-                        else:
-                            print(f"ℹ️  Task reassignment: Keeping status as '{current_status}' since assignee is not a staff member (likely Manager/Director)")
-                    
-                    # Get existing collaborators
-                    existing_collaborators = existing_task.get("collaborators", [])
-                    if isinstance(existing_collaborators, str):
-                        try:
-                            existing_collaborators = json.loads(existing_collaborators)
-                        except:
-                            existing_collaborators = []
-                    elif existing_collaborators is None:
-                        existing_collaborators = []
-                    
-                    # Make a copy to modify
-                    new_collaborators = list(existing_collaborators)
-                    
-                    # Add the old owner as a collaborator if they aren't already
-                    # Do NOT add the actor (the person performing the reassignment) as a collaborator.
-                    # This prevents managers from being automatically added as collaborators when
-                    # they reassign their own tasks to staff.
-                    if old_owner_id not in new_collaborators and old_owner_id != actor_id:
-                        new_collaborators.append(old_owner_id)
-                        print(f"✅ Task reassignment: Adding previous owner {old_owner_id} as collaborator")
-                    
-                    # Remove the new owner from collaborators (if they were a collaborator)
-                    # since they are now the owner
-                    if new_owner_id in new_collaborators:
-                        new_collaborators.remove(new_owner_id)
-                        print(f"✅ Task reassignment: Removing new owner {new_owner_id} from collaborators list")
-                    
-                    # Update the collaborators in the update_data
-                    update_data["collaborators"] = json.dumps(new_collaborators)
-                    print(f"📋 Updated collaborators list: {new_collaborators}")
-            
-            # IMPORTANT: Preserve collaborators unless explicitly being managed by someone with permission
-            # If collaborators field is being updated, check if it should be preserved
-            elif "collaborators" in update_data:
-                submitted_collaborators = update_data["collaborators"]
-                existing_collaborators = existing_task.get("collaborators", [])
-                
-                # Parse both for comparison
-                if isinstance(submitted_collaborators, str):
-                    try:
-                        submitted_collaborators = json.loads(submitted_collaborators)
-                    except:
-                        submitted_collaborators = []
-                elif submitted_collaborators is None:
-                    submitted_collaborators = []
-                    
-                if isinstance(existing_collaborators, str):
-                    try:
-                        existing_collaborators = json.loads(existing_collaborators)
-                    except:
-                        existing_collaborators = []
-                elif existing_collaborators is None:
-                    existing_collaborators = []
-                
-                # If submitted collaborators are empty but existing ones exist, preserve existing
-                # This prevents accidental removal of collaborators by staff edits
-                if not submitted_collaborators and existing_collaborators:
-                    update_data["collaborators"] = json.dumps(existing_collaborators)
-                else:
-                    # Convert to JSON string for database storage
-                    update_data["collaborators"] = json.dumps(submitted_collaborators)
+            # BUSINESS LOGIC: Handle owner_id change (task reassignment) and collaborator preservation
+            apply_reassignment_rules(existing_task, update_data, actor_id)
 
             # Handle notification preferences separately
             reminder_days_update = task_data.reminder_days
@@ -2375,29 +3061,19 @@ def update_task(task_id: str):
         complete_existing_task = fresh_existing_data.data[0]
         
         # BUSINESS LOGIC: Handle completed_date and approval workflow based on status changes
-        if "status" in update_data:
-            old_status = complete_existing_task.get("status")
-            new_status = update_data["status"]
-            
-            # If task is being marked as completed
-            if new_status == "Completed" and old_status != "Completed":
-                from datetime import date
-                
-                # Set completed_date when task is marked as completed
-                update_data["completed_date"] = date.today().isoformat()  # YYYY-MM-DD format
-                print(f"✅ Task {task_id} marked as completed, setting completed_date to {update_data['completed_date']}")
-            
-            # If task status is changed FROM completed to something else, clear completed_date
-            elif old_status == "Completed" and new_status != "Completed":
-                update_data["completed_date"] = None
-                print(f"🔄 Task {task_id} status changed from Completed to {new_status}, clearing completed_date")
+        apply_completion_date(task_id, complete_existing_task.get("status"), update_data)
 
         # Update in database
         response = supabase.table("task").update(update_data).eq("task_id", task_id).execute()
         
         if not response.data:
             return jsonify({"error": "Failed to update task"}), 500
-        
+
+        # Owner or collaborator changes move the task between users' membership index entries
+        if "owner_id" in update_data or "collaborators" in update_data:
+            sync_task_members(response.data[0])
+
+        publish_task_change([task_id], action="updated")
 
         # Get updated task
         updated_task = map_db_row_to_api(response.data[0])
@@ -2461,76 +3137,24 @@ def update_task(task_id: str):
                 else:
                     print(f"❌ Failed to create recurring task instance")
                 
-        # Log changes for audit trail - only log ACTUAL changes
-        changes_made = False
-        print(f"\n🔍 CHECKING FOR CHANGES to log for task {task_id}:")
-        
-        for field, new_value in update_data.items():
-            # Get the actual OLD value from the complete task data (before update)
-            old_value = complete_existing_task.get(field)
-            
-            print(f"  Field '{field}': '{old_value}' -> '{new_value}'")
-            
-            # Normalize values for accurate comparison
-            if field == "due_date":
-                # Handle date comparison - normalize to YYYY-MM-DD format
-                if old_value:
-                    if isinstance(old_value, str):
-                        old_value = old_value[:10]  # Take first 10 chars (YYYY-MM-DD)
-                    else:
-                        old_value = str(old_value)[:10]
-                else:
-                    old_value = None
-                    
-                if new_value:
-                    new_value = str(new_value)[:10]  # Normalize to YYYY-MM-DD
-                else:
-                    new_value = None
-            else:
-                # For all other fields, handle None/empty string normalization
-                # Convert empty strings to None for consistent comparison
-                if old_value == "":
-                    old_value = None
-                if new_value == "":
-                    new_value = None
-                    
-                # Special handling for description field - map API default to database null
-                if field == "description":
-                    if old_value is None and new_value == "No description available":
-                        new_value = None  # Treat API default as null for comparison
-                    elif old_value == "No description available" and new_value is None:
-                        old_value = None  # Normalize API default in old value too
-            
-            # Only log if there's actually a change
-            if old_value != new_value:
-                print(f"  📝 LOGGING CHANGE: {field} from '{old_value}' to '{new_value}'")
-                log_result = log_task_change(
-                    task_id=task_id,
-                    action="update",
-                    field=field,
-                    user_id=actor_id,
-                    old_value=old_value,
-                    new_value=new_value
-                )
-                if log_result:
-                    changes_made = True
-                    print(f"  ✅ Successfully logged change for field '{field}'")
-                else:
-                    print(f"  ❌ Failed to log change for field '{field}'")
-            else:
-                print(f"  ⏭️ No change for field '{field}' - skipping audit log")
-        
-        if not changes_made:
+        # Log changes for audit trail - only log ACTUAL changes, as one batch
+        audit_entries = build_update_audit_entries(task_id, complete_existing_task, update_data, actor_id)
+        for entry in audit_entries:
+            print(f"  📝 LOGGING CHANGE: {entry['field']} from '{entry['old_value']}' to '{entry['new_value']}'")
+
+        if not audit_entries:
             print(f"⚠️ No audit logs created for task {task_id} - no actual changes detected")
-        else:
+        elif log_task_changes(audit_entries):
             print(f"✅ Audit logs created for task {task_id} changes")
+        else:
+            print(f"❌ Failed to log {len(audit_entries)} change(s) for task {task_id}")
 
         return jsonify({"task": updated_task, "message": "Task updated successfully"}), 200
 
     except Exception as exc:
         return jsonify({"error": f"Failed to update task: {str(exc)}"}), 500
 
-@app.route("/tasks/<task_id>/delete-preview", methods=["GET"])
+@api.route("/tasks/<task_id>/delete-preview", methods=["GET"])
 def get_delete_preview(task_id: str):
     """
     GET /tasks/<task_id>/delete-preview - Preview what tasks will be deleted
@@ -2587,7 +3211,7 @@ def get_delete_preview(task_id: str):
         return jsonify({"error": f"Failed to get delete preview: {str(exc)}"}), 500
 
 
-@app.route("/tasks/<task_id>", methods=["DELETE"])
+@api.route("/tasks/<task_id>", methods=["DELETE"])
 def delete_task(task_id: str):
     """
     DELETE /tasks/<task_id> - Delete a task and all its subtasks (cascading delete)
@@ -2634,6 +3258,9 @@ def delete_task(task_id: str):
         
         if not response.data:
             return jsonify({"error": "Failed to delete task"}), 500
+
+        remove_task_members([task_id] + [t["task_id"] for t in deleted_tasks])
+        publish_task_change([task_id] + [t["task_id"] for t in deleted_tasks], action="deleted")
         
         # Add the main task to deleted tasks list
         deleted_tasks.append({
@@ -2666,13 +3293,540 @@ def delete_task(task_id: str):
         return jsonify({"error": f"Failed to delete task: {str(exc)}"}), 500
 
 
-@app.route("/health", methods=["GET"])
+MAX_BULK_OPERATIONS = int(os.getenv("MAX_BULK_OPERATIONS", "200"))
+BULK_OPERATION_TYPES = ("create", "update", "reassign", "delete")
+BULK_UPDATE_EXCLUDE_FIELDS = {"reminder_days", "email_enabled", "in_app_enabled", "updated_by", "completed_date"}
+BULK_SUMMARY_MAX_LINES = 5  # Task lines listed in a summary notification before "and N more"
+
+def fetch_tasks_by_ids(task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Load full task rows for many IDs with batched IN queries"""
+    task_ids = list(dict.fromkeys(task_id for task_id in task_ids if task_id))
+    tasks = {}
+    for start in range(0, len(task_ids), SUBTASK_COUNT_BATCH_SIZE):
+        batch = task_ids[start:start + SUBTASK_COUNT_BATCH_SIZE]
+        response = supabase.table("task").select("*").in_("task_id", batch).execute()
+        for row in response.data or []:
+            tasks[row["task_id"]] = row
+    return tasks
+
+def normalize_audit_values(field: str, old_value: Any, new_value: Any) -> tuple:
+    """Normalize old/new values before deciding whether a field changed: dates by day, "" as None"""
+    if field == "due_date":
+        old_value = str(old_value)[:10] if old_value else None
+        new_value = str(new_value)[:10] if new_value else None
+        return old_value, new_value
+
+    old_value = None if old_value == "" else old_value
+    new_value = None if new_value == "" else new_value
+    if field == "description":
+        if old_value is None and new_value == "No description available":
+            new_value = None
+        elif old_value == "No description available" and new_value is None:
+            old_value = None
+    return old_value, new_value
+
+def build_update_audit_entries(task_id: str, old_row: Dict[str, Any], update_data: Dict[str, Any], actor_id: str) -> List[Dict[str, Any]]:
+    """Audit entries for the fields an update actually changed"""
+    entries = []
+    for field, new_value in update_data.items():
+        old_value, new_value = normalize_audit_values(field, old_row.get(field), new_value)
+        if old_value != new_value:
+            entries.append({
+                "task_id": task_id, "action": "update", "field": field, "user_id": actor_id,
+                "old_value": old_value, "new_value": new_value,
+            })
+    return entries
+
+def send_bulk_summary_notifications(changes_by_user: Dict[str, List[Dict[str, Any]]], actor_id: str) -> int:
+    """
+    Queue one in-app (and real-time) notification per affected user summarising every task they were affected by.
+
+    changes_by_user maps user_id -> [{"task_id", "title", "change"}]. Returns the number of notifications queued.
+    """
+    batch_key = str(uuid.uuid4())  # One bulk request; retries of the same rows stay idempotent
+    outbox_rows = []
+    for user_id, changes in changes_by_user.items():
+        if not user_id or user_id == actor_id or not changes:
+            continue
+        lines = [f"'{change['title']}' {change['change']}" for change in changes[:BULK_SUMMARY_MAX_LINES]]
+        if len(changes) > BULK_SUMMARY_MAX_LINES:
+            lines.append(f"and {len(changes) - BULK_SUMMARY_MAX_LINES} more")
+        outbox_rows.append(build_outbox_row(
+            {
+                "user_id": user_id,
+                "title": f"{len(changes)} task(s) changed" if len(changes) > 1 else f"Task changed: '{changes[0]['title']}'",
+                "message": "; ".join(lines),
+                "type": "bulk_task_update",
+                "task_id": changes[0]["task_id"] if len(changes) == 1 else None,
+            },
+            make_idempotency_key("bulk_task_update", batch_key, user_id),
+            channels=[CHANNEL_IN_APP, CHANNEL_REALTIME]
+        ))
+
+    if not outbox_rows:
+        return 0
+
+    queued = queue_notifications(outbox_rows)
+    print(f"📬 Queued {queued} bulk summary notification(s)")
+    return queued
+
+@api.route("/tasks/bulk", methods=["POST"])
+def bulk_task_operations():
+    """
+    POST /tasks/bulk - Create, update, reassign or delete many tasks in one call
+
+    Body: {"user_id": "...", "operations": [
+        {"op": "create", "task": {...TaskCreate fields}},
+        {"op": "update", "task_id": "...", "changes": {...TaskUpdate fields}},
+        {"op": "reassign", "task_id": "...", "owner_id": "..."},
+        {"op": "delete", "task_id": "..."}
+    ]}
+
+    All operations are validated before anything is written. Identical update payloads are
+    applied with one query, audit rows are written in bulk, and each affected user gets a single
+    summary notification. Items are not atomic: the response reports success or failure per item.
+    Reminder notifications for rescheduled tasks are regenerated by the periodic notification sweep.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        try:
+            bulk = BulkTaskRequest(**body)
+        except ValidationError as e:
+            return jsonify({"error": "Invalid request data", "details": e.errors()}), 400
+
+        if not bulk.operations:
+            return jsonify({"error": "No operations provided"}), 400
+        if len(bulk.operations) > MAX_BULK_OPERATIONS:
+            return jsonify({"error": f"Too many operations (max {MAX_BULK_OPERATIONS})"}), 400
+
+        actor_id = bulk.user_id
+        results: List[Optional[Dict[str, Any]]] = [None] * len(bulk.operations)
+
+        def record(index: int, op: str, task_id: Optional[str], error: Optional[str] = None, **extra):
+            results[index] = {"index": index, "op": op, "task_id": task_id,
+                              "status": "error" if error else "success", **extra}
+            if error:
+                results[index]["error"] = error
+
+        # --- 1. Validate every operation before touching the database ---
+        creates: List[tuple] = []  # (index, TaskCreate)
+        updates: List[tuple] = []  # (index, op, task_id, update_data)
+        deletes: List[tuple] = []  # (index, task_id)
+        claimed_task_ids = set()
+
+        for index, raw_operation in enumerate(bulk.operations):
+            try:
+                operation = BulkTaskOperation(**raw_operation)
+            except (ValidationError, TypeError) as e:
+                record(index, raw_operation.get("op") if isinstance(raw_operation, dict) else None, None,
+                       f"Invalid operation: {str(e)}")
+                continue
+
+            op, task_id = operation.op, operation.task_id
+            if op not in BULK_OPERATION_TYPES:
+                record(index, op, task_id, f"Unknown operation '{op}'")
+                continue
+
+            if op == "create":
+                try:
+                    task_data = TaskCreate(**(operation.task or {}))
+                except ValidationError as e:
+                    record(index, op, None, f"Invalid task data: {e.errors()}")
+                    continue
+                if not task_data.title.strip():
+                    record(index, op, None, "Task title is required")
+                    continue
+                recurrence_error = validate_recurrence(task_data.recurrence)
+                if recurrence_error:
+                    record(index, op, None, f"Invalid recurrence: {recurrence_error}")
+                    continue
+                creates.append((index, task_data))
+                continue
+
+            if not task_id or not validate_task_id(task_id):
+                record(index, op, task_id, "Invalid task ID")
+                continue
+            if task_id in claimed_task_ids:
+                record(index, op, task_id, "Task appears in more than one operation")
+                continue
+            claimed_task_ids.add(task_id)
+
+            if op == "delete":
+                deletes.append((index, task_id))
+            elif op == "reassign":
+                if not operation.owner_id:
+                    record(index, op, task_id, "owner_id is required for reassign")
+                    continue
+                updates.append((index, op, task_id, {"owner_id": operation.owner_id}))
+            else:
+                changes = operation.changes or {}
+                try:
+                    task_update = TaskUpdate(**changes)
+                except ValidationError as e:
+                    record(index, op, task_id, f"Invalid changes: {e.errors()}")
+                    continue
+                recurrence_error = validate_recurrence(task_update.recurrence)
+                if recurrence_error:
+                    record(index, op, task_id, f"Invalid recurrence: {recurrence_error}")
+                    continue
+                update_data = {k: v for k, v in task_update.dict(exclude=BULK_UPDATE_EXCLUDE_FIELDS).items() if v is not None}
+                if "project_id" in changes and changes["project_id"] is None:
+                    update_data["project_id"] = None
+                if not update_data:
+                    record(index, op, task_id, "No valid fields to update")
+                    continue
+                updates.append((index, op, task_id, update_data))
+
+        # One read for every task (and subtask parent) the batch refers to
+        parent_ids = [task_data.parent_task_id for _, task_data in creates if task_data.isSubtask and task_data.parent_task_id]
+        existing_tasks = fetch_tasks_by_ids([u[2] for u in updates] + [d[1] for d in deletes] + parent_ids)
+
+        # Warm the user cache for every new owner so the staff-role checks below hit memory
+        USER_CACHE.get_many([u[3].get("owner_id") for u in updates] + [task_data.owner_id for _, task_data in creates])
+
+        changes_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        audit_entries: List[Dict[str, Any]] = []
+
+        def notify(user_ids, task_row: Dict[str, Any], change: str):
+            for user_id in user_ids:
+                if user_id:
+                    changes_by_user.setdefault(user_id, []).append(
+                        {"task_id": task_row.get("task_id"), "title": task_row.get("title", "Untitled"), "change": change}
+                    )
+
+        # --- 2. Updates and reassignments: one query per distinct set of shared fields ---
+        # Reassignment gives every task its own collaborators list, so collaborators are kept out of the
+        # group key and written for all tasks at once with a single upsert after the shared updates
+        update_groups: Dict[str, Dict[str, Any]] = {}
+        for index, op, task_id, update_data in updates:
+            existing_task = existing_tasks.get(task_id)
+            if not existing_task:
+                record(index, op, task_id, "Task not found")
+                continue
+            apply_reassignment_rules(existing_task, update_data, actor_id)
+            apply_completion_date(task_id, existing_task.get("status"), update_data)
+            shared_data = {field: value for field, value in update_data.items() if field != "collaborators"}
+            group_key = json.dumps(shared_data, sort_keys=True, default=str)
+            group = update_groups.setdefault(group_key, {"data": shared_data, "items": []})
+            group["items"].append((index, op, task_id, update_data))
+
+        written_rows: Dict[str, Dict[str, Any]] = {}
+        written_items = []
+        for group in update_groups.values():
+            shared_data, items = group["data"], group["items"]
+            if not shared_data:  # Only collaborators change: the upsert below is the whole write
+                rows_by_id = {task_id: existing_tasks[task_id] for _, _, task_id, _ in items}
+            else:
+                task_ids = [task_id for _, _, task_id, _ in items]
+                try:
+                    response = supabase.table("task").update(shared_data).in_("task_id", task_ids).execute()
+                    rows_by_id = {row["task_id"]: row for row in response.data or []}
+                except Exception as e:
+                    for index, op, task_id, _ in items:
+                        record(index, op, task_id, f"Failed to update task: {str(e)}")
+                    continue
+            for item in items:
+                row = rows_by_id.get(item[2])
+                if not row:
+                    record(item[0], item[1], item[2], "Failed to update task")
+                    continue
+                written_rows[item[2]] = row
+                written_items.append(item)
+
+        collaborator_rows = [
+            {**written_rows[task_id], "collaborators": update_data["collaborators"]}
+            for _, _, task_id, update_data in written_items if "collaborators" in update_data
+        ]
+        if collaborator_rows:
+            try:
+                response = supabase.table("task").upsert(collaborator_rows, on_conflict="task_id").execute()
+                written_rows.update({row["task_id"]: row for row in response.data or []})
+            except Exception as e:
+                failed_ids = {row["task_id"] for row in collaborator_rows}
+                for index, op, task_id, _ in written_items:
+                    if task_id in failed_ids:
+                        record(index, op, task_id, f"Failed to update collaborators: {str(e)}")
+                        written_rows.pop(task_id, None)
+
+        updated_rows: Dict[str, Dict[str, Any]] = {}
+        for index, op, task_id, update_data in written_items:
+            row = written_rows.get(task_id)
+            if not row:
+                continue
+            updated_rows[task_id] = row
+            record(index, op, task_id, task=map_db_row_to_api(row))
+
+            old_row = existing_tasks[task_id]
+            audit_entries.extend(build_update_audit_entries(task_id, old_row, update_data, actor_id))
+            new_owner_id = row.get("owner_id")
+            if "owner_id" in update_data and new_owner_id != old_row.get("owner_id"):
+                notify([new_owner_id], row, "was assigned to you")
+                notify([user_id for user_id in get_task_stakeholders(row) if user_id != new_owner_id], row, "was reassigned")
+            else:
+                notify(get_task_stakeholders(row), row, "was updated")
+
+        if updated_rows:
+            sync_task_members_bulk([
+                row for task_id, row in updated_rows.items()
+                if parse_collaborators(row.get("collaborators")) != parse_collaborators(existing_tasks[task_id].get("collaborators"))
+                or row.get("owner_id") != existing_tasks[task_id].get("owner_id")
+            ])
+            publish_task_change(list(updated_rows), action="updated")
+
+            # Subtasks follow their parent's project, one query per target project
+            parents_by_project: Dict[Any, List[str]] = {}
+            for task_id, row in updated_rows.items():
+                if row.get("project_id") != existing_tasks[task_id].get("project_id"):
+                    parents_by_project.setdefault(row.get("project_id"), []).append(task_id)
+            for project_id, parent_task_ids in parents_by_project.items():
+                try:
+                    supabase.table("task").update({"project_id": project_id}).in_("parent_task_id", parent_task_ids).execute()
+                except Exception as e:
+                    print(f"❌ Failed to move subtasks of {parent_task_ids} to project {project_id}: {str(e)}")
+
+            # Rescheduled tasks drop their stale reminders in one query
+            rescheduled_ids = [
+                task_id for task_id, row in updated_rows.items()
+                if len(set(normalize_audit_values("due_date", existing_tasks[task_id].get("due_date"), row.get("due_date")))) > 1
+            ]
+            if rescheduled_ids:
+                try:
+                    supabase.table("notifications").delete().in_("task_id", rescheduled_ids).like("type", "reminder_%").execute()
+                except Exception as e:
+                    print(f"Failed to delete old notifications: {e}")
+
+            # Completed recurring tasks spawn their next instance
+            for task_id, row in updated_rows.items():
+                if (row.get("status") == "Completed" and existing_tasks[task_id].get("status") != "Completed"
+                        and row.get("recurrence")):
+                    create_recurring_task_instance(row)
+
+        # --- 3. Deletes: one query for the tasks and their subtasks ---
+        delete_targets = []
+        for index, task_id in deletes:
+            if task_id not in existing_tasks:
+                record(index, "delete", task_id, "Task not found")
+            else:
+                delete_targets.append((index, task_id))
+
+        if delete_targets:
+            target_ids = [task_id for _, task_id in delete_targets]
+            target_id_set = set(target_ids)
+            parent_target_ids = [task_id for task_id in target_ids if not existing_tasks[task_id].get("isSubtask")]
+            subtasks_by_parent: Dict[str, List[Dict[str, Any]]] = {}
+            try:
+                if parent_target_ids:
+                    subtasks_response = supabase.table("task").select("task_id, title, parent_task_id").in_("parent_task_id", parent_target_ids).eq("isSubtask", True).execute()
+                    for subtask in subtasks_response.data or []:
+                        if subtask["task_id"] not in target_id_set:
+                            subtasks_by_parent.setdefault(subtask["parent_task_id"], []).append(subtask)
+
+                all_ids = target_ids + [s["task_id"] for subtasks in subtasks_by_parent.values() for s in subtasks]
+                response = supabase.table("task").delete().in_("task_id", all_ids).execute()
+                deleted_ids = {row["task_id"] for row in response.data or []}
+            except Exception as e:
+                deleted_ids = set()
+                for index, task_id in delete_targets:
+                    record(index, "delete", task_id, f"Failed to delete task: {str(e)}")
+
+            for index, task_id in delete_targets:
+                if results[index] is not None:
+                    continue
+                if task_id not in deleted_ids:
+                    record(index, "delete", task_id, "Failed to delete task")
+                    continue
+                existing_task = existing_tasks[task_id]
+                deleted_subtasks = [s for s in subtasks_by_parent.get(task_id, []) if s["task_id"] in deleted_ids]
+                record(index, "delete", task_id, deleted_tasks=1 + len(deleted_subtasks))
+                audit_entries.append({
+                    "task_id": task_id, "action": "delete", "field": "task", "user_id": actor_id,
+                    "old_value": existing_task, "new_value": None,
+                })
+                notify(get_task_stakeholders(existing_task), existing_task, "was deleted")
+
+            if deleted_ids:
+                remove_task_members(list(deleted_ids))
+                publish_task_change(list(deleted_ids), action="deleted")
+
+        # --- 4. Creates: one insert for every valid new task ---
+        create_rows = []
+        titles_by_owner: Dict[str, set] = {}
+        create_owner_ids = list({task_data.owner_id for _, task_data in creates if task_data.owner_id})
+        if create_owner_ids:
+            # Only the titles being created can clash: filter on them and page past the 1000-row cap
+            create_titles = list({task_data.title.strip() for _, task_data in creates if task_data.owner_id})
+            taken = _select_in_batches(
+                SweepQueryCounter(),
+                lambda batch: supabase.table("task").select("task_id, owner_id, title")
+                .in_("owner_id", create_owner_ids).in_("title", batch).order("task_id"),
+                create_titles,
+            )
+            for row in taken:
+                titles_by_owner.setdefault(row.get("owner_id"), set()).add(row.get("title"))
+
+        for index, task_data in creates:
+            title = task_data.title.strip()
+            if task_data.owner_id and title in titles_by_owner.get(task_data.owner_id, set()):
+                record(index, "create", None, f"A task titled '{title}' already exists for this owner")
+                continue
+            if task_data.isSubtask and task_data.parent_task_id:
+                parent_task = existing_tasks.get(task_data.parent_task_id)
+                if not parent_task:
+                    record(index, "create", None, "Parent task not found")
+                    continue
+                if parent_task.get("isSubtask"):
+                    record(index, "create", None, "Cannot create subtask of another subtask")
+                    continue
+            if task_data.owner_id:
+                titles_by_owner.setdefault(task_data.owner_id, set()).add(title)
+
+            db_data = task_data.dict(exclude={"reminder_days", "email_enabled", "in_app_enabled", "created_by", "project"})
+            db_data["created_at"] = datetime.utcnow().isoformat()
+            creator_for_access = task_data.created_by or actor_id
+            if is_valid_uuid(creator_for_access):
+                db_data["created_by"] = creator_for_access
+            if db_data.get("owner_id") and db_data.get("status") == "Unassigned" and is_staff_member(db_data["owner_id"]):
+                db_data["status"] = "Ongoing"
+            create_rows.append((index, task_data, db_data))
+
+        if create_rows:
+            created, create_error = [], None
+            try:
+                response = supabase.table("task").insert([db_data for _, _, db_data in create_rows]).execute()
+                created = response.data or []
+            except Exception as e:
+                create_error = str(e)
+
+            if len(created) != len(create_rows):
+                for index, _, _ in create_rows:
+                    record(index, "create", None, f"Failed to create task: {create_error}" if create_error else "Failed to create task")
+            else:
+                reminder_rows, preference_rows = [], []
+                for (index, task_data, _), row in zip(create_rows, created):
+                    task_id = row.get("task_id")
+                    record(index, "create", task_id, task=map_db_row_to_api(row))
+                    creator_id = task_data.created_by or actor_id
+                    new_values = {field: row.get(field) for field in ("title", "due_date", "status", "priority", "description",
+                                                                      "collaborators", "project_id", "isSubtask", "parent_task_id")
+                                  if row.get(field) is not None}
+                    audit_entries.append({
+                        "task_id": task_id, "action": "create", "field": "task", "user_id": creator_id,
+                        "old_value": {field: None for field in new_values}, "new_value": new_values,
+                    })
+                    if row.get("owner_id") and row.get("owner_id") != creator_id:
+                        audit_entries.append({
+                            "task_id": task_id, "action": "assign_task", "field": "assignment", "user_id": creator_id,
+                            "old_value": {"assignee": None}, "new_value": {"assignee": row["owner_id"], "assigner": creator_id},
+                        })
+                    if row.get("due_date"):
+                        reminder_rows.append({"task_id": task_id, "reminder_days": task_data.reminder_days or [7, 3, 1]})
+                        if row.get("owner_id"):
+                            preference_rows.append({
+                                "user_id": row["owner_id"], "task_id": task_id,
+                                "email_enabled": task_data.email_enabled if task_data.email_enabled is not None else True,
+                                "in_app_enabled": task_data.in_app_enabled if task_data.in_app_enabled is not None else True,
+                                "updated_at": datetime.now(timezone.utc).isoformat()
+                            })
+                    notify([row.get("owner_id")], row, "was assigned to you")
+                    notify([user_id for user_id in get_task_stakeholders(row) if user_id != row.get("owner_id")], row, "was created")
+
+                sync_task_members_bulk(created)
+                try:
+                    if reminder_rows:
+                        supabase.table("task_reminder_preferences").insert(reminder_rows).execute()
+                    if preference_rows:
+                        supabase.table("notification_preferences").insert(preference_rows).execute()
+                except Exception as e:
+                    print(f"❌ Failed to save preferences for bulk-created tasks: {e}")
+        # --- 5. Audit trail and notifications, once for the whole batch ---
+        logged = log_task_changes(audit_entries)
+        notified = send_bulk_summary_notifications(changes_by_user, actor_id)
+
+        succeeded = sum(1 for result in results if result and result["status"] == "success")
+        failed = len(results) - succeeded
+        print(f"📦 Bulk operations by {actor_id}: {succeeded} succeeded, {failed} failed, "
+              f"{len(update_groups)} update group(s), {logged} audit row(s), {notified} notification(s)")
+
+        return jsonify({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": failed,
+            "notifications_sent": notified
+        }), 200 if failed == 0 else 207
+
+    except Exception as exc:
+        return jsonify({"error": f"Failed to apply bulk operations: {str(exc)}"}), 500
+
+
+@api.route("/tasks/backfill-created-by", methods=["POST"])
+def backfill_task_created_by():
+    """
+    POST /tasks/backfill-created-by?batch_size=500&max_batches=20&after=<task_id> - Fill task.created_by from 'create' audit entries
+
+    Walks tasks with no created_by in task_id order; while "remaining" is true, call again with after=<next_after>.
+    Tasks without a usable audit entry are left empty (access checks then treat them as having no creator).
+    """
+    try:
+        batch_size = min(max(int(request.args.get("batch_size", 500)), 1), 1000)
+        max_batches = min(max(int(request.args.get("max_batches", 20)), 1), 1000)
+    except ValueError:
+        return jsonify({"error": "batch_size and max_batches must be integers"}), 400
+
+    try:
+        AUDIT_LOG_WRITER.flush(timeout=2)
+        scanned = updated = unresolved = 0
+        last_task_id = request.args.get("after") or None
+        remaining = False
+
+        for _ in range(max_batches):
+            query = supabase.table("task").select("task_id").is_("created_by", "null").order("task_id").limit(batch_size)
+            if last_task_id:
+                query = query.gt("task_id", last_task_id)
+            task_ids = [row["task_id"] for row in query.execute().data or []]
+            if not task_ids:
+                remaining = False
+                break
+            scanned += len(task_ids)
+            last_task_id = task_ids[-1]
+
+            logs = supabase.table("task_log").select("task_id, user_id, created_at").in_("task_id", task_ids).eq("action", "create").execute()
+            creators: Dict[str, str] = {}
+            for log in sorted(logs.data or [], key=lambda log: log.get("created_at") or ""):
+                if log.get("task_id") not in creators and is_valid_uuid(log.get("user_id") or ""):
+                    creators[log["task_id"]] = log["user_id"]  # Earliest create entry wins
+
+            # One update per creator rather than one per task
+            tasks_by_creator: Dict[str, List[str]] = {}
+            for task_id, creator_id in creators.items():
+                tasks_by_creator.setdefault(creator_id, []).append(task_id)
+            for creator_id, creator_task_ids in tasks_by_creator.items():
+                supabase.table("task").update({"created_by": creator_id}).in_("task_id", creator_task_ids).execute()
+                updated += len(creator_task_ids)
+            unresolved += len(task_ids) - len(creators)
+            evict_task_access(list(creators))
+
+            remaining = len(task_ids) == batch_size
+
+        print(f"🧾 created_by backfill: scanned {scanned}, updated {updated}, unresolved {unresolved}")
+        return jsonify({
+            "scanned": scanned,
+            "updated": updated,
+            "unresolved": unresolved,
+            "remaining": remaining,
+            "next_after": last_task_id if remaining else None
+        }), 200
+
+    except Exception as exc:
+        return jsonify({"error": f"Failed to backfill created_by: {str(exc)}"}), 500
+
+
+@api.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "task-service"}), 200
+    return jsonify({"status": "healthy", "service": "task-service", "worker": worker_info()}), 200
 
 
-@app.route("/users", methods=["GET"])
+@api.route("/users", methods=["GET"])
 def get_all_users():
     """Get all users from Supabase user table"""
     try:
@@ -2693,7 +3847,27 @@ def get_all_users():
     except Exception as exc:
         return jsonify({"error": f"Failed to fetch users: {str(exc)}"}), 500
 
-@app.route("/users/<user_id>", methods=["GET"])
+MAX_MENTION_SUGGESTIONS = 50
+
+@api.route("/users/mention-suggest", methods=["GET"])
+def mention_suggest():
+    """
+    GET /users/mention-suggest?q=<prefix>&limit=<n> - Autocomplete users for @mentions
+    Matches the start of the name or of any word in it, case-insensitively, from the in-memory name index
+    """
+    try:
+        query = (request.args.get("q") or "").strip()
+        try:
+            limit = min(max(int(request.args.get("limit", 10)), 1), MAX_MENTION_SUGGESTIONS)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+
+        users = [{"user_id": user["user_id"], "name": user.get("name")} for user in MENTION_INDEX.suggest(query, limit)]
+        return jsonify({"query": query, "users": users}), 200
+    except Exception as exc:
+        return jsonify({"error": f"Failed to suggest users: {str(exc)}"}), 500
+
+@api.route("/users/<user_id>", methods=["GET"])
 def get_user_by_id(user_id: str):
     """Get user info by user_id from Supabase user table"""
     try:
@@ -2713,22 +3887,15 @@ def get_user_by_id(user_id: str):
     except Exception as exc:
         return jsonify({"error": f"Failed to fetch user: {str(exc)}", "user_id": user_id}), 500
     
-@app.route("/check-all-tasks-notifications", methods=["POST"])
+@api.route("/check-all-tasks-notifications", methods=["POST"])
 def check_all_tasks_notifications():
-    """Check all existing tasks for due date notifications"""
+    """Send due-date reminders for every task whose reminder falls today (set-based sweep)"""
     try:
-        # Get all tasks with due dates
-        response = supabase.table("task").select("*").not_.is_("due_date", "null").execute()
-        tasks = response.data or []
-        
-        notification_count = 0
-        for task in tasks:
-            check_and_send_due_date_notifications(task)
-            notification_count += 1
-        
+        result = run_due_date_sweep()
         return jsonify({
-            "message": f"Checked {len(tasks)} tasks for notifications",
-            "tasks_processed": notification_count
+            "message": f"Checked {result['tasks_checked']} tasks in the reminder window using {result['queries']} queries",
+            "tasks_processed": result["tasks_checked"],
+            **result
         }), 200
     
     except Exception as e:
@@ -2736,7 +3903,7 @@ def check_all_tasks_notifications():
     
 
 # ALSO ADD: Function to manually trigger notifications for existing tasks
-@app.route("/tasks/<task_id>/check-notifications", methods=["POST"])
+@api.route("/tasks/<task_id>/check-notifications", methods=["POST"])
 def check_task_notifications(task_id: str):
     """Manually check and create notifications for a specific task"""
     try:
@@ -2751,7 +3918,7 @@ def check_task_notifications(task_id: str):
     except Exception as e:
         return jsonify({"error": f"Failed to check notifications: {str(e)}"}), 500
     
-@app.route("/test-notifications/<user_id>", methods=["POST"])
+@api.route("/test-notifications/<user_id>", methods=["POST"])
 def test_create_notification(user_id: str):
     """Test endpoint to create a sample notification"""
     try:
@@ -2790,7 +3957,7 @@ def test_create_notification(user_id: str):
     except Exception as e:
         return jsonify({"error": f"Failed to create test notification: {str(e)}"}), 500
 
-@app.route("/notifications/debug/<user_id>", methods=["GET"])
+@api.route("/notifications/debug/<user_id>", methods=["GET"])
 def debug_notifications(user_id: str):
     """Debug endpoint to check notifications for a user"""
     try:
@@ -2810,7 +3977,7 @@ def debug_notifications(user_id: str):
 
 # Comments API Routes
 
-@app.route("/tasks/<task_id>/comments", methods=["GET"])
+@api.route("/tasks/<task_id>/comments", methods=["GET"])
 def get_task_comments(task_id: str):
     """Get all comments for a specific task - OPTIMIZED with batch user fetching"""
     
@@ -2867,7 +4034,7 @@ def get_task_comments(task_id: str):
         return jsonify({"error": f"Failed to fetch comments: {str(e)}"}), 500
 
 
-@app.route("/tasks/<task_id>/comments", methods=["POST"])
+@api.route("/tasks/<task_id>/comments", methods=["POST"])
 def add_task_comment(task_id: str):
     """Add a new comment to a task"""
     if not validate_task_id(task_id):
@@ -2922,11 +4089,10 @@ def add_task_comment(task_id: str):
         comment = response.data[0]
 
         # Get user information for the response
-        user_response = supabase.table("user").select("name").eq("user_id", user_id).execute()
+        user = get_cached_user(user_id)
         user_name = "Unknown User"
-        if user_response.data:
-            user = user_response.data[0]
-            user_name = user.get('name', '').strip()
+        if user:
+            user_name = (user.get('name') or '').strip()
             if not user_name:  # If the name is empty after stripping
                 user_name = "Unknown User"
         
@@ -2946,7 +4112,8 @@ def add_task_comment(task_id: str):
                 task_data=task,
                 comment_text=comment_data.comment_text,
                 commenter_id=user_id,
-                commenter_name=user_name
+                commenter_name=user_name,
+                comment_id=comment.get("comment_id")
             )
             print(f"✅ Task comment notifications function completed for task {task_id}")
         except Exception as notification_error:
@@ -2961,7 +4128,8 @@ def add_task_comment(task_id: str):
                 task_data=task,
                 comment_text=comment_data.comment_text,
                 commenter_id=user_id,
-                commenter_name=user_name
+                commenter_name=user_name,
+                comment_id=comment.get("comment_id")
             )
             print(f"✅ Mention notifications function completed for task {task_id}")
         except Exception as mention_error:
@@ -2990,7 +4158,7 @@ def add_task_comment(task_id: str):
         return jsonify({"error": "Failed to add comment"}), 500
 
 
-@app.route("/tasks/<task_id>/notification-preferences", methods=["GET"])
+@api.route("/tasks/<task_id>/notification-preferences", methods=["GET"])
 def get_task_notification_preferences(task_id: str):
     """Get notification preferences for a specific task and user"""
     try:
@@ -3003,7 +4171,7 @@ def get_task_notification_preferences(task_id: str):
     except Exception as e:
         return jsonify({"error": f"Failed to get notification preferences: {str(e)}"}), 500
 
-@app.route("/tasks/<task_id>/reminder-preferences", methods=["GET"])
+@api.route("/tasks/<task_id>/reminder-preferences", methods=["GET"])
 def get_task_reminder_preferences(task_id: str):
     """Get reminder days for a specific task"""
     try:
@@ -3017,7 +4185,7 @@ def get_task_reminder_preferences(task_id: str):
     except Exception as e:
         return jsonify({"error": f"Failed to get reminder preferences: {str(e)}"}), 500
 
-@app.route("/tasks/<task_id>/recurring-preview", methods=["GET"])
+@api.route("/tasks/<task_id>/recurring-preview", methods=["GET"])
 def get_recurring_preview(task_id: str):
     """Preview the next N instances of a recurring task"""
     try:
@@ -3036,35 +4204,52 @@ def get_recurring_preview(task_id: str):
         if not due_date:
             return jsonify({"error": "Task has no due date"}), 400
 
-        # Generate next 5 instances
-        instances = []
-        current_date = due_date
-        count = int(request.args.get("count", 5))  # Default to 5 instances
-
-        for i in range(count):
-            next_date = calculate_next_due_date(current_date, recurrence)
-            if not next_date:
-                break
+        try:
+            rule = compile_rule(recurrence)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid recurrence: {str(e)}"}), 400
+        if rule is None:
+            return jsonify({"error": f"Unknown recurrence '{recurrence}'"}), 400
 
-            instances.append({
-                "instance_number": i + 1,
-                "due_date": next_date,
-                "recurrence_type": recurrence
-            })
-            current_date = next_date
+        # Horizon: a number of instances, an end date, or both (whichever comes first)
+        try:
+            until = request.args.get("until")
+            if request.args.get("horizon_days"):
+                horizon_date = parse_due_date(due_date) + timedelta(days=int(request.args["horizon_days"]))
+                until = min(until, horizon_date.isoformat()) if until else horizon_date.isoformat()
+            if until:
+                until = datetime.strptime(until[:10], "%Y-%m-%d").date()
+            default_count = MAX_OCCURRENCES if until else 5  # Default to 5 instances
+            count = int(request.args.get("count", default_count))
+        except ValueError:
+            return jsonify({"error": "count and horizon_days must be integers and until must be YYYY-MM-DD"}), 400
+        if count < 1:
+            return jsonify({"error": "count must be at least 1"}), 400
+        count = min(count, MAX_OCCURRENCES)
+
+        # All occurrences are expanded in one pass from the current due date
+        occurrences = rule.occurrences(due_date, limit=count, until=until)
+        instances = [
+            {"instance_number": i, "due_date": next_date.strftime("%Y-%m-%d"), "recurrence_type": recurrence}
+            for i, next_date in enumerate(occurrences, start=1)
+        ]
 
         return jsonify({
             "task_id": task_id,
             "title": task_data.get("title"),
             "recurrence": recurrence,
+            "rule": rule.describe(),
             "current_due_date": due_date,
-            "next_instances": instances
+            "until": until.isoformat() if until else None,
+            "next_instances": instances,
+            # More occurrences exist beyond what was returned
+            "has_more": bool(occurrences) and rule.advanced(len(occurrences)).next_after(occurrences[-1]) is not None
         }), 200
 
     except Exception as e:
         return jsonify({"error": f"Failed to generate recurring preview: {str(e)}"}), 500
 
-@app.route("/tasks/<task_id>/stop-recurrence", methods=["POST"])
+@api.route("/tasks/<task_id>/stop-recurrence", methods=["POST"])
 def stop_task_recurrence(task_id: str):
     """Stop recurrence for a task"""
     try:
@@ -3084,6 +4269,11 @@ def stop_task_recurrence(task_id: str):
         if not response.data:
             return jsonify({"error": "Failed to stop recurrence"}), 500
 
+        # Instances already pre-created by materialization stop recurring as well
+        successor_ids = get_open_recurrence_successors(task_id)
+        if successor_ids:
+            supabase.table("task").update({"recurrence": None}).in_("task_id", successor_ids).execute()
+
         # Log the change
         log_task_change(
             task_id=task_id,
@@ -3096,28 +4286,74 @@ def stop_task_recurrence(task_id: str):
 
         return jsonify({
             "message": "Recurrence stopped successfully",
-            "task_id": task_id
+            "task_id": task_id,
+            "successors_updated": len(successor_ids)
         }), 200
 
     except Exception as e:
         return jsonify({"error": f"Failed to stop recurrence: {str(e)}"}), 500
 
+@api.route("/tasks/recurring/materialize", methods=["POST"])
+def materialize_recurring_tasks():
+    """
+    POST /tasks/recurring/materialize?window_days=14&dry_run=false
+
+    Pre-create recurring task instances due within the rolling window (called by the notification scheduler).
+    """
+    try:
+        try:
+            window_days = int(request.args.get("window_days", RECURRING_WINDOW_DAYS))
+        except ValueError:
+            return jsonify({"error": "window_days must be an integer"}), 400
+        if not 1 <= window_days <= MAX_RECURRING_WINDOW_DAYS:
+            return jsonify({"error": f"window_days must be between 1 and {MAX_RECURRING_WINDOW_DAYS}"}), 400
+        dry_run = request.args.get("dry_run", "false").lower() == "true"
+
+        return jsonify(materialize_recurring_instances(window_days, dry_run=dry_run)), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to materialize recurring tasks: {str(e)}"}), 500
+
 # OPTIMIZED ENDPOINTS FOR PERFORMANCE
 
-@app.route("/tasks/<task_id>/details", methods=["GET"])
+@api.route("/tasks/<task_id>/details", methods=["GET"])
 def get_task_details_optimized(task_id: str):
     """
     Optimized endpoint that returns task with comments, logs, and user data in one request
     This reduces the number of API calls from frontend
+    The independent queries run concurrently on QUERY_FANOUT; "debug" reports per-stage timings
     """
     try:
         if not validate_task_id(task_id):
             return jsonify({"error": "Invalid task ID"}), 400
 
-        # Get task data
-        task_data = get_task_by_id(task_id)
+        request_start = time.perf_counter()
+
+        def fetch_comments():
+            response = supabase.table("task_comments").select(
+                "comment_id, comment_text, user_id, created_at, updated_at"
+            ).eq("task_id", task_id).order("created_at", desc=False).execute()
+            return response.data or []
+
+        def fetch_logs():
+            # No flush here: queued audit entries land within the writer's flush_interval
+            response = supabase.table("task_log").select(
+                "log_id,task_id,action,user_id,old_value,new_value,created_at,field"
+            ).eq("task_id", task_id).order("created_at", desc=True).execute()
+            return response.data or []
+
+        # The task, comments, logs and subtask count do not depend on each other - fetch them concurrently
+        results, stage_timings = QUERY_FANOUT.run({
+            "comments": fetch_comments,
+            "logs": fetch_logs,
+            "subtasks_count": lambda: get_subtasks_counts([task_id]).get(task_id, 0),
+            "task": lambda: get_task_by_id(task_id),
+        })
+        task_data = results["task"]
         if not task_data:
             return jsonify({"error": "Task not found"}), 404
+        comments = results["comments"]
+        logs = results["logs"]
+        subtasks_count = results["subtasks_count"]
 
         # Collect all user IDs that we need to fetch
         all_user_ids = set()
@@ -3135,28 +4371,18 @@ def get_task_details_optimized(task_id: str):
                 collaborators = []
         all_user_ids.update(collaborators)
 
-        # Get comments and extract user IDs
-        comments_response = supabase.table("task_comments").select(
-            "comment_id, comment_text, user_id, created_at, updated_at"
-        ).eq("task_id", task_id).order("created_at", desc=False).execute()
-        
-        comments = comments_response.data or []
         for comment in comments:
             if comment.get("user_id"):
                 all_user_ids.add(comment["user_id"])
 
-        # Get logs and extract user IDs
-        logs_response = supabase.table("task_log").select(
-            "log_id,task_id,action,user_id,old_value,new_value,created_at,field"
-        ).eq("task_id", task_id).order("created_at", desc=True).execute()
-        
-        logs = logs_response.data or []
         for log in logs:
             if log.get("user_id"):
                 all_user_ids.add(log["user_id"])
 
-        # Batch fetch all users
+        # Batch fetch all users (needs the IDs from every stage above)
+        users_start = time.perf_counter()
         user_cache = batch_fetch_users(list(all_user_ids))
+        stage_timings["users"] = round((time.perf_counter() - users_start) * 1000, 2)
 
         # Enhance task with user data
         enhanced_task = enhance_task_with_user_data(task_data, user_cache)
@@ -3188,10 +4414,6 @@ def get_task_details_optimized(task_id: str):
                 "user_name": user_name
             })
 
-        # Get subtasks count
-        subtasks_response = supabase.table("task").select("task_id", count="exact").eq("parent_task_id", task_id).eq("isSubtask", True).execute()
-        subtasks_count = subtasks_response.count if subtasks_response.count is not None else 0
-
         return jsonify({
             "task": mapped_task,
             "comments": enhanced_comments,
@@ -3202,13 +4424,18 @@ def get_task_details_optimized(task_id: str):
             "cache_info": {
                 "users_cached": len(user_cache),
                 "total_users_needed": len(all_user_ids)
+            },
+            "debug": {
+                "stage_timings_ms": stage_timings,
+                "slowest_stage": max(stage_timings, key=stage_timings.get),
+                "total_ms": round((time.perf_counter() - request_start) * 1000, 2)
             }
         }), 200
 
     except Exception as exc:
         return jsonify({"error": f"Failed to retrieve task details: {str(exc)}"}), 500
 
-@app.route("/tasks/optimized", methods=["GET"])
+@api.route("/tasks/optimized", methods=["GET"])
 def get_tasks_optimized():
     """
     Optimized tasks endpoint that includes user data to reduce frontend API calls
@@ -3219,9 +4446,14 @@ def get_tasks_optimized():
         project_id = request.args.get("project_id")
         status = request.args.get("status")
         include_subtasks = request.args.get("include_subtasks", "true").lower() == "true"
+        try:
+            cursor_position, page_size = get_page_params()
+            fields = parse_fields_param(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Build query
-        query = supabase.table("task").select("*")
+        query = supabase.table("task").select(build_task_select(fields))
         
         if owner_id:
             query = query.eq("owner_id", owner_id)
@@ -3231,14 +4463,11 @@ def get_tasks_optimized():
             query = query.eq("status", status)
         if not include_subtasks:
             query = query.or_("isSubtask.is.null,isSubtask.eq.false")
-            
-        query = query.order("created_at", desc=True)
-        
-        response = query.execute()
-        tasks = response.data or []
+
+        tasks, next_cursor = fetch_task_page(query, cursor_position, page_size)
 
         if not tasks:
-            return jsonify({"tasks": [], "count": 0}), 200
+            return jsonify({"tasks": [], "count": 0, "next_cursor": None}), 200
 
         # Collect all user IDs from tasks
         all_user_ids = set()
@@ -3258,80 +4487,117 @@ def get_tasks_optimized():
         user_cache = batch_fetch_users(list(all_user_ids))
 
         # Enhance tasks with user data
-        enhanced_tasks = []
-        for task in tasks:
-            enhanced_task = enhance_task_with_user_data(task, user_cache)
-            mapped_task = map_db_row_to_api(enhanced_task)
-            enhanced_tasks.append(mapped_task)
+        enhanced_tasks = map_rows_to_api(
+            [enhance_task_with_user_data(task, user_cache) for task in tasks],
+            wants_subtasks_count(fields),
+            fields=fields
+        )
 
         return jsonify({
             "tasks": enhanced_tasks, 
             "count": len(enhanced_tasks),
+            "next_cursor": next_cursor,
             "optimization_info": {
                 "users_cached": len(user_cache),
                 "total_users_needed": len(all_user_ids),
-                "cache_hit_ratio": f"{((len(all_user_ids) - len([uid for uid in all_user_ids if f'user_{uid}' not in USER_CACHE])) / len(all_user_ids)) * 100:.1f}%" if all_user_ids else "0%"
+                "cache_hit_ratio": f"{USER_CACHE.stats()['hit_ratio'] * 100:.1f}%"
             }
         }), 200
 
     except Exception as exc:
         return jsonify({"error": f"Failed to retrieve tasks: {str(exc)}"}), 500
 
-@app.route("/cache/status", methods=["GET"])
+@api.route("/notifications/outbox/relay", methods=["POST"])
+def relay_notification_outbox():
+    """Deliver due notification outbox rows now (for schedulers and deployments with OUTBOX_RELAY_MODE=off)"""
+    try:
+        max_batches = max(1, min(int(request.args.get("max_batches", 100)), 1000))
+    except ValueError:
+        return jsonify({"error": "max_batches must be an integer"}), 400
+    try:
+        result = NOTIFICATION_OUTBOX.relay_pending(max_batches=max_batches)
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to relay notifications: {str(e)}"}), 500
+
+@api.route("/cache/status", methods=["GET"])
 def get_cache_status():
     """Get information about the current cache status"""
     try:
-        current_time = time.time()
-        active_users = 0
-        expired_users = 0
-        
-        for cache_key, (data, timestamp) in USER_CACHE.items():
-            if current_time - timestamp < CACHE_TTL:
-                active_users += 1
-            else:
-                expired_users += 1
-        
         return jsonify({
-            "user_cache": {
-                "active_entries": active_users,
-                "expired_entries": expired_users,
-                "total_entries": len(USER_CACHE),
-                "cache_ttl_seconds": CACHE_TTL
-            },
+            "user_cache": USER_CACHE.stats(),
             "project_cache": {
                 "total_entries": len(PROJECT_CACHE)
-            }
+            },
+            "task_access_cache": TASK_ACCESS_CACHE.stats(),
+            "query_fanout": QUERY_FANOUT.stats(),
+            "audit_log_writer": AUDIT_LOG_WRITER.stats(),
+            "notification_publisher": notification_amqp.stats(),
+            "notification_outbox": NOTIFICATION_OUTBOX.stats(),
+            "email_dispatch": EMAIL_DISPATCHER.stats() if EMAIL_DISPATCHER else None,
+            "mention_index": MENTION_INDEX.stats(),
+            "query_metrics": QUERY_METRICS.stats()
         }), 200
     except Exception as e:
         return jsonify({"error": f"Failed to get cache status: {str(e)}"}), 500
 
-@app.route("/cache/clear", methods=["POST"])
+@api.route("/cache/clear", methods=["POST"])
 def clear_cache():
     """Clear all caches - useful for development/debugging"""
     try:
-        global USER_CACHE, PROJECT_CACHE
         USER_CACHE.clear()
         PROJECT_CACHE.clear()
+        TASK_ACCESS_CACHE.clear()
+        MENTION_INDEX.clear()
         
         return jsonify({"message": "All caches cleared successfully"}), 200
     except Exception as e:
         return jsonify({"error": f"Failed to clear cache: {str(e)}"}), 500
 
 # Error handlers
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
 
-@app.errorhandler(405)
+@api.app_errorhandler(405)
 def method_not_allowed(error):
     return jsonify({"error": "Method not allowed"}), 405
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 
+def create_app() -> Flask:
+    """Build the Flask app around the routes
+
+    Cheap to call: Supabase is built by the first query and RabbitMQ connects from the worker init
+    hooks in the background, so nothing here waits on the network.
+    """
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app)
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "task-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "task-service")
+    # Queue depths and publish/write counters, read from each component's stats() at scrape time
+    METRICS.add_stats("amqp_publisher", notification_amqp.stats, help_text="RabbitMQ notification publisher")
+    METRICS.add_stats("batch_writer", AUDIT_LOG_WRITER.stats, help_text="Audit log batch writer")
+    METRICS.add_stats("notification_outbox", NOTIFICATION_OUTBOX.stats, help_text="Notification outbox relay")
+    if EMAIL_DISPATCHER is not None:
+        METRICS.add_stats("email_dispatch", EMAIL_DISPATCHER.stats, help_text="Email queue dispatcher")
+    METRICS.add_stats("fanout", QUERY_FANOUT.stats, help_text="Parallel query fan-out")
+    METRICS.add_stats("query_metrics", QUERY_METRICS.stats, help_text="Supabase queries per request")
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
+    # Development server; production runs under Gunicorn (see shared/gunicorn_conf.py)
     port = int(os.getenv("PORT", 8080))
-    app.run(host="0.0.0.0", port=port, debug=False)
+    run_development_server(app, port)
 
@@ -1,12 +1,12 @@
 import os
+import sys
 import hashlib
 import secrets
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import bcrypt
 
 load_dotenv()
@@ -18,10 +18,20 @@ SUPABASE_SERVICE_ROLE_KEY: Optional[str] = os.getenv("SUPABASE_SERVICE_ROLE_KEY"
 if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
     raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Shared modules (Docker copies src/microservices/shared next to the service)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../shared'))
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
 
-app = Flask(__name__)
-CORS(app, resources={r"/auth/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]}}, supports_credentials=True)
+# Supabase client, built by the first query
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+# Routes hang off this blueprint; create_app() at the bottom builds the app
+api = Blueprint("auth_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 # Constants
 MAX_FAILED_ATTEMPTS = 5
@@ -164,7 +174,7 @@ def validate_session(session_token: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-@app.route("/auth/login", methods=["POST"])
+@api.route("/auth/login", methods=["POST"])
 def login():
     """Login endpoint with security features"""
     try:
@@ -228,7 +238,7 @@ def login():
         return jsonify({"error": "An error occurred during login"}), 500
 
 
-@app.route("/auth/logout", methods=["POST"])
+@api.route("/auth/logout", methods=["POST"])
 def logout():
     """Logout endpoint"""
     try:
@@ -247,7 +257,7 @@ def logout():
         return jsonify({"error": "An error occurred during logout"}), 500
 
 
-@app.route("/auth/validate", methods=["GET"])
+@api.route("/auth/validate", methods=["GET"])
 def validate_session_endpoint():
     """Validate session endpoint"""
     try:
@@ -281,7 +291,7 @@ def validate_session_endpoint():
         return jsonify({"error": "An error occurred during session validation"}), 500
 
 
-@app.route("/auth/audit-log", methods=["POST"])
+@api.route("/auth/audit-log", methods=["POST"])
 def audit_log():
     """Log audit events for session management and security"""
     try:
@@ -330,17 +340,17 @@ def audit_log():
         return jsonify({"error": "An error occurred while creating audit log"}), 500
 
 
-@app.route("/health", methods=["GET"])
+@api.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint for container orchestration"""
     try:
         # Simple check - just return 200 if service is responding
-        return jsonify({"status": "healthy", "service": "auth-service"}), 200
+        return jsonify({"status": "healthy", "service": "auth-service", "worker": worker_info()}), 200
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 503
 
 
-@app.route("/auth/register", methods=["POST"])
+@api.route("/auth/register", methods=["POST"])
 def register():
     """Register new user (for testing purposes)"""
     try:
@@ -384,7 +394,7 @@ def register():
         return jsonify({"error": "An error occurred during registration"}), 500
 
 
-@app.route("/auth/forgot-password", methods=["POST"])
+@api.route("/auth/forgot-password", methods=["POST"])
 def forgot_password():
     """Request password reset - sends reset email"""
     try:
@@ -518,7 +528,7 @@ def forgot_password():
         return jsonify({"error": "An error occurred while processing your request"}), 500
 
 
-@app.route("/auth/reset-password", methods=["POST"])
+@api.route("/auth/reset-password", methods=["POST"])
 def reset_password():
     """Reset password using reset token"""
     try:
@@ -602,7 +612,7 @@ def reset_password():
         return jsonify({"error": "An error occurred while resetting your password"}), 500
 
 
-@app.route("/auth/validate-reset-token", methods=["GET"])
+@api.route("/auth/validate-reset-token", methods=["GET"])
 def validate_reset_token():
     """Validate reset token without using it"""
     try:
@@ -635,5 +645,22 @@ def validate_reset_token():
         return jsonify({"error": "An error occurred while validating reset token"}), 500
 
 
+def create_app() -> Flask:
+    """Build the Flask app around the auth routes"""
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app, resources={r"/auth/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"]}}, supports_credentials=True)
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "auth-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "auth-service")
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8086, debug=True)
\ No newline at end of file
+    # Development server (debug with FLASK_DEBUG=1); production runs under Gunicorn (see shared/gunicorn_conf.py)
+    run_development_server(app, int(os.getenv("PORT", 8086)), debug=os.getenv("FLASK_DEBUG") == "1")
\ No newline at end of file
@@ -1,12 +1,12 @@
 import os
+import sys
 import uuid
 from typing import Optional, Dict, Any
 from datetime import datetime, timezone, timedelta
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 load_dotenv()
-from supabase import create_client, Client
 
 
 SUPABASE_URL: Optional[str] = os.getenv("SUPABASE_URL")
@@ -19,18 +19,25 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
 
 # CURRENT_USER_ID is now optional - we'll use session-based authentication
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
-app = Flask(__name__)
-CORS(app, resources={
-    r"/*": {
-        "origins": ["http://localhost:3000", "http://localhost:5173"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-        "supports_credentials": True,
-        "max_age": 3600
-    }
-})
+# Cache invalidation events tell other services when cached user rows change
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../shared'))
+from cache_events import CacheEventPublisher
+from query_metrics import QueryMetrics, install_query_metrics
+from metrics import ServiceMetrics, install_metrics
+from serving import on_worker_init, worker_info, run_development_server, lazy_supabase_client
+
+# Supabase client, built by the first query
+supabase = lazy_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+RABBITMQ_URL: str = os.getenv("RABBITMQ_URL", "amqp://localhost")
+cache_events = CacheEventPublisher(RABBITMQ_URL, source="user-service")
+
+# Routes hang off this blueprint; create_app() at the bottom builds the app
+api = Blueprint("user_service", __name__)
+# Set by create_app()
+QUERY_METRICS: Optional[QueryMetrics] = None
+METRICS: Optional[ServiceMetrics] = None
 
 
 # Session timeout constant
@@ -103,7 +110,7 @@ def map_db_row_to_api(row: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-@app.get("/user")
+@api.get("/user")
 def get_current_user():
     """Get the current authenticated user info using session token"""
     try:
@@ -141,7 +148,7 @@ def get_current_user():
         return jsonify({"error": str(exc)}), 500
 
 
-@app.get("/users")
+@api.get("/users")
 def get_all_users():
     """Get all active users (for admin purposes or fallback)"""
     try:
@@ -166,7 +173,7 @@ def get_all_users():
         return jsonify({"error": f"Failed to fetch users: {str(e)}"}), 500
 
 
-@app.get("/users/<user_id>")
+@api.get("/users/<user_id>")
 def get_user_by_id(user_id: str):
     """Get a specific user by their ID"""
     try:
@@ -186,7 +193,7 @@ def get_user_by_id(user_id: str):
         return jsonify({"error": f"Failed to fetch user: {str(e)}"}), 500
 
 
-@app.get("/users/<user_id>/possible-superiors")
+@api.get("/users/<user_id>/possible-superiors")
 def get_possible_superiors(user_id: str):
     """Get possible superiors for a user based on role hierarchy and department"""
     try:
@@ -236,7 +243,7 @@ def get_possible_superiors(user_id: str):
         return jsonify({"error": f"Failed to fetch possible superiors: {str(e)}"}), 500
 
 
-@app.get("/users/departments/<department>")
+@api.get("/users/departments/<department>")
 def get_users_by_department(department: str):
     """Get all active users in a specific department"""
     try:
@@ -261,7 +268,7 @@ def get_users_by_department(department: str):
         return jsonify({"error": f"Failed to fetch users for department {department}: {str(e)}"}), 500
 
 
-@app.get("/users/<user_id>/subordinates")
+@api.get("/users/<user_id>/subordinates")
 def get_user_subordinates(user_id: str):
     """Get subordinates for a Manager or Director user"""
     try:
@@ -343,7 +350,7 @@ def get_user_subordinates(user_id: str):
         return jsonify({"error": f"Failed to fetch subordinates: {str(e)}"}), 500
 
 
-@app.put("/users/<user_id>")
+@api.put("/users/<user_id>")
 def update_user(user_id: str):
     """Update user information (currently supports updating name only)"""
     try:
@@ -402,11 +409,45 @@ def update_user(user_id: str):
         updated_user = response.data[0]
         user_info = map_db_row_to_api(updated_user)
 
+        cache_events.publish("user", [user_id], action="updated")
+
         return jsonify({"user": user_info, "message": "User updated successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": f"Failed to update user: {str(e)}"}), 500
 
 
+@api.route("/health", methods=["GET"])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({"status": "healthy", "service": "user-service", "worker": worker_info()}), 200
+
+
+def create_app() -> Flask:
+    """Build the Flask app around the user routes"""
+    global QUERY_METRICS, METRICS
+    app = Flask(__name__)
+    CORS(app, resources={
+        r"/*": {
+            "origins": ["http://localhost:3000", "http://localhost:5173"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
+            "supports_credentials": True,
+            "max_age": 3600
+        }
+    })
+    # Per-request Supabase query counts, Server-Timing headers and query budget warnings
+    QUERY_METRICS = install_query_metrics(app, "user-service")
+    # Prometheus-format GET /metrics: route latency, in-flight requests, query/HTTP timings, cache counters
+    METRICS = install_metrics(app, "user-service")
+    app.register_blueprint(api)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8081)
\ No newline at end of file
+    # Development server; production runs under Gunicorn (see shared/gunicorn_conf.py)
+    port = int(os.getenv("PORT", 8081))
+    run_development_server(app, port)
\ No newline at end of file
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Email Delivery Throughput Benchmark
+Compares one SMTP session per message (email_service.send_email) with the email dispatcher's
+pooled, reused connections, against a local aiosmtpd server standing in for the SMTP relay
+
+The stand-in requires AUTH (without TLS, since it has no certificate) and can delay every reply
+to imitate the round trip to a real relay. The per-message path pays connect + EHLO + AUTH + QUIT
+for every email; the pooled path pays them once per connection. A real relay also negotiates
+STARTTLS per session, so the measured speed-up is a lower bound.
+
+Requires aiosmtpd (pip install -r tests/requirements-test.txt).
+
+Usage:
+    python benchmark_email_delivery.py [messages] [rtt_ms] [workers...]
+
+Example:
+    python benchmark_email_delivery.py 500 20 1 4 8
+"""
+
+import sys
+import os
+import gc
+import asyncio
+import logging
+import smtplib
+import socket
+import time
+import warnings
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from email_dispatch import EmailDispatcher, SmtpPool, build_email_row, build_message
+
+USER, PASSWORD = "bench", "secret"
+FROM_ADDRESS = "Task Manager <noreply@example.com>"
+
+
+class SlowRelay:
+    """aiosmtpd handler that counts delivered messages and waits rtt seconds before each reply"""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.delivered = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.rtt)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.rtt)
+        envelope.mail_from = address
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.rtt)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.rtt)
+        self.delivered += 1
+        return "250 Message accepted for delivery"
+
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == USER.encode() and auth_data.password == PASSWORD.encode())
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def build_rows(count: int) -> List[dict]:
+    html = "<html><body><h1>Task reminder</h1><p>" + "Your task is due soon. " * 40 + "</p></body></html>"
+    return [dict(build_email_row(f"user{index}@example{index % 5}.com", "Reminder: task due in 1 day", html),
+                 id=index) for index in range(count)]
+
+
+def send_one_session_per_message(port: int, rows: List[dict]) -> None:
+    """What send_email does for every email (minus STARTTLS): connect, EHLO, AUTH, send, QUIT"""
+    for row in rows:
+        with smtplib.SMTP("127.0.0.1", port) as server:
+            server.login(USER, PASSWORD)
+            server.send_message(build_message(row, FROM_ADDRESS))
+
+
+def send_pooled(port: int, rows: List[dict], workers: int) -> None:
+    pool = SmtpPool("127.0.0.1", port, USER, PASSWORD, size=workers, starttls=False)
+    dispatcher = EmailDispatcher(lambda: None, pool, FROM_ADDRESS, mode="off", workers=workers)
+    try:
+        outcomes = dispatcher.send_rows(rows)
+    finally:
+        dispatcher.stop()
+    failures = [outcome for outcome in outcomes if outcome is not None]
+    if failures:
+        raise RuntimeError(f"{len(failures)} message(s) failed, e.g. {failures[0]}")
+
+
+def timed(send, relay: SlowRelay, expected: int) -> float:
+    relay.delivered = 0
+    gc.disable()  # Keep collector pauses out of the measurement, as timeit does
+    try:
+        start = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    assert relay.delivered == expected, f"relay received {relay.delivered} of {expected} messages"
+    return elapsed
+
+
+def main() -> int:
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rtt_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    worker_counts = [int(arg) for arg in sys.argv[3:]] or [1, 4, 8]
+
+    # AUTH without TLS is intended here (the stand-in has no certificate); silence aiosmtpd's warnings
+    warnings.filterwarnings("ignore", module="aiosmtpd")
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+    relay = SlowRelay(rtt_ms / 1000)
+    port = free_port()
+    controller = Controller(relay, hostname="127.0.0.1", port=port, authenticator=authenticate,
+                            auth_require_tls=False, auth_required=True)
+    controller.start()
+    try:
+        rows = build_rows(messages)
+        print(f"{messages} messages, {rtt_ms:g} ms simulated round trip per SMTP reply")
+        print(f"{'path':<32} {'seconds':>9} {'msg/s':>9} {'speed-up':>9}")
+
+        baseline = timed(lambda: send_one_session_per_message(port, rows), relay, messages)
+        print(f"{'one session per message':<32} {baseline:>9.3f} {messages / baseline:>9.1f} {1:>8.1f}x")
+
+        for workers in worker_counts:
+            elapsed = timed(lambda: send_pooled(port, rows, workers), relay, messages)
+            label = f"pooled, {workers} worker(s)"
+            print(f"{label:<32} {elapsed:>9.3f} {messages / elapsed:>9.1f} {baseline / elapsed:>8.1f}x")
+    finally:
+        controller.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
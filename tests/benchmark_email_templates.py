@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Email Template Rendering Benchmark
+Times rendering reminder emails with the templates split once at import against the f-string implementation
+they replaced
+
+The previous create_email_template is loaded from git history: the parent of the commit that
+introduced EMAIL_TEMPLATES, or HEAD while that change is uncommitted. Set EMAIL_TEMPLATE_BASELINE
+to compare against another revision. Both versions must render identical reminders.
+
+Usage:
+    python benchmark_email_templates.py [reminders] [recipients_per_task]
+
+Example:
+    python benchmark_email_templates.py 10000 3
+"""
+
+import sys
+import os
+import gc
+import subprocess
+import time
+import types
+from typing import Callable, Dict, List, Tuple
+
+NOTIFICATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'notifications')
+EMAIL_SERVICE_PATH = "src/microservices/notifications/email_service.py"
+sys.path.insert(0, NOTIFICATIONS_DIR)
+
+import email_service
+
+
+def git(*args: str) -> str:
+    return subprocess.check_output(["git", *args], cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                                   text=True)
+
+
+def load_baseline() -> Tuple[str, types.ModuleType]:
+    """email_service as it was before the templates were split at import"""
+    revision = os.getenv("EMAIL_TEMPLATE_BASELINE")
+    if not revision:
+        introduced = git("log", "--format=%H", "-S", "EMAIL_TEMPLATES: Dict", "--", EMAIL_SERVICE_PATH).split()
+        revision = f"{introduced[-1]}^" if introduced else "HEAD"
+    source = git("show", f"{revision}:{EMAIL_SERVICE_PATH}")
+    module = types.ModuleType("email_service_baseline")
+    module.__file__ = email_service.__file__
+    exec(compile(source, f"{revision}:{EMAIL_SERVICE_PATH}", "exec"), module.__dict__)
+    return git("rev-parse", "--short", revision).strip(), module
+
+
+def build_reminders(count: int, recipients_per_task: int) -> List[Tuple[str, Dict, List[str]]]:
+    """(notification_type, data, recipients) per task, count recipients in total"""
+    events = []
+    for index in range((count + recipients_per_task - 1) // recipients_per_task):
+        data = {"task_title": f"Quarterly report section {index}", "due_date": "October 20, 2025",
+                "priority": str(index % 10 + 1), "task_id": f"task-{index}"}
+        recipients = [f"user{index}-{slot}@example.com" for slot in range(recipients_per_task)]
+        events.append((f"reminder_{(1, 3, 7)[index % 3]}_days", data, recipients))
+    return events
+
+
+def per_recipient(create_template: Callable) -> Callable:
+    def render(events):
+        for notification_type, data, recipients in events:
+            for _ in recipients:
+                create_template(notification_type, data)
+    return render
+
+
+def batched(events) -> None:
+    for notification_type, data, recipients in events:
+        email_service.render_email_batch(notification_type, data, recipients)
+
+
+def best_time(render: Callable, events, repeats: int = 5) -> float:
+    """Return the best wall time in seconds over a few runs"""
+    best = float("inf")
+    gc.disable()  # Keep collector pauses out of the measurement, as timeit does
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            render(events)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    recipients_per_task = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    revision, baseline = load_baseline()
+    events = build_reminders(count, recipients_per_task)
+    for notification_type, data, _ in events[:30]:
+        assert baseline.create_email_template(notification_type, data) == \
+            email_service.create_email_template(notification_type, data), "template output differs from baseline"
+
+    emails = sum(len(recipients) for _, _, recipients in events)
+    print(f"{emails} reminder emails, {recipients_per_task} recipient(s) per task, baseline {revision}")
+    print(f"{'path':<40} {'seconds':>9} {'emails/s':>11} {'speed-up':>9}")
+    base = best_time(per_recipient(baseline.create_email_template), events)
+    for label, render in [("f-strings, one render per recipient", None),
+                          ("split, one render per recipient", per_recipient(email_service.create_email_template)),
+                          ("split, one render per task (batch)", batched)]:
+        elapsed = base if render is None else best_time(render, events)
+        print(f"{label:<40} {elapsed:>9.3f} {emails / elapsed:>11.0f} {base / elapsed:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+Shared pytest fixtures for the microservice test suites
+"""
+
+import os
+import sys
+
+import pytest
+
+# Write audit logs inline so tests can assert on the inserted row
+os.environ.setdefault("AUDIT_LOG_MODE", "sync")
+# Only write notification outbox rows; tests drive the relay explicitly
+os.environ.setdefault("OUTBOX_RELAY_MODE", "off")
+# Send emails inline (through the mocked SMTP client) instead of queueing them in email_queue
+os.environ.setdefault("EMAIL_DELIVERY", "direct")
+
+
+@pytest.fixture(autouse=True)
+def reset_user_directory_caches():
+    """Start every test with empty user directory caches so cached rows never leak between tests"""
+    user_cache = sys.modules.get("user_cache")
+    if user_cache is not None:
+        user_cache.clear_all_caches()
+    yield
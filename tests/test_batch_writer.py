@@ -0,0 +1,113 @@
+"""
+Batch Writer Test Suite
+Unit tests for the background bulk writer used for audit logs
+"""
+
+import sys
+import os
+from unittest.mock import Mock
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestBatchWriter:
+    """Test the background bulk writer used for audit logs"""
+
+    def test_async_rows_are_written_in_batches(self):
+        """Test queued rows are flushed together"""
+        from batch_writer import BatchWriter
+
+        batches = []
+        writer = BatchWriter(lambda rows: batches.append(list(rows)) or rows, batch_size=50, flush_interval=0.05)
+        for index in range(10):
+            writer.submit({"n": index})
+
+        assert writer.flush(timeout=2)
+        assert sum(len(batch) for batch in batches) == 10
+        assert len(batches) < 10
+        writer.close()
+
+    def test_flush_waits_only_for_rows_queued_before_it(self):
+        """Test rows submitted while flush waits do not hold it up"""
+        import threading
+        from batch_writer import BatchWriter
+
+        first_written, later_written = threading.Event(), threading.Event()
+
+        def write_rows(rows):
+            (first_written if rows[0]["n"] == 0 else later_written).wait(2)
+            return rows
+
+        writer = BatchWriter(write_rows, batch_size=1, flush_interval=0.01)
+        writer.submit({"n": 0})
+
+        def keep_writing():
+            writer.submit({"n": 1})
+            writer.submit({"n": 2})
+            first_written.set()
+
+        threading.Timer(0.05, keep_writing).start()
+
+        assert writer.flush(timeout=1)
+        assert writer.stats()["written"] == 1
+        later_written.set()
+        writer.close()
+
+    def test_sync_mode_returns_written_row(self):
+        """Test sync mode writes inline and surfaces errors"""
+        from batch_writer import BatchWriter
+        import pytest
+
+        writer = BatchWriter(lambda rows: [{"log_id": "log-1", **rows[0]}], mode="sync")
+        assert writer.submit({"task_id": "task-1"})["log_id"] == "log-1"
+
+        failing = BatchWriter(Mock(side_effect=Exception("Database error")), mode="sync")
+        with pytest.raises(Exception):
+            failing.submit({"task_id": "task-1"})
+
+    def test_close_flushes_pending_rows(self):
+        """Test shutdown writes everything still queued"""
+        from batch_writer import BatchWriter
+
+        written = []
+        writer = BatchWriter(lambda rows: written.extend(rows) or rows, batch_size=1000, flush_interval=5)
+        writer.submit({"n": 1})
+        writer.submit({"n": 2})
+
+        writer.close(timeout=2)
+
+        assert written == [{"n": 1}, {"n": 2}]
+
+    def test_submit_many_sync_is_one_insert(self):
+        """Test a bulk submit in sync mode becomes a single write"""
+        from batch_writer import BatchWriter
+
+        write_rows = Mock(side_effect=lambda rows: rows)
+        writer = BatchWriter(write_rows, mode="sync")
+
+        assert writer.submit_many([{"n": 1}, {"n": 2}, {"n": 3}]) == 3
+        write_rows.assert_called_once_with([{"n": 1}, {"n": 2}, {"n": 3}])
+
+    def test_failed_batch_is_split_so_only_the_bad_row_is_dropped(self):
+        """Test a batch that keeps failing is bisected down to the row the database rejects"""
+        from batch_writer import BatchWriter
+
+        written = []
+
+        def write_rows(rows):
+            if any(row["n"] == 3 for row in rows):
+                raise Exception("invalid input syntax for type uuid")
+            written.extend(rows)
+            return rows
+
+        writer = BatchWriter(write_rows, mode="sync", max_retries=0)
+        writer._write_with_retries([{"n": n} for n in range(6)])
+
+        assert sorted(row["n"] for row in written) == [0, 1, 2, 4, 5]
+        assert writer.stats()["failed"] == 1
+        assert writer.stats()["written"] == 5
@@ -0,0 +1,174 @@
+"""
+Email Dispatch Test Suite
+Unit tests for the email queue dispatcher, SMTP pool and per-domain rate limits
+"""
+
+import sys
+import os
+import pytest
+from unittest.mock import Mock, patch
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class FakeSMTP:
+    """Records the SMTP conversation; send_message raises queued errors in order"""
+
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.calls = []
+        self.errors = []
+        FakeSMTP.opened.append(self)
+
+    def starttls(self):
+        self.calls.append("starttls")
+
+    def login(self, user, password):
+        self.calls.append("login")
+
+    def send_message(self, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.calls.append(("send", message["To"]))
+
+    def quit(self):
+        self.calls.append("quit")
+
+
+class TestEmailDispatch:
+    """Test the pooled SMTP sender, domain rate limits and the email queue dispatcher"""
+
+    def setup_method(self):
+        FakeSMTP.opened = []
+
+    def _pool(self, **kwargs):
+        from email_dispatch import SmtpPool
+
+        return SmtpPool("smtp.test", 587, "user", "secret", smtp_class=FakeSMTP, **kwargs)
+
+    def _dispatcher(self, client, **kwargs):
+        from email_dispatch import EmailDispatcher
+
+        defaults = dict(mode="off", workers=1, max_attempts=3, retry_base_delay=10)
+        defaults.update(kwargs)
+        return EmailDispatcher(lambda: client, defaults.pop("pool", None) or self._pool(), "Taskio <noreply@test>",
+                               **defaults)
+
+    def _rows(self, *addresses):
+        from email_dispatch import build_email_row
+
+        return [dict(build_email_row(address, "Reminder", "<p>hi</p>"), id=index + 1)
+                for index, address in enumerate(addresses)]
+
+    def test_pool_authenticates_once_and_reuses_the_connection(self):
+        """Test STARTTLS/login run once per connection and connections are recycled after max_messages"""
+        from email_dispatch import build_message
+
+        pool = self._pool(size=2, max_messages=3)
+        for row in self._rows("a@x.com", "b@x.com", "c@x.com", "d@x.com"):
+            pool.send(build_message(row, "noreply@test"))
+
+        first, second = FakeSMTP.opened
+        assert first.calls[:2] == ["starttls", "login"] and first.calls[-1] == "quit"
+        assert [call for call in first.calls if call[0] == "send"] == [("send", "a@x.com"), ("send", "b@x.com"),
+                                                                        ("send", "c@x.com")]
+        assert pool.stats()["connections_opened"] == 2 and pool.stats()["messages_sent"] == 4
+
+    def test_dropped_connection_is_replaced_once(self):
+        """Test a connection the server closed while idle is discarded and the message resent on a new one"""
+        import smtplib
+        from email_dispatch import build_message
+
+        pool = self._pool()
+        message = build_message(self._rows("a@x.com")[0], "noreply@test")
+        pool.send(message)
+        FakeSMTP.opened[0].errors.append(smtplib.SMTPServerDisconnected("gone"))
+        pool.send(message)
+
+        assert len(FakeSMTP.opened) == 2
+        assert pool.stats()["reconnects"] == 1 and pool.stats()["messages_sent"] == 2
+
+    def test_rate_limits_per_domain(self):
+        """Test each domain has its own bucket and the default applies to unlisted domains"""
+        from email_dispatch import DomainRateLimiter, parse_rate_limits
+
+        now = [0.0]
+        limits = parse_rate_limits("gmail.com=2/s, default=60/min, bogus")
+        assert limits == {"gmail.com": 2.0, "default": 1.0}
+        limiter = DomainRateLimiter(limits, clock=lambda: now[0])
+
+        assert [limiter.acquire("gmail.com") for _ in range(2)] == [0.0, 0.0]
+        assert limiter.acquire("gmail.com") == pytest.approx(0.5)
+        assert limiter.acquire("example.com") == 0.0
+        assert limiter.acquire("example.com") == pytest.approx(1.0)
+        now[0] = 0.5
+        assert limiter.acquire("gmail.com") == 0.0
+
+    def test_enqueue_is_one_upsert_and_falls_back_to_inline_send(self):
+        """Test rows are queued by idempotency key, and sent inline if the queue cannot be written"""
+        client = Mock()
+        dispatcher = self._dispatcher(client)
+        rows = self._rows("a@x.com", "b@y.com")
+
+        assert dispatcher.enqueue(rows) == 2
+        assert client.table.return_value.upsert.call_args[1] == {"on_conflict": "idempotency_key",
+                                                                 "ignore_duplicates": True}
+        assert FakeSMTP.opened == []
+
+        client.table.return_value.upsert.return_value.execute.side_effect = Exception("relation does not exist")
+        assert dispatcher.enqueue(rows) == 2
+        assert dispatcher.stats()["sent_inline"] == 2 and dispatcher.stats()["enqueue_errors"] == 1
+
+    def test_dispatch_defers_rate_limited_rows_without_using_an_attempt(self):
+        """Test rows over their domain's rate go back to pending later and the rest are sent in parallel"""
+        from email_dispatch import DomainRateLimiter
+
+        client = Mock()
+        dispatcher = self._dispatcher(client, workers=2, rate_limiter=DomainRateLimiter({"slow.com": 1.0}))
+        rows = self._rows("a@slow.com", "b@slow.com", "c@fast.com")
+
+        with patch.object(dispatcher, "_claim", return_value=rows):
+            result = dispatcher.dispatch_once()
+
+        assert result == {"claimed": 3, "sent": 2, "deferred": 1, "retried": 0, "failed": 0}
+        recorded = {row["to_email"]: row for row in client.table.return_value.upsert.call_args[0][0]}
+        assert recorded["b@slow.com"]["status"] == "pending" and recorded["b@slow.com"]["attempts"] == 0
+        assert recorded["b@slow.com"]["next_attempt_at"] > rows[1]["next_attempt_at"]
+        assert recorded["a@slow.com"]["status"] == recorded["c@fast.com"]["status"] == "sent"
+        dispatcher.stop()
+
+    def test_transient_errors_back_off_and_permanent_errors_fail(self):
+        """Test a 4xx reply is retried with a growing delay until max_attempts and a 5xx reply fails at once"""
+        import smtplib
+
+        client = Mock()
+        pool = self._pool(size=1)
+        dispatcher = self._dispatcher(client, pool=pool)
+        rows = self._rows("busy@x.com", "nobody@x.com")
+        pool.send = Mock(side_effect=[smtplib.SMTPResponseException(451, b"try later"),
+                                      smtplib.SMTPRecipientsRefused({"nobody@x.com": (550, b"no such user")})])
+
+        with patch.object(dispatcher, "_claim", return_value=rows):
+            assert dispatcher.dispatch_once()["retried"] == 1
+        busy, nobody = client.table.return_value.upsert.call_args[0][0]
+        assert (busy["status"], busy["attempts"]) == ("pending", 1)
+        assert (nobody["status"], nobody["attempts"]) == ("failed", 1) and "550" in nobody["last_error"]
+
+        pool.send = Mock(side_effect=smtplib.SMTPResponseException(421, b"closing"))
+        with patch.object(dispatcher, "_claim", return_value=[busy]):
+            dispatcher.dispatch_once()
+        second = client.table.return_value.upsert.call_args[0][0][0]
+        assert (second["status"], second["attempts"]) == ("pending", 2)
+        assert second["next_attempt_at"] > busy["next_attempt_at"]  # 20-25 s after 10-12.5 s
+
+        with patch.object(dispatcher, "_claim", return_value=[second]):
+            dispatcher.dispatch_once()
+        recorded = client.table.return_value.upsert.call_args[0][0][0]
+        assert recorded["status"] == "failed" and recorded["attempts"] == 3
+        assert dispatcher.stats()["failed"] == 2
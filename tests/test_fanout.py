@@ -0,0 +1,65 @@
+"""
+Concurrent Fan-Out Test Suite
+Unit tests for the bounded thread pool that runs request stages concurrently
+"""
+
+import sys
+import os
+import time
+import threading
+from unittest.mock import Mock
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestFanOut:
+    """Test concurrent stage execution on the shared pool"""
+
+    def test_stages_run_concurrently(self):
+        """Test total time is close to the slowest stage, not the sum"""
+        from fanout import FanOut
+
+        fanout = FanOut(max_workers=4)
+        start = time.perf_counter()
+        results, timings = fanout.run({
+            "a": lambda: time.sleep(0.2) or "a",
+            "b": lambda: time.sleep(0.2) or "b",
+            "c": lambda: time.sleep(0.2) or "c",
+        })
+
+        assert results == {"a": "a", "b": "b", "c": "c"}
+        assert time.perf_counter() - start < 0.45
+        assert set(timings) == {"a", "b", "c"}
+        assert timings["a"] >= 150
+
+    def test_stage_error_is_raised(self):
+        """Test a failing stage surfaces to the caller"""
+        from fanout import FanOut
+        import pytest
+
+        fanout = FanOut(max_workers=2)
+        with pytest.raises(ValueError):
+            fanout.run({"ok": lambda: 1, "bad": Mock(side_effect=ValueError("boom"))})
+        assert fanout.stats()["errors"] == 1
+
+    def test_saturated_pool_runs_inline(self):
+        """Test stages run on the caller's thread when no worker slot is free"""
+        from fanout import FanOut
+
+        fanout = FanOut(max_workers=1)
+        release = threading.Event()
+        blocker = threading.Thread(target=lambda: fanout.run({"hold": release.wait, "last": lambda: None}))
+        blocker.start()
+        time.sleep(0.05)
+
+        results, _ = fanout.run({"x": lambda: threading.current_thread().name, "y": lambda: None})
+        release.set()
+        blocker.join(2)
+
+        assert results["x"] == threading.current_thread().name
+        assert fanout.stats()["inline_stages"] == 1
@@ -0,0 +1,155 @@
+"""
+Service Metrics Test Suite
+Unit tests for the Prometheus-format /metrics endpoint
+"""
+
+import sys
+import os
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+def _postgrest_client():
+    """PostgREST client whose requests are answered in-process by httpx.MockTransport"""
+    import httpx
+    from postgrest import SyncPostgrestClient
+
+    client = SyncPostgrestClient("http://postgrest")
+    client.session = httpx.Client(base_url="http://postgrest",
+                                  transport=httpx.MockTransport(lambda request: httpx.Response(200, json=[])))
+    return client
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestPrometheusMetrics:
+    """Test the in-process /metrics endpoint"""
+
+    def _app(self):
+        from flask import Flask, jsonify
+        from metrics import install_metrics, MetricsRegistry
+
+        client = _postgrest_client()
+        app = Flask(__name__)
+        metrics = install_metrics(app, "test-service", registry=MetricsRegistry())
+
+        @app.route("/tasks/<task_id>")
+        def task(task_id):
+            client.from_("task").select("task_id").eq("task_id", task_id).execute()
+            return jsonify({"task_id": task_id})
+
+        @app.route("/boom")
+        def boom():
+            return jsonify({"error": "boom"}), 500
+
+        return app, metrics
+
+    def test_routes_queries_and_in_flight_are_exported(self):
+        """Test request counts and latency are labelled by route template, with query timings per table"""
+        app, metrics = self._app()
+        http = app.test_client()
+        http.get("/tasks/t1")
+        http.get("/tasks/t2")
+        http.get("/boom")
+
+        body = http.get("/metrics").get_data(as_text=True)
+
+        assert 'http_requests_total{method="GET",route="/tasks/<task_id>",status="200"} 2' in body
+        assert 'http_requests_total{method="GET",route="/boom",status="500"} 1' in body
+        assert 'http_request_duration_seconds_count{method="GET",route="/tasks/<task_id>"} 2' in body
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/tasks/<task_id>",le="+Inf"} 2' in body
+        assert 'supabase_query_duration_seconds_count{table="task",method="GET",outcome="ok"} 2' in body
+        assert "http_requests_in_flight 1" in body  # the scrape itself
+        assert "# TYPE http_request_duration_seconds histogram" in body
+
+    def test_stats_caches_and_jobs_are_exported(self):
+        """Test component stats become counters/gauges and job durations are recorded"""
+        from user_cache import UserDirectoryCache
+
+        app, metrics = self._app()
+        cache = UserDirectoryCache(lambda ids: {i: {"user_id": i} for i in ids}, name="metrics_test_cache")
+        cache.get("u1")
+        cache.get("u1")
+        metrics.add_stats("amqp_publisher", lambda: {"name": "test-publisher", "connected": True, "buffered": 3, "sent": 7})
+        with metrics.time_job("check_overdue_tasks"):
+            pass
+
+        body = app.test_client().get("/metrics").get_data(as_text=True)
+
+        assert 'user_cache_hits_total{name="metrics_test_cache"} 1' in body
+        assert 'user_cache_misses_total{name="metrics_test_cache"} 1' in body
+        assert 'amqp_publisher_sent_total{name="test-publisher"} 7' in body
+        assert 'amqp_publisher_buffered{name="test-publisher"} 3' in body
+        assert 'amqp_publisher_connected{name="test-publisher"} 1' in body
+        assert 'job_duration_seconds_count{job="check_overdue_tasks",outcome="ok"} 1' in body
+
+    def test_outbound_http_calls_are_timed(self):
+        """Test calls made with requests are timed per host"""
+        import requests
+        from requests.adapters import BaseAdapter
+
+        class StubAdapter(BaseAdapter):
+            def send(self, request, **kwargs):
+                response = requests.Response()
+                response.status_code = 204
+                response.url = request.url
+                response.request = request
+                return response
+
+            def close(self):
+                pass
+
+        app, metrics = self._app()
+        session = requests.Session()
+        session.mount("http://", StubAdapter())
+        session.get("http://user-service:8081/users/u1")
+
+        body = app.test_client().get("/metrics").get_data(as_text=True)
+
+        assert 'outbound_http_request_duration_seconds_count{host="user-service:8081",method="GET",outcome="2xx"} 1' in body
+
+    def test_workers_sharing_a_directory_render_the_server_totals(self, tmp_path):
+        """Test /metrics sums every worker's snapshot and keeps the counters of exited workers"""
+        from metrics import MetricsRegistry, mark_process_dead
+
+        def worker(jobs, in_flight):
+            registry = MetricsRegistry(str(tmp_path))
+            counter = registry.counter("jobs_total", "Jobs", ("job",))
+            for _ in range(jobs):
+                counter.inc("sweep")
+            registry.gauge("in_flight", "In flight").set(value=in_flight)
+            registry.add_collector(lambda: ["# TYPE queue_depth gauge", 'queue_depth{name="audit"} 5'])
+            return registry
+
+        # Another worker's snapshot, as its sync thread would have written it
+        (tmp_path / "worker-999999.prom").write_text(worker(2, 1).render_process())
+        this_worker = worker(1, 2)
+
+        body = this_worker.render()
+
+        assert 'jobs_total{job="sweep"} 3' in body
+        assert "in_flight 3" in body
+        assert 'queue_depth{name="audit"} 10' in body
+        assert body.count("# TYPE jobs_total counter") == 1
+        assert "pid=" not in body
+
+        mark_process_dead(999999, str(tmp_path))
+        body = this_worker.render()
+
+        assert 'jobs_total{job="sweep"} 3' in body
+        assert "in_flight 2" in body
+        assert 'queue_depth{name="audit"} 5' in body
+        assert not (tmp_path / "worker-999999.prom").exists()
+
+    def test_without_a_directory_the_registry_renders_this_process(self):
+        """Test a registry with no multiproc_dir renders its own samples unlabelled"""
+        from metrics import MetricsRegistry
+
+        registry = MetricsRegistry()
+        registry.counter("jobs_total", "Jobs", ("job",)).inc("sweep")
+
+        assert registry.render() == registry.render_process()
+        assert 'jobs_total{job="sweep"} 1' in registry.render()
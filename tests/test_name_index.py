@@ -0,0 +1,94 @@
+"""
+User Name Index Test Suite
+Unit tests for @mention name resolution and prefix suggestions
+"""
+
+import sys
+import os
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class FakeNameSource:
+    """In-memory stand-in for SupabaseUserNameSource that counts reads"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.full_loads = 0
+        self.name_loads = []
+
+    def load_all(self):
+        self.full_loads += 1
+        return list(self.rows)
+
+    def load_by_ids(self, user_ids):
+        return [row for row in self.rows if row["user_id"] in user_ids]
+
+    def load_by_names(self, names):
+        self.name_loads.append(list(names))
+        wanted = {name.lower() for name in names}
+        return [row for row in self.rows if row["name"].lower() in wanted]
+
+
+class TestUserNameIndex:
+    """Test @mention resolution and prefix suggestions"""
+
+    def _index(self, rows):
+        from name_index import UserNameIndex
+        source = FakeNameSource(rows)
+        return UserNameIndex(source), source
+
+    def test_resolve_is_case_insensitive_and_loads_once(self):
+        """Test mentions resolve from memory after the first build"""
+        index, source = self._index([
+            {"user_id": "u1", "name": "Zenia 2"},
+            {"user_id": "u2", "name": "John Doe"},
+        ])
+
+        assert index.resolve(["zenia 2", "JOHN DOE"]) == {"zenia 2": "u1", "JOHN DOE": "u2"}
+        assert index.resolve(["John Doe"]) == {"John Doe": "u2"}
+        assert source.full_loads == 1
+
+    def test_unknown_name_is_looked_up_then_negatively_cached(self):
+        """Test users created after the build are found by name, and misses are not re-queried"""
+        index, source = self._index([{"user_id": "u1", "name": "Ann"}])
+        index.resolve(["Ann"])
+        source.rows.append({"user_id": "u2", "name": "Ben"})
+
+        assert index.resolve(["ben", "nobody"]) == {"ben": "u2"}
+        assert index.resolve(["nobody"]) == {}
+        assert source.name_loads == [["ben", "nobody"]]
+
+    def test_suggest_matches_name_and_word_prefixes(self):
+        """Test full-name prefix matches come before word matches"""
+        index, _ = self._index([
+            {"user_id": "u1", "name": "Doe Ray"},
+            {"user_id": "u2", "name": "John Doe"},
+            {"user_id": "u3", "name": "Mary Jane"},
+        ])
+
+        assert [user["user_id"] for user in index.suggest("do")] == ["u1", "u2"]
+        assert index.suggest("") == []
+
+    def test_refresh_users_applies_renames(self):
+        """Test an incremental refresh replaces the old name"""
+        index, source = self._index([{"user_id": "u1", "name": "Old Name"}])
+        index.resolve(["old name"])
+        source.rows[0] = {"user_id": "u1", "name": "New Name"}
+
+        index.refresh_users(["u1"])
+
+        assert index.suggest("old") == []
+        assert index.suggest("new")[0]["user_id"] == "u1"
+        assert source.full_loads == 1
+
+    def test_extract_mention_names(self):
+        """Test single-word and two-word mentions are extracted"""
+        from name_index import extract_mention_names
+
+        assert extract_mention_names("hi @zenia 2 and @bob") == ["zenia", "bob", "zenia 2"]
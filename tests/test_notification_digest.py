@@ -0,0 +1,175 @@
+"""
+Notification Digest Test Suite
+Unit tests for buffering notifications and flushing per-user digests
+"""
+
+import sys
+import os
+import pytest
+from unittest.mock import Mock, patch
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestNotificationDigest:
+    """Test per-user delivery preferences, the digest buffer and the digest flush"""
+
+    def _digest(self, client, deliver=None, **kwargs):
+        from notification_digest import NotificationDigest
+
+        defaults = dict(window_minutes=60, max_attempts=2)
+        defaults.update(kwargs)
+        return NotificationDigest(lambda: client, deliver or Mock(return_value="notification-1"), **defaults)
+
+    def _items(self, user_id, *task_ids):
+        from notification_digest import build_digest_item
+
+        return [dict(build_digest_item(user_id, "check_due_date_reminders", "task", task_id,
+                                       {"title": "Task Due in 3 Days", "message": f"Task '{task_id}' is due",
+                                        "type": "reminder_3_days"}, day="2025-10-17"), id=index + 1)
+                for index, task_id in enumerate(task_ids)]
+
+    def test_preferences_are_loaded_in_one_query_and_cached(self):
+        """Test users without a settings row get the default mode and a second lookup hits the cache"""
+        client = Mock()
+        query = client.table.return_value.select.return_value.in_.return_value
+        query.execute.return_value.data = [{"user_id": "user-1", "delivery_mode": "digest", "digest_window_minutes": None}]
+        digest = self._digest(client)
+
+        assert digest.digest_users(["user-1", "user-2", "user-1", None]) == {"user-1"}
+        assert digest.preferences(["user-2"])["user-2"] == {"user_id": "user-2", "delivery_mode": "instant",
+                                                            "digest_window_minutes": 60}
+        assert query.execute.call_count == 1
+        assert client.table.return_value.select.return_value.in_.call_args[0][1] == ["user-1", "user-2"]
+
+    def test_set_preference_validates_and_updates_the_cache(self):
+        """Test invalid modes and windows are rejected and a stored preference is used right away"""
+        client = Mock()
+        digest = self._digest(client)
+
+        with pytest.raises(ValueError):
+            digest.set_preference("user-1", "weekly")
+        with pytest.raises(ValueError):
+            digest.set_preference("user-1", "digest", -5)
+        assert digest.set_preference("user-1", "digest", 240)["digest_window_minutes"] == 240
+
+        assert client.table.return_value.upsert.call_args[1] == {"on_conflict": "user_id"}
+        assert digest.digest_users(["user-1"]) == {"user-1"}
+        client.table.return_value.select.assert_not_called()
+
+    def test_add_buffers_items_in_one_idempotent_upsert(self):
+        """Test duplicates collapse to one row and each item is due after its user's window"""
+        from datetime import datetime
+
+        client = Mock()
+        digest = self._digest(client)
+        digest.set_preference("user-1", "digest", 30)
+        items = self._items("user-1", "task-1", "task-2") + self._items("user-1", "task-1")
+
+        assert digest.add(items) == 2
+        upsert = client.table.return_value.upsert
+        rows = upsert.call_args[0][0]
+        assert upsert.call_args[1] == {"on_conflict": "idempotency_key", "ignore_duplicates": True}
+        assert [row["item_id"] for row in rows] == ["task-1", "task-2"]
+        window = datetime.fromisoformat(rows[0]["deliver_after"]) - datetime.fromisoformat(rows[0]["created_at"])
+        assert window.total_seconds() == 30 * 60
+
+        upsert.return_value.execute.side_effect = Exception("db down")
+        assert digest.add(self._items("user-1", "task-3")) == 0
+        assert digest.stats()["buffer_errors"] == 1
+
+    def test_flush_sends_one_digest_per_user_and_records_provenance(self):
+        """Test every pending item of a user goes out in one digest and is marked with its digest and notification"""
+        client = Mock()
+        deliver = Mock(side_effect=["notification-1", "notification-2"])
+        digest = self._digest(client, deliver)
+        pending = {"user-1": self._items("user-1", "task-1", "task-2", "task-3"), "user-2": self._items("user-2", "task-1")}
+
+        with patch.object(digest, "_pending_items", return_value=pending):
+            result = digest.flush()
+
+        assert result == {"digests": 2, "items": 4, "retried": 0, "failed": 0}
+        assert deliver.call_count == 2
+        user_id, digest_id, items = deliver.call_args_list[0][0]
+        assert user_id == "user-1" and len(items) == 3
+        assigned, recorded = [call[0][0] for call in client.table.return_value.upsert.call_args_list]
+        assert {row["digest_id"] for row in assigned if row["user_id"] == "user-1"} == {digest_id}
+        assert {(row["user_id"], row["status"], row["notification_id"]) for row in recorded} == {
+            ("user-1", "sent", "notification-1"), ("user-2", "sent", "notification-2")}
+        assert {row["digest_id"] for row in recorded if row["user_id"] == "user-1"} == {digest_id}
+        assert all(row["source"] == "check_due_date_reminders" for row in recorded)
+
+    def test_failed_digest_is_retried_with_the_same_items_then_failed(self):
+        """Test a failed digest keeps its id and items on retry; items buffered meanwhile wait for the next digest"""
+        client = Mock()
+        deliver = Mock(side_effect=[Exception("smtp down"), Exception("smtp down"), "notification-2"])
+        digest = self._digest(client, deliver)
+        upsert = client.table.return_value.upsert
+
+        with patch.object(digest, "_pending_items", return_value={"user-1": self._items("user-1", "task-1", "task-2")}):
+            assert digest.flush()["retried"] == 1
+        assigned, retried = upsert.call_args_list[0][0][0], upsert.call_args_list[1][0][0]
+        digest_id = assigned[0]["digest_id"]
+        assert {(row["status"], row["attempts"], row["digest_id"]) for row in retried} == {("pending", 1, digest_id)}
+
+        later = [dict(item, id=10) for item in self._items("user-1", "task-3")]
+        with patch.object(digest, "_pending_items", return_value={"user-1": retried + later}):
+            assert digest.flush()["failed"] == 1
+        assert upsert.call_count == 3  # Nothing new to assign; only the outcome is written
+        assert [row["item_id"] for row in deliver.call_args_list[1][0][2]] == ["task-1", "task-2"]
+        assert deliver.call_args_list[1][0][1] == digest_id
+        assert {row["status"] for row in upsert.call_args[0][0]} == {"failed"}
+
+        with patch.object(digest, "_pending_items", return_value={"user-1": later}):
+            assert digest.flush()["digests"] == 1
+        user_id, next_id, items = deliver.call_args[0]
+        assert next_id != digest_id and [item["item_id"] for item in items] == ["task-3"]
+        assert upsert.call_args[0][0][0]["attempts"] == 0
+
+    def test_pending_items_are_paged_past_the_row_cap(self):
+        """Test a batch of users with more pending items than one response holds is read page by page"""
+        from datetime import datetime, timezone
+        from notification_digest import PAGE_SIZE
+
+        client = Mock()
+        due = client.table.return_value.select.return_value.eq.return_value.lte.return_value.order.return_value.limit.return_value
+        due.execute.return_value.data = [{"user_id": "user-1"}, {"user_id": "user-2"}]
+        pages = client.table.return_value.select.return_value.eq.return_value.in_.return_value.order.return_value.range
+        full = [{"id": n, "user_id": "user-1"} for n in range(PAGE_SIZE)]
+        pages.return_value.execute.side_effect = [Mock(data=full), Mock(data=[{"id": PAGE_SIZE, "user_id": "user-2"}])]
+        digest = self._digest(client, Mock())
+
+        per_user = digest._pending_items(datetime.now(timezone.utc))
+
+        assert len(per_user["user-1"]) == PAGE_SIZE and len(per_user["user-2"]) == 1
+        assert [call[0] for call in pages.call_args_list] == [(0, PAGE_SIZE - 1), (PAGE_SIZE, 2 * PAGE_SIZE - 1)]
+
+    def test_unrecorded_digest_is_resent_under_the_same_id(self):
+        """Test a digest whose sent status was not written goes out again with the same id, not merged with new items"""
+        client = Mock()
+        deliver = Mock(return_value="notification-1")
+        digest = self._digest(client, deliver)
+        sent_once = [dict(item, digest_id="digest-1") for item in self._items("user-1", "task-1")]
+        later = [dict(item, id=10) for item in self._items("user-1", "task-2")]
+
+        with patch.object(digest, "_pending_items", return_value={"user-1": sent_once + later}):
+            digest.flush()
+
+        assert deliver.call_args[0][1] == "digest-1"
+        assert [item["item_id"] for item in deliver.call_args[0][2]] == ["task-1"]
+
+    def test_summary_lists_items_and_counts_the_rest(self):
+        """Test the in-app entry lists the first items and how many more the digest holds"""
+        from notification_digest import summarize_digest
+
+        title, message = summarize_digest(self._items("user-1", *[f"task-{n}" for n in range(12)]), max_lines=10)
+
+        assert title == "📋 12 Updates in Your Digest"
+        assert message.count("\n") == 10
+        assert message.splitlines()[0] == "• Task Due in 3 Days: Task 'task-0' is due"
+        assert message.endswith("...and 2 more")
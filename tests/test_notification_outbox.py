@@ -0,0 +1,161 @@
+"""
+Notification Outbox Test Suite
+Unit tests for outbox enqueueing and the relay that delivers each channel
+"""
+
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestNotificationOutbox:
+    """Test the notification outbox writer and its batch relay"""
+
+    def _outbox(self, client, **kwargs):
+        from notification_outbox import NotificationOutbox
+
+        users = {"user-1": {"email": "one@example.com"}, "user-2": {"email": "two@example.com"}}
+        defaults = dict(get_users=lambda user_ids: {user_id: users[user_id] for user_id in user_ids if user_id in users},
+                        send_email=Mock(), realtime_url="http://notify", mode="off", max_attempts=2)
+        defaults.update(kwargs)
+        return NotificationOutbox(lambda: client, **defaults)
+
+    def _rows(self, *user_ids):
+        from notification_outbox import build_outbox_row, make_idempotency_key
+
+        rows = []
+        for index, user_id in enumerate(user_ids):
+            row = build_outbox_row({"user_id": user_id, "title": "New comment", "message": "hi", "type": "task_comment",
+                                    "task_id": "task-1"},
+                                   make_idempotency_key("task_comment", "comment-1", user_id),
+                                   email={"notification_type": "task_comment", "task_title": "A", "task_id": "task-1"})
+            rows.append(dict(row, id=index + 1))
+        return rows
+
+    def _client(self, preferences=()):
+        client = Mock()
+        query = client.table.return_value.select.return_value
+        for method in ("in_", "order", "range"):
+            getattr(query, method).return_value = query
+        query.execute.return_value.data = list(preferences)
+        return client
+
+    def test_enqueue_is_one_idempotent_upsert(self):
+        """Test intents are written in one upsert keyed by idempotency key, duplicates dropped"""
+        from notification_outbox import build_outbox_row, make_idempotency_key
+
+        client = Mock()
+        outbox = self._outbox(client)
+        key = make_idempotency_key("task_mention", "comment-1", "user-1")
+        rows = [build_outbox_row({"user_id": "user-1", "title": "t"}, key, email={"notification_type": "task_mention"}),
+                build_outbox_row({"user_id": "user-1", "title": "t"}, key),
+                build_outbox_row({"user_id": "user-2", "title": "t"}, "other", channels=["email"])]
+
+        assert outbox.enqueue(rows) == 1
+        upsert = client.table.return_value.upsert
+        assert upsert.call_count == 1
+        assert [row["user_id"] for row in upsert.call_args[0][0]] == ["user-1"]
+        assert upsert.call_args[1] == {"on_conflict": "idempotency_key", "ignore_duplicates": True}
+        assert rows[2]["channels"] == []  # Email without email arguments is dropped, leaving nothing to send
+
+    def test_relay_delivers_each_channel_in_batches(self):
+        """Test one in-app upsert and one real-time POST per batch, and emails per recipient"""
+        client = self._client()
+        outbox = self._outbox(client)
+        rows = self._rows("user-1", "user-2")
+
+        with patch.object(outbox, "_claim", return_value=rows), patch("notification_outbox.requests") as mock_requests:
+            result = outbox.relay_once()
+
+        assert result == {"claimed": 2, "sent": 2, "retried": 0, "failed": 0}
+        stored = client.table.return_value.upsert.call_args_list[0]
+        assert [row["outbox_key"] for row in stored[0][0]] == [row["idempotency_key"] for row in rows]
+        assert stored[1] == {"on_conflict": "outbox_key", "ignore_duplicates": True}
+        assert mock_requests.post.call_count == 1
+        assert len(mock_requests.post.call_args[1]["json"]["notifications"]) == 2
+        assert outbox.send_email.call_count == 2
+        recorded = client.table.return_value.upsert.call_args_list[-1][0][0]
+        assert [row["status"] for row in recorded] == ["sent", "sent"]
+
+    def test_preferences_are_applied_when_delivering(self):
+        """Test muted channels are skipped and count as done"""
+        client = self._client([{"user_id": "user-1", "task_id": "task-1", "email_enabled": False, "in_app_enabled": True}])
+        outbox = self._outbox(client)
+
+        with patch.object(outbox, "_claim", return_value=self._rows("user-1")), patch("notification_outbox.requests"):
+            outbox.relay_once()
+
+        outbox.send_email.assert_not_called()
+        preferences = client.table.return_value.select.return_value
+        assert [call[0] for call in preferences.in_.call_args_list] == [("task_id", ["task-1"]), ("user_id", ["user-1"])]
+        recorded = client.table.return_value.upsert.call_args_list[-1][0][0]
+        assert recorded[0]["status"] == "sent"
+
+    def test_preferences_are_paged_past_the_row_cap(self):
+        """Test a batch with more preference rows than one response holds is read page by page"""
+        from notification_outbox import PREFERENCES_PAGE_SIZE
+
+        client = self._client()
+        full = [{"user_id": f"user-{n}", "task_id": "task-1", "in_app_enabled": True} for n in range(PREFERENCES_PAGE_SIZE)]
+        client.table.return_value.select.return_value.execute.side_effect = [
+            Mock(data=full), Mock(data=[{"user_id": "user-1", "task_id": "task-1", "in_app_enabled": False}])]
+        outbox = self._outbox(client)
+
+        preferences = outbox._load_preferences(self._rows("user-1"))
+
+        assert preferences[("user-1", "task-1")]["in_app_enabled"] is False
+        assert len(preferences) == PREFERENCES_PAGE_SIZE
+
+    def test_project_notifications_use_project_preferences(self):
+        """Test rows without a task are filtered by project_notification_preferences"""
+        from notification_outbox import build_outbox_row
+
+        client = self._client([{"user_id": "user-1", "project_id": "proj-1", "in_app_enabled": False, "email_enabled": True}])
+        outbox = self._outbox(client)
+        row = build_outbox_row({"user_id": "user-1", "title": "New comment", "type": "project_comment",
+                                "project_id": "proj-1"}, "key-1", email={"notification_type": "project_comment"})
+        row["id"] = 1
+
+        preferences = outbox._load_preferences([row])
+        with patch("notification_outbox.requests") as mock_requests:
+            delivered, errors = outbox._deliver([row])
+
+        mock_requests.post.assert_not_called()
+        client.table.assert_any_call("project_notification_preferences")
+        assert preferences[("user-1", "proj-1")]["in_app_enabled"] is False
+        assert delivered[1] == {"in_app", "realtime", "email"} and not errors
+        outbox.send_email.assert_called_once()
+
+    def test_failed_channel_is_retried_with_backoff_then_given_up(self):
+        """Test a retry repeats only the failed channel and the row fails after max_attempts"""
+        client = self._client()
+        outbox = self._outbox(client)
+        rows = self._rows("user-1")
+
+        with patch.object(outbox, "_claim", return_value=rows), patch("notification_outbox.requests") as mock_requests:
+            mock_requests.post.side_effect = Exception("notification service down")
+            first = outbox.relay_once()
+            retried = client.table.return_value.upsert.call_args_list[-1][0][0][0]
+
+        assert first["retried"] == 1
+        assert retried["status"] == "pending" and retried["attempts"] == 1
+        assert retried["delivered"] == ["email", "in_app"]
+        assert retried["next_attempt_at"] > rows[0]["next_attempt_at"]
+
+        client.table.return_value.upsert.reset_mock()
+        outbox.send_email.reset_mock()
+        with patch.object(outbox, "_claim", return_value=[retried]), patch("notification_outbox.requests") as mock_requests:
+            mock_requests.post.side_effect = Exception("still down")
+            second = outbox.relay_once()
+
+        assert second["failed"] == 1
+        assert client.table.return_value.upsert.call_count == 1  # Only the outcome; in-app was not stored again
+        outbox.send_email.assert_not_called()
+        assert client.table.return_value.upsert.call_args[0][0][0]["status"] == "failed"
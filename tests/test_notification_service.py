@@ -573,6 +573,110 @@ class TestEmailTemplateCreation:
         assert isinstance(subject, str)
 
 
+class TestEmailTemplates:
+    """Test templates are built once and rendered by filling in their fields"""
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_every_type_has_a_template(self):
+        """Test reminder families share a template and unknown types fall back to the generic one"""
+        import email_service
+
+        assert email_service.template_key("reminder_3_days") == "reminder"
+        assert email_service.template_key("project_reminder_7_days") == "project_reminder"
+        assert email_service.template_key("task_comment") == "task_comment"
+        assert email_service.template_key("something_else") == "generic"
+        subject, html = email_service.EMAIL_TEMPLATES["reminder"]
+        assert subject.fields == {"task_title"}
+        assert {"task_title", "due_date", "days", "task_link", "priority_color", "priority_label"} <= html.fields
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_every_template_field_has_a_value(self):
+        """Test each type's value builder supplies every field its subject and body use"""
+        import email_service
+
+        for key, (subject, html) in email_service.EMAIL_TEMPLATES.items():
+            values = email_service._template_values(key, f"{key}_2_days", {"message": "Heads up"})
+            assert subject.fields | html.fields <= set(values), key
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_partial_fills_fields_once_and_keeps_the_rest(self):
+        """Test partial() bakes in shared fields so render() only fills the remaining ones"""
+        from email_service import EmailTemplate
+
+        template = EmailTemplate("<p>${greeting}, ${name}!</p><i>${greeting}</i>")
+        partial = template.partial({"greeting": "Hi"})
+
+        assert partial.fields == {"name"}
+        assert partial.render({"name": "Ann"}) == template.render({"greeting": "Hi", "name": "Ann"})
+        assert partial.render({"name": "${greeting}"}) == "<p>Hi, ${greeting}!</p><i>Hi</i>"
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_overdue_alerts_use_the_overdue_colour(self):
+        """Test overdue emails are styled red whatever the priority in the data"""
+        subject, html = create_email_template("overdue_tasks", {"task_title": "2 overdue tasks", "priority": 1})
+
+        assert subject == "⚠️ 2 overdue tasks"
+        assert "border-left: 4px solid #cf1322; }" in html
+        assert "#389e0d" not in html
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_batch_renders_once_for_all_recipients(self):
+        """Test one event renders a single subject/body shared by every distinct recipient"""
+        import email_service
+
+        data = {"task_title": "Quarterly report", "due_date": "October 20, 2025", "priority": 6, "task_id": "task-9"}
+        with patch.object(email_service, "_template_values", wraps=email_service._template_values) as values:
+            messages = email_service.render_email_batch("reminder_1_days", data,
+                                                        ["a@example.com", "b@example.com", "a@example.com", None])
+
+        assert values.call_count == 1
+        assert [message[0] for message in messages] == ["a@example.com", "b@example.com"]
+        assert messages[0][1:] == create_email_template("reminder_1_days", data)
+        assert messages[0][2] is messages[1][2]
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_send_notification_emails_queues_the_batch_in_one_write(self):
+        """Test the batch is handed to the dispatcher in a single enqueue"""
+        import email_service
+
+        dispatcher = Mock()
+        dispatcher.enqueue.side_effect = lambda rows: len(rows)
+        with patch.object(email_service, "EMAIL_DISPATCHER", dispatcher), \
+                patch.object(email_service, "SMTP_USER", "user"), patch.object(email_service, "SMTP_PASSWORD", "pw"):
+            sent = email_service.send_notification_emails(["a@example.com", "b@example.com"], "reminder_3_days",
+                                                          task_title="Demo", due_date="Oct 1", task_id="task-1")
+            skipped = email_service.send_notification_emails(["a@example.com"], "general", message="")
+
+        assert (sent, skipped) == (2, 0)
+        assert dispatcher.enqueue.call_count == 1
+        rows = dispatcher.enqueue.call_args[0][0]
+        assert [row["to_email"] for row in rows] == ["a@example.com", "b@example.com"]
+        assert "Priority: 5/10 (Medium)" in rows[0]["html_content"]  # "Medium" default, as send_notification_email
+        with pytest.raises(TypeError):
+            email_service.send_notification_emails(["a@example.com"], "reminder_3_days", title="typo")
+
+    @pytest.mark.skipif(create_email_template is None, reason="email_service not available")
+    def test_digest_email_lists_every_item_in_one_message(self):
+        """Test a digest is one email with a linked line per buffered notification, queued under its digest key"""
+        import email_service
+
+        items = [{"title": "Task Due in 3 Days", "message": "Task '<Report>' is due", "item_type": "task", "item_id": "task-1"},
+                 {"title": "Overdue Project", "message": "Project 'Apollo' was due", "item_type": "project", "item_id": "proj-1"}]
+        dispatcher = Mock()
+        dispatcher.enqueue.side_effect = lambda rows: len(rows)
+        with patch.object(email_service, "EMAIL_DISPATCHER", dispatcher), \
+                patch.object(email_service, "SMTP_USER", "user"), patch.object(email_service, "SMTP_PASSWORD", "pw"):
+            assert email_service.send_digest_email("a@example.com", "Ann", items, idempotency_key="digest:abc")
+            assert not email_service.send_digest_email("a@example.com", "Ann", [])
+
+        row = dispatcher.enqueue.call_args[0][0][0]
+        assert row["subject"] == "📋 Your Digest: 2 Updates"
+        assert row["idempotency_key"] == "digest:abc"
+        assert "Hi Ann," in row["html_content"]
+        assert "/tasks?taskId=task-1" in row["html_content"] and "/projects/proj-1" in row["html_content"]
+        assert "&lt;Report&gt;" in row["html_content"]
+
+
 class TestEmailSending:
     """Test email sending functionality"""
 
@@ -647,6 +751,31 @@ class TestEmailSending:
 
         assert result == True
 
+    @pytest.mark.skipif(send_email is None, reason="email_service not available")
+    @patch('email_service.SMTP_USER', 'test@example.com')
+    @patch('email_service.SMTP_PASSWORD', 'test_password')
+    @patch('email_service.smtplib.SMTP')
+    def test_notification_email_is_queued_when_a_dispatcher_is_configured(self, mock_smtp):
+        """Test notification emails go to the email queue instead of opening an SMTP connection"""
+        import email_service
+
+        dispatcher = Mock()
+        dispatcher.enqueue.return_value = 1
+        with patch.object(email_service, "EMAIL_DISPATCHER", dispatcher):
+            result = email_service.send_notification_email(
+                user_email="user@example.com",
+                notification_type="reminder_1_days",
+                task_title="Write report",
+                due_date="2025-12-31",
+                task_id="task-1"
+            )
+
+        assert result == True
+        mock_smtp.assert_not_called()
+        row = dispatcher.enqueue.call_args[0][0][0]
+        assert (row["to_email"], row["domain"], row["status"]) == ("user@example.com", "example.com", "pending")
+        assert "Write report" in row["html_content"]
+
 
 # ============================================================================
 # INTEGRATION TESTS - Test actual service endpoints
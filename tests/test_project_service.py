@@ -429,11 +429,9 @@ class TestProjectUserEmail:
 class TestProjectCommentNotification:
     """Test project comment notification logic"""
 
-    @patch('project_service.get_user_email')
-    @patch('project_service.EMAIL_SERVICE_AVAILABLE', True)
     @patch('project_service.supabase')
-    def test_notify_project_comment_basic(self, mock_supabase, mock_get_email):
-        """Test basic project comment notification"""
+    def test_notify_project_comment_basic(self, mock_supabase):
+        """Test project comment notifications are queued in the outbox, one per other stakeholder"""
         from project_service import notify_project_comment
 
         project_data = {
@@ -443,18 +441,31 @@ class TestProjectCommentNotification:
             "collaborators": ["user-collab"]
         }
 
-        mock_get_email.return_value = "user@example.com"
+        notify_project_comment(project_data, "Test comment", "user-creator", "John Doe", comment_id="comment-1")
 
-        # Mock notification insert
-        mock_insert = Mock()
-        mock_insert.data = [{"id": "notif-1"}]
-        mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_insert
+        mock_supabase.table.assert_any_call("notification_outbox")
+        rows = mock_supabase.table.return_value.upsert.call_args[0][0]
+        assert [row["user_id"] for row in rows] == ["user-collab"]
+        assert rows[0]["project_id"] == "proj-123" and rows[0]["task_id"] is None
+        assert rows[0]["type"] == "project_comment"
+        mock_supabase.table.return_value.insert.assert_not_called()
 
-        # Should not raise exception
-        notify_project_comment(project_data, "Test comment", "user-creator", "John Doe")
+    @patch('project_service.MENTION_INDEX')
+    @patch('project_service.supabase')
+    def test_notify_project_comment_mentions_queues_outbox_rows(self, mock_supabase, mock_index):
+        """Test mentioned users are queued in the outbox instead of notified inline"""
+        from project_service import notify_project_comment_mentions
+
+        mock_index.resolve.return_value = {"alice": "user-alice", "john": "user-creator"}
+        project_data = {"project_id": "proj-123", "project_name": "Test Project", "created_by": "user-creator"}
+
+        notify_project_comment_mentions(project_data, "@alice @john please review", "user-creator", "John Doe",
+                                        comment_id="comment-1")
 
-        # Verify notification was inserted (collaborator should be notified, not creator)
-        assert mock_supabase.table.call_count > 0
+        rows = mock_supabase.table.return_value.upsert.call_args[0][0]
+        assert [row["user_id"] for row in rows] == ["user-alice"]
+        assert rows[0]["type"] == "project_mention"
+        assert rows[0]["email"]["notification_type"] == "project_mention"
 
     def test_notify_project_comment_no_stakeholders(self):
         """Test notification when no stakeholders exist"""
@@ -0,0 +1,90 @@
+"""
+Query Metrics Test Suite
+Unit tests for per-request query counting, Server-Timing headers and budgets
+"""
+
+import sys
+import os
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestQueryMetrics:
+    """Test per-request query counting, Server-Timing headers and budget warnings"""
+
+    def _postgrest(self, requests_seen):
+        import httpx
+        from postgrest import SyncPostgrestClient
+
+        def handler(request):
+            requests_seen.append(request.url.path)
+            return httpx.Response(200, json=[{"user_id": "u1"}])
+
+        client = SyncPostgrestClient("http://postgrest")
+        client.session = httpx.Client(base_url="http://postgrest", transport=httpx.MockTransport(handler))
+        return client
+
+    def _app(self, client, **kwargs):
+        from flask import Flask, jsonify
+        from query_metrics import install_query_metrics
+
+        app = Flask(__name__)
+        metrics = install_query_metrics(app, "test-service", **kwargs)
+
+        @app.route("/users/<int:count>")
+        def users(count):
+            for index in range(count):
+                client.from_("user").select("user_id").eq("user_id", f"u{index}").execute()
+            return jsonify({"ok": True})
+
+        return app, metrics
+
+    def test_queries_are_counted_per_request(self):
+        """Test each request gets its own count and a Server-Timing header"""
+        seen = []
+        app, metrics = self._app(self._postgrest(seen), budget=10, repeat_threshold=10)
+
+        first = app.test_client().get("/users/3")
+        second = app.test_client().get("/users/1")
+
+        assert len(seen) == 4
+        assert 'db;dur=' in first.headers["Server-Timing"] and '"3 queries"' in first.headers["Server-Timing"]
+        assert 'desc="GET user [select,user_id]"' in first.headers["Server-Timing"]
+        assert '"1 queries"' in second.headers["Server-Timing"]
+        stats = metrics.stats()
+        assert stats["requests"] == 2 and stats["queries"] == 4
+        assert stats["worst_request"]["endpoint"] == "GET /users/<int:count>"
+
+    def test_budget_and_repeated_statements_are_reported(self, caplog):
+        """Test a request over budget and an N+1 loop both log a warning"""
+        app, metrics = self._app(self._postgrest([]), budget=2, repeat_threshold=3)
+
+        with caplog.at_level("WARNING", logger="query_metrics"):
+            app.test_client().get("/users/4")
+
+        assert metrics.stats()["over_budget"] == 1
+        assert metrics.stats()["n_plus_one"] == 1
+        assert "ran 4 queries (budget 2)" in caplog.text
+        assert "possible N+1 in GET /users/<int:count>: GET user [select,user_id] x4" in caplog.text
+
+    def test_queries_outside_requests_are_not_attributed(self):
+        """Test background queries do not leak into a request's count"""
+        from query_metrics import current_query_stats
+
+        client = self._postgrest([])
+        app, metrics = self._app(client)
+        client.from_("user").select("user_id").execute()
+
+        assert current_query_stats() is None
+        assert metrics.stats()["queries_outside_requests"] >= 1
+        assert metrics.stats()["queries"] == 0
+
+        with metrics.track("job nightly_sweep") as job:
+            client.from_("user").select("user_id").execute()
+        assert job.count == 1
+        assert metrics.stats()["queries"] == 1
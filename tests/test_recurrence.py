@@ -0,0 +1,93 @@
+"""
+Recurrence Rule Test Suite
+Unit tests for recurring task rules
+"""
+
+import sys
+import os
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestRecurrenceRule:
+    """Test recurrence rule parsing and occurrence expansion"""
+
+    def test_legacy_keywords(self):
+        """Test legacy recurrence strings map to rules"""
+        from recurrence import compile_rule
+
+        assert compile_rule("biweekly").to_string() == "FREQ=WEEKLY;INTERVAL=2"
+        assert compile_rule("quarterly").to_string() == "FREQ=MONTHLY;INTERVAL=3"
+        assert compile_rule("invalid") is None
+        assert compile_rule("") is None
+
+    def test_monthly_clamps_to_month_end_and_keeps_anchor_day(self):
+        """Test Jan 31 -> Feb 28 -> Mar 31"""
+        from recurrence import compile_rule
+        from datetime import date
+
+        dates = compile_rule("monthly").occurrences("2025-01-31", limit=3)
+
+        assert dates == [date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+
+    def test_chained_next_after_keeps_the_anchor_day(self):
+        """Test instances created one at a time match the expansion once the rule is anchored"""
+        from recurrence import compile_rule
+        from datetime import date
+
+        rule = compile_rule("monthly").anchored("2026-01-31")
+        chained, current = [], date(2026, 1, 31)
+        for _ in range(3):
+            current = rule.next_after(current)
+            chained.append(current)
+
+        assert rule.to_string() == "FREQ=MONTHLY;BYMONTHDAY=31"
+        assert chained == compile_rule("monthly").occurrences("2026-01-31", limit=3)
+        assert chained == [date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+        assert compile_rule("monthly").anchored("2026-01-15") == compile_rule("monthly")
+        assert compile_rule("yearly").anchored("2024-02-29").occurrences("2025-02-28", limit=3)[-1] == date(2028, 2, 29)
+
+    def test_weekly_byday_with_interval_and_count(self):
+        """Test BYDAY weeks are stepped by INTERVAL and COUNT includes the current instance"""
+        from recurrence import compile_rule
+        from datetime import date
+
+        rule = compile_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=4")
+
+        assert rule.occurrences("2025-10-13", limit=10) == [date(2025, 10, 15), date(2025, 10, 27), date(2025, 10, 29)]
+        assert rule.advanced(2).count == 2
+
+    def test_until_and_horizon(self):
+        """Test UNTIL and the caller's horizon both bound the expansion"""
+        from recurrence import compile_rule
+        from datetime import date
+
+        rule = compile_rule("FREQ=DAILY;UNTIL=20251020")
+
+        assert rule.occurrences("2025-10-17") == [date(2025, 10, 18), date(2025, 10, 19), date(2025, 10, 20)]
+        assert rule.occurrences("2025-10-17", until="2025-10-18") == [date(2025, 10, 18)]
+        assert rule.next_after("2025-10-20") is None
+
+    def test_daily_weekdays_only(self):
+        """Test DAILY with BYDAY skips weekends"""
+        from recurrence import compile_rule
+        from datetime import date
+
+        dates = compile_rule("FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR").occurrences("2025-10-17", limit=2)
+
+        assert dates == [date(2025, 10, 20), date(2025, 10, 21)]
+
+    def test_invalid_rules(self):
+        """Test malformed rule strings are rejected with a message"""
+        from recurrence import validate_recurrence
+
+        assert validate_recurrence("weekly") is None
+        assert "FREQ" in validate_recurrence("FREQ=HOURLY")
+        assert "BYDAY" in validate_recurrence("FREQ=MONTHLY;BYDAY=MO")
+        assert validate_recurrence("FREQ=DAILY;COUNT=3;UNTIL=2026-01-01") is not None
+        assert validate_recurrence("fortnightly") is not None
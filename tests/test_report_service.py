@@ -378,6 +378,28 @@ class TestUserInfoFetching:
         assert "name" in result
         assert result["name"] == "Unknown"
 
+    @patch('report_service.requests.get')
+    def test_failed_lookup_keeps_the_other_users(self, mock_get):
+        """Test one 5xx is reported per user instead of failing the whole batch"""
+        from report_service import load_user_info_from_service
+        from user_cache import PartialLoadError
+
+        def get(url, timeout):
+            user_id = url.rsplit("/", 1)[-1]
+            response = Mock()
+            response.status_code = {"user-2": 503, "ghost": 404}.get(user_id, 200)
+            response.ok = response.status_code == 200
+            response.json.return_value = {"user": {"user_id": user_id}}
+            return response
+
+        mock_get.side_effect = get
+
+        with pytest.raises(PartialLoadError) as error:
+            load_user_info_from_service(["user-1", "user-2", "ghost", "user-3"])
+
+        assert set(error.value.loaded) == {"user-1", "user-3"}
+        assert error.value.failed_ids == {"user-2"}
+
 
 @pytest.mark.skipif(not REPORT_SERVICE_AVAILABLE, reason="report_service not available")
 class TestAccessValidation:
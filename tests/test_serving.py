@@ -0,0 +1,91 @@
+"""
+Serving Test Suite
+Unit tests for per-worker init hooks and the shared Gunicorn configuration
+"""
+
+import sys
+import os
+import pytest
+from unittest.mock import Mock
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestWorkerInit:
+    """Test per-worker init hooks and the worker details reported by /health"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_serving_state(self, monkeypatch):
+        import serving
+        monkeypatch.setattr(serving, "_hooks", [])
+        monkeypatch.setattr(serving, "_state", dict(serving._state, pid=None, started_at=None))
+
+    def test_hooks_run_once_per_process(self):
+        """Test hooks run in order on init, and a second init in the same process is a no-op"""
+        from serving import on_worker_init, init_worker, worker_info
+
+        calls = []
+        on_worker_init(lambda: calls.append("supabase"))
+        on_worker_init(lambda: calls.append("rabbitmq"))
+
+        assert worker_info()["initialised"] is False
+        assert init_worker(server="gunicorn", workers=4, threads=8) is True
+        assert init_worker(server="gunicorn", workers=4, threads=8) is False
+
+        assert calls == ["supabase", "rabbitmq"]
+        info = worker_info()
+        assert info["initialised"] is True
+        assert info["pid"] == os.getpid()
+        assert (info["server"], info["workers"], info["threads"], info["worker_class"]) == ("gunicorn", 4, 8, "gthread")
+
+    def test_failing_hook_does_not_stop_the_others(self):
+        """Test one unreachable dependency does not keep the worker from starting"""
+        from serving import on_worker_init, init_worker
+
+        calls = []
+
+        @on_worker_init
+        def broken():
+            raise ConnectionError("broker down")
+
+        on_worker_init(lambda: calls.append("scheduler"))
+        init_worker()
+
+        assert calls == ["scheduler"]
+
+    def test_hook_registered_after_init_runs_immediately(self):
+        """Test a hook registered by a late import still runs in an initialised worker"""
+        from serving import on_worker_init, init_worker
+
+        init_worker()
+        calls = []
+        on_worker_init(lambda: calls.append("late"))
+
+        assert calls == ["late"]
+
+    def test_gunicorn_config_initialises_workers(self, monkeypatch):
+        """Test the shared Gunicorn config reads its settings from the environment and inits each worker"""
+        import importlib.util
+        from serving import worker_info
+
+        monkeypatch.setenv("PORT", "8080")
+        monkeypatch.setenv("WEB_CONCURRENCY", "3")
+        monkeypatch.setenv("GUNICORN_THREADS", "6")
+        path = os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared', 'gunicorn_conf.py')
+        spec = importlib.util.spec_from_file_location("gunicorn_conf_under_test", path)
+        conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(conf)
+
+        assert (conf.bind, conf.workers, conf.threads, conf.worker_class) == ("0.0.0.0:8080", 3, 6, "gthread")
+        assert conf.preload_app is True and conf.max_requests_jitter == 100
+
+        worker = Mock()
+        worker.cfg.workers, worker.cfg.threads, worker.cfg.worker_class_str = 3, 6, "gthread"
+        conf.post_worker_init(worker)
+
+        assert worker_info()["server"] == "gunicorn" and worker_info()["workers"] == 3
@@ -0,0 +1,161 @@
+"""
+Shared User Directory Cache Test Suite
+Unit tests for the LRU + TTL user cache used by the microservices
+"""
+
+import sys
+import os
+import time
+import threading
+from unittest.mock import Mock
+
+# Add source directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'microservices', 'shared'))
+
+from user_cache import UserDirectoryCache, make_supabase_user_loader, invalidate_user_everywhere
+
+
+# ============================================================================
+# UNIT TESTS
+# ============================================================================
+
+class TestUserDirectoryCache:
+    """Test caching, eviction and counters"""
+
+    def test_hit_after_load(self):
+        """Test a loaded user is served from cache afterwards"""
+        loader = Mock(return_value={"user-1": {"user_id": "user-1", "name": "Ann"}})
+        cache = UserDirectoryCache(loader)
+
+        assert cache.get("user-1")["name"] == "Ann"
+        assert cache.get("user-1")["name"] == "Ann"
+
+        loader.assert_called_once_with(["user-1"])
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_get_many_loads_misses_together(self):
+        """Test misses in a batch are loaded with one loader call"""
+        loader = Mock(side_effect=lambda ids: {i: {"user_id": i} for i in ids})
+        cache = UserDirectoryCache(loader)
+        cache.get("user-1")
+
+        result = cache.get_many(["user-1", "user-2", "user-3"])
+
+        assert set(result) == {"user-1", "user-2", "user-3"}
+        assert loader.call_args_list[-1].args[0] == ["user-2", "user-3"]
+
+    def test_negative_caching(self):
+        """Test unknown IDs are cached as missing"""
+        loader = Mock(return_value={})
+        cache = UserDirectoryCache(loader)
+
+        assert cache.get("ghost") is None
+        assert cache.get("ghost") is None
+
+        loader.assert_called_once()
+        assert cache.stats()["negative_hits"] == 1
+
+    def test_errors_are_not_cached(self):
+        """Test a failed load is retried on the next lookup"""
+        loader = Mock(side_effect=[Exception("Database error"), {"user-1": {"user_id": "user-1"}}])
+        cache = UserDirectoryCache(loader)
+
+        assert cache.get("user-1") is None
+        assert cache.get("user-1") == {"user_id": "user-1"}
+        assert cache.stats()["load_errors"] == 1
+
+    def test_partial_load_caches_only_what_loaded(self):
+        """Test IDs a loader failed on are retried, while loaded and missing IDs are cached"""
+        from user_cache import PartialLoadError
+
+        loader = Mock(side_effect=[
+            PartialLoadError({"user-1": {"user_id": "user-1"}}, ["user-2"]),
+            {"user-2": {"user_id": "user-2"}},
+        ])
+        cache = UserDirectoryCache(loader)
+
+        assert cache.get_many(["user-1", "user-2", "ghost"]) == {"user-1": {"user_id": "user-1"}}
+        assert cache.get_many(["user-1", "user-2", "ghost"]) == {
+            "user-1": {"user_id": "user-1"}, "user-2": {"user_id": "user-2"}}
+        assert loader.call_args_list[-1].args[0] == ["user-2"]
+        assert cache.stats()["load_errors"] == 1
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted past max_size"""
+        cache = UserDirectoryCache(lambda ids: {i: {"user_id": i} for i in ids}, max_size=2)
+        cache.get("user-1")
+        cache.get("user-2")
+        cache.get("user-1")  # user-2 is now least recently used
+        cache.get("user-3")
+
+        assert "user-1" in cache
+        assert "user-2" not in cache
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Test expired entries are reloaded"""
+        loader = Mock(side_effect=lambda ids: {i: {"user_id": i} for i in ids})
+        cache = UserDirectoryCache(loader, ttl=0.01)
+        cache.get("user-1")
+        time.sleep(0.02)
+        cache.get("user-1")
+
+        assert loader.call_count == 2
+        assert cache.stats()["expirations"] == 1
+
+    def test_single_flight(self):
+        """Test concurrent misses for one ID share a single load"""
+        release = threading.Event()
+        calls = []
+
+        def slow_loader(ids):
+            calls.append(list(ids))
+            release.wait(1)
+            return {i: {"user_id": i} for i in ids}
+
+        cache = UserDirectoryCache(slow_loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("user-1"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert calls == [["user-1"]]
+        assert results == [{"user_id": "user-1"}] * 5
+
+    def test_invalidate_everywhere(self):
+        """Test invalidation reaches every cache in the process"""
+        first = UserDirectoryCache(lambda ids: {i: {"user_id": i} for i in ids})
+        second = UserDirectoryCache(lambda ids: {i: {"user_id": i} for i in ids})
+        first.get("user-1")
+        second.get("user-1")
+
+        invalidate_user_everywhere("user-1")
+
+        assert "user-1" not in first
+        assert "user-1" not in second
+
+
+class TestSupabaseUserLoader:
+    """Test the Supabase-backed loader"""
+
+    def test_single_id_uses_eq(self):
+        """Test a single ID is looked up with eq()"""
+        client = Mock()
+        client.table().select().eq().execute.return_value = Mock(data=[{"email": "a@example.com"}])
+        load = make_supabase_user_loader(lambda: client, "email")
+
+        assert load(["user-1"]) == {"user-1": {"email": "a@example.com"}}
+
+    def test_many_ids_use_in(self):
+        """Test several IDs are loaded with in_()"""
+        client = Mock()
+        client.table().select().in_().execute.return_value = Mock(data=[{"user_id": "user-1"}, {"user_id": "user-2"}])
+        load = make_supabase_user_loader(lambda: client, "user_id")
+
+        assert set(load(["user-1", "user-2"])) == {"user-1", "user-2"}
@@ -207,6 +207,61 @@ class TestSubtasksCount:
         assert count == 0  # Should return 0 on error
 
 
+class TestBatchedSubtasksCount:
+    """Test batched subtask counting for task lists"""
+
+    @patch('task_service.supabase')
+    def test_get_subtasks_counts_groups_by_parent(self, mock_supabase):
+        """Test one grouped query returns counts for every parent, including zero counts"""
+        from task_service import get_subtasks_counts
+
+        mock_supabase.rpc.return_value.execute.return_value.data = [
+            {"parent_task_id": "parent-1", "subtasks_count": 2},
+            {"parent_task_id": "parent-2", "subtasks_count": 1},
+        ]
+
+        counts = get_subtasks_counts(["parent-1", "parent-2", "parent-3"])
+
+        assert counts == {"parent-1": 2, "parent-2": 1, "parent-3": 0}
+        mock_supabase.rpc.assert_called_once_with("subtask_counts", {"p_parent_ids": ["parent-1", "parent-2", "parent-3"]})
+        mock_supabase.table.assert_not_called()
+
+    @patch('task_service.supabase')
+    def test_get_subtasks_counts_fallback_reads_every_page(self, mock_supabase):
+        """Test without the function the subtask scan is paged, so busy parents are not undercounted"""
+        from task_service import get_subtasks_counts, SUBTASK_COUNT_PAGE_SIZE
+
+        mock_supabase.rpc.return_value.execute.side_effect = Exception("function subtask_counts does not exist")
+        query = MagicMock()
+        for method in ("select", "in_", "eq", "order", "range"):
+            getattr(query, method).return_value = query
+        query.execute.side_effect = [Mock(data=[{"parent_task_id": "parent-1"}] * SUBTASK_COUNT_PAGE_SIZE),
+                                     Mock(data=[{"parent_task_id": "parent-2"}])]
+        mock_supabase.table.return_value = query
+
+        counts = get_subtasks_counts(["parent-1", "parent-2"])
+
+        assert counts == {"parent-1": SUBTASK_COUNT_PAGE_SIZE, "parent-2": 1}
+        assert query.range.call_count == 2
+
+    @patch('task_service.get_subtasks_count')
+    @patch('task_service.get_subtasks_counts', return_value={"parent-1": 4})
+    def test_map_rows_to_api_avoids_per_row_queries(self, mock_counts, mock_single_count):
+        """Test list mapping uses the batched counts rather than one query per row"""
+        from task_service import map_rows_to_api
+
+        rows = [
+            {"task_id": "parent-1", "isSubtask": False},
+            {"task_id": "sub-1", "isSubtask": True, "parent_task_id": "parent-1"},
+        ]
+
+        result = map_rows_to_api(rows, include_subtasks_count=True)
+
+        mock_counts.assert_called_once_with(["parent-1"])
+        mock_single_count.assert_not_called()
+        assert result[0]["subtasks_count"] == 4
+        assert "subtasks_count" not in result[1]
+
 class TestTaskLogging:
     """Test task change logging with mocked database"""
 
@@ -695,6 +750,841 @@ class TestDataMapping:
         assert "subtasks_count" not in result
 
 
+class TestTaskMembershipIndex:
+    """Test the task_member membership index used by accessible-tasks"""
+
+    def test_build_task_member_rows(self):
+        """Test owner and collaborator rows are built without duplicates"""
+        from task_service import build_task_member_rows
+
+        rows = build_task_member_rows({
+            "task_id": "task-1",
+            "owner_id": "user-1",
+            "collaborators": '["user-1", "user-2", "user-2"]'
+        })
+
+        assert rows == [
+            {"user_id": "user-1", "task_id": "task-1", "role": "owner"},
+            {"user_id": "user-2", "task_id": "task-1", "role": "collaborator"},
+        ]
+
+    @patch('task_service.supabase')
+    def test_get_member_task_ids_unavailable(self, mock_supabase):
+        """Test that a missing index returns None so callers can fall back"""
+        from task_service import get_member_task_ids
+
+        mock_supabase.table().select().eq().order().range().execute.side_effect = Exception("relation does not exist")
+
+        assert get_member_task_ids("user-1") is None
+
+    @patch('task_service.supabase')
+    def test_get_member_task_ids_reads_every_page(self, mock_supabase):
+        """Test the index is paged past the 1000-row response cap"""
+        from task_service import get_member_task_ids
+
+        pages = [[{"task_id": f"task-{index}"} for index in range(1000)], [{"task_id": "task-1000"}]]
+        query = mock_supabase.table().select().eq().order()
+        query.range().execute.side_effect = [Mock(data=page) for page in pages]
+
+        assert len(get_member_task_ids("user-1")) == 1001
+        assert query.range.call_args_list[-2:] == [((0, 999),), ((1000, 1999),)]
+
+    @patch('task_service.get_member_task_ids', return_value=["task-parent", "task-sub"])
+    @patch('task_service.supabase')
+    def test_accessible_tasks_uses_index(self, mock_supabase, mock_member_ids):
+        """Test accessible-tasks loads only indexed tasks and never scans the table"""
+        from task_service import app
+
+        mock_response = Mock()
+        mock_response.data = [
+            {"task_id": "task-parent", "title": "Parent", "owner_id": "user-1", "collaborators": []},
+            {"task_id": "task-sub", "title": "Sub", "owner_id": "user-2", "collaborators": ["user-1"],
+             "parent_task_id": "task-parent", "isSubtask": True},
+        ]
+        mock_supabase.table().select().in_().order().range().execute.return_value = mock_response
+
+        response = app.test_client().get("/users/user-1/accessible-tasks")
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [task["id"] for task in data["tasks"]] == ["task-parent"]
+        mock_supabase.table().select().in_.assert_called_with("task_id", ["task-parent", "task-sub"])
+
+    @patch('task_service.get_member_task_ids', return_value=[f"task-{index}" for index in range(450)])
+    @patch('task_service.supabase')
+    def test_accessible_tasks_batches_member_ids(self, mock_supabase, mock_member_ids):
+        """Test many indexed tasks are fetched in IN batches, not one oversized URL"""
+        from task_service import app, SWEEP_IN_BATCH_SIZE
+
+        mock_supabase.table().select().in_().order().range().execute.return_value = Mock(data=[])
+
+        response = app.test_client().get("/users/user-1/accessible-tasks")
+
+        assert response.status_code == 200
+        batches = [call.args[1] for call in mock_supabase.table().select().in_.call_args_list if call.args]
+        assert [len(batch) for batch in batches] == [SWEEP_IN_BATCH_SIZE, SWEEP_IN_BATCH_SIZE, 50]
+
+    @patch('task_service.get_member_task_ids', return_value=["task-1"])
+    @patch('task_service.supabase')
+    def test_accessible_tasks_falls_back_when_indexed_fetch_fails(self, mock_supabase, mock_member_ids):
+        """Test a failed indexed fetch uses the column queries instead of returning 500"""
+        from task_service import app
+
+        mock_supabase.table().select().in_().order().range().execute.side_effect = Exception("URI too long")
+        mock_supabase.table().select().eq().execute.return_value = Mock(
+            data=[{"task_id": "task-1", "title": "Mine", "owner_id": "user-1"}])
+        mock_supabase.table().select().filter().execute.return_value = Mock(data=[])
+
+        response = app.test_client().get("/users/user-1/accessible-tasks")
+
+        assert response.status_code == 200
+        assert [task["id"] for task in response.get_json()["tasks"]] == ["task-1"]
+
+    def test_filter_visible_tasks_rules(self):
+        """Test subtasks are shown standalone only when their parent is not accessible"""
+        from task_service import filter_visible_tasks
+
+        accessible = {
+            "parent-1": {"task_id": "parent-1", "parent_task_id": None},
+            "sub-1": {"task_id": "sub-1", "parent_task_id": "parent-1"},
+            "sub-2": {"task_id": "sub-2", "parent_task_id": "parent-hidden"},
+        }
+
+        visible = filter_visible_tasks(accessible)
+
+        assert set(visible.keys()) == {"parent-1", "sub-2"}
+
+
+class TestKeysetPagination:
+    """Test opaque cursor pagination helpers for task lists"""
+
+    def test_cursor_round_trip(self):
+        """Test a cursor decodes back to its (created_at, task_id) position"""
+        from task_service import encode_task_cursor, decode_task_cursor
+
+        cursor = encode_task_cursor({"task_id": "task-9", "created_at": "2025-01-02T03:04:05+00:00"})
+
+        assert decode_task_cursor(cursor) == {"created_at": "2025-01-02T03:04:05+00:00", "task_id": "task-9"}
+
+    def test_decode_invalid_cursor(self):
+        """Test tampered cursors are rejected"""
+        from task_service import decode_task_cursor
+
+        with pytest.raises(ValueError):
+            decode_task_cursor("not-a-cursor")
+
+    def test_fetch_task_page_sets_next_cursor(self):
+        """Test an extra row is fetched to detect the next page"""
+        from task_service import fetch_task_page, decode_task_cursor
+
+        query = MagicMock()
+        query.order.return_value = query
+        query.limit.return_value = query
+        query.execute.return_value.data = [
+            {"task_id": "task-3", "created_at": "2025-01-03"},
+            {"task_id": "task-2", "created_at": "2025-01-02"},
+            {"task_id": "task-1", "created_at": "2025-01-01"},
+        ]
+
+        rows, next_cursor = fetch_task_page(query, None, 2)
+
+        query.limit.assert_called_once_with(3)
+        assert [row["task_id"] for row in rows] == ["task-3", "task-2"]
+        assert decode_task_cursor(next_cursor)["task_id"] == "task-2"
+
+    def test_fetch_task_page_last_page(self):
+        """Test the last page has no next cursor"""
+        from task_service import fetch_task_page
+
+        query = MagicMock()
+        query.or_.return_value = query
+        query.order.return_value = query
+        query.limit.return_value = query
+        query.execute.return_value.data = [{"task_id": "task-1", "created_at": "2025-01-01"}]
+
+        rows, next_cursor = fetch_task_page(query, {"created_at": "2025-01-02", "task_id": "task-2"}, 2)
+
+        query.or_.assert_called_once()
+        assert len(rows) == 1
+        assert next_cursor is None
+
+
+class TestSparseFieldProjection:
+    """Test ?fields= projections for task list endpoints"""
+
+    def test_parse_fields_param_adds_id(self):
+        """Test id is always part of a projection"""
+        from task_service import parse_fields_param
+
+        assert parse_fields_param("title,status") == ["id", "title", "status"]
+        assert parse_fields_param(None) is None
+
+    def test_parse_fields_param_rejects_unknown(self):
+        """Test unknown field names are rejected"""
+        from task_service import parse_fields_param
+
+        with pytest.raises(ValueError):
+            parse_fields_param("title,password")
+
+    def test_build_task_select(self):
+        """Test API fields are translated to table columns"""
+        from task_service import build_task_select
+
+        columns = build_task_select(["id", "title", "dueDate"])
+
+        assert columns == "task_id,created_at,title,due_date"
+        assert build_task_select(None) == "*"
+
+    def test_map_db_row_to_api_with_fields(self):
+        """Test the mapper emits only requested fields"""
+        row = {"task_id": "task-1", "title": "Card", "due_date": "2025-03-01T00:00:00", "created_at": "2025-01-01"}
+
+        result = map_db_row_to_api(row, fields=["id", "title", "dueDate"])
+
+        assert result == {"id": "task-1", "title": "Card", "dueDate": "2025-03-01"}
+
+
+class TestBulkTaskOperations:
+    """Test POST /tasks/bulk validation, grouping and fan-out"""
+
+    def _client(self):
+        from task_service import app
+        app.config['TESTING'] = True
+        return app.test_client()
+
+    @patch('task_service.fetch_tasks_by_ids', return_value={})
+    def test_invalid_operations_reported_per_item(self, mock_fetch):
+        """Test bad items fail individually with a 207 instead of rejecting the batch"""
+        response = self._client().post('/tasks/bulk', json={
+            "user_id": "manager-1",
+            "operations": [
+                {"op": "archive", "task_id": "task-1"},
+                {"op": "reassign", "task_id": "task-2"},
+                {"op": "delete", "task_id": "task-3"},
+            ]
+        })
+
+        assert response.status_code == 207
+        results = response.get_json()["results"]
+        assert results[0]["error"] == "Unknown operation 'archive'"
+        assert results[1]["error"] == "owner_id is required for reassign"
+        assert results[2]["error"] == "Task not found"
+
+    def test_requires_operations(self):
+        """Test an empty operation list is rejected"""
+        response = self._client().post('/tasks/bulk', json={"user_id": "manager-1", "operations": []})
+
+        assert response.status_code == 400
+
+    @patch('task_service.cache_events')
+    @patch('task_service.send_bulk_summary_notifications', return_value=2)
+    @patch('task_service.log_task_changes', return_value=2)
+    @patch('task_service.fetch_tasks_by_ids')
+    @patch('task_service.supabase')
+    def test_identical_updates_share_one_query(self, mock_supabase, mock_fetch, mock_log, mock_notify, mock_events):
+        """Test tasks given the same changes are written with a single IN update"""
+        mock_fetch.return_value = {
+            "task-1": {"task_id": "task-1", "title": "A", "priority": 3, "owner_id": "staff-1"},
+            "task-2": {"task_id": "task-2", "title": "B", "priority": 4, "owner_id": "staff-1"},
+        }
+        mock_supabase.table.return_value.update.return_value.in_.return_value.execute.return_value.data = [
+            {"task_id": "task-1", "title": "A", "priority": 8, "owner_id": "staff-1"},
+            {"task_id": "task-2", "title": "B", "priority": 8, "owner_id": "staff-1"},
+        ]
+
+        response = self._client().post('/tasks/bulk', json={
+            "user_id": "manager-1",
+            "operations": [
+                {"op": "update", "task_id": "task-1", "changes": {"priority": 8}},
+                {"op": "update", "task_id": "task-2", "changes": {"priority": 8}},
+            ]
+        })
+
+        assert response.status_code == 200
+        assert response.get_json()["succeeded"] == 2
+        mock_supabase.table.return_value.update.assert_called_once_with({"priority": 8})
+        mock_supabase.table.return_value.update.return_value.in_.assert_called_once_with("task_id", ["task-1", "task-2"])
+        assert len(mock_log.call_args[0][0]) == 2  # One audit row per changed task, written together
+        changes_by_user = mock_notify.call_args[0][0]
+        assert list(changes_by_user) == ["staff-1"]
+        assert len(changes_by_user["staff-1"]) == 2
+
+    @patch('task_service.is_staff_member', return_value=False)
+    @patch('task_service.cache_events')
+    @patch('task_service.send_bulk_summary_notifications', return_value=2)
+    @patch('task_service.log_task_changes', return_value=2)
+    @patch('task_service.fetch_tasks_by_ids')
+    @patch('task_service.supabase')
+    def test_reassignments_share_one_update_and_one_collaborator_upsert(self, mock_supabase, mock_fetch, mock_log,
+                                                                        mock_notify, mock_events, mock_staff):
+        """Test per-task collaborators do not split a bulk reassignment into one query per task"""
+        mock_fetch.return_value = {
+            "task-1": {"task_id": "task-1", "title": "A", "owner_id": "staff-1", "collaborators": []},
+            "task-2": {"task_id": "task-2", "title": "B", "owner_id": "staff-2", "collaborators": ["staff-3"]},
+        }
+        table = mock_supabase.table.return_value
+        table.update.return_value.in_.return_value.execute.return_value.data = [
+            {"task_id": "task-1", "title": "A", "owner_id": "manager-2", "collaborators": []},
+            {"task_id": "task-2", "title": "B", "owner_id": "manager-2", "collaborators": ["staff-3"]},
+        ]
+        table.upsert.return_value.execute.return_value.data = [
+            {"task_id": "task-1", "title": "A", "owner_id": "manager-2", "collaborators": '["staff-1"]'},
+            {"task_id": "task-2", "title": "B", "owner_id": "manager-2", "collaborators": '["staff-3", "staff-2"]'},
+        ]
+
+        response = self._client().post('/tasks/bulk', json={
+            "user_id": "manager-1",
+            "operations": [
+                {"op": "reassign", "task_id": "task-1", "owner_id": "manager-2"},
+                {"op": "reassign", "task_id": "task-2", "owner_id": "manager-2"},
+            ]
+        })
+
+        assert response.status_code == 200
+        assert response.get_json()["succeeded"] == 2
+        table.update.assert_called_once_with({"owner_id": "manager-2"})
+        table.update.return_value.in_.assert_called_once_with("task_id", ["task-1", "task-2"])
+        table.upsert.assert_called_once()
+        rows = table.upsert.call_args[0][0]
+        assert {row["task_id"]: row["collaborators"] for row in rows} == {
+            "task-1": '["staff-1"]', "task-2": '["staff-3", "staff-2"]'}
+        assert all(row["title"] and row["owner_id"] == "manager-2" for row in rows)
+
+    @patch('task_service.sync_task_members_bulk')
+    @patch('task_service.is_staff_member', return_value=False)
+    @patch('task_service.send_bulk_summary_notifications', return_value=0)
+    @patch('task_service.log_task_changes', return_value=0)
+    @patch('task_service.fetch_tasks_by_ids', return_value={})
+    @patch('task_service.supabase')
+    def test_duplicate_title_check_reads_only_the_new_titles(self, mock_supabase, mock_fetch, mock_log,
+                                                             mock_notify, mock_staff, mock_members):
+        """Test bulk creates look up clashing titles by owner and title, paged"""
+        table = mock_supabase.table.return_value
+        taken = table.select.return_value.in_.return_value.in_.return_value.order.return_value.range.return_value
+        taken.execute.return_value.data = [{"task_id": "task-9", "owner_id": "staff-1", "title": "Report"}]
+        table.insert.return_value.execute.return_value.data = [
+            {"task_id": "task-10", "title": "Budget", "owner_id": "staff-1"},
+        ]
+
+        response = self._client().post('/tasks/bulk', json={
+            "user_id": "manager-1",
+            "operations": [
+                {"op": "create", "task": {"title": "Report", "owner_id": "staff-1"}},
+                {"op": "create", "task": {"title": "Budget ", "owner_id": "staff-1"}},
+            ]
+        })
+
+        assert response.status_code == 207
+        results = response.get_json()["results"]
+        assert results[0]["error"] == "A task titled 'Report' already exists for this owner"
+        assert results[1]["status"] == "success"
+        table.select.return_value.in_.assert_called_once_with("owner_id", ["staff-1"])
+        assert sorted(table.select.return_value.in_.return_value.in_.call_args[0][1]) == ["Budget", "Report"]
+        table.select.return_value.in_.return_value.in_.return_value.order.return_value.range.assert_called_once_with(0, 999)
+
+    @patch('task_service.requests')
+    @patch('task_service.supabase')
+    def test_summary_notification_per_user(self, mock_supabase, mock_requests):
+        """Test each affected user gets one notification and the actor gets none"""
+        from task_service import send_bulk_summary_notifications
+
+        changes = {
+            "staff-1": [{"task_id": "task-1", "title": "A", "change": "was updated"},
+                        {"task_id": "task-2", "title": "B", "change": "was assigned to you"}],
+            "manager-1": [{"task_id": "task-1", "title": "A", "change": "was updated"}],
+        }
+
+        sent = send_bulk_summary_notifications(changes, actor_id="manager-1")
+
+        assert sent == 1
+        rows = mock_supabase.table().upsert.call_args[0][0]
+        assert len(rows) == 1
+        assert rows[0]["user_id"] == "staff-1"
+        assert rows[0]["title"] == "2 task(s) changed"
+        assert rows[0]["channels"] == ["in_app", "realtime"]
+        mock_requests.post.assert_not_called()  # Real-time delivery happens in the outbox relay
+
+    def test_update_audit_entries_skip_unchanged_fields(self):
+        """Test only real changes are audited, with due dates compared by day"""
+        from task_service import build_update_audit_entries
+
+        entries = build_update_audit_entries(
+            "task-1",
+            {"due_date": "2025-05-01T00:00:00", "priority": 3},
+            {"due_date": "2025-05-01", "priority": 7},
+            "manager-1"
+        )
+
+        assert entries == [{
+            "task_id": "task-1", "action": "update", "field": "priority", "user_id": "manager-1",
+            "old_value": 3, "new_value": 7,
+        }]
+
+
+class TestMentionSuggest:
+    """Test the @mention autocomplete endpoint"""
+
+    @patch('task_service.MENTION_INDEX')
+    def test_mention_suggest_uses_name_index(self, mock_index):
+        """Test suggestions come from the in-memory index with a bounded limit"""
+        from task_service import app
+
+        mock_index.suggest.return_value = [{"user_id": "u1", "name": "Zenia", "email": "z@example.com"}]
+
+        response = app.test_client().get('/users/mention-suggest?q=ze&limit=500')
+
+        assert response.status_code == 200
+        assert response.get_json()["users"] == [{"user_id": "u1", "name": "Zenia"}]
+        mock_index.suggest.assert_called_once_with("ze", 50)
+
+
+class TestTaskCreatorAccess:
+    """Test creator identity from task.created_by and the task access cache"""
+
+    def test_created_by_on_row_skips_lookup(self):
+        """Test rows carrying created_by need no creator lookup"""
+        from task_service import can_user_access_task
+
+        task_data = {"task_id": "task-1", "owner_id": "user-owner", "collaborators": ["user-manager"], "created_by": "user-manager"}
+
+        with patch('task_service.is_task_creator') as mock_is_creator:
+            access = can_user_access_task("user-manager", task_data)
+
+        assert access["access_type"] == "creator"
+        mock_is_creator.assert_not_called()
+
+    @patch('task_service.supabase')
+    def test_is_task_creator_is_cached(self, mock_supabase):
+        """Test repeated checks hit the access cache and never read task_log"""
+        from task_service import is_task_creator
+
+        mock_supabase.table().select().eq().execute.return_value.data = [
+            {"task_id": "task-1", "owner_id": "user-owner", "collaborators": "[]", "created_by": "user-manager"}
+        ]
+        mock_supabase.table.reset_mock()
+
+        assert is_task_creator("task-1", "user-manager") is True
+        assert is_task_creator("task-1", "user-other") is False
+        mock_supabase.table.assert_called_once_with("task")
+
+    @patch('task_service.supabase')
+    @patch('task_service._load_task_access_rows')
+    def test_load_task_access_falls_back_to_oldest_create_log(self, mock_rows, mock_supabase):
+        """Test rows not yet backfilled use their earliest 'create' audit entry"""
+        from task_service import load_task_access
+
+        mock_rows.return_value = {"task-1": {"task_id": "task-1", "owner_id": "user-owner", "created_by": None}}
+        mock_supabase.table().select().in_().eq().execute.return_value.data = [
+            {"task_id": "task-1", "user_id": "user-late", "created_at": "2025-02-01T00:00:00"},
+            {"task_id": "task-1", "user_id": "user-first", "created_at": "2025-01-01T00:00:00"},
+        ]
+
+        assert load_task_access(["task-1"])["task-1"]["created_by"] == "user-first"
+
+    @patch('task_service.cache_events')
+    def test_publish_task_change_evicts_access_entry(self, mock_events):
+        """Test collaborator changes drop the cached access entry before publishing"""
+        from task_service import TASK_ACCESS_CACHE, publish_task_change
+
+        TASK_ACCESS_CACHE.put("task-1", {"task_id": "task-1", "created_by": "user-manager"})
+
+        publish_task_change(["task-1"])
+
+        assert "task-1" not in TASK_ACCESS_CACHE
+        mock_events.publish.assert_called_once_with("task", ["task-1"], action="updated")
+
+
+class TestTaskDetailsFanOut:
+    """Test /tasks/<task_id>/details merges concurrent stages"""
+
+    @patch('task_service.batch_fetch_users', return_value={"user-1": {"user_id": "user-1", "name": "Ann"}})
+    @patch('task_service.get_subtasks_counts', return_value={"123e4567-e89b-12d3-a456-426614174000": 2})
+    @patch('task_service.get_task_by_id')
+    @patch('task_service.supabase')
+    def test_details_reports_stage_timings(self, mock_supabase, mock_get_task, mock_counts, mock_users):
+        """Test every stage result is merged and timed in the debug block"""
+        from task_service import app
+
+        task_id = "123e4567-e89b-12d3-a456-426614174000"
+        mock_get_task.return_value = {"task_id": task_id, "title": "Card", "owner_id": "user-1", "collaborators": "[]"}
+        mock_supabase.table().select().eq().order().execute.return_value.data = [
+            {"comment_id": "c1", "comment_text": "hi", "user_id": "user-1", "created_at": "2025-01-01"}
+        ]
+
+        response = app.test_client().get(f'/tasks/{task_id}/details')
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["subtasks_count"] == 2
+        assert body["comments"][0]["user_name"] == "Ann"
+        assert set(body["debug"]["stage_timings_ms"]) == {"task", "comments", "logs", "subtasks_count", "users"}
+
+    @patch('task_service.get_task_by_id', return_value=None)
+    @patch('task_service.supabase')
+    def test_details_not_found(self, mock_supabase, mock_get_task):
+        """Test a missing task still returns 404"""
+        from task_service import app
+
+        response = app.test_client().get('/tasks/123e4567-e89b-12d3-a456-426614174000/details')
+
+        assert response.status_code == 404
+
+
+class TestDueDateSweep:
+    """Test the set-based due-date reminder sweep"""
+
+    def _task(self, task_id, days_from_today, **extra):
+        due = (datetime.now(timezone.utc).date() + timedelta(days=days_from_today)).isoformat()
+        return {"task_id": task_id, "title": f"Task {task_id}", "due_date": due, "status": "Ongoing",
+                "owner_id": "user-owner", "collaborators": '["user-collab"]', **extra}
+
+    def test_plan_respects_custom_days_duplicates_and_preferences(self):
+        """Test the in-memory plan applies reminder days, 24h duplicates and channel preferences"""
+        from task_service import plan_due_date_reminders
+
+        today = datetime.now(timezone.utc).date()
+        tasks = [self._task("t1", 3), self._task("t2", 5), self._task("t3", 2), self._task("t4", 3, status="Completed")]
+
+        plan = plan_due_date_reminders(
+            tasks,
+            reminder_days_by_task={"t3": [2]},
+            already_sent={("t1", "user-collab", "reminder_3_days")},
+            preferences={("user-owner", "t3"): {"in_app_enabled": False, "email_enabled": True}},
+            today=today
+        )
+
+        assert sorted((item["task"]["task_id"], item["user_id"]) for item in plan) == [
+            ("t1", "user-owner"), ("t3", "user-collab"), ("t3", "user-owner")
+        ]
+        muted = next(item for item in plan if item["task"]["task_id"] == "t3" and item["user_id"] == "user-owner")
+        assert muted["in_app"] is False and muted["email"] is True
+
+    @patch('task_service.EMAIL_SERVICE_AVAILABLE', False)
+    @patch('task_service.requests')
+    @patch('task_service.notification_publisher')
+    @patch('task_service.supabase')
+    def test_sweep_uses_fixed_number_of_queries(self, mock_supabase, mock_publisher, mock_requests):
+        """Test query count does not grow with tasks or stakeholders"""
+        from task_service import run_due_date_sweep
+
+        tasks = [self._task(f"t{index}", 7) for index in range(20)]
+        query = MagicMock()
+        for method in ("select", "gte", "lt", "neq", "order", "range", "in_", "like", "upsert"):
+            getattr(query, method).return_value = query
+        query.execute.side_effect = lambda: Mock(data=[])
+        mock_supabase.table.return_value = query
+
+        result = run_due_date_sweep(tasks)
+
+        # reminder prefs + sent reminders + notification prefs + one bulk outbox write
+        assert result["queries"] == 4
+        assert result["reminders_planned"] == 40
+        assert result["notifications_queued"] == 40
+        inserted = query.upsert.call_args[0][0]
+        assert len(inserted) == 40
+        assert mock_publisher.publish_due_date_notification.call_count == 20
+
+    def test_in_batches_are_paged_past_the_row_cap(self):
+        """Test a batch matching more rows than one response holds is read page by page, not truncated"""
+        from task_service import _select_in_batches, SweepQueryCounter, SWEEP_PAGE_SIZE
+
+        query = MagicMock()
+        query.range.side_effect = lambda start, end: Mock(start=start)
+        pages = {0: [{"user_id": f"u{n}"} for n in range(SWEEP_PAGE_SIZE)], SWEEP_PAGE_SIZE: [{"user_id": "last"}]}
+        counter = SweepQueryCounter()
+        counter.execute = lambda page_query: Mock(data=pages[page_query.start])
+
+        rows = _select_in_batches(counter, lambda batch: query, ["t1", "t2"])
+
+        assert len(rows) == SWEEP_PAGE_SIZE + 1 and rows[-1] == {"user_id": "last"}
+        assert [call[0] for call in query.range.call_args_list] == [(0, SWEEP_PAGE_SIZE - 1),
+                                                                    (SWEEP_PAGE_SIZE, 2 * SWEEP_PAGE_SIZE - 1)]
+
+
+
+class TestRecurrenceEngine:
+    """Test rule-based recurrence, previews over a horizon and instance materialization"""
+
+    TASK_ID = "123e4567-e89b-12d3-a456-426614174000"
+
+    def test_calculate_next_due_date_rule_string(self):
+        """Test rule strings work wherever legacy keywords do"""
+        from task_service import calculate_next_due_date, next_recurrence_value
+
+        assert calculate_next_due_date("2025-10-17", "FREQ=WEEKLY;BYDAY=MO,FR") == "2025-10-20"
+        assert calculate_next_due_date("2025-10-17", "FREQ=DAILY;COUNT=1") is None
+        assert next_recurrence_value("FREQ=DAILY;COUNT=3") == "FREQ=DAILY;COUNT=2"
+        assert next_recurrence_value("weekly") == "weekly"
+
+    def test_instances_created_on_completion_keep_the_month_end(self):
+        """Test chaining calculate_next_due_date over short months matches the preview (Jan 31 -> Mar 31)"""
+        from task_service import calculate_next_due_date, next_recurrence_value
+
+        due_dates, recurrence, due_date = [], "monthly", "2026-01-31"
+        for _ in range(3):
+            next_due_date = calculate_next_due_date(due_date, recurrence)
+            recurrence = next_recurrence_value(recurrence, anchor=due_date)
+            due_date = next_due_date
+            due_dates.append(due_date)
+
+        assert due_dates == ["2026-02-28", "2026-03-31", "2026-04-30"]
+        assert recurrence == "FREQ=MONTHLY;BYMONTHDAY=31"
+        assert next_recurrence_value("monthly", anchor="2026-01-15") == "monthly"
+
+    @patch('task_service.get_task_by_id')
+    def test_preview_until_horizon(self, mock_get_task):
+        """Test the preview expands every occurrence up to an end date"""
+        from task_service import app
+
+        mock_get_task.return_value = {"task_id": self.TASK_ID, "title": "Standup", "recurrence": "FREQ=WEEKLY;BYDAY=MO,WE",
+                                      "due_date": "2025-10-15"}
+
+        response = app.test_client().get(f'/tasks/{self.TASK_ID}/recurring-preview?until=2025-10-31')
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert [item["due_date"] for item in data["next_instances"]] == ["2025-10-20", "2025-10-22", "2025-10-27", "2025-10-29"]
+        assert data["rule"]["byday"] == ["MO", "WE"]
+
+    @patch('task_service.get_task_by_id')
+    def test_preview_count_and_end_of_series(self, mock_get_task):
+        """Test count limits the preview and has_more reflects COUNT"""
+        from task_service import app
+
+        mock_get_task.return_value = {"task_id": self.TASK_ID, "title": "Report", "recurrence": "FREQ=MONTHLY;COUNT=3",
+                                      "due_date": "2025-01-31"}
+
+        response = app.test_client().get(f'/tasks/{self.TASK_ID}/recurring-preview?count=10')
+
+        data = response.get_json()
+        assert [item["due_date"] for item in data["next_instances"]] == ["2025-02-28", "2025-03-31"]
+        assert data["has_more"] is False
+
+    def test_create_rejects_invalid_rule(self):
+        """Test malformed recurrence rules are rejected before any write"""
+        from task_service import app
+
+        with patch('task_service.supabase') as mock_supabase:
+            response = app.test_client().post('/tasks', json={"title": "Bad", "recurrence": "FREQ=HOURLY"})
+
+        assert response.status_code == 400
+        assert "recurrence" in response.get_json()["error"]
+        mock_supabase.table.assert_not_called()
+
+    def test_plan_chains_instances_within_window(self):
+        """Test instances up to the horizon are chained through recurrence_parent_id"""
+        from task_service import plan_recurring_instances
+        from datetime import date
+
+        head = {"task_id": "head", "title": "Backup", "owner_id": "staff-1", "due_date": "2025-10-13",
+                "recurrence": "FREQ=WEEKLY;COUNT=3", "priority": 3}
+
+        plan = plan_recurring_instances([head], date(2025, 11, 30), {"staff-1": True})
+
+        rows = [item["row"] for item in plan]
+        assert [row["due_date"] for row in rows] == ["2025-10-20", "2025-10-27"]
+        assert rows[0]["recurrence_parent_id"] == "head"
+        assert rows[1]["recurrence_parent_id"] == rows[0]["task_id"]
+        assert [row["recurrence"] for row in rows] == ["FREQ=WEEKLY;COUNT=2", "FREQ=WEEKLY;COUNT=1"]
+        assert rows[0]["status"] == "Ongoing"
+
+    @patch('task_service.get_user_role', return_value="Staff")
+    @patch('task_service.supabase')
+    def test_materialize_skips_series_with_successor(self, mock_supabase, mock_role):
+        """Test series whose next instance exists are left alone and new rows go out in one insert"""
+        from task_service import materialize_recurring_instances
+
+        due = (datetime.now(timezone.utc).date() + timedelta(days=1)).isoformat()
+        heads = [
+            {"task_id": "a", "title": "A", "owner_id": "u1", "due_date": due, "recurrence": "daily", "status": "Ongoing"},
+            {"task_id": "b", "title": "B", "owner_id": "u1", "due_date": due, "recurrence": "daily", "status": "Ongoing"},
+        ]
+        responses = {
+            "range": Mock(data=heads),
+            "recurrence_parent_id": Mock(data=[{"recurrence_parent_id": "b"}]),
+        }
+        query = MagicMock()
+        for method in ("select", "is_", "neq", "lte", "order", "eq"):
+            getattr(query, method).return_value = query
+        query.not_ = query
+        state = {}
+        # Each query is answered by its IN field (IN batches are paged with .range too), else by "range"
+        query.range.side_effect = lambda *args: state.setdefault("last", "range") and query
+        query.in_.side_effect = lambda field, ids: state.update(last=field) or query
+        query.insert.side_effect = lambda rows: state.update(last="insert", rows=rows) or query
+        query.execute.side_effect = lambda: (Mock(data=state["rows"]) if state.get("last") == "insert"
+                                             else responses.get(state.get("last"), Mock(data=[])))
+        mock_supabase.table.side_effect = lambda name: state.clear() or query
+
+        result = materialize_recurring_instances(window_days=3)
+
+        assert result["series_checked"] == 1
+        assert result["instances_created"] == 2
+        task_inserts = [call[0][0] for call in query.insert.call_args_list if call[0][0] and "due_date" in call[0][0][0]]
+        assert len(task_inserts) == 1
+        assert task_inserts[0][0]["recurrence_parent_id"] == "a"
+        assert task_inserts[0][1]["recurrence_parent_id"] == task_inserts[0][0]["task_id"]
+
+
+class TestNotificationOutboxWrites:
+    """Test request-path notifications are written to the outbox instead of delivered inline"""
+
+    @patch('task_service.send_notification_email', create=True)
+    @patch('task_service.requests')
+    @patch('task_service.supabase')
+    def test_comment_notification_is_one_outbox_write(self, mock_supabase, mock_requests, mock_email):
+        """Test a comment queues one row per stakeholder keyed by the comment, with no inline delivery"""
+        from task_service import notify_task_comment
+
+        task = {"task_id": "task-1", "title": "Report", "owner_id": "user-owner", "collaborators": ["user-collab", "user-commenter"]}
+
+        notify_task_comment(task, "Looks good", "user-commenter", "Ann", comment_id="comment-1")
+        notify_task_comment(task, "Looks good", "user-commenter", "Ann", comment_id="comment-1")
+
+        upserts = mock_supabase.table.return_value.upsert.call_args_list
+        assert len(upserts) == 2
+        rows = upserts[0][0][0]
+        assert sorted(row["user_id"] for row in rows) == ["user-collab", "user-owner"]
+        assert {row["channels"] == ["in_app", "realtime", "email"] for row in rows} == {True}
+        # Same comment, same keys: the second write is ignored by the unique index
+        assert [row["idempotency_key"] for row in upserts[1][0][0]] == [row["idempotency_key"] for row in rows]
+        mock_supabase.table.return_value.insert.assert_not_called()
+        mock_requests.post.assert_not_called()
+        mock_email.assert_not_called()
+
+    @patch('task_service.supabase')
+    def test_repeated_due_date_change_is_notified_again(self, mock_supabase):
+        """Test a second change between the same dates gets new keys, while a retried change reuses its keys"""
+        from task_service import notify_collaborators_due_date_change
+
+        task = {"task_id": "task-1", "title": "Report", "owner_id": "user-owner", "collaborators": []}
+
+        notify_collaborators_due_date_change(task, "2025-10-01", "2025-10-08", change_id="change-1")
+        notify_collaborators_due_date_change(task, "2025-10-01", "2025-10-08", change_id="change-1")
+        notify_collaborators_due_date_change(task, "2025-10-01", "2025-10-08", change_id="change-3")
+        notify_collaborators_due_date_change(task, "2025-10-01", "2025-10-08")
+
+        keys = [call[0][0][0]["idempotency_key"] for call in mock_supabase.table.return_value.upsert.call_args_list]
+        assert keys[0] == keys[1]
+        assert len({keys[0], keys[2], keys[3]}) == 3
+
+
+class TestTaskStats:
+    """Test the server-side dashboard aggregates"""
+
+    @patch('task_service.supabase')
+    def test_grouped_query_is_folded(self, mock_supabase):
+        """Test grouped rows from task_stats become totals and per-owner breakdowns"""
+        from task_service import app
+
+        mock_supabase.rpc.return_value.execute.return_value.data = [
+            {"owner_id": "u1", "status": "Ongoing", "priority": "5", "total": 3, "overdue": 1, "due_soon": 1,
+             "completion_days_sum": 0, "completion_samples": 0},
+            {"owner_id": "u1", "status": "Completed", "priority": "8", "total": 2, "overdue": 0, "due_soon": 0,
+             "completion_days_sum": 6.0, "completion_samples": 2},
+            {"owner_id": "u2", "status": "Completed", "priority": "5", "total": 1, "overdue": 0, "due_soon": 0,
+             "completion_days_sum": 1.0, "completion_samples": 1},
+        ]
+
+        response = app.test_client().get('/tasks/stats?owner_ids=u1,u2&today=2025-10-17')
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["total"] == 6
+        assert data["by_status"] == {"Ongoing": 3, "Completed": 3}
+        assert data["by_priority"] == {"5": 4, "8": 2}
+        assert data["overdue"] == 1 and data["completed"] == 3
+        assert data["avg_completion_days"] == round(7.0 / 3, 2)
+        assert data["by_owner"]["u1"]["avg_completion_days"] == 3.0
+        assert data["source"] == "grouped_query"
+        assert mock_supabase.rpc.call_args[0][1]["p_owner_ids"] == ["u1", "u2"]
+        mock_supabase.table.assert_not_called()
+
+    @patch('task_service.supabase')
+    def test_scan_fallback_counts_overdue_and_completion(self, mock_supabase):
+        """Test the column-scan fallback yields the same counters when the function is missing"""
+        from task_service import app
+
+        mock_supabase.rpc.side_effect = Exception("function task_stats does not exist")
+        query = MagicMock()
+        for method in ("select", "eq", "in_", "order", "range"):
+            getattr(query, method).return_value = query
+        query.execute.return_value.data = [
+            {"owner_id": "u1", "status": "Ongoing", "priority": 5, "due_date": "2025-10-10"},
+            {"owner_id": "u1", "status": "Ongoing", "priority": 5, "due_date": "2025-10-20"},
+            {"owner_id": "u1", "status": "Completed", "priority": 9, "due_date": "2025-10-01",
+             "created_at": "2025-10-01T00:00:00+00:00", "completed_date": "2025-10-03T12:00:00+00:00"},
+        ]
+        mock_supabase.table.return_value = query
+
+        response = app.test_client().get('/tasks/stats?owner_id=u1&today=2025-10-17')
+
+        data = response.get_json()
+        assert data["source"] == "scan"
+        assert data["total"] == 3 and data["overdue"] == 1 and data["due_soon"] == 1
+        assert data["avg_completion_days"] == 2.5
+        assert "by_owner" not in data
+        query.select.assert_called_with("owner_id, status, priority, due_date, created_at, completed_date")
+
+    @patch('task_service.supabase')
+    def test_scan_fallback_main_only_keeps_null_subtask_flags(self, mock_supabase):
+        """Test main_only matches isSubtask IS NOT TRUE like task_stats, so NULL rows are counted"""
+        from task_service import app
+
+        mock_supabase.rpc.side_effect = Exception("function task_stats does not exist")
+        query = MagicMock()
+        for method in ("select", "eq", "in_", "or_", "order", "range"):
+            getattr(query, method).return_value = query
+        query.execute.return_value.data = []
+        mock_supabase.table.return_value = query
+
+        app.test_client().get('/tasks/stats?owner_id=u1&main_only=true&today=2025-10-17')
+
+        query.or_.assert_called_once_with("isSubtask.is.null,isSubtask.eq.false")
+        assert ("isSubtask", False) not in [call.args for call in query.eq.call_args_list]
+
+
+class TestSearch:
+    """Test ranked full-text search"""
+
+    USER_ID = "123e4567-e89b-12d3-a456-426614174000"
+
+    @patch('task_service.supabase')
+    def test_search_returns_ranked_page(self, mock_supabase):
+        """Test the query, access scope and paging are passed to one search call"""
+        from task_service import app
+
+        mock_supabase.rpc.return_value.execute.return_value.data = [
+            {"type": "task", "id": "t1", "task_id": "t1", "project_id": None, "title": "Quarterly report",
+             "snippet": "**report** draft", "rank": 0.9, "total": 3},
+            {"type": "comment", "id": "c1", "task_id": "t2", "project_id": "p1", "title": "Budget",
+             "snippet": "see the **report**", "rank": 0.4, "total": 3},
+        ]
+
+        response = app.test_client().get(f'/search?q=report&user_id={self.USER_ID}&page=1&page_size=2')
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert [result["type"] for result in data["results"]] == ["task", "comment"]
+        assert data["total"] == 3 and data["has_more"] is True
+        params = mock_supabase.rpc.call_args[0][1]
+        assert mock_supabase.rpc.call_args[0][0] == "search_workspace"
+        assert params["p_user_id"] == self.USER_ID
+        assert (params["p_limit"], params["p_offset"]) == (2, 0)
+        mock_supabase.table.assert_not_called()
+
+    @patch('task_service.supabase')
+    def test_search_validates_input(self, mock_supabase):
+        """Test short queries, missing users and unknown types are rejected before searching"""
+        from task_service import app
+
+        client = app.test_client()
+        assert client.get(f'/search?q=a&user_id={self.USER_ID}').status_code == 400
+        assert client.get('/search?q=report').status_code == 400
+        assert client.get(f'/search?q=report&user_id={self.USER_ID}&types=user').status_code == 400
+        mock_supabase.rpc.assert_not_called()
+
+
 # ============================================================================
 # INTEGRATION TESTS - Test actual service endpoints
 # ============================================================================